@@ -106,6 +106,28 @@ def rime_solver(slvr_cfg):
 
     return montblanc.factory.rime_solver(slvr_cfg)
 
+def solver_pool():
+    """
+    solver_pool()
+
+    Returns the process-level pool of RIME solvers.
+    Solvers released to the pool are reused by later
+    acquisitions with an equivalent configuration.
+
+    .. code-block:: python
+
+        with montblanc.solver_pool().solver(slvr_cfg) as slvr:
+            slvr.solve(...)
+
+    Returns
+    -------
+    A :class:`montblanc.pool.SolverPool`
+    """
+
+    import montblanc.pool
+
+    return montblanc.pool.default_solver_pool()
+
 from ._version import get_versions
 __version__ = get_versions()['version']
 del get_versions
@@ -99,6 +99,17 @@ def config_validator():
                                "If 'test', initialised with sensible "
                                "test data." },
 
+        'backend': {
+            'type': 'string',
+            'allowed': ['tensorflow', 'numpy'],
+            'default': 'tensorflow',
+            '__description__': "Compute backend. "
+                               "If 'tensorflow', the RIME is computed "
+                               "with the compiled tensorflow operators. "
+                               "If 'numpy', the RIME is computed with "
+                               "NumPy and Numba, without requiring "
+                               "tensorflow." },
+
         'device_type': {
             'type': 'string',
             'allowed': ['CPU', 'GPU'],
@@ -119,6 +130,16 @@ def config_validator():
                                "when computing number of baselines "
                                "from number of antenna." },
 
+        'field_ids': {
+            'type': 'list',
+            'schema': {'type': 'integer', 'min': 0},
+            'default': [0],
+            '__description__': "Measurement Set fields to process. "
+                               "Rows of all fields are ordered in a "
+                               "single pass over the Measurement Set, "
+                               "and each field is solved after "
+                               "selecting it on the manager." },
+
         'polarisation_type': {
             'type': 'string',
             'allowed': ['linear', 'circular'],
@@ -126,6 +147,29 @@ def config_validator():
             '__description__': "Type of polarisation. "
                                "Should be 'linear' or 'circular'." },
 
+        'beam_model': {
+            'type': 'string',
+            'allowed': ['cube', 'cos3', 'airy', 'gaussian'],
+            'default': 'cube',
+            '__description__': "Primary beam model. If 'cube', the "
+                               "E beam is interpolated from the "
+                               "'ebeam' cube. Otherwise, an analytic "
+                               "'cos3', 'airy' or 'gaussian' beam "
+                               "is evaluated directly and no beam "
+                               "cube is required." },
+
+        'beam_parameter': {
+            'type': 'number',
+            'min': 0,
+            'nullable': True,
+            'default': None,
+            '__description__': "Parameter of the analytic beam model. "
+                               "The cos3 frequency scaling in rad^-1 Hz^-1 "
+                               "(default 65e-9), or the dish diameter "
+                               "in metres for the airy and gaussian "
+                               "models (default 13.5). "
+                               "If None, the default is used." },
+
         'mem_budget': {
             'type': 'integer',
             'min': 1024,
@@ -134,6 +178,62 @@ def config_validator():
                                "tile of the problem on a CPU/GPU "
                                "in bytes." },
 
+        'thread_budget': {
+            'type': 'boolean',
+            'default': True,
+            '__description__': "Plan the number of OpenMP threads per "
+                               "operator and the sizes of the tensorflow "
+                               "intra-op and inter-op thread pools so that "
+                               "concurrently executing shards do not "
+                               "oversubscribe the CPUs. If False, "
+                               "library defaults are used." },
+
+        'cpu_threads': {
+            'type': 'integer',
+            'min': 0,
+            'default': 0,
+            '__description__': "Number of CPU threads available "
+                               "to the solver. If 0, all CPUs "
+                               "available to the process are used." },
+
+        'tile_cache_bytes': {
+            'type': 'integer',
+            'min': 0,
+            'default': 0,
+            '__description__': "Memory budget in bytes for caching the "
+                               "model visibilities and chi-squared of "
+                               "solved tiles, keyed on a hash of every "
+                               "input fed for the tile. Tiles whose "
+                               "inputs are identical to a cached tile "
+                               "are not computed. If 0, tile results "
+                               "are not cached." },
+
+        'shards_per_device': {
+            'type': 'integer',
+            'min': 1,
+            'default': 2,
+            '__description__': "Number of shards concurrently "
+                               "computing tiles of the problem "
+                               "on each device." },
+
+        'cpu_affinity': {
+            'type': 'boolean',
+            'default': False,
+            '__description__': "Pin the feed and compute threads of "
+                               "each shard to a disjoint set of CPUs, "
+                               "grouped by NUMA node." },
+
+        'graph_cache': {
+            'type': 'string',
+            'nullable': True,
+            'default': None,
+            '__description__': "Directory in which compute graphs are "
+                               "serialised. If set, a solver imports the "
+                               "graph previously constructed for the same "
+                               "configuration, devices and shards instead "
+                               "of rebuilding it. If None, the graph "
+                               "is always constructed." },
+
         'source_batch_size': {
             'type': 'integer',
             'min': 0,
@@ -107,6 +107,9 @@ if __name__ == '__main__':
         type=lambda v: v.lower() in ("yes", "true", "t", "1"),
         choices=[True, False], default=False,
         help='Handle auto-correlations')
+    parser.add_argument('-f','--fields', dest='field_ids',
+        type=int, nargs='+', default=[0],
+        help='Fields to process')
 
     args = parser.parse_args(sys.argv[1:])
 
@@ -118,7 +121,8 @@ if __name__ == '__main__':
         mem_budget=1024*1024*1024,
         data_source='default',
         dtype='double',
-        auto_correlations=args.auto_correlations)
+        auto_correlations=args.auto_correlations,
+        field_ids=args.field_ids)
 
     with montblanc.rime_solver(slvr_cfg) as slvr:
         # Manages measurement sets
@@ -135,5 +139,7 @@ if __name__ == '__main__':
         # Dump model visibilities into CORRECTED_DATA
         sink_provs.append(MSSinkProvider(ms_mgr, 'CORRECTED_DATA'))
 
-        slvr.solve(source_providers=source_provs,
-            sink_providers=sink_provs)
+        # Solve each field, reading the MS only once
+        for field_id in ms_mgr.iter_fields():
+            slvr.solve(source_providers=source_provs,
+                sink_providers=sink_provs)
@@ -0,0 +1,94 @@
+import argparse
+import time
+
+import numpy as np
+
+import montblanc
+import montblanc.util as mbu
+from montblanc.impl.rime.tensorflow.sources import SourceProvider
+
+def create_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ntime", default=100, type=int,
+                                   help="Number of timesteps")
+    parser.add_argument("--nchan", default=64, type=int,
+                                   help="Number of channels")
+    parser.add_argument("--na", default=27, type=int,
+                                    help="Number of antenna")
+    parser.add_argument("--npsrc", default=10, type=int,
+                                    help="Number of point sources")
+    parser.add_argument("--ngsrc", default=10, type=int,
+                                    help="Number of gaussian sources")
+    parser.add_argument("--nssrc", default=10, type=int,
+                                    help="Number of sersic sources")
+    parser.add_argument("--dtype", default='double',
+                                    choices=['float', 'double'],
+                                    help="Floating point precision")
+    parser.add_argument("--iterations", default=3, type=int,
+                                    help="Number of timed solves")
+    parser.add_argument("--backends", default=['numpy', 'tensorflow'],
+                                    nargs='+',
+                                    choices=['numpy', 'tensorflow'],
+                                    help="Backends to benchmark")
+
+    return parser
+
+args = create_parser().parse_args()
+
+class BenchmarkSourceProvider(SourceProvider):
+    """ Configures the problem size. Data comes from the 'test' data source """
+    def name(self):
+        return self.__class__.__name__
+
+    def updated_dimensions(self):
+        return [("ntime", args.ntime),
+                ("nchan", args.nchan),
+                ("na", args.na),
+                ("nbl", mbu.nr_of_baselines(args.na)),
+                ("npsrc", args.npsrc),
+                ("ngsrc", args.ngsrc),
+                ("nssrc", args.nssrc)]
+
+def benchmark(backend):
+    """ Time solves of the RIME on the CPU with the given backend """
+    slvr_cfg = montblanc.rime_solver_cfg(backend=backend,
+        data_source='test', device_type='CPU', dtype=args.dtype,
+        mem_budget=2*1024*1024*1024)
+
+    with montblanc.rime_solver(slvr_cfg) as slvr:
+        source_provs = [BenchmarkSourceProvider()]
+
+        # Warm up, compiling kernels and graphs
+        slvr.solve(source_providers=source_provs)
+
+        timings = []
+
+        for i in range(args.iterations):
+            start = time.time()
+            slvr.solve(source_providers=source_provs)
+            timings.append(time.time() - start)
+
+    return timings
+
+results = {}
+
+for backend in args.backends:
+    try:
+        results[backend] = benchmark(backend)
+    except ImportError as e:
+        montblanc.log.warn("Skipping the '{b}' backend, "
+            "it is unavailable: {e}".format(b=backend, e=e))
+
+nvis = args.ntime*mbu.nr_of_baselines(args.na)*args.nchan
+nsrc = args.npsrc + args.ngsrc + args.nssrc
+
+for backend, timings in results.iteritems():
+    best = min(timings)
+    print ("{b:>12}: best {t:.3f}s, mean {m:.3f}s over {n} solves. "
+        "{r:.3e} source visibilities per second".format(
+            b=backend, t=best, m=np.mean(timings), n=len(timings),
+            r=nvis*nsrc/best))
+
+if len(results) == 2:
+    print "numpy/tensorflow speedup: {s:.2f}".format(
+        s=min(results['tensorflow'])/min(results['numpy']))
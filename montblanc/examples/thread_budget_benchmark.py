@@ -0,0 +1,89 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import montblanc
+import montblanc.util as mbu
+from montblanc.impl.rime.tensorflow.sources import SourceProvider
+
+def create_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ntime", default=100, type=int,
+                                   help="Number of timesteps")
+    parser.add_argument("--nchan", default=64, type=int,
+                                   help="Number of channels")
+    parser.add_argument("--na", default=27, type=int,
+                                    help="Number of antenna")
+    parser.add_argument("--npsrc", default=50, type=int,
+                                    help="Number of point sources")
+    parser.add_argument("--iterations", default=3, type=int,
+                                    help="Number of timed solves")
+    parser.add_argument("--cpu-threads", default=0, type=int,
+                                    help="CPU threads available to the "
+                                         "solver. 0 uses all CPUs")
+    parser.add_argument("--cpu-affinity", action='store_true',
+                                    help="Pin shards to CPUs")
+    # Internal, runs a single configuration in a child process
+    parser.add_argument("--child", choices=['default', 'budget'],
+                                    help=argparse.SUPPRESS)
+
+    return parser
+
+args = create_parser().parse_args()
+
+class BenchmarkSourceProvider(SourceProvider):
+    """ Configures the problem size. Data comes from the 'test' data source """
+    def name(self):
+        return self.__class__.__name__
+
+    def updated_dimensions(self):
+        return [("ntime", args.ntime),
+                ("nchan", args.nchan),
+                ("na", args.na),
+                ("nbl", mbu.nr_of_baselines(args.na)),
+                ("npsrc", args.npsrc)]
+
+def benchmark(thread_budget):
+    """ Time solves of the RIME on the CPU """
+    slvr_cfg = montblanc.rime_solver_cfg(data_source='test',
+        device_type='CPU', thread_budget=thread_budget,
+        cpu_threads=args.cpu_threads, cpu_affinity=args.cpu_affinity)
+
+    with montblanc.rime_solver(slvr_cfg) as slvr:
+        source_provs = [BenchmarkSourceProvider()]
+
+        # Warm up
+        slvr.solve(source_providers=source_provs)
+
+        timings = []
+
+        for i in range(args.iterations):
+            start = time.time()
+            slvr.solve(source_providers=source_provs)
+            timings.append(time.time() - start)
+
+    return timings
+
+if args.child is not None:
+    print json.dumps(benchmark(args.child == 'budget'))
+    sys.exit(0)
+
+# OpenMP reads its thread count once, when the rime library
+# is loaded, so run each configuration in a separate process
+results = {}
+
+for config in ('default', 'budget'):
+    cmd = [sys.executable] + sys.argv + ['--child', config]
+    output = subprocess.check_output(cmd)
+    results[config] = json.loads(output.strip().splitlines()[-1])
+
+for config in ('default', 'budget'):
+    timings = results[config]
+    print "{c:>8}: best {b:.3f}s, mean {m:.3f}s over {n} solves".format(
+        c=config, b=min(timings), m=sum(timings)/len(timings),
+        n=len(timings))
+
+print "Thread budget speedup: {s:.2f}".format(
+    s=min(results['default'])/min(results['budget']))
@@ -20,5 +20,14 @@
 
 def rime_solver(slvr_cfg):
     """ Factory function that produces a RIME solver """
-    from montblanc.impl.rime.tensorflow.RimeSolver import RimeSolver
+    if slvr_cfg.get('backend', 'tensorflow') == 'numpy':
+        from montblanc.impl.rime.numpy.RimeSolver import RimeSolver
+    else:
+        # OpenMP threads must be configured before the
+        # tensorflow rime library is loaded
+        from montblanc.impl.rime.tensorflow.thread_budget import (
+            configure_openmp)
+        configure_openmp(slvr_cfg)
+        from montblanc.impl.rime.tensorflow.RimeSolver import RimeSolver
+
     return RimeSolver(slvr_cfg)
\ No newline at end of file
@@ -0,0 +1,469 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import time
+
+import numpy as np
+from attrdict import AttrDict
+
+import montblanc
+from montblanc.src_types import source_var_types
+from montblanc.solvers import MontblancNumpySolver
+
+from montblanc.impl.rime.tensorflow.sources import SourceContext
+from montblanc.impl.rime.tensorflow.sinks import (SinkContext,
+    NullSinkProvider)
+from montblanc.impl.rime.tensorflow.start_context import StartContext
+from montblanc.impl.rime.tensorflow.stop_context import StopContext
+from montblanc.impl.rime.tensorflow.init_context import InitialisationContext
+from montblanc.impl.rime.tensorflow.solver_utils import (ALL_POLS_FLAGGED,
+    DataSource, DataSink, DataSourceCopies,
+    _create_defaults_source_provider, _pack_flags, _get_data, _supply_data,
+    _iter_args, _budget, _apply_source_provider_dim_updates,
+    _setup_hypercube, _partition, _analytic_beam, BEAM_CUBE_DIMS,
+    _create_tile_cache, _solve_digest, _tile_key, _cache_tile,
+    _log_tile_cache_stats)
+
+from . import rime_kernels as rime
+
+class RimeSolver(MontblancNumpySolver):
+    """
+    RIME Solver Implementation, computing the RIME with
+    NumPy and Numba rather than the tensorflow rime_ops library
+    """
+
+    def __init__(self, slvr_cfg):
+        """
+        RimeSolver Constructor
+
+        Parameters:
+            slvr_cfg : SolverConfiguration
+                Solver Configuration variables
+        """
+        start = time.time()
+
+        super(RimeSolver, self).__init__(slvr_cfg)
+
+        #=========================================
+        # Register hypercube Dimensions
+        #=========================================
+
+        cube, slvr_cfg = self.hypercube, self.config()
+
+        _setup_hypercube(cube, slvr_cfg)
+
+        #=======================
+        # Data Sources and Sinks
+        #=======================
+
+        # Get the defaults data source (default or test data)
+        data_source = slvr_cfg['data_source']
+        montblanc.log.info("Defaults Data Source '{}'".format(data_source))
+
+        # Construct list of data sources and sinks
+        # internal to the solver.
+        # These will be overridden by source and sink
+        # providers supplied by the user in the solve()
+        # method
+        default_prov = _create_defaults_source_provider(cube, data_source)
+        self._source_providers = [default_prov]
+        self._sink_providers = [NullSinkProvider()]
+
+        #==================
+        # Memory Budgeting
+        #==================
+
+        # For deciding whether to rebudget
+        self._previous_budget = 0
+        self._previous_budget_dims = {}
+
+        #========================================================
+        # Determine which arrays need feeding once/multiple times
+        #========================================================
+
+        self._iter_dims = ['ntime', 'nbl']
+
+        input_arrays = [a for a in cube.arrays().itervalues()
+                        if 'input' in a.tags]
+
+        src_data_sources, feed_many, feed_once = _partition(
+            self._iter_dims, input_arrays)
+
+        self._src_arrays = { src_nr_var: [a.name for a in arrays]
+            for src_nr_var, arrays in src_data_sources.iteritems() }
+        self._feed_many = [a.name for a in feed_many]
+        self._feed_once = [a.name for a in feed_once]
+
+        montblanc.log.info("Using the NumPy backend for compute. "
+            "Device type '{}' is ignored.".format(slvr_cfg['device_type']))
+
+        self._data_source_copies = DataSourceCopies()
+        self._iterations = 0
+
+        # Results of previously solved tiles, keyed on their inputs
+        self._tile_cache = _create_tile_cache(slvr_cfg)
+        self._solve_digest = None
+
+        self._startup_stats = { 'total': time.time() - start }
+
+        montblanc.log.info("Solver started in {t:.3f}s".format(
+            t=self._startup_stats['total']))
+
+    def _source_context(self, name, cube, global_iter_args, array_schemas):
+        """ Create a SourceContext for the named array on the cube """
+        return SourceContext(name, cube,
+            self.config(), global_iter_args,
+            cube.array(name) if name in cube.arrays() else {},
+            array_schemas[name].shape,
+            array_schemas[name].dtype)
+
+    def _supply_outputs(self, data_sinks, cube, global_iter_args,
+                                                output, input_data):
+        """ Supply output arrays to their data sinks """
+        for n, a in output.iteritems():
+            sink_context = SinkContext(n, cube,
+                self.config(), global_iter_args,
+                cube.array(n) if n in cube.arrays() else {},
+                a, input_data)
+
+            _supply_data(data_sinks[n], sink_context)
+
+    def _source_batches(self, cube, data_sources, global_iter_args):
+        """
+        Generates (src_type, source arrays) tuples for
+        each batch of sources of each source type
+        """
+        copies = self._data_source_copies
+
+        for src_type, src_nr_var in source_var_types().iteritems():
+            src_cube = cube.copy()
+            iter_args = [(src_nr_var, cube.dim_extent_size(src_nr_var))]
+
+            for dim_desc in src_cube.dim_iter(*iter_args):
+                src_cube.update_dimensions(dim_desc)
+                src_schemas = src_cube.arrays(reify=True)
+
+                yield src_type, AttrDict({ a: _get_data(data_sources[a],
+                        self._source_context(a, src_cube,
+                            global_iter_args + iter_args, src_schemas),
+                        copies)
+                    for a in self._src_arrays[src_nr_var] })
+
+    def tile_cache_stats(self):
+        """
+        Returns a dictionary of tile cache statistics,
+        empty if tile caching is disabled
+        """
+        if self._tile_cache is None:
+            return {}
+
+        return self._tile_cache.stats()
+
+    def _solve_tile(self, cube, data_sources, data_sinks,
+                            global_iter_args, feed_once):
+        """
+        Solve the RIME for the tile of the problem described by cube.
+        Returns True if the tile was fully flagged and compute
+        was skipped.
+        """
+        slvr_cfg = self.config()
+        copies = self._data_source_copies
+        array_schemas = cube.arrays(reify=True)
+
+        # Get input data by calling the data source functors
+        input_cache = { a: _get_data(data_sources[a],
+                self._source_context(a, cube, global_iter_args,
+                    array_schemas), copies)
+            for a in self._feed_many }
+
+        D = AttrDict(feed_once)
+        D.update(input_cache)
+
+        flag = _pack_flags(D.flag)
+
+        # Fully flagged tiles are zeroed
+        # and contribute nothing to the chi-squared
+        if np.all(flag == ALL_POLS_FLAGGED):
+            montblanc.log.info("Chunk {d} is fully flagged, "
+                "skipping compute".format(d=cube.dim_extents(*self._iter_dims)))
+
+            output = {
+                'model_vis' : np.zeros(array_schemas['model_vis'].shape,
+                                    array_schemas['model_vis'].dtype),
+                'chi_squared' : np.zeros((),
+                                    array_schemas['chi_squared'].dtype),
+            }
+
+            self._supply_outputs(data_sinks, cube, global_iter_args,
+                output, input_cache)
+
+            return True
+
+        batches = self._source_batches(cube, data_sources, global_iter_args)
+
+        # Supply the results of a tile with identical
+        # inputs, if any, instead of computing them
+        if self._tile_cache is not None:
+            batches = list(batches)
+            key = _tile_key(self._solve_digest,
+                sorted(input_cache.iteritems()) +
+                [a for _, S in batches for a in sorted(S.iteritems())])
+
+            cached = self._tile_cache.get(key)
+
+            if cached is not None:
+                model_vis, chi_squared = cached
+                output = { 'model_vis': model_vis, 'chi_squared': chi_squared }
+                self._supply_outputs(data_sinks, cube, global_iter_args,
+                    output, input_cache)
+
+                return False
+
+        # Broadcast per row weights across all channels
+        weight = D.weight
+
+        if weight.ndim == len(array_schemas['weight'].shape) - 1:
+            weight = np.expand_dims(weight, -2)
+
+        polarisation_type = slvr_cfg['polarisation_type']
+        analytic_beam = _analytic_beam(slvr_cfg)
+
+        # Infer complex type
+        CT = D.model_vis.dtype
+
+        # Compute sine and cosine of parallactic angles
+        pa_sin, pa_cos = rime.parallactic_angle_sin_cos(D.parallactic_angles)
+        # Compute feed rotation
+        feed_rotation = rime.feed_rotation(pa_sin, pa_cos, CT=CT,
+                                           feed_type=polarisation_type)
+
+        def antenna_jones(lm, stokes, alpha, ref_freq):
+            """
+            Compute the jones terms for each antenna.
+
+            lm, stokes and alpha are the source variables.
+            """
+
+            # Compute the complex phase
+            cplx_phase = rime.phase(lm, D.uvw, D.frequency, CT=CT)
+
+            # Compute the square root of the brightness matrix
+            # (as well as the sign)
+            bsqrt, sgn_brightness = rime.b_sqrt(stokes, alpha,
+                D.frequency, ref_freq, CT=CT,
+                polarisation_type=polarisation_type)
+
+            # Compute the direction dependent effects from the beam,
+            # either interpolated from the beam cube or analytically
+            if analytic_beam is None:
+                ejones = rime.e_beam(lm, D.frequency,
+                    D.pointing_errors, D.antenna_scaling,
+                    pa_sin, pa_cos,
+                    D.beam_extents, D.beam_freq_map, D.ebeam,
+                    D.antenna_beam)
+            else:
+                beam_model, beam_parameter = analytic_beam
+                ejones = rime.analytic_e_beam(lm, D.frequency,
+                    D.pointing_errors, D.antenna_scaling,
+                    pa_sin, pa_cos, CT=CT,
+                    beam_model=beam_model,
+                    beam_parameter=beam_parameter)
+
+            # Combine the brightness square root, complex phase,
+            # feed rotation and beam dde's
+            ant_jones = rime.create_antenna_jones(bsqrt, cplx_phase,
+                                                feed_rotation, ejones)
+
+            return ant_jones, sgn_brightness
+
+        def source_shape(src_type, S):
+            """ Compute the shape of a batch of sources """
+            if src_type == 'gaussian':
+                return rime.gauss_shape(D.uvw, D.antenna1, D.antenna2,
+                    D.frequency, S.gaussian_shape)
+            elif src_type == 'sersic':
+                return rime.sersic_shape(D.uvw, D.antenna1, D.antenna2,
+                    D.frequency, S.sersic_shape)
+
+            nsrc = S[src_type + '_lm'].shape[0]
+            ntime, nbl = D.antenna1.shape
+            return np.ones((nsrc, ntime, nbl, D.frequency.shape[0]),
+                dtype=D.uvw.dtype)
+
+        coherencies = np.zeros(D.model_vis.shape, dtype=CT)
+
+        # Accumulate coherencies for each batch of sources
+        for src_type, S in batches:
+            ant_jones, sgn_brightness = antenna_jones(
+                S[src_type + '_lm'], S[src_type + '_stokes'],
+                S[src_type + '_alpha'], S[src_type + '_ref_freq'])
+
+            coherencies = rime.sum_coherencies(D.antenna1, D.antenna2,
+                source_shape(src_type, S), ant_jones, sgn_brightness,
+                flag, coherencies)
+
+        # Post process visibilities to produce model visibilites and chi squared
+        model_vis, chi_squared = rime.post_process_visibilities(
+            D.antenna1, D.antenna2, D.direction_independent_effects, flag,
+            weight, D.model_vis, coherencies, D.observed_vis)
+
+        if self._tile_cache is not None:
+            _cache_tile(self._tile_cache, key, model_vis, chi_squared)
+
+        output = { 'model_vis': model_vis, 'chi_squared': chi_squared }
+
+        self._supply_outputs(data_sinks, cube, global_iter_args,
+            output, input_cache)
+
+        return False
+
+    def solve(self, *args, **kwargs):
+        #  Obtain source and sink providers, including internal providers
+        source_providers = (self._source_providers +
+            kwargs.get('source_providers', []))
+        sink_providers = (self._sink_providers +
+            kwargs.get('sink_providers', []))
+
+        src_provs_str = 'Source Providers ' + str([sp.name() for sp
+                                                in source_providers])
+        snk_provs_str = 'Sink Providers ' + str([sp.name() for sp
+                                                in sink_providers])
+
+        montblanc.log.info(src_provs_str)
+        montblanc.log.info(snk_provs_str)
+
+        # Allow providers to initialise themselves based on
+        # the given configuration
+        ctx = InitialisationContext(self.config())
+
+        for p in itertools.chain(source_providers, sink_providers):
+            p.init(ctx)
+
+        # Apply any dimension updates from the source provider
+        # to the hypercube, taking previous reductions into account.
+        # Analytic beams don't need a beam cube, so leave its
+        # dimensions at their (small) defaults
+        ignored_dims = (BEAM_CUBE_DIMS if _analytic_beam(self.config())
+                                                    is not None else ())
+
+        bytes_required = _apply_source_provider_dim_updates(
+            self.hypercube, source_providers,
+            self._previous_budget_dims, ignored_dims)
+
+        # If we use more memory than previously,
+        # perform another budgeting operation
+        # to make sure everything fits
+        if bytes_required > self._previous_budget:
+            self._previous_budget_dims, self._previous_budget = (
+                _budget(self.hypercube, self.config()))
+
+        # Determine the global iteration arguments
+        # e.g. [('ntime', 100), ('nbl', 20)]
+        global_iter_args = _iter_args(self._iter_dims, self.hypercube)
+
+        # Indicate solution started in providers
+        ctx = StartContext(self.hypercube, self.config(), global_iter_args)
+
+        for p in itertools.chain(source_providers, sink_providers):
+            p.start(ctx)
+
+        # Copy the hypercube
+        cube = self.hypercube.copy()
+        array_schemas = cube.arrays(reify=True)
+
+        # Construct data sources from those supplied by the
+        # source providers, if they're associated with
+        # input sources
+        input_sources = set(self._feed_once + self._feed_many +
+            [a for arrays in self._src_arrays.itervalues() for a in arrays])
+        data_sources = {n: DataSource(f, cube.array(n).dtype, prov.name())
+            for prov in source_providers
+            for n, f in prov.sources().iteritems()
+            if n in input_sources}
+
+        # Get data sinks from supplied providers
+        data_sinks = { n: DataSink(f, prov.name())
+            for prov in sink_providers
+            for n, f in prov.sinks().iteritems()
+            if not n == 'descriptor' }
+
+        self._data_source_copies.reset()
+        flagged_tiles = 0
+
+        try:
+            # Obtain data for arrays that are only fed once
+            feed_once = { a: _get_data(data_sources[a],
+                    self._source_context(a, cube, global_iter_args,
+                        array_schemas), self._data_source_copies)
+                for a in self._feed_once }
+
+            if self._tile_cache is not None:
+                self._solve_digest = _solve_digest(cube, feed_once)
+
+            # Iterate over tiles of the hypercube
+            for dim_desc in cube.dim_iter(*global_iter_args):
+                tile_cube = cube.copy()
+                tile_cube.update_dimensions(dim_desc)
+                flagged_tiles += self._solve_tile(tile_cube, data_sources,
+                    data_sinks, global_iter_args, feed_once)
+
+        except (KeyboardInterrupt, SystemExit) as e:
+            montblanc.log.exception('Solving interrupted')
+            raise
+        except Exception:
+            montblanc.log.exception('Solving exception')
+            raise
+        else:
+            montblanc.log.info("Skipped compute on {n} fully "
+                "flagged chunks".format(n=flagged_tiles))
+
+            _log_tile_cache_stats(self._tile_cache)
+
+            copies = self._data_source_copies.get()
+
+            if len(copies) > 0:
+                montblanc.log.info("Data source arrays copied by the "
+                    "solver: {c}".format(c=", ".join("{n}: {c}".format(
+                        n=n, c=c) for n, c in sorted(copies.iteritems()))))
+
+            self._iterations += 1
+        finally:
+            # Indicate solution stopped in providers
+            ctx = StopContext(self.hypercube, self.config(), global_iter_args)
+            for p in itertools.chain(source_providers, sink_providers):
+                p.stop(ctx)
+
+            montblanc.log.info('Solution Completed')
+
+    def close(self):
+        # Shutdown data sources
+        for source in self._source_providers:
+            source.close()
+
+        # Shutdown data sinks
+        for sink in self._sink_providers:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, evalue, etrace):
+        self.close()
@@ -0,0 +1,708 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+NumPy and Numba implementations of the RIME operators
+defined in the tensorflow rime_ops library.
+
+Each public function mirrors the inputs, outputs and semantics
+of the tensorflow operator of the same name, while the loops
+parallelise over their outer dimensions with numba.prange.
+"""
+
+import numba
+import numpy as np
+
+import montblanc
+
+from montblanc.impl.rime.tensorflow.solver_utils import ALL_POLS_FLAGGED
+
+LIGHTSPEED = float(montblanc.constants.C)
+MINUS_TWO_PI_OVER_C = -2.0*np.pi/LIGHTSPEED
+FWHM2INT = 1.0/np.sqrt(np.log(256.0))
+GAUSS_SCALE = FWHM2INT*np.sqrt(2.0)*np.pi/LIGHTSPEED
+# Matches the value of the constant used by the sersic_shape operator
+TWO_PI_OVER_C = 2.0*LIGHTSPEED/np.pi
+
+EBEAM_NPOL = 4
+
+# Analytic beam models, indexed by the _analytic_e_beam kernel
+ANALYTIC_BEAM_MODELS = ('cos3', 'airy', 'gaussian')
+# Argument at which the cos3 beam is clamped, flooring it at 10%
+COS3_CUTOFF = 1.0881
+# Gaussian voltage beam with a power FWHM of 1.02 lambda / D
+AIRY_SCALE = np.pi/LIGHTSPEED
+GAUSS_BEAM_SCALE = 2.0*np.log(2.0)/(1.02*LIGHTSPEED)**2
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True)
+def _phase(lm, uvw, frequency, complex_phase):
+    nsrc = lm.shape[0]
+    ntime, na = uvw.shape[0], uvw.shape[1]
+    nchan = frequency.shape[0]
+
+    for st in numba.prange(nsrc*ntime):
+        src = st // ntime
+        time = st - src*ntime
+
+        l = lm[src,0]
+        m = lm[src,1]
+        n = np.sqrt(1.0 - l*l - m*m) - 1.0
+
+        for ant in range(na):
+            real_phase_base = MINUS_TWO_PI_OVER_C*(l*uvw[time,ant,0] +
+                                                   m*uvw[time,ant,1] +
+                                                   n*uvw[time,ant,2])
+
+            for chan in range(nchan):
+                real_phase = real_phase_base*frequency[chan]
+                complex_phase[src,time,ant,chan] = (np.cos(real_phase) +
+                                                    1j*np.sin(real_phase))
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True)
+def _b_sqrt(stokes, alpha, frequency, ref_freq, iQ, iU, iV,
+                                        b_sqrt, sgn_brightness):
+    nsrc, ntime = stokes.shape[0], stokes.shape[1]
+    nchan = frequency.shape[0]
+
+    for st in numba.prange(nsrc*ntime):
+        src = st // ntime
+        time = st - src*ntime
+
+        I = stokes[src,time,0]
+        Q = stokes[src,time,iQ]
+        U = stokes[src,time,iU]
+        V = stokes[src,time,iV]
+
+        IQ = I + Q
+        sgn = np.sign(IQ)
+        U *= sgn
+        V *= sgn
+        IQ *= sgn
+        sgn_brightness[src,time] = sgn
+
+        L00 = np.sqrt(IQ + 0j)
+        div = L00
+
+        # Avoid division by zero
+        if IQ == 0.0:
+            div = 1.0 + 0j
+            IQ = 1.0
+
+        L10 = (U - 1j*V) / div
+        L11 = np.sqrt((I*I - Q*Q - U*U - V*V)/IQ + 0j)
+
+        for chan in range(nchan):
+            psqrt = (frequency[chan]/ref_freq[src])**(alpha[src,time]*0.5)
+            b_sqrt[src,time,chan,0] = L00*psqrt
+            b_sqrt[src,time,chan,1] = 0.0
+            b_sqrt[src,time,chan,2] = L10*psqrt
+            b_sqrt[src,time,chan,3] = L11*psqrt
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _trilinear_interpolate(ebeam, beam, gl, gm, gchan, pol, weight):
+    """ Returns the weighted beam sample and its weighted absolute value """
+    beam_lw, beam_mh = ebeam.shape[1], ebeam.shape[2]
+
+    if gl < 0 or gl > beam_lw or gm < 0 or gm > beam_mh:
+        return 0j, 0.0
+
+    data = ebeam[beam, int(gl), int(gm), int(gchan), pol]
+    return data*weight, weight*np.abs(data)
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True,
+                                                error_model='numpy')
+def _e_beam(lm, point_errors, antenna_scaling, pa_sin, pa_cos,
+        lower_l, lower_m, lscale, mscale,
+        gchan0, gchan1, chd0, chd1, ebeam, antenna_beam, jones):
+
+    nsrc = lm.shape[0]
+    ntime, na, nchan = point_errors.shape[:3]
+    beam_lw, beam_mh = ebeam.shape[1], ebeam.shape[2]
+
+    lmax = float(beam_lw - 1)
+    mmax = float(beam_mh - 1)
+
+    for ta in numba.prange(ntime*na):
+        time = ta // na
+        ant = ta - time*na
+
+        sint = pa_sin[time,ant]
+        cost = pa_cos[time,ant]
+        beam = antenna_beam[ant]
+
+        for src in range(nsrc):
+            # Rotate lm coordinates by the parallactic angle
+            l = lm[src,0]*cost - lm[src,1]*sint
+            m = lm[src,0]*sint + lm[src,1]*cost
+
+            for chan in range(nchan):
+                # Offset by pointing errors, scale by antenna
+                # scaling and transform to beam cube coordinates
+                vl = l + point_errors[time,ant,chan,0]
+                vm = m + point_errors[time,ant,chan,1]
+
+                vl *= antenna_scaling[ant,chan,0]
+                vm *= antenna_scaling[ant,chan,1]
+
+                vl = lscale*(vl - lower_l)
+                vm = mscale*(vm - lower_m)
+
+                vl = max(0.0, min(vl, lmax))
+                vm = max(0.0, min(vm, mmax))
+
+                gl0 = np.floor(vl)
+                gm0 = np.floor(vm)
+
+                gl1 = min(gl0 + 1.0, lmax)
+                gm1 = min(gm0 + 1.0, mmax)
+
+                ld = vl - gl0
+                md = vm - gm0
+
+                c0 = chd0[chan]
+                c1 = chd1[chan]
+                g0 = gchan0[chan]
+                g1 = gchan1[chan]
+
+                for pol in range(EBEAM_NPOL):
+                    pol_sum = 0j
+                    abs_sum = 0.0
+
+                    # Sum the eight corners of the interpolation cube
+                    p, a = _trilinear_interpolate(ebeam, beam, gl0, gm0, g0,
+                        pol, (1.0-ld)*(1.0-md)*c0)
+                    pol_sum += p; abs_sum += a
+                    p, a = _trilinear_interpolate(ebeam, beam, gl1, gm0, g0,
+                        pol, ld*(1.0-md)*c0)
+                    pol_sum += p; abs_sum += a
+                    p, a = _trilinear_interpolate(ebeam, beam, gl0, gm1, g0,
+                        pol, (1.0-ld)*md*c0)
+                    pol_sum += p; abs_sum += a
+                    p, a = _trilinear_interpolate(ebeam, beam, gl1, gm1, g0,
+                        pol, ld*md*c0)
+                    pol_sum += p; abs_sum += a
+
+                    p, a = _trilinear_interpolate(ebeam, beam, gl0, gm0, g1,
+                        pol, (1.0-ld)*(1.0-md)*c1)
+                    pol_sum += p; abs_sum += a
+                    p, a = _trilinear_interpolate(ebeam, beam, gl1, gm0, g1,
+                        pol, ld*(1.0-md)*c1)
+                    pol_sum += p; abs_sum += a
+                    p, a = _trilinear_interpolate(ebeam, beam, gl0, gm1, g1,
+                        pol, (1.0-ld)*md*c1)
+                    pol_sum += p; abs_sum += a
+                    p, a = _trilinear_interpolate(ebeam, beam, gl1, gm1, g1,
+                        pol, ld*md*c1)
+                    pol_sum += p; abs_sum += a
+
+                    # Normalise the interpolated value, scaling
+                    # it by the interpolated amplitudes
+                    norm = 1.0 / np.abs(pol_sum)
+
+                    if not np.isfinite(norm):
+                        norm = 1.0
+
+                    jones[src,time,ant,chan,pol] = pol_sum*norm*abs_sum
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _bessel_j1(x):
+    """
+    Bessel function of the first kind of order one, using the
+    rational and asymptotic approximations of Numerical Recipes
+    """
+    ax = abs(x)
+
+    if ax < 8.0:
+        y = x*x
+        num = x*(72362614232.0 + y*(-7895059235.0 + y*(242396853.1 +
+            y*(-2972611.439 + y*(15704.48260 + y*(-30.16036606))))))
+        den = 144725228442.0 + y*(2300535178.0 + y*(18583304.74 +
+            y*(99447.43394 + y*(376.9991397 + y))))
+        return num/den
+
+    z = 8.0/ax
+    y = z*z
+    xx = ax - 2.356194491
+    p = 1.0 + y*(0.183105e-2 + y*(-0.3516396496e-4 +
+        y*(0.2457520174e-5 + y*(-0.240337019e-6))))
+    q = 0.04687499995 + y*(-0.2002690873e-3 + y*(0.8449199096e-5 +
+        y*(-0.88228987e-6 + y*0.105787412e-6)))
+    result = np.sqrt(0.636619772/ax)*(np.cos(xx)*p - z*np.sin(xx)*q)
+
+    return -result if x < 0.0 else result
+
+@numba.jit(nopython=True, nogil=True, cache=True)
+def _analytic_beam(model, parameter, r, frequency):
+    """ Evaluates the analytic voltage beam at radius r and frequency """
+    if model == 0:
+        # cos3, parameter is the frequency scaling
+        return np.cos(min(parameter*frequency*r, COS3_CUTOFF))**3
+    elif model == 1:
+        # airy, parameter is the dish diameter
+        x = AIRY_SCALE*parameter*frequency*r
+
+        if x < 1e-8:
+            return 1.0
+
+        return 2.0*_bessel_j1(x)/x
+    else:
+        # gaussian, parameter is the dish diameter
+        x = parameter*frequency*r
+        return np.exp(-GAUSS_BEAM_SCALE*x*x)
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True)
+def _analytic_e_beam(lm, frequency, point_errors, antenna_scaling,
+                            pa_sin, pa_cos, model, parameter, jones):
+    nsrc = lm.shape[0]
+    ntime, na, nchan = point_errors.shape[:3]
+
+    for ta in numba.prange(ntime*na):
+        time = ta // na
+        ant = ta - time*na
+
+        sint = pa_sin[time,ant]
+        cost = pa_cos[time,ant]
+
+        for src in range(nsrc):
+            # Rotate lm coordinates by the parallactic angle
+            l = lm[src,0]*cost - lm[src,1]*sint
+            m = lm[src,0]*sint + lm[src,1]*cost
+
+            for chan in range(nchan):
+                # Offset by pointing errors and
+                # scale by antenna scaling
+                vl = l + point_errors[time,ant,chan,0]
+                vm = m + point_errors[time,ant,chan,1]
+
+                vl *= antenna_scaling[ant,chan,0]
+                vm *= antenna_scaling[ant,chan,1]
+
+                E = _analytic_beam(model, parameter,
+                    np.sqrt(vl*vl + vm*vm), frequency[chan])
+
+                jones[src,time,ant,chan,0] = E
+                jones[src,time,ant,chan,1] = 0.0
+                jones[src,time,ant,chan,2] = 0.0
+                jones[src,time,ant,chan,3] = E
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True)
+def _create_antenna_jones(bsqrt, complex_phase, feed_rotation,
+                                                ejones, ant_jones):
+    nsrc, ntime, na, nchan = complex_phase.shape
+
+    for st in numba.prange(nsrc*ntime):
+        src = st // ntime
+        time = st - src*ntime
+
+        for ant in range(na):
+            l0 = feed_rotation[time,ant,0]
+            l1 = feed_rotation[time,ant,1]
+            l2 = feed_rotation[time,ant,2]
+            l3 = feed_rotation[time,ant,3]
+
+            for chan in range(nchan):
+                # Phase the brightness square root
+                cp = complex_phase[src,time,ant,chan]
+                kb0 = cp*bsqrt[src,time,chan,0]
+                kb1 = cp*bsqrt[src,time,chan,1]
+                kb2 = cp*bsqrt[src,time,chan,2]
+                kb3 = cp*bsqrt[src,time,chan,3]
+
+                # Apply the feed rotation
+                lkb0 = l0*kb0 + l1*kb2
+                lkb1 = l0*kb1 + l1*kb3
+                lkb2 = l2*kb0 + l3*kb2
+                lkb3 = l2*kb1 + l3*kb3
+
+                # Apply the beam
+                e0 = ejones[src,time,ant,chan,0]
+                e1 = ejones[src,time,ant,chan,1]
+                e2 = ejones[src,time,ant,chan,2]
+                e3 = ejones[src,time,ant,chan,3]
+
+                ant_jones[src,time,ant,chan,0] = e0*lkb0 + e1*lkb2
+                ant_jones[src,time,ant,chan,1] = e0*lkb1 + e1*lkb3
+                ant_jones[src,time,ant,chan,2] = e2*lkb0 + e3*lkb2
+                ant_jones[src,time,ant,chan,3] = e2*lkb1 + e3*lkb3
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True)
+def _gauss_shape(uvw, antenna1, antenna2, frequency, gauss_params, shape):
+    ngsrc = gauss_params.shape[1]
+    ntime, nbl = antenna1.shape
+    nchan = frequency.shape[0]
+
+    for tb in numba.prange(ntime*nbl):
+        time = tb // nbl
+        bl = tb - time*nbl
+
+        ant1 = antenna1[time,bl]
+        ant2 = antenna2[time,bl]
+
+        u = uvw[time,ant2,0] - uvw[time,ant1,0]
+        v = uvw[time,ant2,1] - uvw[time,ant1,1]
+
+        for gsrc in range(ngsrc):
+            el = gauss_params[0,gsrc]
+            em = gauss_params[1,gsrc]
+            eR = gauss_params[2,gsrc]
+
+            for chan in range(nchan):
+                scaled_freq = GAUSS_SCALE*frequency[chan]
+
+                u1 = (u*em - v*el)*scaled_freq*eR
+                v1 = (u*el + v*em)*scaled_freq
+
+                shape[gsrc,time,bl,chan] = np.exp(-(u1*u1 + v1*v1))
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True,
+                                                error_model='numpy')
+def _sersic_shape(uvw, antenna1, antenna2, frequency, sersic_params, shape):
+    nssrc = sersic_params.shape[1]
+    ntime, nbl = antenna1.shape
+    nchan = frequency.shape[0]
+
+    for tb in numba.prange(ntime*nbl):
+        time = tb // nbl
+        bl = tb - time*nbl
+
+        ant1 = antenna1[time,bl]
+        ant2 = antenna2[time,bl]
+
+        u = uvw[time,ant2,0] - uvw[time,ant1,0]
+        v = uvw[time,ant2,1] - uvw[time,ant1,1]
+
+        for ssrc in range(nssrc):
+            e1 = sersic_params[0,ssrc]
+            e2 = sersic_params[1,ssrc]
+            ss = sersic_params[2,ssrc]
+
+            for chan in range(nchan):
+                scaled_freq = TWO_PI_OVER_C*frequency[chan]
+
+                u1 = (u*(1.0 + e1) + v*e2)*scaled_freq
+                u1 *= ss/(1.0 - e1*e1 - e2*e2)
+
+                v1 = (u*e2 + v*(1.0 - e1))*scaled_freq
+                v1 *= ss/(1.0 - e1*e1 - e2*e2)
+
+                sersic_factor = 1.0 + u1*u1 + v1*v1
+                shape[ssrc,time,bl,chan] = 1.0 / (ss*np.sqrt(sersic_factor))
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True)
+def _sum_coherencies(antenna1, antenna2, shape, ant_jones,
+                sgn_brightness, flag, base_coherencies, coherencies):
+    nsrc = ant_jones.shape[0]
+    ntime, nbl, nchan = flag.shape
+
+    for tb in numba.prange(ntime*nbl):
+        time = tb // nbl
+        bl = tb - time*nbl
+
+        ant1 = antenna1[time,bl]
+        ant2 = antenna2[time,bl]
+
+        for chan in range(nchan):
+            s0 = base_coherencies[time,bl,chan,0]
+            s1 = base_coherencies[time,bl,chan,1]
+            s2 = base_coherencies[time,bl,chan,2]
+            s3 = base_coherencies[time,bl,chan,3]
+
+            # Skip sources for fully flagged visibilities
+            nsrc_ = 0 if flag[time,bl,chan] == ALL_POLS_FLAGGED else nsrc
+
+            for src in range(nsrc_):
+                a0 = ant_jones[src,time,ant1,chan,0]
+                a1 = ant_jones[src,time,ant1,chan,1]
+                a2 = ant_jones[src,time,ant1,chan,2]
+                a3 = ant_jones[src,time,ant1,chan,3]
+
+                s = shape[src,time,bl,chan]
+
+                b0 = np.conj(ant_jones[src,time,ant2,chan,0]*s)
+                b1 = np.conj(ant_jones[src,time,ant2,chan,2]*s)
+                b2 = np.conj(ant_jones[src,time,ant2,chan,1]*s)
+                b3 = np.conj(ant_jones[src,time,ant2,chan,3]*s)
+
+                sign = sgn_brightness[src,time]
+
+                s0 += sign*(a0*b0 + a1*b2)
+                s1 += sign*(a0*b1 + a1*b3)
+                s2 += sign*(a2*b0 + a3*b2)
+                s3 += sign*(a2*b1 + a3*b3)
+
+            coherencies[time,bl,chan,0] = s0
+            coherencies[time,bl,chan,1] = s1
+            coherencies[time,bl,chan,2] = s2
+            coherencies[time,bl,chan,3] = s3
+
+@numba.jit(nopython=True, nogil=True, cache=True, parallel=True)
+def _post_process_visibilities(antenna1, antenna2, die, flag, weight,
+                    base_vis, model_vis, observed_vis, final_vis):
+    ntime, nbl, nchan = flag.shape
+    chan_per_wchan = nchan // weight.shape[2]
+
+    chi_squared = 0.0
+
+    for tb in numba.prange(ntime*nbl):
+        time = tb // nbl
+        bl = tb - time*nbl
+
+        ant1 = antenna1[time,bl]
+        ant2 = antenna2[time,bl]
+
+        for chan in range(nchan):
+            mv0 = model_vis[time,bl,chan,0]
+            mv1 = model_vis[time,bl,chan,1]
+            mv2 = model_vis[time,bl,chan,2]
+            mv3 = model_vis[time,bl,chan,3]
+
+            # Multiply the model visibilities by antenna1's g term
+            a0 = die[time,ant1,chan,0]
+            a1 = die[time,ant1,chan,1]
+            a2 = die[time,ant1,chan,2]
+            a3 = die[time,ant1,chan,3]
+
+            r0 = a0*mv0 + a1*mv2
+            r1 = a0*mv1 + a1*mv3
+            r2 = a2*mv0 + a3*mv2
+            r3 = a2*mv1 + a3*mv3
+
+            # Multiply by the transpose conjugate of antenna2's g term
+            b0 = np.conj(die[time,ant2,chan,0])
+            b1 = np.conj(die[time,ant2,chan,2])
+            b2 = np.conj(die[time,ant2,chan,1])
+            b3 = np.conj(die[time,ant2,chan,3])
+
+            mvs = (r0*b0 + r1*b2 + base_vis[time,bl,chan,0],
+                   r0*b1 + r1*b3 + base_vis[time,bl,chan,1],
+                   r2*b0 + r3*b2 + base_vis[time,bl,chan,2],
+                   r2*b1 + r3*b3 + base_vis[time,bl,chan,3])
+
+            f = flag[time,bl,chan]
+            wchan = chan // chan_per_wchan
+
+            for pol in range(4):
+                # Zero flagged visibilities, which
+                # contribute nothing to the chi squared
+                if (f >> pol) & 1:
+                    final_vis[time,bl,chan,pol] = 0j
+                    continue
+
+                mv = mvs[pol]
+                final_vis[time,bl,chan,pol] = mv
+
+                d = mv - observed_vis[time,bl,chan,pol]
+                chi_squared += ((d.real*d.real + d.imag*d.imag) *
+                                weight[time,bl,wchan,pol])
+
+    return chi_squared
+
+def parallactic_angle_sin_cos(parallactic_angles):
+    """ Computes the sine and cosine of the parallactic angles """
+    return np.sin(parallactic_angles), np.cos(parallactic_angles)
+
+def feed_rotation(parallactic_angle_sin, parallactic_angle_cos,
+                                                CT, feed_type):
+    """
+    Computes the (ntime, na, 4) feed rotation matrix
+    of 'linear' or 'circular' feeds
+    """
+    pa_sin = parallactic_angle_sin
+    pa_cos = parallactic_angle_cos
+
+    result = np.empty(pa_sin.shape + (4,), dtype=CT)
+
+    if feed_type == 'linear':
+        result[...,0] = pa_cos
+        result[...,1] = pa_sin
+        result[...,2] = -pa_sin
+        result[...,3] = pa_cos
+    elif feed_type == 'circular':
+        result[...,0] = pa_cos - 1j*pa_sin
+        result[...,1] = 0
+        result[...,2] = 0
+        result[...,3] = pa_cos + 1j*pa_sin
+    else:
+        raise ValueError("Invalid feed type '{ft}'. "
+            "Must be 'linear' or 'circular'".format(ft=feed_type))
+
+    return result
+
+def phase(lm, uvw, frequency, CT):
+    """ Computes the (nsrc, ntime, na, nchan) complex phase """
+    nsrc, (ntime, na), nchan = lm.shape[0], uvw.shape[:2], frequency.shape[0]
+    complex_phase = np.empty((nsrc, ntime, na, nchan), dtype=CT)
+    _phase(lm, uvw, frequency, complex_phase)
+    return complex_phase
+
+def b_sqrt(stokes, alpha, frequency, ref_freq, CT, polarisation_type):
+    """
+    Computes the (nsrc, ntime, nchan, 4) square root of the
+    brightness matrix, as well as its (nsrc, ntime) sign
+    """
+    if polarisation_type == 'linear':
+        iQ, iU, iV = 1, 2, 3
+    elif polarisation_type == 'circular':
+        iQ, iU, iV = 3, 1, 2
+    else:
+        raise ValueError("Invalid polarisation type '{pt}'. "
+            "Must be 'linear' or 'circular'".format(pt=polarisation_type))
+
+    nsrc, ntime, nchan = stokes.shape[0], stokes.shape[1], frequency.shape[0]
+    result = np.empty((nsrc, ntime, nchan, 4), dtype=CT)
+    sgn_brightness = np.empty((nsrc, ntime), dtype=np.int8)
+
+    _b_sqrt(stokes, alpha, frequency, ref_freq, iQ, iU, iV,
+                                    result, sgn_brightness)
+
+    return result, sgn_brightness
+
+def e_beam(lm, frequency, point_errors, antenna_scaling,
+        parallactic_angle_sin, parallactic_angle_cos,
+        beam_extents, beam_freq_map, ebeam, antenna_beam):
+    """
+    Computes the (nsrc, ntime, na, nchan, 4) beam jones terms
+    by trilinear interpolation of the (nbeam, lw, mh, nud, 4) ebeam
+    cubes, using the cube of each antenna given by antenna_beam
+    """
+    beam_nb, beam_lw, beam_mh, beam_nud = ebeam.shape[:4]
+    FT = lm.dtype.type
+
+    if np.any((antenna_beam < 0) | (antenna_beam >= beam_nb)):
+        raise ValueError("antenna_beam indices must lie in "
+            "[0, {nb}) but are {ab}".format(nb=beam_nb, ab=antenna_beam))
+
+    lower_l, lower_m, _, upper_l, upper_m, _ = beam_extents
+
+    lscale = FT(beam_lw - 1)/(upper_l - lower_l)
+    mscale = FT(beam_mh - 1)/(upper_m - lower_m)
+
+    # Find the beam frequencies bracketing each channel
+    f = np.clip(frequency, beam_freq_map[0], beam_freq_map[-1])
+    uchan = np.minimum(np.searchsorted(beam_freq_map, f, side='right'),
+                                                        beam_nud - 1)
+    lchan = np.maximum(uchan - 1, 0)
+
+    lower_freq = beam_freq_map[lchan]
+    upper_freq = beam_freq_map[uchan]
+    freq_diff = upper_freq - lower_freq
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chd0 = (upper_freq - f)/freq_diff
+        chd1 = (f - lower_freq)/freq_diff
+
+    nsrc = lm.shape[0]
+    ntime, na, nchan = point_errors.shape[:3]
+    jones = np.empty((nsrc, ntime, na, nchan, EBEAM_NPOL), dtype=ebeam.dtype)
+
+    _e_beam(lm, point_errors, antenna_scaling,
+        parallactic_angle_sin, parallactic_angle_cos,
+        lower_l, lower_m, lscale, mscale,
+        lchan.astype(FT), uchan.astype(FT), chd0, chd1,
+        ebeam, antenna_beam, jones)
+
+    return jones
+
+def analytic_e_beam(lm, frequency, point_errors, antenna_scaling,
+        parallactic_angle_sin, parallactic_angle_cos,
+        CT, beam_model, beam_parameter):
+    """
+    Computes the (nsrc, ntime, na, nchan, 4) beam jones terms
+    by evaluating a 'cos3', 'airy' or 'gaussian' analytic beam
+    """
+    try:
+        model = ANALYTIC_BEAM_MODELS.index(beam_model)
+    except ValueError:
+        raise ValueError("Invalid beam model '{bm}'. "
+            "Must be one of {bms}".format(bm=beam_model,
+                                        bms=ANALYTIC_BEAM_MODELS))
+
+    nsrc = lm.shape[0]
+    ntime, na, nchan = point_errors.shape[:3]
+    jones = np.empty((nsrc, ntime, na, nchan, EBEAM_NPOL), dtype=CT)
+
+    _analytic_e_beam(lm, frequency, point_errors, antenna_scaling,
+        parallactic_angle_sin, parallactic_angle_cos,
+        model, float(beam_parameter), jones)
+
+    return jones
+
+def create_antenna_jones(bsqrt, complex_phase, feed_rotation, ejones):
+    """
+    Combines the brightness square root, complex phase,
+    feed rotation and beam into (nsrc, ntime, na, nchan, 4)
+    per antenna jones terms
+    """
+    ant_jones = np.empty(ejones.shape, dtype=ejones.dtype)
+    _create_antenna_jones(bsqrt, complex_phase, feed_rotation,
+                                            ejones, ant_jones)
+    return ant_jones
+
+def gauss_shape(uvw, antenna1, antenna2, frequency, gauss_params):
+    """ Computes the (ngsrc, ntime, nbl, nchan) gaussian shape """
+    ntime, nbl = antenna1.shape
+    shape = np.empty((gauss_params.shape[1], ntime, nbl,
+        frequency.shape[0]), dtype=uvw.dtype)
+    _gauss_shape(uvw, antenna1, antenna2, frequency, gauss_params, shape)
+    return shape
+
+def sersic_shape(uvw, antenna1, antenna2, frequency, sersic_params):
+    """ Computes the (nssrc, ntime, nbl, nchan) sersic shape """
+    ntime, nbl = antenna1.shape
+    shape = np.empty((sersic_params.shape[1], ntime, nbl,
+        frequency.shape[0]), dtype=uvw.dtype)
+    _sersic_shape(uvw, antenna1, antenna2, frequency, sersic_params, shape)
+    return shape
+
+def sum_coherencies(antenna1, antenna2, shape, ant_jones,
+                        sgn_brightness, flag, base_coherencies):
+    """
+    Sums the coherencies of each source onto base_coherencies,
+    skipping visibilities with all polarisations flagged
+    in the (ntime, nbl, nchan) flag bitmask
+    """
+    coherencies = np.empty_like(base_coherencies)
+    _sum_coherencies(antenna1, antenna2, shape, ant_jones,
+        sgn_brightness, flag, base_coherencies, coherencies)
+    return coherencies
+
+def post_process_visibilities(antenna1, antenna2,
+        direction_independent_effects, flag, weight,
+        base_vis, model_vis, observed_vis):
+    """
+    Applies direction independent effects to model_vis
+    and adds base_vis, zeroing flagged visibilities.
+
+    Returns the final visibilities and their chi squared
+    with respect to observed_vis.
+    """
+    nchan, nwchan = flag.shape[2], weight.shape[2]
+
+    if nwchan == 0 or nchan % nwchan != 0:
+        raise ValueError("Number of weight channels '{nw}' does not "
+            "divide the number of channels '{n}'.".format(
+                nw=nwchan, n=nchan))
+
+    final_vis = np.empty_like(model_vis)
+    chi_squared = _post_process_visibilities(antenna1, antenna2,
+        direction_independent_effects, flag, weight,
+        base_vis, model_vis, observed_vis, final_vis)
+
+    return final_vis, weight.dtype.type(chi_squared)
@@ -18,12 +18,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
-import collections
-import copy
 import itertools
 import threading
 import sys
-import types
+import time
 
 import concurrent.futures as cf
 import numpy as np
@@ -40,22 +38,28 @@ from montblanc.solvers import MontblancTensorflowSolver
 from . import load_tf_lib
 from .cube_dim_transcoder import CubeDimensionTranscoder
 from .staging_area_wrapper import create_staging_area_wrapper
-from .sources import (SourceContext, DefaultsSourceProvider)
+from .graph_cache import graph_key, load_graph, save_graph
+from .sources import SourceContext
 from .sinks import (SinkContext, NullSinkProvider)
 from .start_context import StartContext
 from .stop_context import StopContext
 from .init_context import InitialisationContext
-
-ONE_KB, ONE_MB, ONE_GB = 1024, 1024**2, 1024**3
+from .thread_budget import (plan_thread_budget, pin_thread)
+from .solver_utils import (ALL_POLS_FLAGGED, DataSource, DataSink,
+    DataSourceCopies, _create_defaults_source_provider, _pack_flags,
+    _get_data, _supply_data, _iter_args, _budget,
+    _apply_source_provider_dim_updates, _setup_hypercube, _partition,
+    _analytic_beam, BEAM_CUBE_DIMS, _create_tile_cache, _solve_digest,
+    _tile_key, _cache_tile, _log_tile_cache_stats)
 
 QUEUE_SIZE = 10
 
+# Outcomes of feeding a tile. Fed tiles are computed,
+# compute is skipped for fully flagged and cached tiles
+TILE_FED, TILE_FLAGGED, TILE_CACHED = range(3)
+
 rime = load_tf_lib()
 
-DataSource = attr.make_class("DataSource", ['source', 'dtype', 'name'],
-    slots=True, frozen=True)
-DataSink = attr.make_class("DataSink", ['sink', 'name'],
-    slots=True, frozen=True)
 FeedOnce = attr.make_class("FeedOnce", ['ph', 'var', 'assign_op'],
     slots=True, frozen=True)
 
@@ -70,6 +74,8 @@ class RimeSolver(MontblancTensorflowSolver):
             slvr_cfg : SolverConfiguration
                 Solver Configuration variables
         """
+        start = time.time()
+
         super(RimeSolver, self).__init__(slvr_cfg)
 
         #=========================================
@@ -125,6 +131,16 @@ class RimeSolver(MontblancTensorflowSolver):
 
         self._source_cache = SourceCache()
 
+        #==================
+        # Tile Result Cache
+        #==================
+
+        # Results of previously solved tiles, keyed on their inputs
+        self._tile_cache = _create_tile_cache(slvr_cfg)
+        self._solve_digest = None
+        # Tile keys and cached results of tiles in flight
+        self._tile_keys = SourceCache()
+
         #==================
         # Memory Budgeting
         #==================
@@ -159,6 +175,8 @@ class RimeSolver(MontblancTensorflowSolver):
         # Tensorflow devices
         #=========================
 
+        setup_done = time.time()
+
         from tensorflow.python.client import device_lib
         devices = device_lib.list_local_devices()
 
@@ -174,35 +192,73 @@ class RimeSolver(MontblancTensorflowSolver):
         use_cpus = device_type == 'CPU'
         montblanc.log.info("Using '{}' devices for compute".format(device_type))
         self._devices = cpus if use_cpus else gpus
-        self._shards_per_device = spd = 2
+
+        assert len(self._devices) > 0
+
+        #=========================
+        # Thread budget
+        #=========================
+
+        budget = plan_thread_budget(slvr_cfg, len(self._devices), use_cpus)
+
+        montblanc.log.info("Thread budget: {spd} shards per device, "
+            "{omp} OpenMP threads per operator, {intra} intra-op "
+            "and {inter} inter-op tensorflow threads".format(
+                spd=budget.shards_per_device, omp=budget.omp_threads,
+                intra=budget.intra_op_threads,
+                inter=budget.inter_op_threads))
+
+        self._shards_per_device = spd = budget.shards_per_device
         self._nr_of_shards = shards = len(self._devices)*spd
         # shard_id == d*spd + shard
         self._shard = lambda d, s: d*spd + s
 
-        assert len(self._devices) > 0
+        devices_done = time.time()
 
         #=========================
         # Tensorflow Compute Graph
         #=========================
 
-        # Create all tensorflow constructs within the compute graph
-        with tf.Graph().as_default() as compute_graph:
-            # Create our data feeding structure containing
-            # input/output staging_areas and feed once variables
-            self._tf_feed_data = _construct_tensorflow_feed_data(
-                dfs, cube, self._iter_dims, shards)
-
-            # Construct tensorflow expressions for each shard
-            self._tf_expr = [_construct_tensorflow_expression(
-                    slvr_cfg,
-                    self._tf_feed_data, dev, self._shard(d,s))
-                for d, dev in enumerate(self._devices)
-                for s in range(self._shards_per_device)]
-
-            # Initialisation operation
-            init_op = tf.global_variables_initializer()
-            # Now forbid modification of the graph
-            compute_graph.finalize()
+        # Import a previously serialised compute graph if available
+        graph_cache = slvr_cfg.get('graph_cache', None)
+        loaded = None
+
+        if graph_cache is not None:
+            key = graph_key(slvr_cfg, self._devices, spd)
+            loaded = load_graph(graph_cache, key, self._devices, spd)
+
+        if loaded is not None:
+            compute_graph, self._tf_feed_data, self._tf_expr, init_op = loaded
+        else:
+            # Create all tensorflow constructs within the compute graph
+            with tf.Graph().as_default() as compute_graph:
+                # Create our data feeding structure containing
+                # input/output staging_areas and feed once variables
+                self._tf_feed_data = _construct_tensorflow_feed_data(
+                    dfs, cube, self._iter_dims, shards)
+
+                # Construct tensorflow expressions for each shard
+                self._tf_expr = [_construct_tensorflow_expression(
+                        slvr_cfg,
+                        self._tf_feed_data, dev, self._shard(d,s))
+                    for d, dev in enumerate(self._devices)
+                    for s in range(self._shards_per_device)]
+
+                # Initialisation operation
+                init_op = tf.global_variables_initializer()
+                # Now forbid modification of the graph
+                compute_graph.finalize()
+
+            if graph_cache is not None:
+                try:
+                    save_graph(graph_cache, key, compute_graph,
+                        self._tf_feed_data, self._tf_expr, init_op,
+                        self._devices, spd)
+                except (IOError, OSError):
+                    montblanc.log.exception("Unable to cache compute "
+                        "graph in '{d}'".format(d=graph_cache))
+
+        graph_done = time.time()
 
         #==========================================
         # Tensorflow Session
@@ -215,12 +271,16 @@ class RimeSolver(MontblancTensorflowSolver):
         montblanc.log.debug("Attaching session to tensorflow server "
             "'{tfs}'".format(tfs=tf_server_target))
 
-        session_config = tf.ConfigProto(allow_soft_placement=True)
+        session_config = tf.ConfigProto(allow_soft_placement=True,
+            intra_op_parallelism_threads=budget.intra_op_threads,
+            inter_op_parallelism_threads=budget.inter_op_threads)
 
         self._tf_session = tf.Session(tf_server_target,
             graph=compute_graph, config=session_config)
         self._tf_session.run(init_op)
 
+        session_done = time.time()
+
         #======================
         # Thread pool executors
         #======================
@@ -232,6 +292,16 @@ class RimeSolver(MontblancTensorflowSolver):
         self._compute_executors = [tpe(1) for i in range(shards)]
         self._consumer_executor = tpe(1)
 
+        # Pin the feed and compute threads of each shard
+        if budget.shard_cpus is not None:
+            for shard, cpus in enumerate(budget.shard_cpus):
+                montblanc.log.info("Pinning shard {s} to CPUs {c}".format(
+                    s=shard, c=list(cpus)))
+
+                for executor in (self._feed_executors[shard],
+                                self._compute_executors[shard]):
+                    executor.submit(pin_thread, cpus).result()
+
         class InputsWaiting(object):
             """
             Keep track of the number of inputs waiting
@@ -255,6 +325,31 @@ class RimeSolver(MontblancTensorflowSolver):
 
         self._inputs_waiting = InputsWaiting(shards)
 
+        class FlaggedTiles(object):
+            """
+            Keep track of the number of fully flagged tiles
+            for which compute was skipped
+            """
+            def __init__(self):
+                self._lock = threading.Lock()
+                self._flagged_tiles = 0
+
+            def get(self):
+                with self._lock:
+                    return self._flagged_tiles
+
+            def increment(self):
+                with self._lock:
+                    self._flagged_tiles += 1
+
+            def reset(self):
+                with self._lock:
+                    self._flagged_tiles = 0
+
+        self._flagged_tiles = FlaggedTiles()
+
+        self._data_source_copies = DataSourceCopies()
+
         #======================
         # Tracing
         #======================
@@ -321,6 +416,28 @@ class RimeSolver(MontblancTensorflowSolver):
         self._tfrun = _tfrunner(self._tf_session, self._should_trace)
         self._iterations = 0
 
+        #======================
+        # Startup timings
+        #======================
+
+        self._startup_stats = {
+            'setup': setup_done - start,
+            'devices': devices_done - setup_done,
+            'graph': graph_done - devices_done,
+            'graph_loaded': loaded is not None,
+            'session': session_done - graph_done,
+            'total': time.time() - start,
+        }
+
+        montblanc.log.info("Solver started in {t:.3f}s "
+            "(setup {s:.3f}s, devices {d:.3f}s, graph {g:.3f}s{l}, "
+            "session {x:.3f}s)".format(t=self._startup_stats['total'],
+                s=self._startup_stats['setup'],
+                d=self._startup_stats['devices'],
+                g=self._startup_stats['graph'],
+                l=' loaded' if loaded is not None else '',
+                x=self._startup_stats['session']))
+
     def _descriptor_feed(self):
         try:
             self._descriptor_feed_impl()
@@ -413,10 +530,11 @@ class RimeSolver(MontblancTensorflowSolver):
                 global_iter_args)
 
             compute_f = self._compute_executors[shard].submit(self._compute,
-                compute_feed_dict, shard)
+                compute_feed_dict, shard, feed_f)
 
             consume_f = self._consumer_executor.submit(self._consume,
-                data_sinks.copy(), cube.copy(), global_iter_args)
+                data_sinks.copy(), cube.copy(), global_iter_args,
+                descriptor, feed_f)
 
             self._inputs_waiting.increment(shard)
 
@@ -466,22 +584,80 @@ class RimeSolver(MontblancTensorflowSolver):
         input_data = [(a, ph, _get_data(ds, SourceContext(a, cube,
                 self.config(), global_iter_args,
                 cube.array(a) if a in cube.arrays() else {},
-                ad.shape, ad.dtype)))
+                ad.shape, ad.dtype), self._data_source_copies))
             for (a, ph, ds, ad) in gen]
 
-        # Create a feed dictionary from the input data
-        feed_dict = { ph: data for (a, ph, data) in input_data }
-
         # Cache the inputs for this chunk of data,
         # so that sinks can access them
         input_cache = { a: data for (a, ph, data) in input_data }
         self._source_cache[descriptor.data] = input_cache
 
+        # Transport flags to the compute graph
+        # as a per-visibility polarisation bitmask
+        flag_bits = _pack_flags(input_cache['flag'])
+
+        # Fully flagged tiles are never fed to the compute graph.
+        # The consumer supplies zeroed outputs to the sinks instead
+        if np.all(flag_bits == ALL_POLS_FLAGGED):
+            montblanc.log.info("Chunk {d} is fully flagged, "
+                "skipping compute".format(d=descriptor))
+            self._flagged_tiles.increment()
+            return TILE_FLAGGED
+
+        src_feeds = self._source_feeds(data_sources, cube, descriptor,
+            shard, src_types, src_strides, src_staging_areas,
+            global_iter_args)
+
+        # Tiles with inputs identical to a previously solved tile
+        # are never fed to the compute graph. The consumer
+        # supplies the cached outputs to the sinks instead
+        if self._tile_cache is not None:
+            src_feeds = list(src_feeds)
+            key = _tile_key(self._solve_digest,
+                [(a, data) for (a, ph, data) in input_data
+                    if not a == 'descriptor'] +
+                [(a, data) for _, feeds in src_feeds
+                    for (a, ph, data) in feeds])
+
+            cached = self._tile_cache.get(key)
+            self._tile_keys[descriptor.data] = (key, cached)
+
+            if cached is not None:
+                montblanc.log.info("Chunk {d} is cached, "
+                    "skipping compute".format(d=descriptor))
+                return TILE_CACHED
+
+        # Transport per row weights with a single
+        # channel, broadcast across all channels
+        weight = input_cache['weight']
+
+        if weight.ndim == len(array_schemas['weight'].shape) - 1:
+            weight = np.expand_dims(weight, -2)
+
+        transport = { 'flag': flag_bits, 'weight': weight }
+
+        # Create a feed dictionary from the input data
+        feed_dict = { ph: transport.get(a, data)
+            for (a, ph, data) in input_data }
+
         montblanc.log.info("Enqueueing chunk {d} on shard {sh}".format(
             d=descriptor, sh=shard))
 
         self._tfrun(iq.put_op, feed_dict=feed_dict)
 
+        # Feed the source staging_areas
+        for staging_area, feeds in src_feeds:
+            feed_dict = { ph: data for (a, ph, data) in feeds }
+            self._tfrun(staging_area.put_op, feed_dict=feed_dict)
+
+        return TILE_FED
+
+    def _source_feeds(self, data_sources, cube, descriptor, shard,
+            src_types, src_strides, src_staging_areas, global_iter_args):
+        """
+        Generates (staging_area, [(name, placeholder, data)]) tuples
+        for each batch of sources of each source type
+        """
         # For each source type, feed that source staging_area
         for src_type, staging_area, stride in zip(src_types, src_staging_areas, src_strides):
             iter_args = [(src_type, stride)]
@@ -505,20 +681,22 @@ class RimeSolver(MontblancTensorflowSolver):
                 gen = [(a, ph, data_sources[a], array_schemas[a])
                     for ph, a in zip(staging_area.placeholders, staging_area.fed_arrays)]
 
-                # Create a feed dictionary by calling the data source functors
-                feed_dict = { ph: _get_data(ds, SourceContext(a, cube,
-                        self.config(), global_iter_args + iter_args,
+                # Get source data by calling the data source functors
+                yield staging_area, [(a, ph, _get_data(ds, SourceContext(a,
+                        cube, self.config(), global_iter_args + iter_args,
                         cube.array(a) if a in cube.arrays() else {},
-                        ad.shape, ad.dtype))
-                    for (a, ph, ds, ad) in gen }
+                        ad.shape, ad.dtype), self._data_source_copies))
+                    for (a, ph, ds, ad) in gen]
 
-                self._tfrun(staging_area.put_op, feed_dict=feed_dict)
-
-    def _compute(self, feed_dict, shard):
+    def _compute(self, feed_dict, shard, feed_future):
         """ Call the tensorflow compute """
 
         try:
-            descriptor, enq = self._tfrun(self._tf_expr[shard], feed_dict=feed_dict)
+            # Nothing was fed for fully flagged or cached tiles
+            if feed_future.result() == TILE_FED:
+                descriptor, enq = self._tfrun(self._tf_expr[shard],
+                    feed_dict=feed_dict)
+
             self._inputs_waiting.decrement(shard)
 
         except Exception as e:
@@ -526,14 +704,79 @@ class RimeSolver(MontblancTensorflowSolver):
             raise
 
 
-    def _consume(self, data_sinks, cube, global_iter_args):
+    def _consume(self, data_sinks, cube, global_iter_args,
+            descriptor, feed_future):
         """ Consume stub """
         try:
+            status = feed_future.result()
+
+            if status == TILE_FLAGGED:
+                return self._consume_flagged(data_sinks, cube,
+                    global_iter_args, descriptor)
+            elif status == TILE_CACHED:
+                return self._consume_cached(data_sinks, cube,
+                    global_iter_args, descriptor)
+
             return self._consume_impl(data_sinks, cube, global_iter_args)
         except Exception as e:
             montblanc.log.exception("Consumer Exception")
             raise e, None, sys.exc_info()[2]
 
+    def _consume_flagged(self, data_sinks, cube, global_iter_args, descriptor):
+        """ Supply zeroed outputs for a fully flagged tile """
+        dims = self._transcoder.decode(descriptor)
+        cube.update_dimensions(dims)
+        output_schemas = cube.arrays(reify=True)
+
+        # Flagged visibilities are zeroed and contribute
+        # nothing to the chi-squared. chi_squared is a scalar
+        # on output, matching post_process_visibilities
+        output = {
+            'model_vis' : np.zeros(output_schemas['model_vis'].shape,
+                                output_schemas['model_vis'].dtype),
+            'chi_squared' : np.zeros((), output_schemas['chi_squared'].dtype),
+        }
+
+        self._supply_outputs(data_sinks, cube, global_iter_args,
+            descriptor, output)
+
+    def _consume_cached(self, data_sinks, cube, global_iter_args, descriptor):
+        """ Supply cached outputs for a tile """
+        dims = self._transcoder.decode(descriptor)
+        cube.update_dimensions(dims)
+
+        _, (model_vis, chi_squared) = self._tile_keys.pop(descriptor.data)
+        output = { 'model_vis': model_vis, 'chi_squared': chi_squared }
+
+        self._supply_outputs(data_sinks, cube, global_iter_args,
+            descriptor, output)
+
+    def _supply_outputs(self, data_sinks, cube, global_iter_args,
+                                                descriptor, output):
+        """ Supply outputs computed outside the compute graph to sinks """
+        input_data = self._pop_input_cache(descriptor)
+        LSA = self._tf_feed_data.local
+
+        for n in LSA.output.fed_arrays:
+            if n == 'descriptor':
+                continue
+
+            sink_context = SinkContext(n, cube,
+                self.config(), global_iter_args,
+                cube.array(n) if n in cube.arrays() else {},
+                output[n], input_data)
+
+            _supply_data(data_sinks[n], sink_context)
+
+    def _pop_input_cache(self, descriptor):
+        """ Obtain and remove input data from the source cache """
+        try:
+            return self._source_cache.pop(descriptor.data)
+        except KeyError:
+            raise ValueError("No input data cache available "
+                "in source cache for descriptor {}!"
+                    .format(descriptor))
+
     def _consume_impl(self, data_sinks, cube, global_iter_args):
         """ Consume """
 
@@ -552,12 +795,13 @@ class RimeSolver(MontblancTensorflowSolver):
         cube.update_dimensions(dims)
 
         # Obtain and remove input data from the source cache
-        try:
-            input_data = self._source_cache.pop(descriptor.data)
-        except KeyError:
-            raise ValueError("No input data cache available "
-                "in source cache for descriptor {}!"
-                    .format(descriptor))
+        input_data = self._pop_input_cache(descriptor)
+
+        # Cache the outputs of this tile
+        if self._tile_cache is not None:
+            key, _ = self._tile_keys.pop(descriptor.data)
+            _cache_tile(self._tile_cache, key,
+                output['model_vis'], output['chi_squared'])
 
         # For each array in our output, call the associated data sink
         gen = ((n, a) for n, a in output.iteritems() if not n == 'descriptor')
@@ -593,10 +837,15 @@ class RimeSolver(MontblancTensorflowSolver):
             p.init(ctx)
 
         # Apply any dimension updates from the source provider
-        # to the hypercube, taking previous reductions into account
+        # to the hypercube, taking previous reductions into account.
+        # Analytic beams don't need a beam cube, so leave its
+        # dimensions at their (small) defaults
+        ignored_dims = (BEAM_CUBE_DIMS if _analytic_beam(self.config())
+                                                    is not None else ())
+
         bytes_required = _apply_source_provider_dim_updates(
             self.hypercube, source_providers,
-            self._previous_budget_dims)
+            self._previous_budget_dims, ignored_dims)
 
         # If we use more memory than previously,
         # perform another budgeting operation
@@ -639,17 +888,27 @@ class RimeSolver(MontblancTensorflowSolver):
             for n, f in prov.sinks().iteritems()
             if not n == 'descriptor' }
 
-        # Construct a feed dictionary from data sources
-        feed_dict = {  fo.ph: _get_data(data_sources[k],
+        self._data_source_copies.reset()
+
+        # Obtain data for arrays that are only fed once
+        feed_once = { k: _get_data(data_sources[k],
                 SourceContext(k, cube,
                     self.config(), global_iter_args,
                     cube.array(k) if k in cube.arrays() else {},
                     array_schemas[k].shape,
-                    array_schemas[k].dtype))
-            for k, fo
+                    array_schemas[k].dtype),
+                self._data_source_copies)
+            for k in LSA.feed_once.iterkeys() }
+
+        if self._tile_cache is not None:
+            self._solve_digest = _solve_digest(cube, feed_once)
+
+        # Construct a feed dictionary from data sources
+        feed_dict = { fo.ph: feed_once[k] for k, fo
             in LSA.feed_once.iteritems() }
 
         self._run_metadata.clear()
+        self._flagged_tiles.reset()
 
         # Run the assign operations for each feed_once variable
         assign_ops = [fo.assign_op.op for fo in LSA.feed_once.itervalues()]
@@ -720,6 +979,18 @@ class RimeSolver(MontblancTensorflowSolver):
             if self._should_trace:
                 self._run_metadata.write(self._iterations)
 
+            montblanc.log.info("Skipped compute on {n} fully "
+                "flagged chunks".format(n=self._flagged_tiles.get()))
+
+            _log_tile_cache_stats(self._tile_cache)
+
+            copies = self._data_source_copies.get()
+
+            if len(copies) > 0:
+                montblanc.log.info("Data source arrays copied by the "
+                    "solver: {c}".format(c=", ".join("{n}: {c}".format(
+                        n=n, c=c) for n, c in sorted(copies.iteritems()))))
+
             self._iterations += 1
         finally:
             # Indicate solution stopped in providers
@@ -730,6 +1001,16 @@ class RimeSolver(MontblancTensorflowSolver):
             montblanc.log.info('Solution Completed')
 
 
+    def tile_cache_stats(self):
+        """
+        Returns a dictionary of tile cache statistics,
+        empty if tile caching is disabled
+        """
+        if self._tile_cache is None:
+            return {}
+
+        return self._tile_cache.stats()
+
     def close(self):
         # Shutdown thread executors
         self._descriptor_executor.shutdown()
@@ -755,62 +1036,6 @@ class RimeSolver(MontblancTensorflowSolver):
         self.close()
 
 
-def _create_defaults_source_provider(cube, data_source):
-    """
-    Create a DefaultsSourceProvider object. This provides default
-    data sources for each array defined on the hypercube. The data sources
-    may either by obtained from the arrays 'default' data source
-    or the 'test' data source.
-    """
-    from montblanc.impl.rime.tensorflow.sources import (
-        find_sources, DEFAULT_ARGSPEC)
-    from montblanc.impl.rime.tensorflow.sources import constant_cache
-
-    # Obtain default data sources for each array,
-    # Just take from defaults if test data isn't specified
-    staging_area_data_source = ('default' if not data_source == 'test'
-                                                      else data_source)
-
-    cache = True
-
-    default_prov = DefaultsSourceProvider(cache=cache)
-
-    # Create data sources on the source provider from
-    # the cube array data sources
-    for n, a in cube.arrays().iteritems():
-        # Unnecessary for temporary arrays
-        if 'temporary' in a.tags:
-            continue
-
-        # Obtain the data source
-        data_source = a.get(staging_area_data_source)
-
-        # Array marked as constant, decorate the data source
-        # with a constant caching decorator
-        if cache is True and 'constant' in a.tags:
-            data_source = constant_cache(data_source)
-
-        method = types.MethodType(data_source, default_prov)
-        setattr(default_prov, n, method)
-
-    def _sources(self):
-        """
-        Override the sources method to also handle lambdas that look like
-        lambda s, c: ..., as defined in the config module
-        """
-
-        try:
-            return self._sources
-        except AttributeError:
-            self._sources = find_sources(self, [DEFAULT_ARGSPEC] + [['s', 'c']])
-
-        return self._sources
-
-    # Monkey patch the sources method
-    default_prov.sources = types.MethodType(_sources, default_prov)
-
-    return default_prov
-
 def _construct_tensorflow_feed_data(dfs, cube, iter_dims,
     nr_of_input_staging_areas):
 
@@ -930,6 +1155,7 @@ def _construct_tensorflow_expression(slvr_cfg, feed_data, device, shard):
     LSA = feed_data.local
 
     polarisation_type = slvr_cfg['polarisation_type']
+    analytic_beam = _analytic_beam(slvr_cfg)
 
     # Pull RIME inputs out of the feed staging_area
     # of the relevant shard, adding the feed once
@@ -986,11 +1212,21 @@ def _construct_tensorflow_expression(slvr_cfg, feed_data, device, shard):
         bsqrt_real = tf.check_numerics(tf.real(bsqrt), bsqrt_msg)
         bsqrt_imag = tf.check_numerics(tf.imag(bsqrt), bsqrt_msg)
 
-        # Compute the direction dependent effects from the beam
-        ejones = rime.e_beam(lm, D.frequency,
-            D.pointing_errors, D.antenna_scaling,
-            pa_sin, pa_cos,
-            D.beam_extents, D.beam_freq_map, D.ebeam)
+        # Compute the direction dependent effects from the beam,
+        # either interpolated from the beam cube or analytically
+        if analytic_beam is None:
+            ejones = rime.e_beam(lm, D.frequency,
+                D.pointing_errors, D.antenna_scaling,
+                pa_sin, pa_cos,
+                D.beam_extents, D.beam_freq_map, D.ebeam,
+                D.antenna_beam)
+        else:
+            beam_model, beam_parameter = analytic_beam
+            ejones = rime.analytic_e_beam(lm, D.frequency,
+                D.pointing_errors, D.antenna_scaling,
+                pa_sin, pa_cos, CT=CT,
+                beam_model=beam_model,
+                beam_parameter=beam_parameter)
 
         deps = [phase_real, phase_imag, bsqrt_real, bsqrt_imag]
         deps = [] # Do nothing for now
@@ -1026,7 +1262,7 @@ def _construct_tensorflow_expression(slvr_cfg, feed_data, device, shard):
             S.point_stokes, S.point_alpha, S.point_ref_freq)
         shape = tf.ones(shape=[nsrc,ntime,nbl,nchan], dtype=FT)
         coherencies = rime.sum_coherencies(D.antenna1, D.antenna2,
-            shape, ant_jones, sgn_brightness, coherencies)
+            shape, ant_jones, sgn_brightness, D.flag, coherencies)
 
         return coherencies, npsrc, src_count
 
@@ -1044,7 +1280,7 @@ def _construct_tensorflow_expression(slvr_cfg, feed_data, device, shard):
         gauss_shape = rime.gauss_shape(D.uvw, D.antenna1, D.antenna2,
             D.frequency, S.gaussian_shape)
         coherencies = rime.sum_coherencies(D.antenna1, D.antenna2,
-            gauss_shape, ant_jones, sgn_brightness, coherencies)
+            gauss_shape, ant_jones, sgn_brightness, D.flag, coherencies)
 
         return coherencies, ngsrc, src_count
 
@@ -1062,7 +1298,7 @@ def _construct_tensorflow_expression(slvr_cfg, feed_data, device, shard):
         sersic_shape = rime.sersic_shape(D.uvw, D.antenna1, D.antenna2,
             D.frequency, S.sersic_shape)
         coherencies = rime.sum_coherencies(D.antenna1, D.antenna2,
-            sersic_shape, ant_jones, sgn_brightness, coherencies)
+            sersic_shape, ant_jones, sgn_brightness, D.flag, coherencies)
 
         return coherencies, nssrc, src_count
 
@@ -1094,296 +1330,3 @@ def _construct_tensorflow_expression(slvr_cfg, feed_data, device, shard):
 
     # Return descriptor and enstaging_area operation
     return D.descriptor, put_op
-
-def _get_data(data_source, context):
-    """ Get data from the data source, checking the return values """
-    try:
-        # Get data from the data source
-        data = data_source.source(context)
-
-        # Complain about None values
-        if data is None:
-            raise ValueError("'None' returned from "
-                "data source '{n}'".format(n=context.name))
-        # We want numpy arrays
-        elif not isinstance(data, np.ndarray):
-            raise TypeError("Data source '{n}' did not "
-                "return a numpy array, returned a '{t}'".format(
-                    t=type(data)))
-        # And they should be the right shape and type
-        elif data.shape != context.shape or data.dtype != context.dtype:
-            raise ValueError("Expected data of shape '{esh}' and "
-                "dtype '{edt}' for data source '{n}', but "
-                "shape '{rsh}' and '{rdt}' was found instead".format(
-                    n=context.name, esh=context.shape, edt=context.dtype,
-                    rsh=data.shape, rdt=data.dtype))
-
-        return data
-
-    except Exception as e:
-        ex = ValueError("An exception occurred while "
-            "obtaining data from data source '{ds}'\n\n"
-            "{e}\n\n"
-            "{help}".format(ds=context.name,
-                e=str(e), help=context.help()))
-
-        raise ex, None, sys.exc_info()[2]
-
-def _supply_data(data_sink, context):
-    """ Supply data to the data sink """
-    try:
-        data_sink.sink(context)
-    except Exception as e:
-        ex = ValueError("An exception occurred while "
-            "supplying data to data sink '{ds}'\n\n"
-            "{e}\n\n"
-            "{help}".format(ds=context.name,
-                e=str(e), help=context.help()))
-
-        raise ex, None, sys.exc_info()[2]
-
-def _iter_args(iter_dims, cube):
-    iter_strides = cube.dim_extent_size(*iter_dims)
-    return zip(iter_dims, iter_strides)
-
-def _uniq_log2_range(start, size, div):
-    start = np.log2(start)
-    size = np.log2(size)
-    int_values = np.int32(np.logspace(start, size, div, base=2)[:-1])
-
-    return np.flipud(np.unique(int_values))
-
-def _budget(cube, slvr_cfg):
-    # Figure out a viable dimension configuration
-    # given the total problem size
-    mem_budget = slvr_cfg.get('mem_budget', 2*ONE_GB)
-    bytes_required = cube.bytes_required()
-
-    src_dims = mbu.source_nr_vars() + ['nsrc']
-    dim_names = ['na', 'nbl', 'ntime'] + src_dims
-    global_sizes = cube.dim_global_size(*dim_names)
-    na, nbl, ntime = global_sizes[:3]
-
-    # Keep track of original dimension sizes and any reductions that are applied
-    original_sizes = { r: s for r, s in zip(dim_names, global_sizes) }
-    applied_reductions = {}
-
-    def _reduction():
-        # Reduce over time first
-        trange = _uniq_log2_range(1, ntime, 5)
-        for t in trange[0:1]:
-            yield [('ntime', t)]
-
-        # Attempt reduction over source
-        sbs = slvr_cfg['source_batch_size']
-        srange = _uniq_log2_range(10, sbs, 5) if sbs > 10 else 10
-        src_dim_gs = global_sizes[3:]
-
-        for bs in srange:
-            yield [(d, bs if bs < gs else gs) for d, gs
-                in zip(src_dims, src_dim_gs)]
-
-        # Try the rest of the timesteps
-        for t in trange[1:]:
-            yield [('ntime', t)]
-
-        # Reduce by baseline
-        for bl in _uniq_log2_range(na, nbl, 5):
-            yield [('nbl', bl)]
-
-    for reduction in _reduction():
-        if bytes_required > mem_budget:
-            for dim, size in reduction:
-                applied_reductions[dim] = size
-                cube.update_dimension(dim, lower_extent=0, upper_extent=size)
-        else:
-            break
-
-        bytes_required = cube.bytes_required()
-
-    # Log some information about the memory_budget
-    # and dimension reduction
-    montblanc.log.info(("Selected a solver memory budget of {rb} "
-        "given a hard limit of {mb}.").format(
-        rb=mbu.fmt_bytes(bytes_required),
-        mb=mbu.fmt_bytes(mem_budget)))
-
-    if len(applied_reductions) > 0:
-        montblanc.log.info("The following dimension reductions "
-            "were applied:")
-
-        for k, v in applied_reductions.iteritems():
-            montblanc.log.info('{p}{d}: {id} => {rd}'.format
-                (p=' '*4, d=k, id=original_sizes[k], rd=v))
-    else:
-        montblanc.log.info("No dimension reductions were applied.")
-
-    return applied_reductions, bytes_required
-
-DimensionUpdate = attr.make_class("DimensionUpdate",
-    ['size', 'prov'], slots=True, frozen=True)
-
-def _apply_source_provider_dim_updates(cube, source_providers, budget_dims):
-    """
-    Given a list of source_providers, apply the list of
-    suggested dimension updates given in provider.updated_dimensions()
-    to the supplied hypercube.
-
-    Dimension global_sizes are always updated with the supplied sizes and
-    lower_extent is always set to 0. upper_extent is set to any reductions
-    (current upper_extents) existing in budget_dims, otherwise it is set
-    to global_size.
-
-    """
-    # Create a mapping between a dimension and a
-    # list of (global_size, provider_name) tuples
-    update_map = collections.defaultdict(list)
-
-    for prov in source_providers:
-        for dim_tuple in prov.updated_dimensions():
-            name, size = dim_tuple
-
-            # Don't accept any updates on the nsrc dimension
-            # This is managed internally
-            if name == 'nsrc':
-                continue
-
-            dim_update = DimensionUpdate(size, prov.name())
-            update_map[name].append(dim_update)
-
-    # No dimensions were updated, quit early
-    if len(update_map) == 0:
-        return cube.bytes_required()
-
-    # Ensure that the global sizes we receive
-    # for each dimension are unique. Tell the user
-    # when conflicts occur
-    update_list = []
-
-    for name, updates in update_map.iteritems():
-        if not all(updates[0].size == du.size for du in updates[1:]):
-            raise ValueError("Received conflicting "
-                "global size updates '{u}'"
-                " for dimension '{n}'.".format(n=name, u=updates))
-
-        update_list.append((name, updates[0].size))
-
-    montblanc.log.info("Updating dimensions {} from "
-                        "source providers.".format(str(update_list)))
-
-    # Now update our dimensions
-    for name, global_size in update_list:
-        # Defer to existing any existing budgeted extent sizes
-        # Otherwise take the global_size
-        extent_size = budget_dims.get(name, global_size)
-
-        # Take the global_size if extent_size was previously zero!
-        extent_size = global_size if extent_size == 0 else extent_size
-
-        # Clamp extent size to global size
-        if extent_size > global_size:
-            extent_size = global_size
-
-        # Update the dimension
-        cube.update_dimension(name,
-            global_size=global_size,
-            lower_extent=0,
-            upper_extent=extent_size)
-
-    # Handle global number of sources differently
-    # It's equal to the number of
-    # point's, gaussian's, sersic's combined
-    nsrc = sum(cube.dim_global_size(*mbu.source_nr_vars()))
-
-    # Extent size will be equal to whatever source type
-    # we're currently iterating over. So just take
-    # the maximum extent size given the sources
-    es = max(cube.dim_extent_size(*mbu.source_nr_vars()))
-
-    cube.update_dimension('nsrc',
-        global_size=nsrc,
-        lower_extent=0,
-        upper_extent=es)
-
-    # Return our cube size
-    return cube.bytes_required()
-
-def _setup_hypercube(cube, slvr_cfg):
-    """ Sets up the hypercube given a solver configuration """
-    mbu.register_default_dimensions(cube, slvr_cfg)
-
-    # Configure the dimensions of the beam cube
-    cube.register_dimension('beam_lw', 2,
-                            description='E Beam cube l width')
-
-    cube.register_dimension('beam_mh', 2,
-                            description='E Beam cube m height')
-
-    cube.register_dimension('beam_nud', 2,
-                            description='E Beam cube nu depth')
-
-    # =========================================
-    # Register hypercube Arrays and Properties
-    # =========================================
-
-    from montblanc.impl.rime.tensorflow.config import (A, P)
-
-    def _massage_dtypes(A, T):
-        def _massage_dtype_in_dict(D):
-            new_dict = D.copy()
-            new_dict['dtype'] = mbu.dtype_from_str(D['dtype'], T)
-            return new_dict
-
-        return [_massage_dtype_in_dict(D) for D in A]
-
-    dtype = slvr_cfg['dtype']
-    is_f32 = dtype == 'float'
-
-    T = {
-        'ft' : np.float32 if is_f32 else np.float64,
-        'ct' : np.complex64 if is_f32 else np.complex128,
-        'int' : int,
-    }
-
-    cube.register_properties(_massage_dtypes(P, T))
-    cube.register_arrays(_massage_dtypes(A, T))
-
-def _partition(iter_dims, data_sources):
-    """
-    Partition data sources into
-
-    1. Dictionary of data sources associated with radio sources.
-    2. List of data sources to feed multiple times.
-    3. List of data sources to feed once.
-    """
-
-    src_nr_vars = set(source_var_types().values())
-    iter_dims = set(iter_dims)
-
-    src_data_sources = collections.defaultdict(list)
-    feed_many = []
-    feed_once = []
-
-    for ds in data_sources:
-        # Is this data source associated with
-        # a radio source (point, gaussian, etc.?)
-        src_int = src_nr_vars.intersection(ds.shape)
-
-        if len(src_int) > 1:
-            raise ValueError("Data source '{}' contains multiple "
-                            "source types '{}'".format(ds.name, src_int))
-        elif len(src_int) == 1:
-            # Yep, record appropriately and iterate
-            src_data_sources[src_int.pop()].append(ds)
-            continue
-
-        # Are we feeding this data source multiple times
-        # (Does it possess dimensions on which we iterate?)
-        if len(iter_dims.intersection(ds.shape)) > 0:
-            feed_many.append(ds)
-            continue
-
-        # Assume this is a data source that we only feed once
-        feed_once.append(ds)
-
-    return src_data_sources, feed_many, feed_once
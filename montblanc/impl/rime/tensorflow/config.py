@@ -75,14 +75,15 @@ def default_base_ant_pairs(self, context):
     # method will be grafted onto a DefaultsSourceProvider with
     # the appropriate members.
     if self._is_cached:
-        array_cache = self._chunk_cache['default_base_ant_pairs']
-        key = (k, na)
+        key = ('default_base_ant_pairs', k, na)
+        ant_pairs = self._chunk_cache.get(key, None)
 
         # Cache miss
-        if key not in array_cache:
-            array_cache[key] = tuple(gen)
+        if ant_pairs is None:
+            ant_pairs = tuple(gen)
+            self._chunk_cache.put(key, ant_pairs)
 
-        return array_cache[key]
+        return ant_pairs
 
     return tuple(gen)
 
@@ -338,16 +339,25 @@ A = [
             "slice of the frequency dimension of the holographic beam cube.",
         units   = HERTZ),
 
-    # Beam cube
-    array_dict('ebeam', ('beam_lw', 'beam_mh', 'beam_nud', 'npol'), 'ct',
+    # Beam cubes
+    array_dict('ebeam', ('beam_nb', 'beam_lw', 'beam_mh', 'beam_nud', 'npol'), 'ct',
         default = identity_on_pols,
         test    = lambda s, c: rc(c.shape, c.dtype),
         tags    = "input, constant",
-        description = "Holographic beam cube providing "
-            "a discretised representation of the antenna beam pattern. "
+        description = "Holographic beam cubes providing "
+            "a discretised representation of the antenna beam patterns. "
             "Used to simulate the Direction Dependent Effects (DDE) "
             " or E term of the RIME."
-            "Composed of a frequency stack of (l,m) images.",
+            "Each cube is composed of a frequency stack of (l,m) images.",
+        units   = DIMENSIONLESS),
+
+    # Beam cube of each antenna
+    array_dict('antenna_beam', ('na',), np.int32,
+        default = lambda s, c: np.zeros(c.shape, c.dtype),
+        test    = lambda s, c: np.zeros(c.shape, c.dtype),
+        tags    = "input, constant",
+        description = "Index of the holographic beam cube "
+            "associated with each antenna.",
         units   = DIMENSIONLESS),
 
     # Direction-Independent Effects
@@ -470,7 +480,11 @@ A = [
         test    = lambda s, c: rf(c.shape, c.dtype),
         tags    = "input, constant",
         description = "Weight applied to the difference of observed and model "
-            "visibilities when computing a Chi-Squared value.",
+            "visibilities when computing a Chi-Squared value. "
+            "May also be supplied per band, with shape "
+            "(ntime, nbl, nbands, npol), or per row, with shape "
+            "(ntime, nbl, npol), in which case it is broadcast "
+            "across channels.",
         units   = DIMENSIONLESS),
     # Observed Visibilities
     array_dict('observed_vis', ('ntime','nbl','nchan', 'npol'), 'ct',
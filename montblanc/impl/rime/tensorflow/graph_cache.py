@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import os
+
+from attrdict import AttrDict
+import attr
+import tensorflow as tf
+
+import montblanc
+import montblanc.util as mbu
+
+# Bumped whenever the layout of the binding manifest changes
+MANIFEST_VERSION = 1
+
+# Configuration options which do not affect the
+# construction of the compute graph
+NON_GRAPH_CONFIG_KEYS = ('graph_cache', 'mem_budget', 'tf_server_target',
+    'thread_budget', 'cpu_threads', 'cpu_affinity', 'source_batch_size',
+    'field_ids', 'data_source', 'backend')
+
+BoundFeedOnce = attr.make_class("BoundFeedOnce", ['ph', 'var', 'assign_op'],
+    slots=True, frozen=True)
+
+class BoundStagingArea(object):
+    """
+    Staging area of an imported compute graph.
+    Exposes the fed arrays, placeholders and put and get operations of
+    a :class:`StagingAreaWrapper`, bound by name to the imported graph.
+    """
+    def __init__(self, name, fed_arrays, placeholders, put_op, get_op):
+        self._name = name
+        self._fed_arrays = fed_arrays
+        self._placeholders = placeholders
+        self._put_op = put_op
+        self._get_op = get_op
+
+    @property
+    def fed_arrays(self):
+        return self._fed_arrays
+
+    @property
+    def placeholders(self):
+        return self._placeholders
+
+    @property
+    def put_op(self):
+        return self._put_op
+
+    @property
+    def get_op(self):
+        return self._get_op
+
+def graph_key(slvr_cfg, devices, shards_per_device):
+    """
+    Returns a SHA1 hex digest identifying the compute graph
+    constructed for the given configuration, devices and shards
+    """
+    cfg = { k: v for k, v in slvr_cfg.iteritems()
+        if k not in NON_GRAPH_CONFIG_KEYS }
+
+    sha = hashlib.sha1()
+    sha.update(repr(mbu.freeze(cfg)))
+    sha.update(repr(tuple(devices)))
+    sha.update(repr(shards_per_device))
+    sha.update(montblanc.__version__)
+    sha.update(tf.__version__)
+    sha.update(str(MANIFEST_VERSION))
+
+    return sha.hexdigest()
+
+def graph_filenames(cache_dir, key):
+    """ Returns the (meta graph, manifest) filenames for key """
+    base = os.path.join(cache_dir, 'rime-graph-{k}'.format(k=key))
+    return base + '.meta', base + '.json'
+
+def _staging_area_manifest(sa):
+    return { 'fed_arrays': list(sa.fed_arrays),
+        'placeholders': [p.name for p in sa.placeholders],
+        'put_op': sa.put_op.name,
+        'get_op': { n: t.name for n, t in sa.get_op.iteritems() } }
+
+def _manifest(feed_data, expr, init_op, devices, shards_per_device):
+    """ Names of the graph elements referenced by the solver """
+    local = feed_data.local
+
+    return {
+        'version': MANIFEST_VERSION,
+        'devices': list(devices),
+        'shards_per_device': shards_per_device,
+        'init_op': init_op.name,
+        'src_ph_vars': { n: p.name for n, p
+            in feed_data.src_ph_vars.iteritems() },
+        'property_ph_vars': { n: p.name for n, p
+            in feed_data.property_ph_vars.iteritems() },
+        'descriptor': _staging_area_manifest(local.descriptor),
+        'feed_many': [_staging_area_manifest(sa) for sa in local.feed_many],
+        'sources': { n: [_staging_area_manifest(sa) for sa in sas]
+            for n, sas in local.sources.iteritems() },
+        'output': _staging_area_manifest(local.output),
+        'feed_once': { n: [fo.ph.name, fo.var.name, fo.assign_op.name]
+            for n, fo in local.feed_once.iteritems() },
+        'input_sources': sorted(local.input_sources),
+        'expr': [[d.name, p.name] for d, p in expr],
+    }
+
+def save_graph(cache_dir, key, graph, feed_data, expr, init_op,
+                                    devices, shards_per_device):
+    """
+    Serialise the compute graph and a manifest binding
+    the solver's staging areas, placeholders and
+    operations by name into cache_dir
+    """
+    meta_filename, manifest_filename = graph_filenames(cache_dir, key)
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    manifest = _manifest(feed_data, expr, init_op,
+        devices, shards_per_device)
+
+    # Write to temporary files and rename, so that other
+    # processes never observe a partial graph. The manifest
+    # is renamed last and marks a complete entry.
+    tmp_meta = '{f}.{p}.tmp'.format(f=meta_filename, p=os.getpid())
+    tmp_manifest = '{f}.{p}.tmp'.format(f=manifest_filename, p=os.getpid())
+
+    tf.train.export_meta_graph(filename=tmp_meta, graph=graph,
+        clear_devices=False)
+
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f)
+
+    os.rename(tmp_meta, meta_filename)
+    os.rename(tmp_manifest, manifest_filename)
+
+    montblanc.log.info("Cached compute graph in '{f}'.".format(
+        f=meta_filename))
+
+def _bind_staging_area(graph, name, manifest):
+    tensor, op = graph.get_tensor_by_name, graph.get_operation_by_name
+
+    return BoundStagingArea(name, manifest['fed_arrays'],
+        [tensor(p) for p in manifest['placeholders']],
+        op(manifest['put_op']),
+        { n: tensor(t) for n, t in manifest['get_op'].iteritems() })
+
+def load_graph(cache_dir, key, devices, shards_per_device):
+    """
+    Import a compute graph previously serialised by :func:`save_graph`.
+
+    Returns
+    -------
+    tuple or None
+        (graph, feed_data, expr, init_op) or None
+        if no usable graph exists in cache_dir.
+    """
+    meta_filename, manifest_filename = graph_filenames(cache_dir, key)
+
+    if not os.path.exists(manifest_filename):
+        return None
+
+    try:
+        with open(manifest_filename, 'r') as f:
+            manifest = json.load(f)
+
+        if (manifest['version'] != MANIFEST_VERSION or
+            manifest['devices'] != list(devices) or
+            manifest['shards_per_device'] != shards_per_device):
+
+            montblanc.log.warn("Cached compute graph '{f}' was constructed "
+                "for different devices. Rebuilding.".format(f=meta_filename))
+            return None
+
+        with tf.Graph().as_default() as graph:
+            tf.train.import_meta_graph(meta_filename, clear_devices=False)
+
+        tensor, op = graph.get_tensor_by_name, graph.get_operation_by_name
+
+        FD = AttrDict()
+        # https://github.com/bcj/AttrDict/issues/34
+        FD._setattr('_sequence_type', list)
+        FD.local = local = AttrDict()
+        local._setattr('_sequence_type', list)
+
+        FD.src_ph_vars = AttrDict({ n: tensor(t) for n, t
+            in manifest['src_ph_vars'].iteritems() })
+        FD.property_ph_vars = AttrDict({ n: tensor(t) for n, t
+            in manifest['property_ph_vars'].iteritems() })
+
+        local.descriptor = _bind_staging_area(graph, 'descriptors',
+            manifest['descriptor'])
+        local.feed_many = [_bind_staging_area(graph, 'feed_many_%d' % i, m)
+            for i, m in enumerate(manifest['feed_many'])]
+        local.sources = { n: [_bind_staging_area(graph, '%s_%d' % (n, i), m)
+                for i, m in enumerate(sas)]
+            for n, sas in manifest['sources'].iteritems() }
+        local.output = _bind_staging_area(graph, 'output', manifest['output'])
+        local.feed_once = { n: BoundFeedOnce(tensor(ph), tensor(var),
+                                                    tensor(assign))
+            for n, (ph, var, assign) in manifest['feed_once'].iteritems() }
+        local.input_sources = set(manifest['input_sources'])
+
+        expr = [(tensor(d), op(p)) for d, p in manifest['expr']]
+        init_op = op(manifest['init_op'])
+    except Exception:
+        montblanc.log.exception("Unable to load cached compute "
+            "graph '{f}'. Rebuilding.".format(f=meta_filename))
+        return None
+
+    graph.finalize()
+
+    montblanc.log.info("Loaded cached compute graph '{f}'.".format(
+        f=meta_filename))
+
+    return graph, FD, expr, init_op
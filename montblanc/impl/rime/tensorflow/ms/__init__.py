@@ -18,4 +18,5 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
-from ms_manager import MeasurementSetManager
\ No newline at end of file
+from ms_manager import MeasurementSetManager
+from multi_ms import solve_measurement_sets
\ No newline at end of file
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import glob
+import json
+import os
+
+import numpy as np
+
+import montblanc
+
+# Name of the manifest describing the cached arrays.
+# It is written last, so a partial conversion is never valid
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+
+def ms_mtime(msname):
+    """
+    Returns the latest modification time of the column data of a
+    Measurement Set. The table description and lock files are
+    rewritten whenever the MS is opened for writing, and are ignored.
+    """
+    mtimes = [os.path.getmtime(f) for f in
+        glob.glob(os.path.join(msname, 'table.f*'))]
+
+    return max(mtimes) if len(mtimes) > 0 else os.path.getmtime(msname)
+
+def load_manifest(directory):
+    """
+    Returns the manifest of the memmap cache in directory,
+    or None if no complete cache exists there
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+
+    return manifest
+
+def memmap_cache_valid(directory, msname, field_id, vis_column, dtype):
+    """
+    Returns True if the memmap cache in directory holds the
+    field_id rows and vis_column of msname in dtype precision,
+    and msname has not been modified since the cache was created
+    """
+    manifest = load_manifest(directory)
+
+    return (manifest is not None
+        and manifest['msname'] == os.path.abspath(msname)
+        and manifest['field_id'] == field_id
+        and manifest['vis_column'] == vis_column
+        and manifest['dtype'] == dtype
+        and manifest['ms_mtime'] >= ms_mtime(msname))
+
+def _expand_channels(data, context):
+    """ Expand per band or per row data across channels """
+    if data.shape == context.shape:
+        return data
+
+    chan = context.array_schema.shape.index('nchan')
+    nchan = context.shape[chan]
+
+    if data.ndim < len(context.shape):
+        data = np.expand_dims(data, chan)
+
+    return np.repeat(data, nchan // data.shape[chan], axis=chan)
+
+def create_memmap_cache(manager, directory, slvr_cfg,
+        vis_column=None, ntime_chunk=64):
+    """
+    Converts the data of the field selected on manager into
+    (time, baseline, band) ordered arrays in directory, with the
+    shapes expected by the solver. The arrays are saved as .npy files
+    that :py:class:`.MemmapSourceProvider` memory maps.
+
+    Parameters
+    ----------
+    manager : :py:class:`.MeasurementSetManager`
+        Manager of the Measurement Set
+    directory : str
+        Cache directory, created if it does not exist
+    slvr_cfg : dict
+        Solver configuration
+    vis_column : str
+        Column from which observed visibilities are read.
+        Defaults to 'DATA'.
+    ntime_chunk : integer
+        Number of timesteps converted at a time
+
+    Returns
+    -------
+    dict
+        The cache manifest
+    """
+    from hypercube import HyperCube
+
+    from montblanc.impl.rime.tensorflow.solver_utils import (
+        DataSource, DataSourceCopies, _get_data, _setup_hypercube)
+    from montblanc.impl.rime.tensorflow.sources import (
+        MSSourceProvider, SourceContext)
+
+    vis_column = 'DATA' if vis_column is None else vis_column
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    # Invalidate any existing cache before writing arrays
+    manifest_path = os.path.join(directory, MANIFEST)
+
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    # Record the modification time before reading, so that
+    # writes during the conversion invalidate the cache
+    mtime = ms_mtime(manager.msname)
+
+    # Only dimensions and arrays are needed for the conversion
+    cube = HyperCube()
+    _setup_hypercube(cube, slvr_cfg, properties=False)
+    dim_sizes = { n: int(s) for n, s in manager.updated_dimensions() }
+    cube.update_dimensions([{ 'name': n, 'global_size': s,
+        'lower_extent': 0, 'upper_extent': s }
+        for n, s in dim_sizes.iteritems()])
+
+    prov = MSSourceProvider(manager, vis_column, prefetch=0)
+    copies = DataSourceCopies()
+    cube_arrays = cube.arrays()
+    sources = { n: f for n, f in prov.sources().iteritems()
+        if n in cube_arrays }
+    arrays = {}
+    memmaps = {}
+
+    for name, fn in sources.iteritems():
+        array = cube.array(name, reify=True)
+        filename = '{n}.npy'.format(n=name)
+        memmaps[name] = np.lib.format.open_memmap(
+            os.path.join(directory, filename), mode='w+',
+            dtype=array.dtype, shape=array.shape)
+        arrays[name] = { 'file': filename,
+            'dtype': np.dtype(array.dtype).str,
+            'shape': [int(d) for d in array.shape] }
+
+    def _convert(cube, names):
+        for name in names:
+            schema = cube.array(name)
+            array = cube.array(name, reify=True)
+            context = SourceContext(name, cube, slvr_cfg, [], schema,
+                array.shape, array.dtype)
+            source = DataSource(sources[name], array.dtype, prov.name())
+            data = _expand_channels(_get_data(source, context, copies),
+                context)
+            memmaps[name][cube.array_slice_index(name)] = data
+
+    time_varying = [n for n in sources
+        if 'ntime' in cube.array(n).shape]
+
+    # Convert arrays that don't vary by time in one go,
+    # and the rest in chunks of time
+    _convert(cube, [n for n in sources if n not in time_varying])
+
+    tcube = cube.copy()
+
+    for dim_desc in cube.dim_iter(('ntime', ntime_chunk)):
+        tcube.update_dimensions(dim_desc)
+        _convert(tcube, time_varying)
+
+    for memmap in memmaps.itervalues():
+        memmap.flush()
+
+    memmaps.clear()
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'msname': os.path.abspath(manager.msname),
+        'ms_mtime': mtime,
+        'field_id': manager.field_id,
+        'vis_column': vis_column,
+        'dtype': slvr_cfg['dtype'],
+        'dimensions': dim_sizes,
+        'arrays': arrays,
+    }
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    montblanc.log.info("Cached arrays '{a}' of field '{f}' of '{ms}' "
+        "in '{d}'.".format(a=sorted(arrays.keys()), f=manager.field_id,
+            ms=manager.msname, d=directory))
+
+    return manifest
+
+def ensure_memmap_cache(manager, directory, slvr_cfg, vis_column=None):
+    """
+    Creates the memmap cache of the field selected on manager
+    in directory, unless a valid one already exists.
+
+    Returns
+    -------
+    dict
+        The cache manifest
+    """
+    vis_column = 'DATA' if vis_column is None else vis_column
+
+    if memmap_cache_valid(directory, manager.msname, manager.field_id,
+            vis_column, slvr_cfg['dtype']):
+        return load_manifest(directory)
+
+    return create_memmap_cache(manager, directory, slvr_cfg, vis_column)
+
+if __name__ == '__main__':
+    import argparse
+
+    from montblanc.impl.rime.tensorflow.ms import MeasurementSetManager
+
+    parser = argparse.ArgumentParser(description="Convert a Measurement "
+        "Set field into a directory of memory mappable arrays")
+    parser.add_argument('msfile', help='Measurement Set File')
+    parser.add_argument('directory', help='Cache directory')
+    parser.add_argument('-c', '--vis-column', default='DATA',
+        help='Observed visibility column')
+    parser.add_argument('-f', '--field', type=int, default=0,
+        help='Field to convert')
+    parser.add_argument('-d', '--dtype', default='double',
+        choices=['float', 'double'], help='Floating point precision')
+    parser.add_argument('-ac', '--auto-correlations', action='store_true',
+        help='Handle auto-correlations')
+    args = parser.parse_args()
+
+    slvr_cfg = montblanc.rime_solver_cfg(dtype=args.dtype,
+        auto_correlations=args.auto_correlations,
+        field_ids=[args.field])
+
+    with MeasurementSetManager(args.msfile, slvr_cfg) as manager:
+        ensure_memmap_cache(manager, args.directory, slvr_cfg,
+            args.vis_column)
@@ -19,6 +19,7 @@
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
 import collections
+import threading
 
 import numpy as np
 
@@ -44,6 +45,9 @@ ORDERED_UVW_TABLE = 'ORDERED_UVW'
 ORDERED_TIME_TABLE = 'ORDERED_TIME'
 ORDERED_BASELINE_TABLE = 'ORDERED_BASELINE'
 
+# Ordered tables read through reader table handles
+READER_TABLES = (ORDERED_MAIN_TABLE, ORDERED_UVW_TABLE)
+
 # Measurement Set sub-table name string constants
 ANTENNA_TABLE = 'ANTENNA'
 SPECTRAL_WINDOW_TABLE = 'SPECTRAL_WINDOW'
@@ -65,6 +69,7 @@ UVW = 'UVW'
 DATA = 'DATA'
 FLAG = 'FLAG'
 WEIGHT = 'WEIGHT'
+WEIGHT_SPECTRUM = 'WEIGHT_SPECTRUM'
 MODEL_DATA = 'MODEL_DATA'
 CORRECTED_DATA = 'CORRECTED_DATA'
 
@@ -86,7 +91,8 @@ SELECTED = [TIME, ANTENNA1, ANTENNA2, UVW,
 # Named tuple defining a mapping from MS row to dimension
 OrderbyMap = collections.namedtuple("OrderbyMap", "dimension orderby")
 
-# Mappings for time, baseline and band
+# Mappings for field, time, baseline and band
+FIELD_MAP = OrderbyMap("nfield", "FIELD_ID")
 TIME_MAP = OrderbyMap("ntime", "TIME")
 BASELINE_MAP = OrderbyMap("nbl", "ANTENNA1, ANTENNA2")
 BAND_MAP = OrderbyMap("nbands", "[SELECT SPECTRAL_WINDOW_ID "
@@ -94,6 +100,7 @@ BAND_MAP = OrderbyMap("nbands", "[SELECT SPECTRAL_WINDOW_ID "
 
 # Place mapping in a list
 MS_ROW_MAPPINGS = [
+    FIELD_MAP,
     TIME_MAP,
     BASELINE_MAP,
     BAND_MAP
@@ -104,6 +111,9 @@ UPDATE_DIMENSIONS = ['ntime', 'nbl', 'na', 'nchan', 'nbands', 'npol',
 
 # Main measurement set ordering dimensions
 MS_DIM_ORDER = ('ntime', 'nbl', 'nbands')
+# Ordering of the rows of all selected fields.
+# Rows of each field are contiguous and in MS_DIM_ORDER
+FIELD_DIM_ORDER = ('nfield',) + MS_DIM_ORDER
 # UVW measurement set ordering dimensions
 UVW_DIM_ORDER = ('ntime', 'nbl')
 
@@ -114,12 +124,18 @@ def orderby_clause(dimensions, unique=False):
 
     return " ".join(("ORDERBY", "UNIQUE" if unique else "", columns))
 
+# Ordered views over the rows of a single field.
+# The row indices are None if the field is regular
+FieldViews = collections.namedtuple("FieldViews", "ordered_main "
+    "ordered_uvw ordered_time ordered_baseline dim_sizes "
+    "row_index uvw_row_index")
+
 def subtable_name(msname, subtable=None):
     return '::'.join((msname, subtable)) if subtable else msname
 
-def open_table(msname, subtable=None):
+def open_table(msname, subtable=None, readonly=False, lockoptions='default'):
     return pt.table(subtable_name(msname, subtable),
-        ack=False, readonly=False)
+        ack=False, readonly=readonly, lockoptions=lockoptions)
 
 def row_extents(cube, dim_order=None):
     if dim_order is None:
@@ -135,11 +151,231 @@ def row_extents(cube, dim_order=None):
 def uvw_row_extents(cube):
     return row_extents(cube, UVW_DIM_ORDER)
 
+def tile_rows(row_index, cube, dim_order=None):
+    """
+    Returns the rows of an irregular ordered view that
+    lie within the tile of the dense grid described by cube.
+
+    Parameters
+    ----------
+    row_index : np.ndarray
+        Ordered view row of each position on the dense
+        dim_order grid, -1 where the position is missing.
+    cube : :py:class:`~hypercube.base_cube.HyperCube`
+        Cube describing the tile extents
+    dim_order : tuple
+        Dimensions of row_index. Defaults to MS_DIM_ORDER.
+
+    Returns
+    -------
+    tuple
+        (lrow, urow, rows, mask) where rows are the present rows
+        in tile order, bounded by [lrow, urow), and mask
+        indicates the positions of the tile present in the view.
+    """
+    if dim_order is None:
+        dim_order = MS_DIM_ORDER
+
+    idx = tuple(slice(l, u) for l, u in cube.dim_extents(*dim_order))
+    tile = row_index[idx]
+    mask = tile >= 0
+    rows = tile[mask]
+
+    if rows.size == 0:
+        return 0, 0, rows, mask
+
+    # Grid and view orderings agree, so rows are ascending
+    return rows[0], rows[-1] + 1, rows, mask
+
+# Channels of a Measurement Set within the concatenated
+# channels of several Measurement Sets
+ChannelBands = collections.namedtuple("ChannelBands",
+    "offset nchan nbands")
+
+def band_cube(cube, bands):
+    """
+    Returns a copy of cube describing the channels and bands
+    of a single Measurement Set, whose channels start at
+    bands.offset within the channels of cube.
+    Channel extents are clipped to those of the Measurement Set.
+    """
+    cube = cube.copy()
+    offset, nchan, nbands = bands
+    chan_per_band = nchan // nbands
+    ntime, nbl, npol = cube.dim_global_size('ntime', 'nbl', 'npol')
+    lc, uc = (min(max(e - offset, 0), nchan)
+        for e in cube.dim_extents('nchan'))
+
+    cube.update_dimension('nchan', global_size=nchan,
+        lower_extent=lc, upper_extent=uc)
+    cube.update_dimension('nbands', global_size=nbands,
+        lower_extent=lc // chan_per_band,
+        upper_extent=-(-uc // chan_per_band))
+    cube.update_dimension('npolchan', global_size=npol*nchan,
+        lower_extent=npol*lc, upper_extent=npol*uc)
+    cube.update_dimension('nvis', global_size=ntime*nbl*nchan,
+        lower_extent=0, upper_extent=ntime*nbl*nchan)
+
+    return cube
+
+def band_tiles(cube, channel_bands):
+    """
+    Yields (index, cube, channels) tuples for each
+    :py:class:`ChannelBands` in channel_bands overlapping the
+    channel extents of cube. cube describes the tile of the
+    Measurement Set (see :func:`band_cube`) and channels is
+    a slice of its channels within the channel extents of the tile.
+    """
+    lc, uc = cube.dim_extents('nchan')
+
+    for i, bands in enumerate(channel_bands):
+        lo = max(lc, bands.offset)
+        hi = min(uc, bands.offset + bands.nchan)
+
+        if lo < hi:
+            yield i, band_cube(cube, bands), slice(lo - lc, hi - lc)
+
+# Maximum number of unrequested rows read between
+# two requested rows when coalescing reads
+MAX_ROW_GAP = 64
+
+class RowMappedTable(object):
+    """
+    Provides access to the rows of an ordered TaQL view
+    through the base table on which it is defined.
+
+    Reading a range of rows from a view scatters reads
+    through the base table. Instead, if the view is a contiguous
+    range of base table rows, the base table is read directly.
+    Otherwise, a range of view rows is mapped onto the base table
+    rows with a row permutation index and read with a small number
+    of contiguous reads, before being scattered into place in memory.
+
+    Other attribute accesses are forwarded to the view.
+    """
+    def __init__(self, view, table):
+        self._view = view
+        self._table = table
+        self._rows = rows = np.asarray(view.rownumbers(table), dtype=np.int64)
+
+        # Is the view a contiguous range of base table rows?
+        self._contiguous = len(rows) == 0 or bool(np.all(np.diff(rows) == 1))
+        self._offset = rows[0] if len(rows) > 0 else 0
+
+    @property
+    def contiguous(self):
+        return self._contiguous
+
+    def _nrow(self, startrow, nrow):
+        return len(self._rows) - startrow if nrow < 0 else nrow
+
+    def _runs(self, startrow, nrow, max_gap):
+        """
+        Produces (base startrow, base nrow, view indices, base offsets)
+        tuples describing contiguous reads of base table rows.
+        View indices describe where rows lie in the requested range,
+        while base offsets describe where they lie in the read.
+        """
+        rows = self._rows[startrow:startrow+nrow]
+        indices = np.argsort(rows, kind='mergesort')
+        sorted_rows = rows[indices]
+
+        # Split wherever the gap between successive rows is too large
+        splits = np.nonzero(np.diff(sorted_rows) > max_gap)[0] + 1
+
+        for idx, run in zip(np.split(indices, splits),
+                            np.split(sorted_rows, splits)):
+            start = run[0]
+            yield start, run[-1] - start + 1, idx, run - start
+
+    def getcol(self, columnname, startrow=0, nrow=-1):
+        """ Read nrow view rows of columnname, starting at startrow """
+        nrow = self._nrow(startrow, nrow)
+
+        if self._contiguous:
+            return self._table.getcol(columnname,
+                startrow=self._offset + startrow, nrow=nrow)
+        elif nrow == 0:
+            return self._table.getcol(columnname, startrow=0, nrow=0)
+
+        result = None
+
+        for start, n, idx, offsets in self._runs(startrow, nrow, MAX_ROW_GAP):
+            data = self._table.getcol(columnname, startrow=start, nrow=n)
+
+            if result is None:
+                result = np.empty((nrow,) + data.shape[1:], dtype=data.dtype)
+
+            result[idx] = data[offsets]
+
+        return result
+
+    def putcol(self, columnname, value, startrow=0, nrow=-1):
+        """ Write value to nrow view rows of columnname, starting at startrow """
+        nrow = self._nrow(startrow, nrow)
+
+        if self._contiguous:
+            return self._table.putcol(columnname, value,
+                startrow=self._offset + startrow, nrow=nrow)
+
+        # Rows between requested rows can't be written, so only
+        # coalesce rows that are adjacent in the base table
+        for start, n, idx, offsets in self._runs(startrow, nrow, 1):
+            self._table.putcol(columnname, value[idx], startrow=start, nrow=n)
+
+    def bind(self, table):
+        """
+        Returns a RowMappedTable over the same view rows,
+        accessed through another handle on the base table
+        """
+        bound = RowMappedTable.__new__(RowMappedTable)
+        bound.__dict__.update(self.__dict__)
+        bound._table = table
+        return bound
+
+    def rebind(self, table):
+        """ Read and write rows through another handle on the base table """
+        self._table = table
+
+    def __getattr__(self, name):
+        return getattr(self._view, name)
+
+class ReaderTables(collections.Mapping):
+    """
+    Mapping of READER_TABLES names to the ordered views of a field.
+    Views are read through a read-only main table handle owned
+    by the thread accessing the mapping.
+    """
+    def __init__(self, manager, field_id):
+        self._manager = manager
+        self._field_id = field_id
+
+    def __getitem__(self, key):
+        return self._manager.reader_table(key, self._field_id)
+
+    def __iter__(self):
+        return iter(READER_TABLES)
+
+    def __len__(self):
+        return len(READER_TABLES)
+
 class MeasurementSetManager(object):
     def __init__(self, msname, slvr_cfg):
         super(MeasurementSetManager, self).__init__()
 
         self._msname = msname
+
+        # Main table handles opened read-only, one per reading
+        # thread. The writable main table is reserved for sinks,
+        # which hold the write lock. casacore shares the underlying
+        # table between handles opened on the same table within a
+        # process: see ReaderProcesses for reads in parallel
+        self._local = threading.local()
+        self._reader_handles = []
+        self._reader_lock = threading.Lock()
+        self._reader_lockoptions = 'default'
+        self._write_lock = threading.Lock()
+
         # Create dictionary of tables
         self._tables = { k: open_table(msname, k) for k in SUBTABLE_KEYS }
 
@@ -177,19 +413,21 @@ class MeasurementSetManager(object):
             raise ValueError("DATA_DESCRIPTOR.nrows() "
                 "!= SPECTRAL_WINDOW.nrows()")
 
-        # Hard code auto-correlations and field_id 0
         self._auto_correlations = auto_correlations = slvr_cfg['auto_correlations']
-        self._field_id = field_id = 0
+        field_ids = sorted(set(slvr_cfg['field_ids']))
 
-        # Create a view over the MS, ordered by
+        # Create a single view over the selected fields of the MS,
+        # ordered by
+        # (0) field (FIELD_ID)
         # (1) time (TIME)
         # (2) baseline (ANTENNA1, ANTENNA2)
         # (3) band (SPECTRAL_WINDOW_ID via DATA_DESC_ID)
         ordering_query = " ".join((
             "SELECT FROM $ms",
-            "WHERE FIELD_ID={fid}".format(fid=field_id),
+            "WHERE FIELD_ID IN [{fids}]".format(
+                fids=", ".join(str(f) for f in field_ids)),
             "" if auto_correlations else "AND ANTENNA1 != ANTENNA2",
-            orderby_clause(MS_DIM_ORDER)
+            orderby_clause(FIELD_DIM_ORDER)
         ))
 
         # Ordered Measurement Set
@@ -198,28 +436,20 @@ class MeasurementSetManager(object):
         montblanc.log.debug("MS ordering query is '{o}'."
             .format(o=ordering_query))
 
-        # Measurement Set ordered by unique time and baseline
-        otblms = pt.taql("SELECT FROM $oms {c}".format(
-            c=orderby_clause(UVW_DIM_ORDER, unique=True)))
-
         # Store the main table
         self._tables[MAIN_TABLE] = ms
         self._tables[ORDERED_MAIN_TABLE] = oms
-        self._tables[ORDERED_UVW_TABLE] = otblms
 
         self._column_descriptors = {col: ms.getcoldesc(col) for col in SELECTED}
 
-        # Count distinct timesteps in the MS
-        t_orderby = orderby_clause(['ntime'], unique=True)
-        t_query = "SELECT FROM $otblms {c}".format(c=t_orderby)
-        self._tables[ORDERED_TIME_TABLE] = ot = pt.taql(t_query)
-        self._ntime = ntime = ot.nrows()
+        # Read per-channel weights from WEIGHT_SPECTRUM if it is
+        # present and populated. Otherwise WEIGHT is broadcast
+        # across the channels of each band
+        self._weight_spectrum = (WEIGHT_SPECTRUM in ms.colnames() and
+            ms.nrows() > 0 and ms.iscelldefined(WEIGHT_SPECTRUM, 0))
 
-        # Count number of baselines in the MS
-        bl_orderby = orderby_clause(['nbl'], unique=True)
-        bl_query = "SELECT FROM $otblms {c}".format(c=bl_orderby)
-        self._tables[ORDERED_BASELINE_TABLE] = obl = pt.taql(bl_query)
-        self._nbl = nbl = obl.nrows()
+        montblanc.log.info("Reading weights from '{c}'.".format(
+            c=WEIGHT_SPECTRUM if self._weight_spectrum else WEIGHT))
 
         # Number of channels per band
         self._nchanperband = chan_per_band[0]
@@ -227,34 +457,268 @@ class MeasurementSetManager(object):
         self._nchan = nchan = sum(chan_per_band)
         self._nbands = nbands = len(chan_per_band)
         self._npolchan = npolchan = npol*nchan
-        self._nvis = nvis = ntime*nbl*nchan
+        self._na = ant.nrows()
+
+        # Rows of each field are contiguous in the ordered view.
+        # Find the row range of each field
+        fids, starts = np.unique(oms.getcol('FIELD_ID'), return_index=True)
+        ends = np.append(starts[1:], oms.nrows())
+        field_rows = { int(f): (s, e) for f, s, e
+            in zip(fids, starts, ends) }
+
+        missing = [f for f in field_ids if f not in field_rows]
+
+        if len(missing) > 0:
+            montblanc.log.warn("No rows were found for fields '{f}' "
+                "in '{ms}'.".format(f=missing, ms=msname))
+
+        if len(field_rows) == 0:
+            raise ValueError("No rows were found for any of the "
+                "fields '{f}' in '{ms}'".format(f=field_ids, ms=msname))
+
+        # Create ordered views over the rows of each field
+        self._fields = { f: self._field_views(f, oms, ms, s, e)
+            for f, (s, e) in field_rows.iteritems() }
+        self._field_ids = sorted(self._fields.keys())
+
+        self.select_field(self._field_ids[0])
+
+    def _field_views(self, field_id, oms, ms, start, end):
+        """
+        Creates ordered views over rows [start, end)
+        of the ordered view, which belong to field_id
+        """
+        # Rows of the field, ordered by time, baseline and band
+        foms = oms.selectrows(range(start, end))
+
+        # Measurement Set ordered by unique time and baseline
+        otblms = pt.taql("SELECT FROM $foms {c}".format(
+            c=orderby_clause(UVW_DIM_ORDER, unique=True)))
+
+        # Count distinct timesteps in the field
+        t_orderby = orderby_clause(['ntime'], unique=True)
+        t_query = "SELECT FROM $otblms {c}".format(c=t_orderby)
+        ot = pt.taql(t_query)
+        ntime = ot.nrows()
+
+        # Count number of baselines in the field
+        bl_orderby = orderby_clause(['nbl'], unique=True)
+        bl_query = "SELECT FROM $otblms {c}".format(c=bl_orderby)
+        obl = pt.taql(bl_query)
+        nbl = obl.nrows()
+
+        nvis = ntime*nbl*self._nchan
 
         # Update the cube with dimension information
         # obtained from the MS
-        updated_sizes = [ntime, nbl, ant.nrows(),
-            sum(chan_per_band), len(chan_per_band), npol,
-            npolchan, nvis]
+        updated_sizes = [ntime, nbl, self._na,
+            self._nchan, self._nbands, self._npol,
+            self._npolchan, nvis]
 
-        self._dim_sizes = dim_sizes = { dim: size for dim, size
+        dim_sizes = { dim: size for dim, size
             in zip(UPDATE_DIMENSIONS, updated_sizes) }
 
         shape = tuple(dim_sizes[d] for d in MS_DIM_ORDER)
         expected_rows = np.product(shape)
 
-        if not expected_rows == oms.nrows():
+        if expected_rows == foms.nrows():
+            row_index = uvw_row_index = None
+        else:
             dim_desc = ", ".join('(%s,%s)' % (d, s) for
                 d, s in zip(MS_DIM_ORDER, shape))
             row_desc = " x ".join('%s' % s for s in shape)
 
-            montblanc.log.warn("Encountered '{msr}' rows in '{ms}' "
-                "but expected '{rd} = {er}' after finding the following "
-                "dimensions by inspection: [{d}]. Irregular Measurement Sets "
-                "are not fully supported due to the generality of the format.".format(
-                    msr=oms.nrows(), ms=msname,
+            montblanc.log.info("Encountered '{msr}' rows in field '{f}' "
+                "of '{ms}' but expected '{rd} = {er}' after finding "
+                "the following dimensions by inspection: [{d}]. "
+                "Mapping the rows onto the dimensions "
+                "with a row index.".format(
+                    msr=foms.nrows(), f=field_id, ms=self._msname,
                     er=expected_rows, rd=row_desc, d=dim_desc))
 
+            row_index, uvw_row_index = self._row_indices(
+                foms, otblms, ot, obl, shape)
+
+        # Read the ordered views through the main table
+        views = FieldViews(RowMappedTable(foms, ms),
+            RowMappedTable(otblms, ms), ot, obl, dim_sizes,
+            row_index, uvw_row_index)
+
+        montblanc.log.info("Field '{f}' of '{ms}' is {o} in "
+            "(time, baseline, band) order.".format(f=field_id,
+                ms=self._msname, o="already"
+                    if views.ordered_main.contiguous else "not"))
+
+        return views
+
+    def _row_indices(self, foms, otblms, ot, obl, shape):
+        """
+        Index the rows of an irregular field on the dense
+        (time, baseline, band) and (time, baseline) grids
+        """
+        na = self._na
+        times = ot.getcol(TIME)
+        baselines = obl.getcol(ANTENNA1)*na + obl.getcol(ANTENNA2)
+        spw = self._tables[DATA_DESCRIPTION_TABLE].getcol('SPECTRAL_WINDOW_ID')
+
+        def _index(table, shape, band=False):
+            t = np.searchsorted(times, table.getcol(TIME))
+            bl = np.searchsorted(baselines, table.getcol(ANTENNA1)*na +
+                table.getcol(ANTENNA2))
+            idx = (t, bl, spw[table.getcol('DATA_DESC_ID')]) if band else (t, bl)
+
+            row_index = np.full(shape, -1, dtype=np.int64)
+            row_index[idx] = np.arange(table.nrows())
+            return row_index
+
+        return (_index(foms, shape, band=True),
+            _index(otblms, shape[:2]))
+
+    def select_field(self, field_id):
+        """
+        Select the field whose rows are presented by the
+        ordered tables and dimensions of this manager
+        """
+        try:
+            views = self._fields[field_id]
+        except KeyError:
+            raise ValueError("Field '{f}' is not one of the "
+                "selected fields '{fs}'".format(f=field_id,
+                    fs=self._field_ids))
+
+        self._field_id = field_id
+        self._dim_sizes = views.dim_sizes
+        self._ntime = views.dim_sizes['ntime']
+        self._nbl = views.dim_sizes['nbl']
+        self._nvis = views.dim_sizes['nvis']
+
+    def iter_fields(self):
+        """
+        Select each field in turn, yielding the field id.
+
+        .. code-block:: python
+
+            for field_id in manager.iter_fields():
+                slvr.solve(source_providers=..., sink_providers=...)
+        """
+        for field_id in self._field_ids:
+            self.select_field(field_id)
+            yield field_id
+
+    def _reader_handle(self):
+        """ Read-only main table handle of the calling thread """
+        try:
+            return self._local.handle
+        except AttributeError:
+            pass
+
+        handle = open_table(self._msname, readonly=True,
+            lockoptions=self._reader_lockoptions)
+
+        with self._reader_lock:
+            self._reader_handles.append(handle)
+
+        self._local.handle = handle
+        self._local.views = {}
+        return handle
+
+    def reader_table(self, key, field_id=None):
+        """
+        Returns the key ordered view (one of READER_TABLES) of
+        field_id, read through a read-only main table handle owned
+        by the calling thread, so that reading threads do not share
+        a table handle with each other, or with sinks.
+        Defaults to the currently selected field.
+        """
+        if key not in READER_TABLES:
+            raise ValueError("'{k}' is not one of the reader "
+                "tables '{t}'".format(k=key, t=READER_TABLES))
+
+        field_id = self._field_id if field_id is None else field_id
+        handle = self._reader_handle()
+
+        try:
+            return self._local.views[(field_id, key)]
+        except KeyError:
+            pass
+
+        views = self._fields[field_id]
+        view = (views.ordered_main if key == ORDERED_MAIN_TABLE
+            else views.ordered_uvw)
+
+        self._local.views[(field_id, key)] = view = view.bind(handle)
+        return view
+
+    def reader_tables(self):
+        """
+        Returns a :py:class:`ReaderTables` mapping
+        of the currently selected field
+        """
+        return ReaderTables(self, self._field_id)
+
+    @property
+    def write_lock(self):
+        """
+        Lock held by sinks writing to the writable main table,
+        ensuring a single writer
+        """
+        return self._write_lock
+
+    def flush(self):
+        """
+        Flush writes to the main table. Processes forked
+        afterwards don't inherit unwritten table buffers.
+        """
+        with self._write_lock:
+            self._tables[MAIN_TABLE].flush()
+
+    def reopen(self):
+        """
+        Reopens the Measurement Set in a forked process,
+        such as a :py:class:`.ProcessSourceProvider` worker.
+
+        Inherited handles share file offsets with the parent process,
+        and casacore's table cache returns them when a table is opened
+        again. They are therefore closed, and the main table and
+        sub-tables reopened read-only without read locks.
+        The ordered main and uvw tables of each field, and
+        :meth:`reader_table` views, are read through the reopened
+        main table, while the other ordered views are no longer
+        available.
+
+        The parent process should :meth:`flush` before forking,
+        so that closing the inherited handles doesn't write.
+        """
+        # Locks may have been held by other threads when forking
+        self._reader_lock = threading.Lock()
+        self.close()
+
+        self._local = threading.local()
+        self._reader_lockoptions = 'usernoread'
+        self._write_lock = threading.Lock()
+        self._tables = { k: open_table(self._msname, k, readonly=True,
+            lockoptions='usernoread') for k in SUBTABLE_KEYS }
+        self._tables[MAIN_TABLE] = ms = open_table(self._msname,
+            readonly=True, lockoptions='usernoread')
+
+        for views in self._fields.itervalues():
+            views.ordered_main.rebind(ms)
+            views.ordered_uvw.rebind(ms)
+
     def close(self):
+        # Close per-thread read-only handles
+        with self._reader_lock:
+            for handle in self._reader_handles:
+                handle.close()
+
+            self._reader_handles = []
+
         # Close all the tables
+        for views in self._fields.itervalues():
+            for table in (views.ordered_baseline, views.ordered_time,
+                    views.ordered_uvw, views.ordered_main):
+                table.close()
+
         for table in self._tables.itervalues():
             table.close()
 
@@ -281,21 +745,51 @@ class MeasurementSetManager(object):
     def field_id(self):
         return self._field_id
 
+    @property
+    def field_ids(self):
+        return self._field_ids
+
+    @property
+    def weight_spectrum(self):
+        return self._weight_spectrum
+
     @property
     def main_table(self):
         return self._tables[MAIN_TABLE]
 
     @property
     def ordered_main_table(self):
-        return self._tables[ORDERED_MAIN_TABLE]
+        return self._fields[self._field_id].ordered_main
 
     @property
     def ordered_uvw_table(self):
-        return self._tables[ORDERED_UVW_TABLE]
+        return self._fields[self._field_id].ordered_uvw
 
     @property
     def ordered_time_table(self):
-        return self._tables[ORDERED_TIME_TABLE]
+        return self._fields[self._field_id].ordered_time
+
+    @property
+    def ordered_baseline_table(self):
+        return self._fields[self._field_id].ordered_baseline
+
+    @property
+    def row_index(self):
+        """
+        Row of the ordered main table at each (time, baseline, band)
+        position of the current field, -1 where the row is missing.
+        None if the field has a row for every position.
+        """
+        return self._fields[self._field_id].row_index
+
+    @property
+    def uvw_row_index(self):
+        """
+        Row of the ordered uvw table at each (time, baseline)
+        position of the current field, -1 where the row is missing.
+        None if the field has a row for every position.
+        """
+        return self._fields[self._field_id].uvw_row_index
 
     @property
     def antenna_table(self):
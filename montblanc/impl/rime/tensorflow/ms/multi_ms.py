@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import time
+
+import concurrent.futures as cf
+
+import montblanc
+
+from montblanc.impl.rime.tensorflow.ms.ms_manager import (
+    MeasurementSetManager)
+
+# Per Measurement Set field solution statistics
+MSSolveStats = collections.namedtuple("MSSolveStats",
+    ["msname", "field_id", "nvis", "open_time", "solve_time"])
+
+# Aggregate statistics over all Measurement Sets
+MultiMSSolveStats = collections.namedtuple("MultiMSSolveStats",
+    ["solves", "nvis", "elapsed", "throughput"])
+
+# Opened Measurement Set and providers
+_OpenMS = collections.namedtuple("_OpenMS",
+    ["manager", "source_provider", "sink_provider", "open_time"])
+
+def _visibilities(manager):
+    """ Number of visibilities in the currently selected field """
+    dims = dict(manager.updated_dimensions())
+    return dims['ntime']*dims['nbl']*dims['nchan']
+
+def _open_ms(msname, slvr_cfg, vis_column, model_column,
+        source_kwargs, sink_kwargs):
+    """ Open and order a Measurement Set, constructing its providers """
+    # Imported here to avoid circular imports
+    from montblanc.impl.rime.tensorflow.sources import MSSourceProvider
+    from montblanc.impl.rime.tensorflow.sinks import MSSinkProvider
+
+    start = time.time()
+    manager = MeasurementSetManager(msname, slvr_cfg)
+
+    try:
+        source_prov = MSSourceProvider(manager, vis_column, **source_kwargs)
+        sink_prov = MSSinkProvider(manager, model_column, **sink_kwargs)
+    except:
+        manager.close()
+        raise
+
+    return _OpenMS(manager, source_prov, sink_prov, time.time() - start)
+
+def _source_only_data_sources(providers):
+    """
+    Names of data sources on providers whose arrays only vary
+    along source dimensions, and can therefore be shared between
+    Measurement Sets. Arrays with time, baseline, antenna or channel
+    dimensions, or without a schema, are excluded.
+    """
+    from montblanc.impl.rime.tensorflow.config import A
+    from montblanc.src_types import source_nr_vars
+
+    src_dims = set(source_nr_vars() + ['nsrc'])
+    shapes = { a['name']: a['shape'] for a in A }
+
+    return [n for prov in providers for n in prov.sources().iterkeys()
+        if n in shapes and all(isinstance(d, int) or d in src_dims
+                                for d in shapes[n])]
+
+def _close_ms(open_ms):
+    """ Close the providers and manager of an opened Measurement Set """
+    try:
+        open_ms.sink_provider.close()
+        open_ms.source_provider.close()
+    finally:
+        open_ms.manager.close()
+
+def _open_measurement_sets(msnames, open_threads, *args):
+    """
+    Open and order Measurement Sets concurrently
+    on open_threads threads, returning a list of :class:`_OpenMS`.
+    All are closed if any fail to open.
+    """
+    with cf.ThreadPoolExecutor(open_threads) as executor:
+        futures = [executor.submit(_open_ms, msname, *args)
+            for msname in msnames]
+
+    opened = [f.result() for f in futures if f.exception() is None]
+    failed = [f.exception() for f in futures if f.exception() is not None]
+
+    if len(failed) > 0:
+        for open_ms in opened:
+            _close_ms(open_ms)
+
+        raise failed[0]
+
+    return opened
+
+def solve_measurement_sets(slvr, msnames, slvr_cfg, sky_providers,
+        sink_providers=None, vis_column=None, model_column=None,
+        open_threads=2, cache_sky_model=True,
+        source_kwargs=None, sink_kwargs=None):
+    """
+    Solves a list of Measurement Sets sharing a sky model,
+    typically one per spectral window of an observation,
+    concurrently against a single solver.
+
+    The Measurement Sets are presented to the solver as a single
+    problem whose channels are the concatenated channels of each
+    Measurement Set, by a :py:class:`.MultiMSSourceProvider`,
+    so that each field is solved once for all of them.
+    Every tile of the solution holds the rows of all Measurement
+    Sets: their tiles are interleaved and the sky model is supplied
+    to the solver once per tile, rather than once per
+    Measurement Set. Model visibilities are routed to
+    the sink of each Measurement Set by a
+    :py:class:`.MultiMSSinkProvider`.
+
+    The Measurement Sets must therefore share times, baselines,
+    antenna, polarisations and selected fields. They are opened and
+    ordered concurrently on ``open_threads`` background threads.
+
+    .. code-block:: python
+
+        with montblanc.rime_solver(slvr_cfg) as slvr:
+            stats = solve_measurement_sets(slvr,
+                ['spw0.ms', 'spw1.ms'], slvr_cfg,
+                [MySkyModelProvider()],
+                vis_column='DATA', model_column='MODEL_DATA')
+
+    Parameters
+    ----------
+    slvr: RimeSolver
+        Solver used to solve the Measurement Sets
+    msnames: list of str
+        Measurement Set names, in channel order
+    slvr_cfg: dict
+        Solver configuration, used to open each Measurement Set
+    sky_providers: list of :py:class:`.SourceProvider`
+        Source providers supplying the shared sky model
+    sink_providers: list of :py:class:`.SinkProvider`
+        Additional sink providers, supplied to every solve
+    vis_column: str
+        Column from which observed visibilities are read
+    model_column: str
+        Column to which model visibilities are written
+    open_threads: integer
+        Number of threads opening Measurement Sets
+    cache_sky_model: bool
+        If True, sky model data sources whose arrays only vary along
+        source dimensions (``point_lm`` or ``gaussian_shape``, say)
+        are cached by a :py:class:`.CachedSourceProvider`
+        so that they are only produced once across all
+        tiles and fields. Data sources with time dimensions,
+        such as ``point_stokes``, are called per tile.
+    source_kwargs: dict
+        Keyword arguments for each :py:class:`.MSSourceProvider`
+    sink_kwargs: dict
+        Keyword arguments for each :py:class:`.MSSinkProvider`
+
+    Returns
+    -------
+    :py:class:`MultiMSSolveStats`
+        Per Measurement Set field statistics and aggregate throughput,
+        in visibilities per second. The solve time of each
+        Measurement Set field is that of the combined solve.
+    """
+    # Imported here to avoid circular imports
+    from montblanc.impl.rime.tensorflow.sources import (CachedSourceProvider,
+        MultiMSSourceProvider)
+    from montblanc.impl.rime.tensorflow.sinks import MultiMSSinkProvider
+
+    if len(msnames) == 0:
+        raise ValueError("At least one Measurement Set is required")
+
+    if open_threads < 1:
+        raise ValueError("open_threads '{o}' must be "
+            "at least 1".format(o=open_threads))
+
+    sink_providers = [] if sink_providers is None else list(sink_providers)
+    source_kwargs = {} if source_kwargs is None else source_kwargs
+    sink_kwargs = {} if sink_kwargs is None else sink_kwargs
+
+    if cache_sky_model and len(sky_providers) > 0:
+        sky_providers = [CachedSourceProvider(sky_providers,
+            cache_data_sources=_source_only_data_sources(sky_providers))]
+    else:
+        sky_providers = list(sky_providers)
+
+    start = time.time()
+    opened = _open_measurement_sets(msnames, open_threads, slvr_cfg,
+        vis_column, model_column, source_kwargs, sink_kwargs)
+    solves = []
+
+    try:
+        managers = [o.manager for o in opened]
+        field_ids = managers[0].field_ids
+
+        for o in opened[1:]:
+            if o.manager.field_ids != field_ids:
+                raise ValueError("Measurement Set '{m}' selects fields "
+                    "'{f}' rather than '{e}'".format(m=o.manager.msname,
+                        f=o.manager.field_ids, e=field_ids))
+
+        source_prov = MultiMSSourceProvider(
+            [o.source_provider for o in opened])
+        sink_prov = MultiMSSinkProvider(
+            [o.sink_provider for o in opened], source_prov)
+
+        for field_id in field_ids:
+            for manager in managers:
+                manager.select_field(field_id)
+
+            solve_start = time.time()
+
+            slvr.solve(source_providers=[source_prov] + sky_providers,
+                sink_providers=[sink_prov] + sink_providers)
+
+            solve_time = time.time() - solve_start
+            field_solves = [MSSolveStats(o.manager.msname, field_id,
+                    _visibilities(o.manager), o.open_time, solve_time)
+                for o in opened]
+
+            montblanc.log.info("Solved field {f} of {m} Measurement "
+                "Set(s): {v} visibilities in {t:.3f}s".format(
+                    f=field_id, m=len(opened), t=solve_time,
+                    v=sum(s.nvis for s in field_solves)))
+
+            solves.extend(field_solves)
+    finally:
+        for open_ms in opened:
+            _close_ms(open_ms)
+
+    elapsed = time.time() - start
+    nvis = sum(s.nvis for s in solves)
+    throughput = nvis / elapsed if elapsed > 0 else 0.0
+
+    montblanc.log.info("Solved {n} visibilities from {m} "
+        "Measurement Set field(s) in {t:.3f}s ({r:.1f} vis/s)".format(
+            n=nvis, m=len(solves), t=elapsed, r=throughput))
+
+    return MultiMSSolveStats(solves, nvis, elapsed, throughput)
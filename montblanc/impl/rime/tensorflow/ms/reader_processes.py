@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import itertools
+import multiprocessing
+
+from .ms_manager import READER_TABLES
+
+# Measurement Set managers of each ReaderProcesses, keyed on
+# reader id. Inherited by the reader processes when they are forked.
+_READER_STATE = {}
+_reader_ids = itertools.count()
+
+# Failures to reopen the Measurement Set in a reader process,
+# keyed on reader id
+_READER_ERRORS = {}
+
+def _init_reader(reader_id):
+    """
+    Reopens the Measurement Set of a ReaderProcesses
+    in a newly forked reader process, recording any
+    failure to do so
+    """
+    try:
+        _READER_STATE[reader_id].reopen()
+    except Exception as e:
+        _READER_ERRORS[reader_id] = ("'{ms}' can't be read in a reader "
+            "process: {e!r}".format(ms=_READER_STATE[reader_id].msname, e=e))
+
+def _reader_error(reader_id):
+    """ Returns any failure to reopen the Measurement Set """
+    return _READER_ERRORS.get(reader_id, None)
+
+def _getcol(reader_id, field_id, key, columnname, startrow, nrow):
+    """ Reads rows of an ordered view in a reader process """
+    error = _READER_ERRORS.get(reader_id, None)
+
+    if error is not None:
+        raise ValueError(error)
+
+    table = _READER_STATE[reader_id].reader_table(key, field_id)
+    return table.getcol(columnname, startrow=startrow, nrow=nrow)
+
+class ProcessReaderTable(object):
+    """
+    Reads rows of an ordered view of a field in
+    the reader processes of a :py:class:`ReaderProcesses`
+    """
+    def __init__(self, readers, field_id, key):
+        self._readers = readers
+        self._field_id = field_id
+        self._key = key
+
+    def getcol(self, columnname, startrow=0, nrow=-1):
+        return self._readers.getcol(self._field_id, self._key,
+            columnname, startrow=startrow, nrow=nrow)
+
+class ReaderProcesses(object):
+    """
+    Reads the ordered main and uvw tables of a
+    :py:class:`.MeasurementSetManager` in forked reader processes.
+
+    casacore shares the underlying table between handles opened
+    on the same table within a process, and python-casacore
+    holds the GIL while reading. Each reader process therefore
+    reopens the Measurement Set read-only, without read locks,
+    on the same TaQL ordering, so that reads issued by different
+    threads proceed in parallel. Rows are returned by pickling.
+
+    Writes remain with the parent process, whose sinks hold
+    the manager's write lock. The manager is flushed before
+    forking so that the reader processes don't inherit
+    unwritten table buffers.
+    """
+    def __init__(self, manager, processes):
+        self._manager = manager
+        self._id = next(_reader_ids)
+
+        manager.flush()
+        _READER_STATE[self._id] = manager
+
+        self._pool = pool = multiprocessing.Pool(processes,
+            initializer=_init_reader, initargs=(self._id,))
+
+        # Reader processes reopen identically,
+        # so checking one of them suffices
+        error = pool.apply(_reader_error, (self._id,))
+
+        if error is not None:
+            self.close()
+            raise ValueError(error)
+
+    def getcol(self, field_id, key, columnname, startrow=0, nrow=-1):
+        """
+        Read nrow rows of columnname, starting at startrow,
+        from the key ordered view of field_id
+        """
+        return self._pool.apply(_getcol, (self._id, field_id, key,
+            columnname, startrow, nrow))
+
+    def tables(self, field_id):
+        """
+        Returns a dictionary of READER_TABLES names to
+        :py:class:`ProcessReaderTable` views of field_id
+        """
+        return { k: ProcessReaderTable(self, field_id, k)
+            for k in READER_TABLES }
+
+    def close(self):
+        """ Shut down the reader processes """
+        pool, self._pool = self._pool, None
+        _READER_STATE.pop(self._id, None)
+
+        if pool is not None:
+            pool.close()
+            pool.join()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import threading
+import time
+
+import montblanc
+
+class RowPrefetcher(object):
+    """
+    Reads rows of table columns for upcoming chunks of the problem
+    in a background thread, holding them in a bounded buffer until
+    they are requested.
+
+    Each chunk is described by a list of
+    (table, column, startrow, nrow) keys. A key may be listed
+    multiple times if it is requested multiple times.
+    """
+    def __init__(self, tables, chunks, depth, lock=None):
+        """
+        Parameters
+        ----------
+        tables : dict
+            Dictionary of tables keyed by table name
+        chunks : list
+            Ordered list of key lists, one per chunk
+        depth : integer
+            Maximum number of chunks held in the buffer
+        lock : threading.Lock
+            Lock serialising table access.
+            Defaults to None in which case a new lock is created.
+        """
+        self._tables = tables
+        self._depth = max(1, depth)
+        self._table_lock = threading.Lock() if lock is None else lock
+        self._cond = threading.Condition()
+
+        # Chunk and number of uses of keys yet to be requested
+        self._key_chunk = {}
+        self._key_uses = collections.Counter()
+        self._chunks = []
+
+        for i, keys in enumerate(chunks):
+            keys = [k for k in keys if self._key_chunk.setdefault(k, i) == i]
+            self._key_uses.update(keys)
+            self._chunks.append(sorted(set(keys)))
+
+        # Data in the buffer, and the keys
+        # outstanding on each buffered chunk
+        self._buffer = {}
+        self._buffered_chunks = collections.OrderedDict()
+        self._chunks_read = 0
+        self._closed = False
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._stall_time = 0.0
+
+        self._thread = threading.Thread(target=self._prefetch,
+            name='RowPrefetcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _prefetch(self):
+        try:
+            self._prefetch_impl()
+        except Exception as e:
+            montblanc.log.exception("Prefetch Exception")
+        finally:
+            # Don't leave requests waiting on chunks
+            with self._cond:
+                self._chunks_read = len(self._chunks)
+                self._cond.notify_all()
+
+    def _prefetch_impl(self):
+        for chunk, keys in enumerate(self._chunks):
+            with self._cond:
+                # Wait for space in the buffer
+                while (not self._closed and
+                        len(self._buffered_chunks) >= self._depth):
+                    self._cond.wait()
+
+                if self._closed:
+                    return
+
+                # Skip keys that have already been requested
+                keys = [k for k in keys if self._key_chunk.get(k) == chunk]
+
+            data = {}
+
+            for key in keys:
+                table, column, startrow, nrow = key
+
+                with self._table_lock:
+                    data[key] = self._tables[table].getcol(column,
+                        startrow=startrow, nrow=nrow)
+
+            with self._cond:
+                for key, value in data.iteritems():
+                    if self._key_chunk.get(key) == chunk:
+                        self._buffer[key] = value
+                        self._buffered_chunks.setdefault(chunk, set()).add(key)
+
+                self._chunks_read = chunk + 1
+                self._cond.notify_all()
+
+    def _evict(self, chunk):
+        """ Evict a buffered chunk. Must be called with the condition held """
+        for key in self._buffered_chunks.pop(chunk):
+            self._key_chunk.pop(key, None)
+            self._key_uses.pop(key, None)
+            del self._buffer[key]
+
+        self._evictions += 1
+        self._cond.notify_all()
+
+    def get(self, key):
+        """
+        Returns the data associated with key,
+        or None if it was not prefetched
+        """
+        with self._cond:
+            chunk = self._key_chunk.get(key, None)
+
+            if chunk is None:
+                self._misses += 1
+                return None
+
+            # Evict chunks that have fallen well behind the requests.
+            # Their remaining keys are unlikely to be requested
+            while (len(self._buffered_chunks) > 0 and
+                    next(iter(self._buffered_chunks)) < chunk - self._depth):
+                self._evict(next(iter(self._buffered_chunks)))
+
+            start = time.time()
+
+            while self._chunks_read <= chunk:
+                # Make space for the requested chunk
+                # if a full buffer is blocking the read
+                if (len(self._buffered_chunks) >= self._depth and
+                        next(iter(self._buffered_chunks)) < chunk):
+                    self._evict(next(iter(self._buffered_chunks)))
+                    continue
+
+                self._cond.wait()
+
+            self._stall_time += time.time() - start
+
+            try:
+                data = self._buffer[key]
+            except KeyError:
+                # Read failed or chunk was evicted
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            self._key_uses[key] -= 1
+
+            # Release the key after its last use, and the
+            # chunk once all of its keys have been released
+            if self._key_uses[key] == 0:
+                del self._buffer[key]
+                del self._key_uses[key]
+                del self._key_chunk[key]
+
+                keys = self._buffered_chunks[chunk]
+                keys.discard(key)
+
+                if len(keys) == 0:
+                    del self._buffered_chunks[chunk]
+                    self._cond.notify_all()
+
+            return data
+
+    def stats(self):
+        """ Returns a dictionary of prefetch statistics """
+        with self._cond:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'stall_time': self._stall_time,
+            }
+
+    def close(self):
+        """ Stop prefetching, discarding the buffer """
+        with self._cond:
+            self._closed = True
+            self._buffer.clear()
+            self._buffered_chunks.clear()
+            self._cond.notify_all()
+
+        self._thread.join()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import sys
+import threading
+
+import numpy as np
+
+import montblanc
+
+# A contiguous range of rows of a column awaiting a write
+_Run = collections.namedtuple("_Run", "column startrow nrow arrays nbytes")
+
+class WriteBehindBuffer(object):
+    """
+    Accumulates writes of row ranges to the columns of a table,
+    coalescing adjacent ranges into larger writes that are
+    performed by a dedicated I/O thread.
+
+    Exceptions raised while writing are re-raised by the
+    next call to :meth:`write`, :meth:`flush` or :meth:`close`.
+    """
+    def __init__(self, table, max_bytes, write_bytes=None, lock=None):
+        """
+        Parameters
+        ----------
+        table : table
+            Table supporting a putcol(column, data, startrow, nrow) method
+        max_bytes : integer
+            Maximum number of bytes held by the buffer,
+            both awaiting and undergoing writes.
+        write_bytes : integer
+            Ranges are written once they have coalesced into
+            this many bytes. Defaults to a quarter of max_bytes.
+        lock : threading.Lock
+            Lock held while writing to the table.
+            Defaults to None in which case a new lock is created.
+        """
+        self._table = table
+        self._table_lock = threading.Lock() if lock is None else lock
+        self._max_bytes = max_bytes
+        self._write_bytes = (max_bytes // 4 if write_bytes is None
+            else write_bytes)
+        self._cond = threading.Condition()
+
+        # Runs awaiting coalescing, keyed on their
+        # (column, startrow) and (column, endrow)
+        self._run_starts = {}
+        self._run_ends = {}
+        self._pending_bytes = 0
+
+        # Runs queued for, or undergoing writes by the I/O thread
+        self._queue = []
+        self._queued_bytes = 0
+
+        self._exc_info = None
+        self._closed = False
+
+        self._writes = 0
+        self._table_writes = 0
+
+        self._thread = threading.Thread(target=self._write_loop,
+            name='WriteBehindBuffer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _raise_error(self):
+        """ Re-raise any I/O thread exception. Call with the condition held """
+        if self._exc_info is not None:
+            etype, evalue, etb = self._exc_info
+            raise etype, evalue, etb
+
+    def _remove(self, run):
+        """ Remove a pending run. Call with the condition held """
+        del self._run_starts[(run.column, run.startrow)]
+        del self._run_ends[(run.column, run.startrow + run.nrow)]
+        self._pending_bytes -= run.nbytes
+
+    def _dispatch(self, run):
+        """ Queue a run for writing. Call with the condition held """
+        self._remove(run)
+        self._queue.append(run)
+        self._queued_bytes += run.nbytes
+        self._cond.notify_all()
+
+    def _dispatch_all(self):
+        """ Queue all pending runs for writing. Call with the condition held """
+        for run in self._run_starts.values():
+            self._dispatch(run)
+
+    def write(self, column, data, startrow, nrow):
+        """
+        Buffers a write of data to rows [startrow, startrow + nrow)
+        of column. data is copied.
+        """
+        data = np.array(data, copy=True)
+
+        with self._cond:
+            self._raise_error()
+
+            if self._closed:
+                raise ValueError("Write to a closed WriteBehindBuffer")
+
+            # Write pending runs and wait for space
+            while (self._pending_bytes + self._queued_bytes > 0 and
+                    self._pending_bytes + self._queued_bytes +
+                        data.nbytes > self._max_bytes):
+                self._dispatch_all()
+                self._cond.wait()
+                self._raise_error()
+
+            # Coalesce with runs ending at startrow
+            # and starting at startrow + nrow
+            before = self._run_ends.get((column, startrow), None)
+            after = self._run_starts.get((column, startrow + nrow), None)
+            arrays = [data]
+            nbytes = data.nbytes
+
+            if before is not None:
+                self._remove(before)
+                arrays = before.arrays + arrays
+                nbytes += before.nbytes
+                startrow, nrow = before.startrow, before.nrow + nrow
+
+            if after is not None:
+                self._remove(after)
+                arrays = arrays + after.arrays
+                nbytes += after.nbytes
+                nrow += after.nrow
+
+            run = _Run(column, startrow, nrow, arrays, nbytes)
+            self._run_starts[(column, startrow)] = run
+            self._run_ends[(column, startrow + nrow)] = run
+            self._pending_bytes += nbytes
+            self._writes += 1
+
+            if run.nbytes >= self._write_bytes:
+                self._dispatch(run)
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while len(self._queue) == 0 and not self._closed:
+                    self._cond.wait()
+
+                if len(self._queue) == 0:
+                    return
+
+                # Write queued runs in row order
+                runs = sorted(self._queue,
+                    key=lambda r: (r.column, r.startrow))
+                self._queue = []
+
+            try:
+                for run in runs:
+                    data = (run.arrays[0] if len(run.arrays) == 1
+                        else np.concatenate(run.arrays))
+
+                    with self._table_lock:
+                        self._table.putcol(run.column, data,
+                            startrow=run.startrow, nrow=run.nrow)
+
+                    with self._cond:
+                        self._queued_bytes -= run.nbytes
+                        self._table_writes += 1
+                        self._cond.notify_all()
+            except Exception:
+                montblanc.log.exception("Write Behind Exception")
+
+                # Record the exception and discard outstanding writes
+                with self._cond:
+                    self._exc_info = sys.exc_info()
+                    self._queue = []
+                    self._queued_bytes = 0
+                    self._cond.notify_all()
+
+                return
+
+    def flush(self):
+        """ Writes all buffered rows, waiting for the writes to complete """
+        with self._cond:
+            self._dispatch_all()
+
+            while self._queued_bytes > 0 and self._exc_info is None:
+                self._cond.wait()
+
+            self._raise_error()
+
+    def close(self):
+        """ Flushes the buffer and stops the I/O thread """
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+
+            self._thread.join()
+
+    def stats(self):
+        """ Returns a dictionary of write statistics """
+        with self._cond:
+            return {
+                'writes': self._writes,
+                'table_writes': self._table_writes,
+            }
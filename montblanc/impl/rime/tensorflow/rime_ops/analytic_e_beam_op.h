@@ -0,0 +1,75 @@
+#ifndef RIME_ANALYTIC_E_BEAM_OP_H
+#define RIME_ANALYTIC_E_BEAM_OP_H
+
+#include <cmath>
+#include <string>
+
+// montblanc namespace start and stop defines
+#define MONTBLANC_NAMESPACE_BEGIN namespace montblanc {
+#define MONTBLANC_NAMESPACE_STOP }
+
+//  namespace start and stop defines
+#define MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_BEGIN namespace  {
+#define MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_STOP }
+
+MONTBLANC_NAMESPACE_BEGIN
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_BEGIN
+
+// General definition of the AnalyticEBeam op, which will be specialised in:
+//   - analytic_e_beam_op_cpu.h for CPUs
+//   - analytic_e_beam_op_gpu.cuh for CUDA devices
+// Concrete template instantions of this class are provided in:
+//   - analytic_e_beam_op_cpu.cpp for CPUs
+//   - analytic_e_beam_op_gpu.cu for CUDA devices
+template <typename Device, typename FT, typename CT>
+class AnalyticEBeam {};
+
+// Number of polarisations handled by this kernel
+constexpr int ANALYTIC_E_BEAM_NPOL = 4;
+
+// Analytic beam models
+enum AnalyticBeamModel { COS3 = 0, AIRY = 1, GAUSSIAN = 2 };
+
+// Argument at which the cos3 beam is clamped, flooring it at 10%
+constexpr double ANALYTIC_E_BEAM_COS3_CUTOFF = 1.0881;
+
+// Converts the beam_model attribute to an AnalyticBeamModel,
+// returning false if the model is not recognised
+inline bool analytic_beam_model(const std::string & name,
+                                AnalyticBeamModel & model)
+{
+    if(name == "cos3") { model = COS3; }
+    else if(name == "airy") { model = AIRY; }
+    else if(name == "gaussian") { model = GAUSSIAN; }
+    else { return false; }
+
+    return true;
+}
+
+// The analytic beams are all evaluated as functions of
+// x = scale*frequency*r. Returns the scale given the
+// model and its parameter, which is the frequency scaling
+// of the cos3 beam, or the dish diameter of the airy
+// and gaussian beams
+template <typename FT>
+inline FT analytic_beam_scale(AnalyticBeamModel model,
+                              FT parameter, FT pi, FT lightspeed)
+{
+    switch(model)
+    {
+        case COS3:
+            return parameter;
+        case AIRY:
+            return pi*parameter/lightspeed;
+        case GAUSSIAN:
+        default:
+            // Power beam FWHM of 1.02 lambda / D
+            return parameter*std::sqrt(FT(2.0*std::log(2.0)))/
+                                            (FT(1.02)*lightspeed);
+    }
+}
+
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_STOP
+MONTBLANC_NAMESPACE_STOP
+
+#endif // #ifndef RIME_ANALYTIC_E_BEAM_OP_H
@@ -0,0 +1,114 @@
+#include "analytic_e_beam_op_cpu.h"
+
+#include "tensorflow/core/framework/shape_inference.h"
+
+MONTBLANC_NAMESPACE_BEGIN
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_BEGIN
+
+using tensorflow::shape_inference::InferenceContext;
+using tensorflow::shape_inference::ShapeHandle;
+using tensorflow::shape_inference::DimensionHandle;
+using tensorflow::Status;
+
+auto shape_function = [](InferenceContext* c) {
+    // Dummies for tests
+    ShapeHandle input;
+    DimensionHandle d;
+
+    // Get input shapes
+    ShapeHandle lm = c->input(0);
+    ShapeHandle frequency = c->input(1);
+    ShapeHandle point_errors = c->input(2);
+    ShapeHandle antenna_scaling = c->input(3);
+    ShapeHandle parallactic_angle_sin = c->input(4);
+    ShapeHandle parallactic_angle_cos = c->input(5);
+
+    // lm should be shape (nsrc, 2)
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(lm, 2, &input),
+        "lm shape must be [nsrc, 2] but is " + c->DebugString(lm));
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithValue(c->Dim(lm, 1), 2, &d),
+        "lm shape must be [nsrc, 2] but is " + c->DebugString(lm));
+
+    // frequency should be shape (nchan,)
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(frequency, 1, &input),
+        "frequency shape must be [nchan,] but is " + c->DebugString(frequency));
+
+    // point errors should be shape (ntime, na, nchan, 2)
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(point_errors, 4, &input),
+        "point_errors shape must be [ntime, na, nchan, 2] but is " +
+        c->DebugString(point_errors));
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithValue(c->Dim(point_errors, 3), 2, &d),
+        "point_errors shape must be [ntime, na, nchan, 2] but is " +
+        c->DebugString(point_errors));
+
+    // antenna scaling should be shape (na, nchan, 2)
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(antenna_scaling, 3, &input),
+        "antenna_scaling shape must be [na, nchan, 2] but is " +
+        c->DebugString(antenna_scaling));
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithValue(c->Dim(antenna_scaling, 2), 2, &d),
+        "antenna_scaling shape must be [na, nchan, 2] but is " +
+        c->DebugString(antenna_scaling));
+
+    // parallactic angle sin and cos should be shape (ntime, na)
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(parallactic_angle_sin, 2, &input),
+        "parallactic_angle_sin shape must be [ntime, na] but is " +
+        c->DebugString(parallactic_angle_sin));
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(parallactic_angle_cos, 2, &input),
+        "parallactic_angle_cos shape must be [ntime, na] but is " +
+        c->DebugString(parallactic_angle_cos));
+
+    // E Jones output is (nsrc, ntime, na, nchan, 4)
+    ShapeHandle ejones = c->MakeShape({
+        c->Dim(lm, 0),
+        c->Dim(point_errors, 0),
+        c->Dim(point_errors, 1),
+        c->Dim(point_errors, 2),
+        ANALYTIC_E_BEAM_NPOL});
+
+    c->set_output(0, ejones);
+
+    return Status::OK();
+};
+
+// Register the AnalyticEBeam operator.
+REGISTER_OP("AnalyticEBeam")
+    .Input("lm: FT")
+    .Input("frequency: FT")
+    .Input("point_errors: FT")
+    .Input("antenna_scaling: FT")
+    .Input("parallactic_angle_sin: FT")
+    .Input("parallactic_angle_cos: FT")
+    .Output("jones: CT")
+    .Attr("beam_model: {'cos3', 'airy', 'gaussian'}")
+    .Attr("beam_parameter: float")
+    .Attr("FT: {float, double} = DT_FLOAT")
+    .Attr("CT: {complex64, complex128} = DT_COMPLEX64")
+    .Doc(R"doc(Evaluate an analytic 'cos3', 'airy' or 'gaussian' beam,
+parameterised by beam_parameter, for each source, time, antenna and channel.
+Pointing errors, antenna scaling and the parallactic angle rotation
+are applied to the lm coordinates, as in the EBeam operator.)doc")
+    .SetShapeFn(shape_function);
+
+
+// Register a CPU kernel for AnalyticEBeam
+// handling permutation ['float', 'tensorflow::complex64']
+REGISTER_KERNEL_BUILDER(
+    Name("AnalyticEBeam")
+    .TypeConstraint<float>("FT")
+    .TypeConstraint<tensorflow::complex64>("CT")
+    .Device(tensorflow::DEVICE_CPU),
+    AnalyticEBeam<CPUDevice, float, tensorflow::complex64>);
+
+// Register a CPU kernel for AnalyticEBeam
+// handling permutation ['double', 'tensorflow::complex128']
+REGISTER_KERNEL_BUILDER(
+    Name("AnalyticEBeam")
+    .TypeConstraint<double>("FT")
+    .TypeConstraint<tensorflow::complex128>("CT")
+    .Device(tensorflow::DEVICE_CPU),
+    AnalyticEBeam<CPUDevice, double, tensorflow::complex128>);
+
+
+
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_STOP
+MONTBLANC_NAMESPACE_STOP
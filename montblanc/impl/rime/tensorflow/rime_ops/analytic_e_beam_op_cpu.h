@@ -0,0 +1,157 @@
+#ifndef RIME_ANALYTIC_E_BEAM_OP_CPU_H
+#define RIME_ANALYTIC_E_BEAM_OP_CPU_H
+
+#include "analytic_e_beam_op.h"
+#include "constants.h"
+
+// Required in order for Eigen::ThreadPoolDevice to be an actual type
+#define EIGEN_USE_THREADS
+
+#include <math.h>
+
+#include "tensorflow/core/framework/op.h"
+#include "tensorflow/core/framework/op_kernel.h"
+
+MONTBLANC_NAMESPACE_BEGIN
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_BEGIN
+
+// For simpler partial specialisation
+typedef Eigen::ThreadPoolDevice CPUDevice;
+
+// Bessel function of the first kind of order one
+inline float bessel_j1(float x) { return ::j1f(x); }
+inline double bessel_j1(double x) { return ::j1(x); }
+
+// Evaluate the analytic voltage beam at x = scale*frequency*r
+template <typename FT>
+inline FT analytic_beam(AnalyticBeamModel model, FT x)
+{
+    constexpr FT one = 1.0;
+    constexpr FT two = 2.0;
+
+    switch(model)
+    {
+        case COS3:
+        {
+            FT c = std::cos(std::min(x, FT(ANALYTIC_E_BEAM_COS3_CUTOFF)));
+            return c*c*c;
+        }
+        case AIRY:
+            return x < FT(1e-8) ? one : two*bessel_j1(x)/x;
+        case GAUSSIAN:
+        default:
+            return std::exp(-x*x);
+    }
+}
+
+// Specialise the AnalyticEBeam op for CPUs
+template <typename FT, typename CT>
+class AnalyticEBeam<CPUDevice, FT, CT> : public tensorflow::OpKernel
+{
+private:
+    std::string beam_model_name;
+    AnalyticBeamModel beam_model;
+    float beam_parameter;
+
+public:
+    explicit AnalyticEBeam(tensorflow::OpKernelConstruction * context) :
+        tensorflow::OpKernel(context)
+    {
+        namespace tf = tensorflow;
+
+        OP_REQUIRES_OK(context, context->GetAttr("beam_model",
+                                                &beam_model_name));
+        OP_REQUIRES_OK(context, context->GetAttr("beam_parameter",
+                                                &beam_parameter));
+
+        OP_REQUIRES(context, analytic_beam_model(beam_model_name, beam_model),
+            tf::errors::InvalidArgument("Invalid beam model '",
+                beam_model_name, "'. Must be 'cos3', 'airy' or 'gaussian'"));
+    }
+
+    void Compute(tensorflow::OpKernelContext * context) override
+    {
+        namespace tf = tensorflow;
+
+        // Create reference to input Tensorflow tensors
+        const auto & in_lm = context->input(0);
+        const auto & in_frequency = context->input(1);
+        const auto & in_point_errors = context->input(2);
+        const auto & in_antenna_scaling = context->input(3);
+        const auto & in_parallactic_angle_sin = context->input(4);
+        const auto & in_parallactic_angle_cos = context->input(5);
+
+        // Extract problem dimensions
+        int nsrc = in_lm.dim_size(0);
+        int ntime = in_point_errors.dim_size(0);
+        int na = in_point_errors.dim_size(1);
+        int nchan = in_point_errors.dim_size(2);
+
+        // Allocate output tensors
+        // Allocate space for output tensor 'jones'
+        tf::Tensor * jones_ptr = nullptr;
+        tf::TensorShape jones_shape = tf::TensorShape({
+            nsrc, ntime, na, nchan, ANALYTIC_E_BEAM_NPOL });
+        OP_REQUIRES_OK(context, context->allocate_output(
+            0, jones_shape, &jones_ptr));
+
+        if (jones_ptr->NumElements() == 0)
+            { return; }
+
+        auto lm = in_lm.tensor<FT, 2>();
+        auto frequency = in_frequency.tensor<FT, 1>();
+        auto point_errors = in_point_errors.tensor<FT, 4>();
+        auto antenna_scaling = in_antenna_scaling.tensor<FT, 3>();
+        auto parallactic_angle_sin = in_parallactic_angle_sin.tensor<FT, 2>();
+        auto parallactic_angle_cos = in_parallactic_angle_cos.tensor<FT, 2>();
+        auto jones = jones_ptr->tensor<CT, 5>();
+
+        const FT scale = analytic_beam_scale<FT>(beam_model,
+            FT(beam_parameter),
+            montblanc::constants<FT>::pi,
+            montblanc::constants<FT>::lightspeed);
+
+        #pragma omp parallel for collapse(2)
+        for(int time=0; time < ntime; ++time)
+        {
+            for(int ant=0; ant < na; ++ant)
+            {
+                // Rotation angle
+                const FT & sint = parallactic_angle_sin(time, ant);
+                const FT & cost = parallactic_angle_cos(time, ant);
+
+                for(int src=0; src < nsrc; ++src)
+                {
+                    // Rotate lm coordinate angle
+                    FT l = lm(src,0)*cost - lm(src,1)*sint;
+                    FT m = lm(src,0)*sint + lm(src,1)*cost;
+
+                    for(int chan=0; chan < nchan; chan++)
+                    {
+                        // Offset lm coordinates by point errors
+                        // and scale by antenna scaling
+                        FT vl = l + point_errors(time, ant, chan, 0);
+                        FT vm = m + point_errors(time, ant, chan, 1);
+
+                        vl *= antenna_scaling(ant, chan, 0);
+                        vm *= antenna_scaling(ant, chan, 1);
+
+                        FT r = std::sqrt(vl*vl + vm*vm);
+                        FT E = analytic_beam<FT>(beam_model,
+                            scale*frequency(chan)*r);
+
+                        jones(src,time,ant,chan,0) = CT(E, 0);
+                        jones(src,time,ant,chan,1) = CT(0, 0);
+                        jones(src,time,ant,chan,2) = CT(0, 0);
+                        jones(src,time,ant,chan,3) = CT(E, 0);
+                    }
+                }
+            }
+        }
+    }
+};
+
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_STOP
+MONTBLANC_NAMESPACE_STOP
+
+#endif // #ifndef RIME_ANALYTIC_E_BEAM_OP_CPU_H
@@ -0,0 +1,32 @@
+#if GOOGLE_CUDA
+
+#include "analytic_e_beam_op_gpu.cuh"
+
+MONTBLANC_NAMESPACE_BEGIN
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_BEGIN
+
+
+// Register a GPU kernel for AnalyticEBeam
+// handling permutation ['float', 'tensorflow::complex64']
+REGISTER_KERNEL_BUILDER(
+    Name("AnalyticEBeam")
+    .TypeConstraint<float>("FT")
+    .TypeConstraint<tensorflow::complex64>("CT")
+    .Device(tensorflow::DEVICE_GPU),
+    AnalyticEBeam<GPUDevice, float, tensorflow::complex64>);
+
+// Register a GPU kernel for AnalyticEBeam
+// handling permutation ['double', 'tensorflow::complex128']
+REGISTER_KERNEL_BUILDER(
+    Name("AnalyticEBeam")
+    .TypeConstraint<double>("FT")
+    .TypeConstraint<tensorflow::complex128>("CT")
+    .Device(tensorflow::DEVICE_GPU),
+    AnalyticEBeam<GPUDevice, double, tensorflow::complex128>);
+
+
+
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_STOP
+MONTBLANC_NAMESPACE_STOP
+
+#endif // #if GOOGLE_CUDA
\ No newline at end of file
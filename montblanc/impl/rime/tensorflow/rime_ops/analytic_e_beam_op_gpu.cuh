@@ -0,0 +1,246 @@
+#if GOOGLE_CUDA
+
+#ifndef RIME_ANALYTIC_E_BEAM_OP_GPU_CUH
+#define RIME_ANALYTIC_E_BEAM_OP_GPU_CUH
+
+#include "analytic_e_beam_op.h"
+#include "constants.h"
+#include <montblanc/abstraction.cuh>
+
+// Required in order for Eigen::GpuDevice to be an actual type
+#define EIGEN_USE_GPU
+
+#include "tensorflow/core/framework/op.h"
+#include "tensorflow/core/framework/op_kernel.h"
+
+MONTBLANC_NAMESPACE_BEGIN
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_BEGIN
+
+// For simpler partial specialisation
+typedef Eigen::GpuDevice GPUDevice;
+
+// LaunchTraits struct defining
+// kernel block sizes for type permutations
+template <typename FT, typename CT> struct LaunchTraits {};
+
+// Specialise for float, tensorflow::complex64
+// Should really be .cu file as this is a concrete type
+// but this works because this header is included only once
+template <> struct LaunchTraits<float, tensorflow::complex64>
+{
+    static constexpr int BLOCKDIMX = 32;
+    static constexpr int BLOCKDIMY = 8;
+    static constexpr int BLOCKDIMZ = 1;
+
+    static dim3 block_size(int X, int Y, int Z)
+    {
+        return montblanc::shrink_small_dims(
+            dim3(BLOCKDIMX, BLOCKDIMY, BLOCKDIMZ),
+            X, Y, Z);
+    }
+};
+
+// Specialise for double, tensorflow::complex128
+// Should really be .cu file as this is a concrete type
+// but this works because this header is included only once
+template <> struct LaunchTraits<double, tensorflow::complex128>
+{
+    static constexpr int BLOCKDIMX = 32;
+    static constexpr int BLOCKDIMY = 4;
+    static constexpr int BLOCKDIMZ = 1;
+
+    static dim3 block_size(int X, int Y, int Z)
+    {
+        return montblanc::shrink_small_dims(
+            dim3(BLOCKDIMX, BLOCKDIMY, BLOCKDIMZ),
+            X, Y, Z);
+    }
+};
+
+// Bessel function of the first kind of order one
+__device__ __forceinline__ float bessel_j1(float x) { return ::j1f(x); }
+__device__ __forceinline__ double bessel_j1(double x) { return ::j1(x); }
+
+// Evaluate the analytic voltage beam at x = scale*frequency*r
+template <typename FT>
+__device__ __forceinline__ FT analytic_beam(AnalyticBeamModel model, FT x)
+{
+    using Po = typename montblanc::kernel_policies<FT>;
+
+    switch(model)
+    {
+        case COS3:
+        {
+            FT c = Po::cos(Po::min(x, FT(ANALYTIC_E_BEAM_COS3_CUTOFF)));
+            return c*c*c;
+        }
+        case AIRY:
+            return x < FT(1e-8) ? FT(1) : FT(2)*bessel_j1(x)/x;
+        case GAUSSIAN:
+        default:
+            return Po::exp(-x*x);
+    }
+}
+
+// CUDA kernel outline
+template <typename Traits>
+__global__ void rime_analytic_e_beam(
+    const typename Traits::lm_type * in_lm,
+    const typename Traits::FT * in_frequency,
+    const typename Traits::point_error_type * in_point_errors,
+    const typename Traits::antenna_scale_type * in_antenna_scaling,
+    const typename Traits::FT * in_parallactic_angle_sin,
+    const typename Traits::FT * in_parallactic_angle_cos,
+    typename Traits::CT * out_jones,
+    AnalyticBeamModel beam_model,
+    typename Traits::FT scale,
+    int nsrc, int ntime, int na, int nchan)
+{
+    using FT = typename Traits::FT;
+    using CT = typename Traits::CT;
+
+    using Po = typename montblanc::kernel_policies<FT>;
+
+    int CHAN = blockIdx.x*blockDim.x + threadIdx.x;
+    int ANT = blockIdx.y*blockDim.y + threadIdx.y;
+    int TIME = blockIdx.z*blockDim.z + threadIdx.z;
+
+    if(TIME >= ntime || ANT >= na || CHAN >= nchan)
+        { return; }
+
+    int i = TIME*na + ANT;
+    FT sint = in_parallactic_angle_sin[i];
+    FT cost = in_parallactic_angle_cos[i];
+
+    // Pointing errors vary by time, antenna and channel
+    i = (TIME*na + ANT)*nchan + CHAN;
+    typename Traits::point_error_type pe = in_point_errors[i];
+
+    // Antenna scaling varies by antenna and channel
+    i = ANT*nchan + CHAN;
+    typename Traits::antenna_scale_type as = in_antenna_scaling[i];
+
+    FT freq_scale = scale*in_frequency[CHAN];
+
+    for(int SRC=0; SRC < nsrc; ++SRC)
+    {
+        typename Traits::lm_type lm = in_lm[SRC];
+
+        // Rotate lm coordinate angle, offset by point
+        // errors and scale by antenna scaling
+        FT l = (lm.x*cost - lm.y*sint + pe.x)*as.x;
+        FT m = (lm.x*sint + lm.y*cost + pe.y)*as.y;
+
+        FT E = analytic_beam<FT>(beam_model,
+            freq_scale*Po::sqrt(l*l + m*m));
+
+        i = (((SRC*ntime + TIME)*na + ANT)*nchan + CHAN)*ANALYTIC_E_BEAM_NPOL;
+        out_jones[i + 0] = Po::make_ct(E, 0);
+        out_jones[i + 1] = Po::make_ct(0, 0);
+        out_jones[i + 2] = Po::make_ct(0, 0);
+        out_jones[i + 3] = Po::make_ct(E, 0);
+    }
+}
+
+// Specialise the AnalyticEBeam op for GPUs
+template <typename FT, typename CT>
+class AnalyticEBeam<GPUDevice, FT, CT> : public tensorflow::OpKernel
+{
+private:
+    std::string beam_model_name;
+    AnalyticBeamModel beam_model;
+    float beam_parameter;
+
+public:
+    explicit AnalyticEBeam(tensorflow::OpKernelConstruction * context) :
+        tensorflow::OpKernel(context)
+    {
+        namespace tf = tensorflow;
+
+        OP_REQUIRES_OK(context, context->GetAttr("beam_model",
+                                                &beam_model_name));
+        OP_REQUIRES_OK(context, context->GetAttr("beam_parameter",
+                                                &beam_parameter));
+
+        OP_REQUIRES(context, analytic_beam_model(beam_model_name, beam_model),
+            tf::errors::InvalidArgument("Invalid beam model '",
+                beam_model_name, "'. Must be 'cos3', 'airy' or 'gaussian'"));
+    }
+
+    void Compute(tensorflow::OpKernelContext * context) override
+    {
+        namespace tf = tensorflow;
+
+        // Create variables for input tensors
+        const auto & in_lm = context->input(0);
+        const auto & in_frequency = context->input(1);
+        const auto & in_point_errors = context->input(2);
+        const auto & in_antenna_scaling = context->input(3);
+        const auto & in_parallactic_angle_sin = context->input(4);
+        const auto & in_parallactic_angle_cos = context->input(5);
+
+        // Extract problem dimensions
+        int nsrc = in_lm.dim_size(0);
+        int ntime = in_point_errors.dim_size(0);
+        int na = in_point_errors.dim_size(1);
+        int nchan = in_point_errors.dim_size(2);
+
+        // Allocate output tensors
+        // Allocate space for output tensor 'jones'
+        tf::Tensor * jones_ptr = nullptr;
+        tf::TensorShape jones_shape = tf::TensorShape({
+            nsrc, ntime, na, nchan, ANALYTIC_E_BEAM_NPOL });
+        OP_REQUIRES_OK(context, context->allocate_output(
+            0, jones_shape, &jones_ptr));
+
+        if (jones_ptr->NumElements() == 0)
+            { return; }
+
+        using Tr = montblanc::kernel_traits<FT>;
+        using LTr = LaunchTraits<FT, CT>;
+
+        // Set up our CUDA thread block and grid
+        dim3 block(LTr::block_size(nchan, na, ntime));
+        dim3 grid(montblanc::grid_from_thread_block(
+            block, nchan, na, ntime));
+
+        // Get the GPU device
+        const auto & device = context->eigen_device<GPUDevice>();
+
+        // Get pointers to flattened tensor data buffers
+        auto fin_lm = reinterpret_cast<const typename Tr::lm_type *>(
+            in_lm.flat<FT>().data());
+        auto fin_frequency = in_frequency.flat<FT>().data();
+        auto fin_point_errors = reinterpret_cast<
+            const typename Tr::point_error_type *>(
+                in_point_errors.flat<FT>().data());
+        auto fin_antenna_scaling = reinterpret_cast<
+            const typename Tr::antenna_scale_type *>(
+                in_antenna_scaling.flat<FT>().data());
+        auto fin_parallactic_angle_sin = in_parallactic_angle_sin.flat<FT>().data();
+        auto fin_parallactic_angle_cos = in_parallactic_angle_cos.flat<FT>().data();
+        auto fout_jones = reinterpret_cast<typename Tr::CT *>(
+            jones_ptr->flat<CT>().data());
+
+        const FT scale = analytic_beam_scale<FT>(beam_model,
+            FT(beam_parameter),
+            montblanc::constants<FT>::pi,
+            montblanc::constants<FT>::lightspeed);
+
+        // Call the rime_analytic_e_beam CUDA kernel
+        rime_analytic_e_beam<Tr>
+            <<<grid, block, 0, device.stream()>>>(
+                fin_lm, fin_frequency,
+                fin_point_errors, fin_antenna_scaling,
+                fin_parallactic_angle_sin, fin_parallactic_angle_cos,
+                fout_jones, beam_model, scale,
+                nsrc, ntime, na, nchan);
+    }
+};
+
+MONTBLANC_ANALYTIC_E_BEAM_NAMESPACE_STOP
+MONTBLANC_NAMESPACE_STOP
+
+#endif // #ifndef RIME_ANALYTIC_E_BEAM_OP_GPU_CUH
+
+#endif // #if GOOGLE_CUDA
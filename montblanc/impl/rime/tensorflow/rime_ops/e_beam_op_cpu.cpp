@@ -25,6 +25,7 @@ auto ebeam_shape_function = [](InferenceContext* c) {
     ShapeHandle beam_extents = c->input(6);
     ShapeHandle beam_freq_map = c->input(7);
     ShapeHandle ebeam = c->input(8);
+    ShapeHandle antenna_beam = c->input(9);
 
     // lm should be shape (nsrc, 2)
     TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(lm, 2, &input),
@@ -76,13 +77,18 @@ auto ebeam_shape_function = [](InferenceContext* c) {
         c->DebugString(beam_freq_map));
 
     // ebeam
-    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(ebeam, 4, &input),
-        "ebeam should shape must be [beam_lw, beam_mh, beam_nud, 4] but is " +
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(ebeam, 5, &input),
+        "ebeam should shape must be [beam_nb, beam_lw, beam_mh, beam_nud, 4] but is " +
         c->DebugString(ebeam));
-    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithValue(c->Dim(ebeam, 3), 4, &d),
-        "ebeam shape must be [beam_lw, beam_mh, beam_nud, 4] but is " +
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithValue(c->Dim(ebeam, 4), 4, &d),
+        "ebeam shape must be [beam_nb, beam_lw, beam_mh, beam_nud, 4] but is " +
         c->DebugString(ebeam));
 
+    // antenna_beam should be shape (na,)
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(antenna_beam, 1, &input),
+        "antenna_beam shape must be [na,] but is " +
+        c->DebugString(antenna_beam));
+
     // E Jones output is (nsrc, ntime, na, nchan, 4)
     ShapeHandle ejones = c->MakeShape({
         c->Dim(lm, 0),
@@ -108,6 +114,7 @@ REGISTER_OP("EBeam")
     .Input("beam_extents: FT")
     .Input("beam_freq_map: FT")
     .Input("e_beam: CT")
+    .Input("antenna_beam: int32")
     .Output("jones: CT")
     .Attr("FT: {float, double} = DT_FLOAT")
     .Attr("CT: {complex64, complex128} = DT_COMPLEX64")
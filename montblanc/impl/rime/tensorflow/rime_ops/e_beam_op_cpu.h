@@ -19,15 +19,15 @@ inline void
 trilinear_interpolate(
     CT & pol_sum,
     FT & abs_sum,
-    typename tensorflow::TTypes<CT, 4>::ConstTensor & e_beam,
-    const FT & gl, const FT & gm, const FT & gchan,
+    typename tensorflow::TTypes<CT, 5>::ConstTensor & e_beam,
+    int beam, const FT & gl, const FT & gm, const FT & gchan,
     int beam_lw, int beam_mh, int beam_nud, int pol,
     const FT & weight)
 {
     if(gl < 0 || gl > beam_lw || gm < 0 || gm > beam_mh)
         { return; }
 
-    CT data = e_beam(int(gl), int(gm), int(gchan), pol);
+    CT data = e_beam(beam, int(gl), int(gm), int(gchan), pol);
     abs_sum += weight*std::abs(data);
     pol_sum += data*FT(weight);
 }
@@ -52,6 +52,7 @@ public:
         const tf::Tensor & in_beam_extents = context->input(6);
         const tf::Tensor & in_beam_freq_map = context->input(7);
         const tf::Tensor & in_ebeam = context->input(8);
+        const tf::Tensor & in_antenna_beam = context->input(9);
 
         // Extract problem dimensions
         int nsrc = in_lm.dim_size(0);
@@ -62,9 +63,25 @@ public:
         int npol = EBEAM_NPOL;
         int npolchan = npol * nchan;
 
-        int beam_lw = in_ebeam.dim_size(0);
-        int beam_mh = in_ebeam.dim_size(1);
-        int beam_nud = in_ebeam.dim_size(2);
+        int beam_nb = in_ebeam.dim_size(0);
+        int beam_lw = in_ebeam.dim_size(1);
+        int beam_mh = in_ebeam.dim_size(2);
+        int beam_nud = in_ebeam.dim_size(3);
+
+        OP_REQUIRES(context, in_antenna_beam.dim_size(0) == na,
+            tf::errors::InvalidArgument("antenna_beam must have "
+                "shape [na,]"));
+
+        auto antenna_beam = in_antenna_beam.tensor<int, 1>();
+
+        for(int ant=0; ant < na; ++ant)
+        {
+            OP_REQUIRES(context, antenna_beam(ant) >= 0 &&
+                antenna_beam(ant) < beam_nb,
+                tf::errors::InvalidArgument("antenna_beam index '" +
+                    std::to_string(antenna_beam(ant)) + "' of antenna '" +
+                    std::to_string(ant) + "' is not in [0, beam_nb)"));
+        }
 
         // Extract beam extents
         auto beam_extents = in_beam_extents.tensor<FT, 1>();
@@ -102,7 +119,7 @@ public:
         auto beam_freq_map = in_beam_freq_map.flat<FT>();
         auto beam_freq_map_begin = beam_freq_map.data();
         auto beam_freq_map_end = beam_freq_map_begin + beam_freq_map.size();
-        auto e_beam = in_ebeam.tensor<CT, 4>();
+        auto e_beam = in_ebeam.tensor<CT, 5>();
         auto jones = jones_ptr->tensor<CT, 5>();
 
         constexpr FT zero = 0.0;
@@ -173,6 +190,8 @@ public:
                 // Rotation angle
                 const FT & sint = parallactic_angle_sin(time, ant);
                 const FT & cost = parallactic_angle_cos(time, ant);
+                // Beam cube of this antenna
+                const int beam = antenna_beam(ant);
 
                 for(int src=0; src < nsrc; ++src)
                 {
@@ -217,36 +236,36 @@ public:
                             // at the supplied coordinate offsets.
                             // Save the complex sum in pol_sum
                             // and the sum of abs in abs_sum
-                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam,
+                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam, beam,
                                 gl0, gm0, gchan0[chan],
                                 beam_lw, beam_mh, beam_nud, pol,
                                 (one-ld)*(one-md)*(chd0[chan]));
-                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam,
+                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam, beam,
                                 gl1, gm0, gchan0[chan],
                                 beam_lw, beam_mh, beam_nud, pol,
                                 ld*(one-md)*(chd0[chan]));
-                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam,
+                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam, beam,
                                 gl0, gm1, gchan0[chan],
                                 beam_lw, beam_mh, beam_nud, pol,
                                 (one-ld)*md*(chd0[chan]));
-                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam,
+                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam, beam,
                                 gl1, gm1, gchan0[chan],
                                 beam_lw, beam_mh, beam_nud, pol,
                                 ld*md*(chd0[chan]));
 
-                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam,
+                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam, beam,
                                 gl0, gm0, gchan1[chan],
                                 beam_lw, beam_mh, beam_nud, pol,
                                 (one-ld)*(one-md)*chd1[chan]);
-                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam,
+                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam, beam,
                                 gl1, gm0, gchan1[chan],
                                 beam_lw, beam_mh, beam_nud, pol,
                                 ld*(one-md)*chd1[chan]);
-                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam,
+                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam, beam,
                                 gl0, gm1, gchan1[chan],
                                 beam_lw, beam_mh, beam_nud, pol,
                                 (one-ld)*md*chd1[chan]);
-                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam,
+                            trilinear_interpolate<FT, CT>(pol_sum, abs_sum, e_beam, beam,
                                 gl1, gm1, gchan1[chan],
                                 beam_lw, beam_mh, beam_nud, pol,
                                 ld*md*chd1[chan]);
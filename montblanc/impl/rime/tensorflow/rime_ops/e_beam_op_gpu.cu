@@ -7,6 +7,7 @@ REGISTER_KERNEL_BUILDER(
     Name("EBeam")
     .Device(tensorflow::DEVICE_GPU)
     .HostMemory("beam_extents")
+    .HostMemory("antenna_beam")
     .TypeConstraint<float>("FT")
     .TypeConstraint<tensorflow::complex64>("CT"),
     EBeam<GPUDevice, float, tensorflow::complex64>);
@@ -15,6 +16,7 @@ REGISTER_KERNEL_BUILDER(
     Name("EBeam")
     .Device(tensorflow::DEVICE_GPU)
     .HostMemory("beam_extents")
+    .HostMemory("antenna_beam")
     .TypeConstraint<double>("FT")
     .TypeConstraint<tensorflow::complex128>("CT"),
     EBeam<GPUDevice, double, tensorflow::complex128>);
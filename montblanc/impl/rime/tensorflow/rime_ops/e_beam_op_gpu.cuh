@@ -3,6 +3,8 @@
 
 #if GOOGLE_CUDA
 
+#include <vector>
+
 #include "e_beam_op.h"
 #include <montblanc/abstraction.cuh>
 #include <montblanc/brightness.cuh>
@@ -145,13 +147,14 @@ __global__ void rime_e_beam(
     const typename Traits::FT * parallactic_angle_cos,
     const typename Traits::FT * beam_freq_map,
     const typename Traits::CT * ebeam,
+    const int * antenna_beam,
     typename Traits::CT * jones,
     const typename Traits::FT lower_l,
     const typename Traits::FT lower_m,
     const typename Traits::FT upper_l,
     const typename Traits::FT upper_m,
     int nsrc, int ntime, int na, int nchan, int npolchan,
-    int beam_lw, int beam_mh, int beam_nud)
+    int beam_nb, int beam_lw, int beam_mh, int beam_nud)
 {
     // Simpler float and complex types
     using FT = typename Traits::FT;
@@ -264,6 +267,11 @@ __global__ void rime_e_beam(
 
     __syncthreads();
 
+    // Offset to the beam cube of this antenna.
+    // Indices are validated on the host before launch
+    i = cub::ThreadLoad<cub::LOAD_LDG>(antenna_beam + ANT);
+    ebeam += std::size_t(i)*beam_lw*beam_mh*beam_nud*EBEAM_NPOL;
+
     for(int SRC=0; SRC < nsrc; ++SRC)
     {
         lm_type rlm = lm[SRC];
@@ -403,6 +411,7 @@ public:
         const tf::Tensor & in_beam_extents = context->input(6);
         const tf::Tensor & in_beam_freq_map = context->input(7);
         const tf::Tensor & in_ebeam = context->input(8);
+        const tf::Tensor & in_antenna_beam = context->input(9);
 
         // Extract problem dimensions
         int nsrc = in_lm.dim_size(0);
@@ -410,9 +419,30 @@ public:
         int na = in_point_errors.dim_size(1);
         int nchan = in_point_errors.dim_size(2);
         int npolchan = nchan*EBEAM_NPOL;
-        int beam_lw = in_ebeam.dim_size(0);
-        int beam_mh = in_ebeam.dim_size(1);
-        int beam_nud = in_ebeam.dim_size(2);
+        int beam_nb = in_ebeam.dim_size(0);
+        int beam_lw = in_ebeam.dim_size(1);
+        int beam_mh = in_ebeam.dim_size(2);
+        int beam_nud = in_ebeam.dim_size(3);
+
+        OP_REQUIRES(context, in_antenna_beam.dim_size(0) == na,
+            tf::errors::InvalidArgument("antenna_beam must have "
+                "shape [na,]"));
+
+        // antenna_beam is in host memory, validate it
+        // here rather than clamping indices on the device
+        auto host_antenna_beam = in_antenna_beam.tensor<int, 1>();
+        std::vector<int> antenna_beam_indices(na);
+
+        for(int ant=0; ant < na; ++ant)
+        {
+            OP_REQUIRES(context, host_antenna_beam(ant) >= 0 &&
+                host_antenna_beam(ant) < beam_nb,
+                tf::errors::InvalidArgument("antenna_beam index '" +
+                    std::to_string(host_antenna_beam(ant)) + "' of antenna '" +
+                    std::to_string(ant) + "' is not in [0, beam_nb)"));
+
+            antenna_beam_indices[ant] = host_antenna_beam(ant);
+        }
 
         // Reason about our output shape
         // Create a pointer for the jones result
@@ -438,7 +468,8 @@ public:
         FT upper_l = beam_extents(3); // Upper l
         FT upper_m = beam_extents(4); // Upper m
 
-        const auto & stream = context->eigen_device<GPUDevice>().stream();
+        const auto & device = context->eigen_device<GPUDevice>();
+        const auto & stream = device.stream();
 
         typedef montblanc::kernel_traits<FT> Tr;
         typedef typename montblanc::ebeam::LaunchTraits<FT> LTr;
@@ -482,13 +513,29 @@ public:
             const typename Tr::CT *>(
                 in_ebeam.flat<CT>().data());
 
+        // Create a GPU Allocator
+        tf::AllocatorAttributes gpu_allocator;
+        gpu_allocator.set_gpu_compatible(true);
+
+        // Copy the validated antenna beam indices to the device.
+        // The copy is staged out of pageable memory before
+        // memcpyHostToDevice returns, so the vector may go out of scope
+        tf::Tensor device_antenna_beam;
+        OP_REQUIRES_OK(context, context->allocate_temp(
+            tf::DT_INT32, tf::TensorShape({na}),
+            &device_antenna_beam, gpu_allocator));
+
+        auto antenna_beam = device_antenna_beam.flat<int>().data();
+        device.memcpyHostToDevice(antenna_beam,
+            antenna_beam_indices.data(), na*sizeof(int));
+
         rime_e_beam<Tr><<<grid, blocks, 0, stream>>>(
             lm, frequency, point_errors, antenna_scaling,
             parallactic_angle_sin, parallactic_angle_cos,
-            beam_freq_map, ebeam, jones,
+            beam_freq_map, ebeam, antenna_beam, jones,
             lower_l, lower_m, upper_l, upper_m,
             nsrc, ntime, na, nchan, npolchan,
-            beam_lw, beam_mh, beam_nud);
+            beam_nb, beam_lw, beam_mh, beam_nud);
 
     }
 };
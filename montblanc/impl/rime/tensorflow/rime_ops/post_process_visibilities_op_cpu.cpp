@@ -42,24 +42,23 @@ auto shape_function = [](InferenceContext* c) {
 
     // TODO. Check shape and dimension sizes for 'flag'
     ShapeHandle in_flag = c->input(3);
-    // Assert 'flag' number of dimensions
-    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(in_flag, 4, &input),
-        "flag must have shape [ntime, nbl, nchan, 4] but is " +
-        c->DebugString(in_flag));
-    // Assert 'flag' dimension '3' size
-    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithValue(c->Dim(in_flag, 3), 4, &d),
-        "flag must have shape [ntime, nbl, nchan, 4] but is " +
+    // Assert 'flag' number of dimensions.
+    // Flags are a per-visibility polarisation bitmask
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(in_flag, 3, &input),
+        "flag must have shape [ntime, nbl, nchan] but is " +
         c->DebugString(in_flag));
 
     // TODO. Check shape and dimension sizes for 'weight'
     ShapeHandle in_weight = c->input(4);
-    // Assert 'weight' number of dimensions
+    // Assert 'weight' number of dimensions.
+    // nwchan may be nchan for per-channel weights, or a divisor
+    // of nchan, such as nbands, for weights broadcast over channels
     TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(in_weight, 4, &input),
-        "weight must have shape [ntime, nbl, nchan, 4] but is " +
+        "weight must have shape [ntime, nbl, nwchan, 4] but is " +
         c->DebugString(in_weight));
     // Assert 'weight' dimension '3' size
     TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithValue(c->Dim(in_weight, 3), 4, &d),
-        "weight must have shape [ntime, nbl, nchan, 4] but is " +
+        "weight must have shape [ntime, nbl, nwchan, 4] but is " +
         c->DebugString(in_weight));
 
     // TODO. Check shape and dimension sizes for 'base_vis'
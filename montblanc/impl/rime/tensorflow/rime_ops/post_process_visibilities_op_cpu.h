@@ -51,6 +51,15 @@ public:
         int nbl = in_model_vis.dim_size(1);
         int nchan = in_model_vis.dim_size(2);
         int npol = in_model_vis.dim_size(3);
+        int nwchan = in_weight.dim_size(2);
+
+        // Weights may be broadcast across groups of channels
+        OP_REQUIRES(context, nwchan > 0 && nchan % nwchan == 0,
+            tf::errors::InvalidArgument("Number of weight channels '",
+                nwchan, "' does not divide the number of channels '",
+                nchan, "'."));
+
+        int chan_per_wchan = nchan / nwchan;
 
         // Allocate output tensors
         // Allocate space for output tensor 'final_vis'
@@ -68,7 +77,7 @@ public:
         auto antenna1 = in_antenna1.tensor<tensorflow::int32, 2>();
         auto antenna2 = in_antenna2.tensor<tensorflow::int32, 2>();
         auto direction_independent_effects = in_direction_independent_effects.tensor<CT, 4>();
-        auto flag = in_flag.tensor<tensorflow::uint8, 4>();
+        auto flag = in_flag.tensor<tensorflow::uint8, 3>();
         auto weight = in_weight.tensor<FT, 4>();
         auto base_vis = in_base_vis.tensor<CT, 4>();
         auto model_vis = in_model_vis.tensor<CT, 4>();
@@ -127,11 +136,12 @@ public:
                     mv2 += base_vis(time, bl, chan, 2);
                     mv3 += base_vis(time, bl, chan, 3);
 
-                    // Flags
-                    bool f0 = flag(time, bl, chan, 0) > 0;
-                    bool f1 = flag(time, bl, chan, 1) > 0;
-                    bool f2 = flag(time, bl, chan, 2) > 0;
-                    bool f3 = flag(time, bl, chan, 3) > 0;
+                    // Flags, bit p set if polarisation p is flagged
+                    const tensorflow::uint8 & f = flag(time, bl, chan);
+                    bool f0 = (f & 0x1) != 0;
+                    bool f1 = (f & 0x2) != 0;
+                    bool f2 = (f & 0x4) != 0;
+                    bool f3 = (f & 0x8) != 0;
 
                     // Write out model visibilities, zeroed if flagged
                     final_vis(time, bl, chan, 0) = f0 ? CT(0) : mv0;
@@ -144,11 +154,12 @@ public:
                     const CT & ov2 = observed_vis(time, bl, chan, 2);
                     const CT & ov3 = observed_vis(time, bl, chan, 3);
 
-                    // Weights
-                    const FT & w0 = weight(time, bl, chan, 0);
-                    const FT & w1 = weight(time, bl, chan, 1);
-                    const FT & w2 = weight(time, bl, chan, 2);
-                    const FT & w3 = weight(time, bl, chan, 3);
+                    // Weights, possibly broadcast across channels
+                    int wchan = chan / chan_per_wchan;
+                    const FT & w0 = weight(time, bl, wchan, 0);
+                    const FT & w1 = weight(time, bl, wchan, 1);
+                    const FT & w2 = weight(time, bl, wchan, 2);
+                    const FT & w3 = weight(time, bl, wchan, 3);
 
                     // Compute chi squared
                     FT d0 = f0 ? FT(0) : chi_squared_term(mv0, ov0, w0);
@@ -53,7 +53,8 @@ __global__ void rime_post_process_visibilities(
     const typename Traits::vis_type * in_observed_vis,
     typename Traits::vis_type * out_final_vis,
     typename Traits::FT * out_chi_squared_terms,
-    int ntime, int nbl, int na, int npolchan)
+    int ntime, int nbl, int na, int nchan, int npolchan,
+    int nwchan, int chan_per_wchan)
 
 {
     // Simpler float and complex types
@@ -82,9 +83,18 @@ __global__ void rime_post_process_visibilities(
     CT base_vis = in_base_vis[i];
     CT model_vis = in_model_vis[i];
     CT diff_vis = in_observed_vis[i];
+
+    int pol = polchan & 0x3;
+    int chan = polchan >> 2;
+
+    // Weights, possibly broadcast across channels
+    i = ((time*nbl + bl)*nwchan + chan/chan_per_wchan)*4 + pol;
     FT weight = in_weight[i];
-    // Flag multiplier used to zero flagged visibility points
-    FT flag_mul = FT(in_flag[i] == 0);
+
+    // Flag multiplier used to zero flagged visibility points.
+    // Bit p of the flag bitmask is set if polarisation p is flagged
+    i = (time*nbl + bl)*nchan + chan;
+    FT flag_mul = FT(((in_flag[i] >> pol) & 0x1) == 0);
 
     // Multiply the visibility by antenna 1's g term
     i = (time*na + ant1)*npolchan + polchan;
@@ -150,6 +160,15 @@ public:
         int npol = in_model_vis.dim_size(3);
         int npolchan = npol*nchan;
         int na = in_die.dim_size(1);
+        int nwchan = in_weight.dim_size(2);
+
+        // Weights may be broadcast across groups of channels
+        OP_REQUIRES(context, nwchan > 0 && nchan % nwchan == 0,
+            tf::errors::InvalidArgument("Number of weight channels '",
+                nwchan, "' does not divide the number of channels '",
+                nchan, "'."));
+
+        int chan_per_wchan = nchan / nwchan;
 
         using LTr = LaunchTraits<FT>;
 
@@ -246,7 +265,8 @@ public:
                 fin_observed_vis,
                 fout_final_vis,
                 fout_chi_squared_terms,
-                ntime, nbl, na, npolchan);
+                ntime, nbl, na, nchan, npolchan,
+                nwchan, chan_per_wchan);
 
         // Perform a reduction on the chi squared terms
         tf::uint8 * temp_storage_ptr = temp_storage.flat<tf::uint8>().data();
@@ -18,6 +18,11 @@ MONTBLANC_SUM_COHERENCIES_NAMESPACE_BEGIN
 // sum_coherencies_op_cpu.cpp and sum_coherencies_op_gpu.cu respectively
 template <typename Device, typename FT, typename CT> class SumCoherencies {};
 
+// Flags are transported as a per-visibility bitmask,
+// bit p being set if polarisation p is flagged.
+// Coherencies are not summed for fully flagged visibilities
+constexpr unsigned char ALL_POLS_FLAGGED = 0xF;
+
 MONTBLANC_SUM_COHERENCIES_NAMESPACE_STOP
 MONTBLANC_NAMESPACE_STOP
 
@@ -21,7 +21,8 @@ auto sum_coherencies_shape_function = [](InferenceContext* c) {
     ShapeHandle shape = c->input(2);
     ShapeHandle ant_jones = c->input(3);
     ShapeHandle sgn_brightness = c->input(4);
-    ShapeHandle base_coherencies = c->input(5);
+    ShapeHandle flag = c->input(5);
+    ShapeHandle base_coherencies = c->input(6);
 
     // antenna1
     TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(antenna1, 2, &input),
@@ -46,6 +47,11 @@ auto sum_coherencies_shape_function = [](InferenceContext* c) {
         "sgn_brightness shape must be [nsrc, ntime] but is " +
         c->DebugString(sgn_brightness));
 
+    // flag
+    TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(flag, 3, &input),
+        "flag shape must be [ntime, nbl, nchan] but is " +
+        c->DebugString(flag));
+
     // base_coherencies
     TF_RETURN_WITH_CONTEXT_IF_ERROR(c->WithRank(base_coherencies, 4, &input),
         "base_coherencies shape must be [ntime, nbl, nchan, npol] but is " +
@@ -72,6 +78,7 @@ REGISTER_OP("SumCoherencies")
     .Input("shape: FT")
     .Input("ant_jones: CT")
     .Input("sgn_brightness: int8")
+    .Input("flag: uint8")
     .Input("base_coherencies: CT")
     .Output("coherencies: CT")
     .Attr("FT: {double, float} = DT_FLOAT")
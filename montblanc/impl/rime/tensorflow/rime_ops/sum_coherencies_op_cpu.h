@@ -32,7 +32,8 @@ public:
         const tf::Tensor & in_shape = context->input(2);
         const tf::Tensor & in_ant_jones = context->input(3);
         const tf::Tensor & in_sgn_brightness = context->input(4);
-        const tf::Tensor & in_base_coherencies = context->input(5);
+        const tf::Tensor & in_flag = context->input(5);
+        const tf::Tensor & in_base_coherencies = context->input(6);
 
         int nsrc = in_shape.dim_size(0);
         int ntime = in_shape.dim_size(1);
@@ -54,6 +55,7 @@ public:
         auto shape = in_shape.tensor<FT, 4>();
         auto ant_jones = in_ant_jones.tensor<CT, 5>();
         auto sgn_brightness = in_sgn_brightness.tensor<tf::int8, 2>();
+        auto flag = in_flag.tensor<tf::uint8, 3>();
         auto base_coherencies = in_base_coherencies.tensor<CT, 4>();
         auto coherencies = coherencies_ptr->tensor<CT, 4>();
 
@@ -74,7 +76,12 @@ public:
                     CT s2 = base_coherencies(time, bl, chan, 2);
                     CT s3 = base_coherencies(time, bl, chan, 3);
 
-                    for(int src=0; src<nsrc; ++src)
+                    // Fully flagged visibilities are zeroed in
+                    // post-processing, don't bother summing sources
+                    int nsrc_ = flag(time, bl, chan) == ALL_POLS_FLAGGED ?
+                        0 : nsrc;
+
+                    for(int src=0; src<nsrc_; ++src)
                     {
                         // Reference antenna 1 jones
                         const CT & a0 = ant_jones(src, time, ant1, chan, 0);
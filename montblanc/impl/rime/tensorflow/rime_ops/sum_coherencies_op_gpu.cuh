@@ -45,6 +45,7 @@ __global__ void rime_sum_coherencies(
     const typename Traits::FT * shape,
     const typename Traits::ant_jones_type * ant_jones,
     const typename Traits::sgn_brightness_type * sgn_brightness,
+    const typename Traits::flag_type * flag,
     const typename Traits::vis_type * base_coherencies,
     typename Traits::vis_type * coherencies,
     int nsrc, int ntime, int nbl, int na, int nchan, int npolchan)
@@ -73,6 +74,13 @@ __global__ void rime_sum_coherencies(
     i = (time*nbl + bl)*npolchan + polchan;
     CT coherency = base_coherencies[i];
 
+    // Fully flagged visibilities are zeroed in post-processing,
+    // don't bother summing sources. All polarisation threads
+    // of a channel take the same branch.
+    i = (time*nbl + bl)*nchan + chan;
+    if(flag[i] == ALL_POLS_FLAGGED)
+        { nsrc = 0; }
+
     // Sum over visibilities
     for(int src=0; src < nsrc; ++src)
     {
@@ -128,7 +136,8 @@ public:
         const tf::Tensor & in_shape = context->input(2);
         const tf::Tensor & in_ant_jones = context->input(3);
         const tf::Tensor & in_sgn_brightness = context->input(4);
-        const tf::Tensor & in_base_coherencies = context->input(5);
+        const tf::Tensor & in_flag = context->input(5);
+        const tf::Tensor & in_base_coherencies = context->input(6);
 
         int nsrc = in_shape.dim_size(0);
         int ntime = in_shape.dim_size(1);
@@ -159,6 +168,8 @@ public:
             in_ant_jones.flat<CT>().data());
         auto sgn_brightness = reinterpret_cast<const typename Tr::sgn_brightness_type *>(
             in_sgn_brightness.flat<tf::int8>().data());
+        auto flag = reinterpret_cast<const typename Tr::flag_type *>(
+            in_flag.flat<tf::uint8>().data());
         auto base_coherencies = reinterpret_cast<const typename Tr::vis_type *>(
             in_base_coherencies.flat<CT>().data());
         auto coherencies = reinterpret_cast<typename Tr::vis_type *>(
@@ -177,7 +188,7 @@ public:
         // Call the rime_sum_coherencies CUDA kernel
         rime_sum_coherencies<Tr><<<grid, block, 0, device.stream()>>>(
             antenna1, antenna2, shape, ant_jones, sgn_brightness,
-            base_coherencies, coherencies,
+            flag, base_coherencies, coherencies,
             nsrc, ntime, nbl, na, nchan, npolchan);
     }
 };
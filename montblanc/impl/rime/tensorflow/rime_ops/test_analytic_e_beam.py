@@ -0,0 +1,97 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.client import device_lib
+
+class TestAnalyticEBeam(unittest.TestCase):
+    """ Tests the AnalyticEBeam operator """
+
+    def setUp(self):
+        # Load the rime operation library
+        from montblanc.impl.rime.tensorflow import load_tf_lib
+        self.rime = load_tf_lib()
+        # Obtain a list of GPU device specifications ['/gpu:0', '/gpu:1', ...]
+        self.gpu_devs = [d.name for d in device_lib.list_local_devices()
+                                if d.device_type == 'GPU']
+
+    def test_analytic_e_beam(self):
+        """ Test the AnalyticEBeam operator """
+        # List of type constraint for testing this operator
+        type_permutations = [
+            [np.float32, np.complex64, 'cos3', 65e-9],
+            [np.float64, np.complex128, 'cos3', 65e-9],
+            [np.float32, np.complex64, 'airy', 13.5],
+            [np.float64, np.complex128, 'airy', 13.5],
+            [np.float32, np.complex64, 'gaussian', 13.5],
+            [np.float64, np.complex128, 'gaussian', 13.5],
+        ]
+
+        # Run test with the type combinations above
+        for FT, CT, beam_model, beam_parameter in type_permutations:
+            self._impl_test_analytic_e_beam(FT, CT,
+                beam_model, beam_parameter)
+
+    def _impl_test_analytic_e_beam(self, FT, CT, beam_model, beam_parameter):
+        """ Implementation of the AnalyticEBeam operator test """
+        from montblanc.impl.rime.numpy import rime_kernels as np_rime
+
+        nsrc, ntime, na, nchan = 20, 29, 14, 64
+
+        # Useful random floats functor
+        rf = lambda *s: np.random.random(size=s).astype(FT)
+
+        # Set up our numpy input arrays
+        lm = (rf(nsrc, 2) - 0.5) * 1e-1
+        frequency = np.linspace(1e9, 2e9, nchan,dtype=FT)
+        point_errors = (rf(ntime, na, nchan, 2) - 0.5) * 1e-2
+        antenna_scaling = rf(na, nchan, 2)
+        parallactic_angle = np.deg2rad(rf(ntime, na))
+        parallactic_angle_sin = np.sin(parallactic_angle)
+        parallactic_angle_cos = np.cos(parallactic_angle)
+
+        # Argument list
+        np_args = [lm, frequency, point_errors, antenna_scaling,
+                     parallactic_angle_sin, parallactic_angle_cos]
+        # Argument string name list
+        arg_names = ["lm", "frequency", "point_errors", "antenna_scaling",
+                     "parallactic_angle_sin", "parallactic_angle_cos"]
+
+        # Constructor tensorflow variables
+        tf_args = [tf.Variable(v, name=n) for v, n in zip(np_args, arg_names)]
+
+        def _pin_op(device, *tf_args):
+            """ Pin operation to device """
+            with tf.device(device):
+                return self.rime.analytic_e_beam(*tf_args, CT=CT,
+                    beam_model=beam_model, beam_parameter=beam_parameter)
+
+        # Pin operation to CPU
+        cpu_op = _pin_op('/cpu:0', *tf_args)
+
+        # Run the op on all GPUs
+        gpu_ops = [_pin_op(d, *tf_args) for d in self.gpu_devs]
+
+        # Initialise variables
+        init_op = tf.global_variables_initializer()
+
+        with tf.Session() as S:
+            S.run(init_op)
+
+            cpu_ejones = S.run(cpu_op)
+
+            # Compare with the NumPy kernel
+            np_ejones = np_rime.analytic_e_beam(*np_args, CT=CT,
+                beam_model=beam_model, beam_parameter=beam_parameter)
+
+            rtol = 1e-4 if FT == np.float32 else 1e-7
+            self.assertTrue(np.allclose(cpu_ejones, np_ejones,
+                                        rtol=rtol, atol=rtol))
+
+            # Compare with GPU ejones
+            for gpu_ejones in S.run(gpu_ops):
+                self.assertTrue(np.allclose(cpu_ejones, gpu_ejones,
+                                            rtol=rtol, atol=rtol))
+
+if __name__ == "__main__":
+    unittest.main()
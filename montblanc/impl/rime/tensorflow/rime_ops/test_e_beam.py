@@ -30,6 +30,7 @@ class TestEBeam(unittest.TestCase):
         """ Implementation of the EBeam operator test """
 
         nsrc, ntime, na, nchan = 20, 29, 14, 64
+        beam_nb = 2
         beam_lw = beam_mh = beam_nud = 50
 
         # Useful random floats functor
@@ -46,16 +47,17 @@ class TestEBeam(unittest.TestCase):
         parallactic_angle_cos = np.cos(parallactic_angle)
         beam_extents = FT([-0.9, -0.8, 1e9, 0.8, 0.9, 2e9])
         beam_freq_map = np.linspace(1e9, 2e9, beam_nud, dtype=FT, endpoint=True)
-        e_beam = rc(beam_lw, beam_mh, beam_nud, 4)
+        e_beam = rc(beam_nb, beam_lw, beam_mh, beam_nud, 4)
+        antenna_beam = np.random.randint(0, beam_nb, size=na).astype(np.int32)
 
         # Argument list
         np_args = [lm, frequency, point_errors, antenna_scaling,
                      parallactic_angle_sin, parallactic_angle_cos,
-                     beam_extents, beam_freq_map, e_beam]
+                     beam_extents, beam_freq_map, e_beam, antenna_beam]
         # Argument string name list
         arg_names = ["lm", "frequency", "point_errors", "antenna_scaling",
                      "parallactic_angle_sin", "parallactic_angle_cos",
-                     "beam_extents", "beam_freq_map", "e_beam"]
+                     "beam_extents", "beam_freq_map", "e_beam", "antenna_beam"]
 
         # Constructor tensorflow variables
         tf_args = [tf.Variable(v, name=n) for v, n in zip(np_args, arg_names)]
@@ -107,5 +109,39 @@ class TestEBeam(unittest.TestCase):
                         pi=proportion_incorrect, i=incorrect,
                         t=d.size, pa=proportion_acceptable))
 
+    def test_invalid_antenna_beam(self):
+        """ Test that CPU and GPU operators reject invalid beam indices """
+        FT, CT = np.float32, np.complex64
+        nsrc, ntime, na, nchan = 2, 3, 4, 8
+        beam_nb = 2
+        beam_lw = beam_mh = beam_nud = 10
+
+        np_args = [np.zeros((nsrc, 2), FT),
+            np.linspace(1e9, 2e9, nchan, dtype=FT),
+            np.zeros((ntime, na, nchan, 2), FT),
+            np.ones((na, nchan, 2), FT),
+            np.zeros((ntime, na), FT),
+            np.ones((ntime, na), FT),
+            FT([-0.9, -0.8, 1e9, 0.8, 0.9, 2e9]),
+            np.linspace(1e9, 2e9, beam_nud, dtype=FT, endpoint=True),
+            np.ones((beam_nb, beam_lw, beam_mh, beam_nud, 4), CT),
+            np.int32([0, 1, beam_nb, 0])]
+
+        tf_args = [tf.Variable(v) for v in np_args]
+
+        def _pin_op(device, *tf_args):
+            """ Pin operation to device """
+            with tf.device(device):
+                return self.rime.e_beam(*tf_args)
+
+        ops = [_pin_op(d, *tf_args) for d in ['/cpu:0'] + self.gpu_devs]
+
+        with tf.Session() as S:
+            S.run(tf.global_variables_initializer())
+
+            for op in ops:
+                with self.assertRaises(tf.errors.InvalidArgumentError):
+                    S.run(op)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -27,11 +27,16 @@ class TestPostProcessVisibilities(unittest.TestCase):
             [np.float32, np.complex64],
             [np.float64, np.complex128]]
 
+        # Per-channel weights and weights broadcast
+        # over bands of channels, or all channels
+        weight_channels = [16, 4, 1]
+
         # Run test with the type combinations above
-        for FT, CT in type_permutations:
-            self._impl_test_post_process_visibilities(FT, CT)
+        for (FT, CT), nwchan in itertools.product(type_permutations,
+                                                weight_channels):
+            self._impl_test_post_process_visibilities(FT, CT, nwchan)
 
-    def _impl_test_post_process_visibilities(self, FT, CT):
+    def _impl_test_post_process_visibilities(self, FT, CT, nwchan):
         """ Implementation of the PostProcessVisibilities operator test """
 
         ntime, nbl, na, nchan = 100, 21, 7, 16
@@ -45,9 +50,10 @@ class TestPostProcessVisibilities(unittest.TestCase):
         antenna2 = np.random.randint(low=0, high=na,
             size=[ntime, nbl]).astype(np.int32)
         direction_independent_effects = rc(size=[ntime, na, nchan, 4])
-        flag = np.random.randint(low=0, high=2,
-            size=[ntime, nbl, nchan, 4]).astype(np.uint8)
-        weight = rf(size=[ntime, nbl, nchan, 4])
+        # Polarisation flag bitmask
+        flag = np.random.randint(low=0, high=16,
+            size=[ntime, nbl, nchan]).astype(np.uint8)
+        weight = rf(size=[ntime, nbl, nwchan, 4])
         base_vis = rc(size=[ntime, nbl, nchan, 4])
         model_vis = rc(size=[ntime, nbl, nchan, 4])
         observed_vis = rc(size=[ntime, nbl, nchan, 4])
@@ -69,6 +75,13 @@ class TestPostProcessVisibilities(unittest.TestCase):
         # Pin operation to CPU
         cpu_op = _pin_op('/cpu:0', *tf_args)
 
+        # Expand broadcast weights across channels
+        # and pin the operation to the CPU
+        full_weight = np.repeat(weight, nchan // nwchan, axis=2)
+        full_args = [tf.constant(full_weight) if n == 'weight' else a
+            for a, n in zip(tf_args, arg_names)]
+        full_cpu_op = _pin_op('/cpu:0', *full_args)
+
         # Run the op on all GPUs
         gpu_ops = [_pin_op(d, *tf_args) for d in self.gpu_devs]
 
@@ -81,6 +94,11 @@ class TestPostProcessVisibilities(unittest.TestCase):
             # Get the CPU visiblities and chi squared
             cpu_vis, cpu_X2 = S.run(cpu_op)
 
+            # Broadcast weights should match expanded weights
+            full_vis, full_X2 = S.run(full_cpu_op)
+            self.assertTrue(np.allclose(cpu_vis, full_vis))
+            self.assertTrue(np.allclose(cpu_X2, full_X2))
+
             # Compare against the gpu visibilities and chi squared values
             for gpu_vis, gpu_X2 in S.run(gpu_ops):
                 self.assertTrue(np.allclose(cpu_vis, gpu_vis))
@@ -45,14 +45,17 @@ class TestSumCoherencies(unittest.TestCase):
         np_shape = rf(size=(nsrc, ntime, nbl, nchan))
         np_ant_jones = rc(size=(nsrc, ntime, na, nchan, 4))
         np_sgn_brightness = np.random.randint(0, 3, size=(nsrc, ntime), dtype=np.int8) - 1
+        # Polarisation flag bitmask
+        np_flag = np.random.randint(0, 16, size=(ntime, nbl, nchan),
+            dtype=np.uint8)
         np_base_coherencies =  rc(size=(ntime, nbl, nchan, 4))
 
         # Argument list
         np_args = [np_ant1, np_ant2, np_shape, np_ant_jones,
-            np_sgn_brightness, np_base_coherencies]
+            np_sgn_brightness, np_flag, np_base_coherencies]
         # Argument string name list
         arg_names = ['antenna1', 'antenna2', 'shape', 'ant_jones',
-            'sgn_brightness', 'base_coherencies']
+            'sgn_brightness', 'flag', 'base_coherencies']
         # Constructor tensorflow variables
         tf_args = [tf.Variable(v, name=n) for v, n in zip(np_args, arg_names)]
 
@@ -76,6 +79,11 @@ class TestSumCoherencies(unittest.TestCase):
             # Get the CPU coherencies
             cpu_coherencies = S.run(cpu_op)
 
+            # Sources are not summed for fully flagged visibilities
+            all_flagged = np_flag == 0xF
+            self.assertTrue(np.all(cpu_coherencies[all_flagged] ==
+                np_base_coherencies[all_flagged]))
+
             # Compare against the GPU coherencies
             for gpu_coherencies in S.run(gpu_ops):
                 self.assertTrue(np.allclose(cpu_coherencies, gpu_coherencies))
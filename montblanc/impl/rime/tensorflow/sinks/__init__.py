@@ -22,4 +22,6 @@ from montblanc.impl.rime.tensorflow.sinks.sink_provider import (SinkProvider,
     find_sinks)
 from montblanc.impl.rime.tensorflow.sinks.null_sink_provider import NullSinkProvider
 from montblanc.impl.rime.tensorflow.sinks.ms_sink_provider import MSSinkProvider
+from montblanc.impl.rime.tensorflow.sinks.multi_ms_sink_provider import (
+    MultiMSSinkProvider)
 from montblanc.impl.rime.tensorflow.sinks.sink_context import SinkContext
\ No newline at end of file
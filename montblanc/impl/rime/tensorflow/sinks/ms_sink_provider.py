@@ -20,10 +20,13 @@
 
 import sys
 
+import numpy as np
+
 import montblanc
 
 from montblanc.impl.rime.tensorflow.sinks.sink_provider import SinkProvider
 import montblanc.impl.rime.tensorflow.ms.ms_manager as MS
+from montblanc.impl.rime.tensorflow.ms.write_behind import WriteBehindBuffer
 
 class MSSinkProvider(SinkProvider):
     """
@@ -31,7 +34,8 @@ class MSSinkProvider(SinkProvider):
     montblanc
     """
 
-    def __init__(self, manager, vis_column=None):
+    def __init__(self, manager, vis_column=None,
+            write_buffer_size=256*1024*1024):
         """
         Constructs an MSSinkProvider object
 
@@ -42,15 +46,44 @@ class MSSinkProvider(SinkProvider):
             the Measurement Set.
         vis_column: str
             Column to which model visibilities will be read
+        write_buffer_size: integer
+            Maximum number of bytes of model visibilities buffered
+            for writing by a background I/O thread. Adjacent row
+            ranges are coalesced into larger writes.
+            0 writes synchronously.
         """
 
         self._manager = manager
         self._name = "Measurement Set '{ms}'".format(ms=manager.msname)
         self._vis_column = ('CORRECTED_DATA' if vis_column is None else vis_column)
+        self._write_buffer_size = write_buffer_size
+        self._write_buffer = None
 
     def name(self):
         return self._name
 
+    def start(self, start_context):
+        if self._write_buffer_size > 0:
+            self._write_buffer = WriteBehindBuffer(
+                self._manager.ordered_main_table,
+                self._write_buffer_size,
+                lock=self._manager.write_lock)
+
+    def stop(self, stop_context):
+        """ Flush buffered writes, raising any write exceptions """
+        if self._write_buffer is None:
+            return
+
+        write_buffer, self._write_buffer = self._write_buffer, None
+        write_buffer.close()
+
+        montblanc.log.info("{n} coalesced {s[writes]} model visibility "
+            "writes into {s[table_writes]}.".format(n=self._name,
+                s=write_buffer.stats()))
+
+    def close(self):
+        self.stop(None)
+
     def model_vis(self, context):
         """ model visibility data sink """
         column = self._vis_column
@@ -79,11 +112,32 @@ class MSSinkProvider(SinkProvider):
 
             msshape = [-1] + guessed_shape
 
-        lrow, urow = MS.row_extents(context)
-
-        self._manager.ordered_main_table.putcol(column,
-            context.data.reshape(msshape),
-            startrow=lrow, nrow=urow-lrow)
+        row_index = self._manager.row_index
+
+        if row_index is None:
+            lrow, urow = MS.row_extents(context)
+            self._write(column, context.data.reshape(msshape),
+                lrow, urow-lrow)
+            return
+
+        # Irregular fields only write rows present in the tile,
+        # in runs of consecutive rows
+        lrow, urow, rows, mask = MS.tile_rows(row_index, context)
+        data = context.data.reshape(mask.shape + tuple(msshape[1:]))[mask]
+        runs = np.split(np.arange(rows.size),
+            np.nonzero(np.diff(rows) != 1)[0] + 1)
+
+        for run in (r for r in runs if r.size > 0):
+            self._write(column, data[run], rows[run[0]], run.size)
+
+    def _write(self, column, data, startrow, nrow):
+        """ Write rows of column, through the write buffer if present """
+        if self._write_buffer is not None:
+            self._write_buffer.write(column, data, startrow, nrow)
+        else:
+            with self._manager.write_lock:
+                self._manager.ordered_main_table.putcol(column, data,
+                    startrow=startrow, nrow=nrow)
 
     def __str__(self):
         return self.__class__.__name__
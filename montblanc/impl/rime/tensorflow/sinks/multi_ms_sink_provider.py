@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import types
+
+import montblanc
+import montblanc.impl.rime.tensorflow.ms.ms_manager as MS
+from montblanc.impl.rime.tensorflow.sinks.sink_provider import SinkProvider
+from montblanc.impl.rime.tensorflow.sinks.sink_context import SinkContext
+from montblanc.impl.rime.tensorflow.start_context import StartContext
+
+def _route(name):
+    """
+    Returns a method routing the name data sink
+    to the Measurement Set providers
+    """
+    def router(self, context):
+        return self._route(name, context)
+
+    router.__name__ = name
+    return router
+
+def _channel_slice(array, schema, channels):
+    """ Slice the channels of array, if its schema has a channel dimension """
+    shape = getattr(schema, 'shape', ())
+
+    if 'nchan' not in shape:
+        return array
+
+    idx = [slice(None)]*array.ndim
+    idx[shape.index('nchan')] = channels
+    return array[tuple(idx)]
+
+class MultiMSSinkProvider(SinkProvider):
+    """
+    Supplies the tiles of a problem presented by a
+    :py:class:`.MultiMSSourceProvider` to the sink providers
+    of each Measurement Set.
+
+    Data with a channel dimension, such as ``model_vis``, is split
+    along its channels, and each Measurement Set's share is supplied
+    to its provider with a context describing its own channels
+    (see :func:`.band_cube`), along with its share of the input data.
+    Other data, such as ``chi_squared``, describes the combined
+    problem and is supplied unchanged to each provider
+    with a sink for it.
+    """
+    def __init__(self, providers, source_provider):
+        """
+        Parameters
+        ----------
+        providers: list of :py:class:`.SinkProvider`
+            Providers of each Measurement Set, in the channel
+            order of source_provider, such as
+            :py:class:`.MSSinkProvider`'s
+        source_provider: :py:class:`.MultiMSSourceProvider`
+            Source provider describing the channels
+            of each Measurement Set
+        """
+        if len(providers) != len(source_provider.channel_bands()):
+            raise ValueError("'{s}' presents {n} Measurement Sets but "
+                "{p} sink providers were supplied".format(
+                    s=source_provider.name(), p=len(providers),
+                    n=len(source_provider.channel_bands())))
+
+        self._providers = providers
+        self._prov_sinks = [p.sinks() for p in providers]
+        self._source_provider = source_provider
+        self._channel_bands = None
+
+        names = set(n for s in self._prov_sinks for n in s.iterkeys())
+
+        for n in names:
+            setattr(self, n, types.MethodType(_route(n), self))
+
+    def _route(self, name, ctx):
+        """
+        Supplies each Measurement Set's share of the
+        channels of ctx to the name data sink of its provider
+        """
+        channel_bands = self._channel_bands
+
+        if channel_bands is None:
+            channel_bands = self._source_provider.channel_bands()
+
+        cube = ctx._cube
+        schema = getattr(ctx.array_schema, 'shape', ())
+
+        if 'nchan' not in schema:
+            for sinks in self._prov_sinks:
+                if name in sinks:
+                    sinks[name](ctx)
+
+            return
+
+        for i, band_cube, channels in MS.band_tiles(cube, channel_bands):
+            sink = self._prov_sinks[i].get(name, None)
+
+            if sink is None:
+                continue
+
+            input_cache = { n: _channel_slice(a, cube.array(n)
+                    if n in cube.arrays() else None, channels)
+                for n, a in (ctx.input or {}).iteritems() }
+
+            sink(SinkContext(name, band_cube, ctx.cfg, ctx.iter_args,
+                ctx.array_schema, _channel_slice(ctx.data, ctx.array_schema,
+                    channels), input_cache))
+
+    def name(self):
+        sub_prov_names = ', '.join([p.name() for p in self._providers])
+        return 'MultiMS({})'.format(sub_prov_names)
+
+    def init(self, init_context):
+        """ Perform any initialisation required """
+        for p in self._providers:
+            p.init(init_context)
+
+    def start(self, start_context):
+        """
+        Perform any logic on solution start, describing
+        the channels of its Measurement Set to each provider
+        """
+        self._channel_bands = self._source_provider.channel_bands()
+
+        for p, bands in zip(self._providers, self._channel_bands):
+            if isinstance(start_context, StartContext):
+                p.start(StartContext(MS.band_cube(start_context.cube, bands),
+                    start_context.cfg, start_context.iter_args))
+            else:
+                p.start(start_context)
+
+    def stop(self, stop_context):
+        """ Perform any logic on solution stop """
+        for p in self._providers:
+            p.stop(stop_context)
+
+    def close(self):
+        for p in self._providers:
+            p.close()
+
+    def clear_cache(self):
+        for p in self._providers:
+            p.clear_cache()
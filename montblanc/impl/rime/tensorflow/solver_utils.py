@@ -0,0 +1,662 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import hashlib
+import sys
+import threading
+import types
+
+import attr
+import numpy as np
+
+import montblanc
+import montblanc.util as mbu
+from montblanc.src_types import source_var_types
+
+from .sources import DefaultsSourceProvider
+from .sources.defaults_source_provider import BoundedCache
+
+ONE_KB, ONE_MB, ONE_GB = 1024, 1024**2, 1024**3
+
+# Flags are transported to the compute graph as a per-visibility
+# polarisation bitmask, bit p being set if polarisation p is flagged
+ALL_POLS_FLAGGED = 0xF
+
+# Arrays that data sources may supply per band, with an 'nbands'
+# dimension in place of 'nchan', or per row, with no 'nchan'
+# dimension at all. These are broadcast across channels
+# in the compute graph
+CHANNEL_BROADCAST_ARRAYS = frozenset(['weight'])
+
+# Dimensions of the E beam cubes. Updates to these from
+# source providers are ignored when an analytic beam model
+# is configured, as no beam cube is then required
+BEAM_CUBE_DIMS = ('beam_nb', 'beam_lw', 'beam_mh', 'beam_nud')
+
+# Default parameters of the analytic beam models.
+# The cos3 frequency scaling in rad^-1 Hz^-1 and the
+# dish diameter in metres for the airy and gaussian models
+ANALYTIC_BEAM_PARAMETERS = {
+    'cos3': 65e-9,
+    'airy': 13.5,
+    'gaussian': 13.5,
+}
+
+DataSource = attr.make_class("DataSource", ['source', 'dtype', 'name'],
+    slots=True, frozen=True)
+DataSink = attr.make_class("DataSink", ['sink', 'name'],
+    slots=True, frozen=True)
+
+class DataSourceCopies(object):
+    """
+    Keep track of the number of copies made by the solver
+    when conforming data source arrays to their expected
+    shape and dtype, per array
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._copies = collections.Counter()
+
+    def get(self):
+        with self._lock:
+            return self._copies.copy()
+
+    def increment(self, name):
+        with self._lock:
+            self._copies[name] += 1
+
+    def reset(self):
+        with self._lock:
+            self._copies.clear()
+
+def _create_tile_cache(slvr_cfg):
+    """
+    Creates a cache of tile results, bounded by the
+    'tile_cache_bytes' option, or None if it is disabled
+    """
+    tile_cache_bytes = slvr_cfg.get('tile_cache_bytes', 0)
+
+    if tile_cache_bytes == 0:
+        return None
+
+    montblanc.log.info("Caching tile results in up to {b}".format(
+        b=mbu.fmt_bytes(tile_cache_bytes)))
+
+    return BoundedCache(tile_cache_bytes)
+
+def _update_digest(sha, arrays):
+    """
+    Updates sha with the names, types, shapes
+    and contents of (name, array) pairs
+    """
+    for name, array in arrays:
+        array = np.ascontiguousarray(array)
+        sha.update(name)
+        sha.update(array.dtype.str)
+        sha.update(repr(array.shape))
+        sha.update(array.view(np.uint8).data)
+
+def _solve_digest(cube, feed_once):
+    """
+    Returns a SHA1 hex digest of the inputs shared by all tiles
+    of a solution: arrays fed once, source counts and properties
+    """
+    sha = hashlib.sha1()
+    _update_digest(sha, sorted(feed_once.iteritems()))
+    sha.update(repr([(n, cube.dim_global_size(n))
+        for n in ['nsrc'] + mbu.source_nr_vars()]))
+    sha.update(repr(sorted((n, getattr(cube, n))
+        for n in cube.properties())))
+
+    return sha.hexdigest()
+
+def _tile_key(solve_digest, arrays):
+    """
+    Returns a key identifying the result of a tile, given the digest of
+    its solution and the (name, array) pairs fed for the tile
+    """
+    sha = hashlib.sha1(solve_digest)
+    _update_digest(sha, arrays)
+    return sha.hexdigest()
+
+def _cache_tile(tile_cache, key, model_vis, chi_squared):
+    """ Caches read-only tile results """
+    model_vis, chi_squared = np.copy(model_vis), np.copy(chi_squared)
+    model_vis.flags.writeable = False
+    chi_squared.flags.writeable = False
+    tile_cache.put(key, (model_vis, chi_squared))
+
+def _log_tile_cache_stats(tile_cache):
+    """ Log tile cache statistics """
+    if tile_cache is None:
+        return
+
+    stats = tile_cache.stats()
+
+    montblanc.log.info("Tile cache: {h} hits, {m} misses "
+        "({r:.1%} hit rate), {e} entries in {b}".format(
+            h=stats['hits'], m=stats['misses'], r=stats['hit_rate'],
+            e=stats['entries'], b=mbu.fmt_bytes(stats['nbytes'])))
+
+def _create_defaults_source_provider(cube, data_source):
+    """
+    Create a DefaultsSourceProvider object. This provides default
+    data sources for each array defined on the hypercube. The data sources
+    may either by obtained from the arrays 'default' data source
+    or the 'test' data source.
+    """
+    from montblanc.impl.rime.tensorflow.sources import (
+        find_sources, DEFAULT_ARGSPEC)
+    from montblanc.impl.rime.tensorflow.sources import constant_cache
+
+    # Obtain default data sources for each array,
+    # Just take from defaults if test data isn't specified
+    staging_area_data_source = ('default' if not data_source == 'test'
+                                                      else data_source)
+
+    cache = True
+
+    default_prov = DefaultsSourceProvider(cache=cache)
+
+    # Create data sources on the source provider from
+    # the cube array data sources
+    for n, a in cube.arrays().iteritems():
+        # Unnecessary for temporary arrays
+        if 'temporary' in a.tags:
+            continue
+
+        # Obtain the data source
+        data_source = a.get(staging_area_data_source)
+
+        # Array marked as constant, decorate the data source
+        # with a constant caching decorator
+        if cache is True and 'constant' in a.tags:
+            data_source = constant_cache(data_source)
+
+        method = types.MethodType(data_source, default_prov)
+        setattr(default_prov, n, method)
+
+    def _sources(self):
+        """
+        Override the sources method to also handle lambdas that look like
+        lambda s, c: ..., as defined in the config module
+        """
+
+        try:
+            return self._sources
+        except AttributeError:
+            self._sources = find_sources(self, [DEFAULT_ARGSPEC] + [['s', 'c']])
+
+        return self._sources
+
+    # Monkey patch the sources method
+    default_prov.sources = types.MethodType(_sources, default_prov)
+
+    return default_prov
+
+def _analytic_beam(slvr_cfg):
+    """
+    Returns a (beam_model, beam_parameter) tuple if the solver
+    configuration specifies an analytic beam model,
+    otherwise None if the beam is interpolated from a cube
+    """
+    beam_model = slvr_cfg.get('beam_model', 'cube')
+
+    if beam_model == 'cube':
+        return None
+
+    beam_parameter = slvr_cfg.get('beam_parameter', None)
+
+    if beam_parameter is None:
+        beam_parameter = ANALYTIC_BEAM_PARAMETERS[beam_model]
+
+    return beam_model, float(beam_parameter)
+
+def _pack_flags(flag):
+    """
+    Packs a (ntime, nbl, nchan, npol) flag array into a
+    (ntime, nbl, nchan) polarisation bitmask,
+    bit p being set if polarisation p is flagged
+    """
+    packed = np.zeros(flag.shape[:-1], dtype=np.uint8)
+
+    for p in range(flag.shape[-1]):
+        packed |= (flag[...,p] != 0).astype(np.uint8) << p
+
+    return packed
+
+def _expected_shapes(context):
+    """
+    Return the shapes that the data source associated
+    with the context may produce
+    """
+    shapes = [context.shape]
+
+    if context.name not in CHANNEL_BROADCAST_ARRAYS:
+        return shapes
+
+    # Substitute, then remove the channel dimension
+    chan = context.array_schema.shape.index('nchan')
+    shape = list(context.shape)
+    shape[chan] = context.dim_extent_size('nbands')
+    shapes.append(tuple(shape))
+    del shape[chan]
+    shapes.append(tuple(shape))
+
+    return shapes
+
+def _row_layouts(context, expected_shapes):
+    """
+    Return (layout, shape) pairs, describing layouts
+    of data which may be reshaped to an expected shape.
+
+    Each expected shape is its own layout. Measurement Set rows hold
+    the channels of a single band, so the channel dimension of
+    the array is also laid out as (nbands, channels per band).
+    """
+    layouts = [(s, s) for s in expected_shapes]
+    schema = context.array_schema.shape
+
+    if 'nchan' not in schema or 'nbands' not in context.dimensions(copy=False):
+        return layouts
+
+    chan = schema.index('nchan')
+    nbands = context.dim_extent_size('nbands')
+    shape = tuple(context.shape)
+
+    if nbands > 0 and shape[chan] % nbands == 0:
+        layout = (shape[:chan] + (nbands, shape[chan] // nbands)
+            + shape[chan+1:])
+        layouts.append((tuple(layout), shape))
+
+    return layouts
+
+def _is_row_layout(shape, layout):
+    """
+    Is shape the given layout, or the layout with its
+    leading dimensions merged into a single row dimension?
+    """
+    shape, layout = tuple(shape), tuple(layout)
+
+    return shape == layout or any(shape == (int(np.prod(layout[:k])),)
+        + layout[k:] for k in range(2, len(layout)+1))
+
+def _conform_data(data, context, expected_shapes, copies):
+    """
+    Conform data returned by a relaxed data source to
+    one of the expected shapes and the expected dtype.
+
+    Data is reshaped in C order if it has a row layout of an expected
+    shape (see :func:`_row_layouts` and :func:`_is_row_layout`),
+    otherwise it is broadcast to the full shape.
+    Data is copied at most once, and not at all if it
+    is contiguous and of the expected dtype
+    """
+    if not np.can_cast(data.dtype, context.dtype, casting='same_kind'):
+        raise TypeError("Data source '{n}' returned dtype '{rdt}' "
+            "which cannot be cast to '{edt}'".format(
+                n=context.name, rdt=data.dtype, edt=context.dtype))
+
+    shape = next((s for l, s in _row_layouts(context, expected_shapes)
+        if _is_row_layout(data.shape, l)), None)
+
+    if shape is None:
+        shape = context.shape
+
+        try:
+            data = np.broadcast_to(data, shape)
+        except ValueError:
+            raise ValueError("Data source '{n}' returned shape '{rsh}' "
+                "which is neither a row layout of, nor can be "
+                "broadcast to '{esh}'".format(
+                    n=context.name, rsh=data.shape,
+                    esh="' or '".join(str(s) for s in expected_shapes)))
+    # Zero copy case
+    elif data.dtype == context.dtype and data.flags.c_contiguous:
+        return data.reshape(shape)
+
+    # Single conversion, reshaping via a
+    # view on the contiguous result if necessary
+    result = np.empty(shape, dtype=context.dtype)
+    result.reshape(data.shape)[...] = data
+
+    copies.increment(context.name)
+
+    return result
+
+def _get_data(data_source, context, copies):
+    """ Get data from the data source, checking the return values """
+    try:
+        # Get data from the data source
+        data = data_source.source(context)
+        expected_shapes = _expected_shapes(context)
+
+        # Complain about None values
+        if data is None:
+            raise ValueError("'None' returned from "
+                "data source '{n}'".format(n=context.name))
+        # We want numpy arrays
+        elif not isinstance(data, np.ndarray):
+            raise TypeError("Data source '{n}' did not "
+                "return a numpy array, returned a '{t}'".format(
+                    t=type(data)))
+        # Relaxed data sources may return arrays
+        # that can be cast and reshaped or broadcast
+        elif getattr(data_source.source, 'relaxed', False):
+            data = _conform_data(data, context, expected_shapes, copies)
+        # Otherwise they should be the right shape and type
+        elif (data.shape not in expected_shapes
+                or data.dtype != context.dtype):
+            raise ValueError("Expected data of shape '{esh}' and "
+                "dtype '{edt}' for data source '{n}', but "
+                "shape '{rsh}' and '{rdt}' was found instead".format(
+                    n=context.name, edt=context.dtype,
+                    esh="' or '".join(str(s) for s in expected_shapes),
+                    rsh=data.shape, rdt=data.dtype))
+
+        return data
+
+    except Exception as e:
+        ex = ValueError("An exception occurred while "
+            "obtaining data from data source '{ds}'\n\n"
+            "{e}\n\n"
+            "{help}".format(ds=context.name,
+                e=str(e), help=context.help()))
+
+        raise ex, None, sys.exc_info()[2]
+
+def _supply_data(data_sink, context):
+    """ Supply data to the data sink """
+    try:
+        data_sink.sink(context)
+    except Exception as e:
+        ex = ValueError("An exception occurred while "
+            "supplying data to data sink '{ds}'\n\n"
+            "{e}\n\n"
+            "{help}".format(ds=context.name,
+                e=str(e), help=context.help()))
+
+        raise ex, None, sys.exc_info()[2]
+
+def _iter_args(iter_dims, cube):
+    iter_strides = cube.dim_extent_size(*iter_dims)
+    return zip(iter_dims, iter_strides)
+
+def _uniq_log2_range(start, size, div):
+    start = np.log2(start)
+    size = np.log2(size)
+    int_values = np.int32(np.logspace(start, size, div, base=2)[:-1])
+
+    return np.flipud(np.unique(int_values))
+
+def _budget(cube, slvr_cfg):
+    # Figure out a viable dimension configuration
+    # given the total problem size
+    mem_budget = slvr_cfg.get('mem_budget', 2*ONE_GB)
+    bytes_required = cube.bytes_required()
+
+    src_dims = mbu.source_nr_vars() + ['nsrc']
+    dim_names = ['na', 'nbl', 'ntime'] + src_dims
+    global_sizes = cube.dim_global_size(*dim_names)
+    na, nbl, ntime = global_sizes[:3]
+
+    # Keep track of original dimension sizes and any reductions that are applied
+    original_sizes = { r: s for r, s in zip(dim_names, global_sizes) }
+    applied_reductions = {}
+
+    def _reduction():
+        # Reduce over time first
+        trange = _uniq_log2_range(1, ntime, 5)
+        for t in trange[0:1]:
+            yield [('ntime', t)]
+
+        # Attempt reduction over source
+        sbs = slvr_cfg['source_batch_size']
+        srange = _uniq_log2_range(10, sbs, 5) if sbs > 10 else 10
+        src_dim_gs = global_sizes[3:]
+
+        for bs in srange:
+            yield [(d, bs if bs < gs else gs) for d, gs
+                in zip(src_dims, src_dim_gs)]
+
+        # Try the rest of the timesteps
+        for t in trange[1:]:
+            yield [('ntime', t)]
+
+        # Reduce by baseline
+        for bl in _uniq_log2_range(na, nbl, 5):
+            yield [('nbl', bl)]
+
+    for reduction in _reduction():
+        if bytes_required > mem_budget:
+            for dim, size in reduction:
+                applied_reductions[dim] = size
+                cube.update_dimension(dim, lower_extent=0, upper_extent=size)
+        else:
+            break
+
+        bytes_required = cube.bytes_required()
+
+    # Log some information about the memory_budget
+    # and dimension reduction
+    montblanc.log.info(("Selected a solver memory budget of {rb} "
+        "given a hard limit of {mb}.").format(
+        rb=mbu.fmt_bytes(bytes_required),
+        mb=mbu.fmt_bytes(mem_budget)))
+
+    if len(applied_reductions) > 0:
+        montblanc.log.info("The following dimension reductions "
+            "were applied:")
+
+        for k, v in applied_reductions.iteritems():
+            montblanc.log.info('{p}{d}: {id} => {rd}'.format
+                (p=' '*4, d=k, id=original_sizes[k], rd=v))
+    else:
+        montblanc.log.info("No dimension reductions were applied.")
+
+    return applied_reductions, bytes_required
+
+DimensionUpdate = attr.make_class("DimensionUpdate",
+    ['size', 'prov'], slots=True, frozen=True)
+
+def _apply_source_provider_dim_updates(cube, source_providers, budget_dims,
+                                                        ignored_dims=()):
+    """
+    Given a list of source_providers, apply the list of
+    suggested dimension updates given in provider.updated_dimensions()
+    to the supplied hypercube. Updates to dimensions in
+    ignored_dims are discarded.
+
+    Dimension global_sizes are always updated with the supplied sizes and
+    lower_extent is always set to 0. upper_extent is set to any reductions
+    (current upper_extents) existing in budget_dims, otherwise it is set
+    to global_size.
+
+    """
+    # Create a mapping between a dimension and a
+    # list of (global_size, provider_name) tuples
+    update_map = collections.defaultdict(list)
+
+    for prov in source_providers:
+        for dim_tuple in prov.updated_dimensions():
+            name, size = dim_tuple
+
+            # Don't accept any updates on the nsrc dimension
+            # This is managed internally
+            if name == 'nsrc':
+                continue
+
+            if name in ignored_dims:
+                montblanc.log.info("Ignoring update of dimension '{n}' "
+                    "from source provider '{p}'.".format(
+                        n=name, p=prov.name()))
+                continue
+
+            dim_update = DimensionUpdate(size, prov.name())
+            update_map[name].append(dim_update)
+
+    # No dimensions were updated, quit early
+    if len(update_map) == 0:
+        return cube.bytes_required()
+
+    # Ensure that the global sizes we receive
+    # for each dimension are unique. Tell the user
+    # when conflicts occur
+    update_list = []
+
+    for name, updates in update_map.iteritems():
+        if not all(updates[0].size == du.size for du in updates[1:]):
+            raise ValueError("Received conflicting "
+                "global size updates '{u}'"
+                " for dimension '{n}'.".format(n=name, u=updates))
+
+        update_list.append((name, updates[0].size))
+
+    montblanc.log.info("Updating dimensions {} from "
+                        "source providers.".format(str(update_list)))
+
+    # Now update our dimensions
+    for name, global_size in update_list:
+        # Defer to existing any existing budgeted extent sizes
+        # Otherwise take the global_size
+        extent_size = budget_dims.get(name, global_size)
+
+        # Take the global_size if extent_size was previously zero!
+        extent_size = global_size if extent_size == 0 else extent_size
+
+        # Clamp extent size to global size
+        if extent_size > global_size:
+            extent_size = global_size
+
+        # Update the dimension
+        cube.update_dimension(name,
+            global_size=global_size,
+            lower_extent=0,
+            upper_extent=extent_size)
+
+    # Handle global number of sources differently
+    # It's equal to the number of
+    # point's, gaussian's, sersic's combined
+    nsrc = sum(cube.dim_global_size(*mbu.source_nr_vars()))
+
+    # Extent size will be equal to whatever source type
+    # we're currently iterating over. So just take
+    # the maximum extent size given the sources
+    es = max(cube.dim_extent_size(*mbu.source_nr_vars()))
+
+    cube.update_dimension('nsrc',
+        global_size=nsrc,
+        lower_extent=0,
+        upper_extent=es)
+
+    # Return our cube size
+    return cube.bytes_required()
+
+def _setup_hypercube(cube, slvr_cfg, properties=True):
+    """
+    Sets up the hypercube given a solver configuration.
+
+    Properties are registered as descriptors on the HyperCube class,
+    which the solver's proxy metaclass relies upon. Cubes that are
+    not owned by a solver should pass properties=False.
+    """
+    mbu.register_default_dimensions(cube, slvr_cfg)
+
+    # Configure the dimensions of the beam cubes
+    cube.register_dimension('beam_nb', 1,
+                            description='Number of E Beam cubes')
+
+    cube.register_dimension('beam_lw', 2,
+                            description='E Beam cube l width')
+
+    cube.register_dimension('beam_mh', 2,
+                            description='E Beam cube m height')
+
+    cube.register_dimension('beam_nud', 2,
+                            description='E Beam cube nu depth')
+
+    # =========================================
+    # Register hypercube Arrays and Properties
+    # =========================================
+
+    from montblanc.impl.rime.tensorflow.config import (A, P)
+
+    def _massage_dtypes(A, T):
+        def _massage_dtype_in_dict(D):
+            new_dict = D.copy()
+            new_dict['dtype'] = mbu.dtype_from_str(D['dtype'], T)
+            return new_dict
+
+        return [_massage_dtype_in_dict(D) for D in A]
+
+    dtype = slvr_cfg['dtype']
+    is_f32 = dtype == 'float'
+
+    T = {
+        'ft' : np.float32 if is_f32 else np.float64,
+        'ct' : np.complex64 if is_f32 else np.complex128,
+        'int' : int,
+    }
+
+    if properties:
+        cube.register_properties(_massage_dtypes(P, T))
+
+    cube.register_arrays(_massage_dtypes(A, T))
+
+def _partition(iter_dims, data_sources):
+    """
+    Partition data sources into
+
+    1. Dictionary of data sources associated with radio sources.
+    2. List of data sources to feed multiple times.
+    3. List of data sources to feed once.
+    """
+
+    src_nr_vars = set(source_var_types().values())
+    iter_dims = set(iter_dims)
+
+    src_data_sources = collections.defaultdict(list)
+    feed_many = []
+    feed_once = []
+
+    for ds in data_sources:
+        # Is this data source associated with
+        # a radio source (point, gaussian, etc.?)
+        src_int = src_nr_vars.intersection(ds.shape)
+
+        if len(src_int) > 1:
+            raise ValueError("Data source '{}' contains multiple "
+                            "source types '{}'".format(ds.name, src_int))
+        elif len(src_int) == 1:
+            # Yep, record appropriately and iterate
+            src_data_sources[src_int.pop()].append(ds)
+            continue
+
+        # Are we feeding this data source multiple times
+        # (Does it possess dimensions on which we iterate?)
+        if len(iter_dims.intersection(ds.shape)) > 0:
+            feed_many.append(ds)
+            continue
+
+        # Assume this is a data source that we only feed once
+        feed_once.append(ds)
+
+    return src_data_sources, feed_many, feed_once
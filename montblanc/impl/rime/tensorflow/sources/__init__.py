@@ -20,10 +20,13 @@
 
 from .source_context import SourceContext
 from .source_provider import (SourceProvider, find_sources,
-                                DEFAULT_ARGSPEC)
+                                relaxed_source, DEFAULT_ARGSPEC)
 from .defaults_source_provider import (DefaultsSourceProvider,
                                 constant_cache, chunk_cache)
 from .ms_source_provider import MSSourceProvider
+from .multi_ms_source_provider import MultiMSSourceProvider
 from .np_source_provider import NumpySourceProvider
 from .fits_beam_source_provider import FitsBeamSourceProvider
-from .cached_source_provider import CachedSourceProvider
\ No newline at end of file
+from .cached_source_provider import CachedSourceProvider
+from .memmap_source_provider import MemmapSourceProvider
+from .process_source_provider import ProcessSourceProvider
\ No newline at end of file
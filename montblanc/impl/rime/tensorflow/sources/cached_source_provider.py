@@ -20,9 +20,15 @@
 
 import collections
 import functools
+import itertools
+import os
+import shutil
+import tempfile
 import threading
 import types
 
+import numpy as np
+
 import montblanc
 from .source_provider import SourceProvider
 
@@ -41,17 +47,9 @@ def _cache(method):
     def memoizer(self, context):
         # Construct the key for the given index
         idx = context.array_extents(context.name)
-        key = tuple(i for t in idx for i in t)
-
-        with self._lock:
-            # Access the sub-cache for this data source
-            array_cache = self._cache[context.name]
+        key = (context.name,) + tuple(i for t in idx for i in t)
 
-            # Cache miss, call the data source
-            if key not in array_cache:
-                array_cache[key] = method(context)
-
-            return array_cache[key]
+        return self._cached_call(key, method, context)
 
     return memoizer
 
@@ -65,12 +63,47 @@ def _proxy(method):
 
     return memoizer
 
+def _remove(filename):
+    """ Remove filename, ignoring failures """
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+def _nbytes(value):
+    """ Bytes held by a cached data source value """
+    return getattr(value, 'nbytes', 0)
+
+CacheSize = collections.namedtuple("CacheSize", "ram disk")
+
+# Distinguishes missing cache entries from cached None values
+_MISSING = object()
+
+class _Flight(object):
+    """ A data source call in progress, awaited by concurrent misses """
+    __slots__ = ('event', 'value', 'exception')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.exception = None
+
 class CachedSourceProvider(SourceProvider):
     """
-    Caches calls to data_sources on the listed providers
+    Caches calls to data_sources on the listed providers.
+
+    Values are held in a least recently used cache, optionally
+    bounded in bytes. Concurrent misses on the same key call
+    the data source once, and no lock is held while
+    the data source is called.
+
+    If a spill directory is supplied, arrays evicted from memory
+    are saved there as .npy files, in a second least recently used
+    tier. These are promoted back into memory when next requested.
     """
     def __init__(self, providers, cache_data_sources=None,
-                clear_start=False, clear_stop=False):
+                clear_start=False, clear_stop=False, max_bytes=None,
+                spill_dir=None, max_spill_bytes=None):
         """
         Parameters
         ----------
@@ -83,16 +116,69 @@ class CachedSourceProvider(SourceProvider):
             clear cache on start
         clear_stop: bool
             clear cache on stop
+        max_bytes: integer
+            Maximum number of bytes held in the cache. Least recently
+            used values are evicted to stay within it, and values
+            larger than it are not cached. Defaults to None in which
+            case the cache is unbounded.
+        spill_dir: str
+            Directory in which a private subdirectory holding arrays
+            evicted from memory is created. Defaults to None in
+            which case evicted values are discarded.
+        max_spill_bytes: integer
+            Maximum number of bytes held in the spill directory.
+            Least recently used files are removed to stay within it.
+            Defaults to None in which case it is unbounded.
         """
         if not isinstance(providers, collections.Sequence):
             providers = [providers]
 
-        self._cache = collections.defaultdict(dict)
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("max_bytes '{}' must be "
+                            "non-negative".format(max_bytes))
+
+        if max_spill_bytes is not None and max_spill_bytes < 0:
+            raise ValueError("max_spill_bytes '{}' must be "
+                            "non-negative".format(max_spill_bytes))
+
+        self._cache = collections.OrderedDict()
+        self._in_flight = {}
         self._lock = threading.Lock()
+        self._generation = 0
+        self._max_bytes = max_bytes
+        self._nbytes = 0
         self._clear_start = clear_start
         self._clear_stop = clear_stop
         self._providers = providers
 
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._evictions = 0
+        self._evicted_bytes = 0
+        self._uncached = 0
+
+        # Spilled values, keyed like the memory cache, are
+        # (filename, nbytes) tuples. Values in the process
+        # of being spilled are held in _spilling
+        self._spill_dir = None
+        self._max_spill_bytes = max_spill_bytes
+        self._spilled = collections.OrderedDict()
+        self._spilling = {}
+        self._spill_nbytes = 0
+        self._spill_ids = itertools.count()
+
+        self._spills = 0
+        self._promotions = 0
+        self._spill_evictions = 0
+
+        if spill_dir is not None:
+            if not os.path.exists(spill_dir):
+                os.makedirs(spill_dir)
+
+            self._spill_dir = tempfile.mkdtemp(prefix='cache-',
+                                                dir=spill_dir)
+
         # Construct a list of provider data sources
         prov_data_sources = { n: ds for prov in providers
                             for n, ds in prov.sources().iteritems() }
@@ -124,6 +210,187 @@ class CachedSourceProvider(SourceProvider):
             else:
                 setattr(self, n, types.MethodType(_proxy(ds), self))
 
+    def _cached_call(self, key, method, context):
+        """
+        Returns the cached value for key. On a miss, either call
+        the data source, promote the spilled value, or wait for
+        a concurrent call on the same key to complete.
+        """
+        with self._lock:
+            spill = []
+
+            try:
+                value = self._cache.pop(key)
+            except KeyError:
+                # Values being spilled are reinserted into memory
+                value = self._spilling.pop(key, _MISSING)
+
+                if value is not _MISSING:
+                    self._hits += 1
+                    spill = self._insert(key, value)
+            else:
+                # Reinsert as the most recently used value
+                self._cache[key] = value
+                self._hits += 1
+
+            if value is _MISSING:
+                flight = self._in_flight.get(key, None)
+                owner = flight is None
+
+                if owner:
+                    flight = self._in_flight[key] = _Flight()
+                    generation = self._generation
+                    spilled = self._spilled.pop(key, None)
+
+                    if spilled is None:
+                        self._misses += 1
+                    else:
+                        self._spill_nbytes -= spilled[1]
+                        self._promotions += 1
+                else:
+                    self._waits += 1
+
+        if value is not _MISSING:
+            self._spill(spill)
+            return value
+
+        # Another thread is calling the data source
+        if not owner:
+            flight.event.wait()
+
+            if flight.exception is not None:
+                raise flight.exception
+
+            return flight.value
+
+        succeeded = False
+        spill = []
+
+        try:
+            if spilled is None:
+                flight.value = method(context)
+            else:
+                flight.value = self._promote(spilled, method, context)
+
+            succeeded = True
+        except Exception as e:
+            flight.exception = e
+            raise
+        finally:
+            with self._lock:
+                # Don't cache values requested before a clear
+                if succeeded and generation == self._generation:
+                    spill = self._insert(key, flight.value)
+
+                if self._in_flight.get(key, None) is flight:
+                    del self._in_flight[key]
+
+            flight.event.set()
+
+        # Spill evicted values once waiters have been released
+        self._spill(spill)
+
+        return flight.value
+
+    def _insert(self, key, value):
+        """
+        Inserts value into the cache, evicting least recently
+        used values. Must be called with the lock held.
+
+        Returns a list of evicted (key, value) tuples
+        that should be passed to _spill.
+        """
+        nbytes = _nbytes(value)
+
+        if self._max_bytes is not None and nbytes > self._max_bytes:
+            self._uncached += 1
+            return []
+
+        self._cache[key] = value
+        self._nbytes += nbytes
+        spill = []
+
+        while self._max_bytes is not None and self._nbytes > self._max_bytes:
+            evicted_key, evicted = self._cache.popitem(last=False)
+            evicted_bytes = _nbytes(evicted)
+            self._nbytes -= evicted_bytes
+            self._evictions += 1
+            self._evicted_bytes += evicted_bytes
+
+            if (self._spill_dir is not None and
+                    isinstance(evicted, np.ndarray) and
+                    (self._max_spill_bytes is None or
+                        evicted_bytes <= self._max_spill_bytes)):
+                self._spilling[evicted_key] = evicted
+                spill.append((evicted_key, evicted))
+
+        return spill
+
+    def _spill(self, spill):
+        """
+        Saves evicted (key, value) tuples to the spill directory,
+        removing the least recently used files to stay within
+        max_spill_bytes. Must be called without the lock held.
+        """
+        for key, value in spill:
+            with self._lock:
+                filename = os.path.join(self._spill_dir,
+                    '{n}-{i}.npy'.format(n=key[0], i=next(self._spill_ids)))
+
+            try:
+                np.save(filename, value)
+            except (IOError, OSError) as e:
+                montblanc.log.warning("{n} failed to spill '{k}' "
+                    "to '{f}': {e}".format(n=self.name(), k=key,
+                                            f=filename, e=e))
+
+                with self._lock:
+                    if self._spilling.get(key, None) is value:
+                        del self._spilling[key]
+
+                _remove(filename)
+                continue
+
+            removed = []
+
+            with self._lock:
+                # Discard the file if the value was promoted
+                # or the cache cleared while it was saved
+                if self._spilling.get(key, None) is not value:
+                    removed.append(filename)
+                else:
+                    del self._spilling[key]
+                    self._spilled[key] = (filename, value.nbytes)
+                    self._spill_nbytes += value.nbytes
+                    self._spills += 1
+
+                    while (self._max_spill_bytes is not None and
+                            self._spill_nbytes > self._max_spill_bytes):
+                        _, (evicted, nbytes) = self._spilled.popitem(
+                                                            last=False)
+                        self._spill_nbytes -= nbytes
+                        self._spill_evictions += 1
+                        removed.append(evicted)
+
+            for filename in removed:
+                _remove(filename)
+
+    def _promote(self, spilled, method, context):
+        """
+        Loads a spilled value back into memory, removing its file.
+        Falls back to calling the data source if it can't be loaded.
+        """
+        filename, nbytes = spilled
+
+        try:
+            return np.load(filename)
+        except (IOError, OSError, ValueError) as e:
+            montblanc.log.warning("{n} failed to load spilled "
+                "'{f}': {e}".format(n=self.name(), f=filename, e=e))
+            return method(context)
+        finally:
+            _remove(filename)
+
     def init(self, init_context):
         """ Perform any initialisation required """
         for p in self._providers:
@@ -145,6 +412,22 @@ class CachedSourceProvider(SourceProvider):
         if self._clear_stop:
             self.clear_cache()
 
+    def reopen(self):
+        """
+        Reopen the cached providers in a forked process.
+        Values cached in memory are retained, but the spill
+        directory belongs to the parent process and is not used.
+        """
+        for p in self._providers:
+            p.reopen()
+
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._spill_dir = None
+        self._spilled = collections.OrderedDict()
+        self._spilling = {}
+        self._spill_nbytes = 0
+
     def updated_dimensions(self):
         """ Update the dimensions """
         return [d for p in self._providers
@@ -154,11 +437,52 @@ class CachedSourceProvider(SourceProvider):
         sub_prov_names = ', '.join([p.name() for p in self._providers])
         return 'Cache({})'.format(sub_prov_names)
 
+    def close(self):
+        """ Clear the cache, removing the spill directory """
+        self.clear_cache()
+
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
     def clear_cache(self):
         with self._lock:
             self._cache.clear()
+            # Calls in progress complete, but their values aren't cached
+            self._in_flight.clear()
+            self._generation += 1
+            self._nbytes = 0
+
+            removed = [f for f, _ in self._spilled.itervalues()]
+            self._spilled.clear()
+            self._spilling.clear()
+            self._spill_nbytes = 0
+
+        for filename in removed:
+            _remove(filename)
 
     def cache_size(self):
+        """
+        Returns a (ram, disk) tuple of the number of
+        bytes cached in memory and in the spill directory
+        """
+        with self._lock:
+            return CacheSize(self._nbytes, self._spill_nbytes)
+
+    def stats(self):
+        """ Returns a dictionary of cache statistics """
         with self._lock:
-            return sum(a.nbytes for k, v in self._cache.iteritems()
-                                for a in v.itervalues())
\ No newline at end of file
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'waits': self._waits,
+                'evictions': self._evictions,
+                'evicted_bytes': self._evicted_bytes,
+                'uncached': self._uncached,
+                'entries': len(self._cache),
+                'nbytes': self._nbytes,
+                'spills': self._spills,
+                'promotions': self._promotions,
+                'spill_evictions': self._spill_evictions,
+                'spill_entries': len(self._spilled),
+                'spill_nbytes': self._spill_nbytes,
+            }
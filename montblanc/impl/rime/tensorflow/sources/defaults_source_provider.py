@@ -20,13 +20,99 @@
 
 import collections
 import functools
+import threading
 import unittest
 
+import montblanc
 from montblanc.impl.rime.tensorflow.sources.source_provider import (
     SourceProvider,
     find_sources,
     DEFAULT_ARGSPEC)
 
+# Default byte limits of the constant and chunk caches
+DEFAULT_CONSTANT_CACHE_BYTES = 256*1024**2
+DEFAULT_CHUNK_CACHE_BYTES = 64*1024**2
+
+def _nbytes(value):
+    """ Bytes held by a cached array, or a tuple or list of arrays """
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+
+    return getattr(value, 'nbytes', 0)
+
+class BoundedCache(object):
+    """
+    Thread-safe least recently used cache, bounded in bytes.
+    Values larger than the bound are not cached.
+    """
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, default=None):
+        """ Returns the value cached for key, otherwise default """
+        with self._lock:
+            try:
+                value = self._cache.pop(key)
+            except KeyError:
+                self._misses += 1
+                return default
+
+            # Reinsert as the most recently used value
+            self._cache[key] = value
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Caches value for key, replacing any existing value """
+        nbytes = _nbytes(value)
+
+        with self._lock:
+            try:
+                self._nbytes -= _nbytes(self._cache.pop(key))
+            except KeyError:
+                pass
+
+            if nbytes > self._max_bytes:
+                return
+
+            self._cache[key] = value
+            self._nbytes += nbytes
+
+            while self._nbytes > self._max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._nbytes -= _nbytes(evicted)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._nbytes = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+    def stats(self):
+        """ Returns a dictionary of cache statistics """
+        with self._lock:
+            requests = self._hits + self._misses
+
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': (self._hits / float(requests)
+                                if requests > 0 else 0.0),
+                'evictions': self._evictions,
+                'entries': len(self._cache),
+                'nbytes': self._nbytes,
+            }
+
 def constant_cache(method):
     """
     Caches constant arrays associated with an array name.
@@ -51,21 +137,19 @@ def constant_cache(method):
         name = context.name
         cached = self._constant_cache.get(name, None)
 
-        # No cached value, call method and return
-        if cached is None:
-            data = self._constant_cache[name] = method(self, context)
-            return data
-
         # Can we just slice the existing cache entry?
         # 1. Are all context.shape's entries less than or equal
         #    to the shape of the cached data?
         # 2. Do they have the same dtype?
-        cached_ok = (cached.dtype == context.dtype and
+        cached_ok = (cached is not None and
+            cached.dtype == context.dtype and
             all(l <= r for l,r in zip(context.shape, cached.shape)))
 
-        # Need to return something bigger or a different type
+        # No cached value, or need to return
+        # something bigger or of a different type
         if not cached_ok:
-            data = self._constant_cache[name] = method(self, context)
+            data = method(self, context)
+            self._constant_cache.put(name, data)
             return data
 
         # Otherwise slice the cached data
@@ -94,33 +178,69 @@ def chunk_cache(method):
         # Construct the key for the given index
         name = context.name
         idx = context.array_extents(name)
-        key = tuple(i for t in idx for i in t)
-        # Access the sub-cache for this array
-        array_cache = self._chunk_cache[name]
+        key = (name,) + tuple(i for t in idx for i in t)
+
+        data = self._chunk_cache.get(key, None)
 
         # Cache miss, call the function
-        if key not in array_cache:
-            array_cache[key] = method(self, context)
+        if data is None:
+            data = method(self, context)
+            self._chunk_cache.put(key, data)
 
-        return array_cache[key]
+        return data
 
     f = wrapper
     f.__decorator__ = chunk_cache.__name__
     return f
 
 class DefaultsSourceProvider(SourceProvider):
-    def __init__(self, cache=False):
+    """
+    Provides default data sources. Constant and chunked default
+    data is cached in byte bounded least recently used caches,
+    which are invalidated when the global dimensions of
+    the hypercube change between solves.
+    """
+    def __init__(self, cache=False,
+            constant_cache_bytes=DEFAULT_CONSTANT_CACHE_BYTES,
+            chunk_cache_bytes=DEFAULT_CHUNK_CACHE_BYTES):
         self._is_cached = cache
-        self._constant_cache = {}
-        self._chunk_cache = collections.defaultdict(dict)
+        self._constant_cache = BoundedCache(constant_cache_bytes)
+        self._chunk_cache = BoundedCache(chunk_cache_bytes)
+        self._global_sizes = None
+        self._invalidations = 0
 
     def name(self):
         return self.__class__.__name__
 
+    def start(self, start_context):
+        """ Invalidate the caches if global dimensions have changed """
+        global_sizes = start_context.dim_global_size_dict()
+
+        if (self._global_sizes is not None and
+                global_sizes != self._global_sizes):
+            montblanc.log.debug("{n} global dimensions changed, "
+                "clearing caches.".format(n=self.name()))
+            self.clear_cache()
+            self._invalidations += 1
+
+        self._global_sizes = global_sizes
+
+    def stop(self, stop_context):
+        montblanc.log.debug("{n} cache statistics "
+            "{s}".format(n=self.name(), s=self.cache_stats()))
+
     def clear_cache(self):
         self._constant_cache.clear()
         self._chunk_cache.clear()
 
+    def cache_stats(self):
+        """ Returns a dictionary of constant and chunk cache statistics """
+        return {
+            'constant': self._constant_cache.stats(),
+            'chunk': self._chunk_cache.stats(),
+            'invalidations': self._invalidations,
+        }
+
 class TestDefaultsSourceProvider(unittest.TestCase):
 
     def test_defaults_source_provider(self):
@@ -166,9 +286,56 @@ class TestDefaultsSourceProvider(unittest.TestCase):
         self.assertEqual(C.shape, context.shape)
         self.assertIs(C.base, B)
 
-        cached_shape = defprov._constant_cache['model_vis'].shape
+        cached_shape = defprov._constant_cache.get('model_vis').shape
         self.assertEqual(cached_shape, supplied_shape)
 
+    def test_bounded_caches(self):
+        import numpy as np
+        import types
+
+        defprov = DefaultsSourceProvider(cache=True,
+            constant_cache_bytes=1024, chunk_cache_bytes=1024)
+
+        uvw = lambda self, context: np.zeros(context.shape, context.dtype)
+        defprov.uvw = types.MethodType(chunk_cache(uvw), defprov)
+
+        # Mock a context object
+        class Context(object):
+            name = 'uvw'
+            shape = (10, 3)
+            dtype = np.float64
+
+            def __init__(self, extents, global_sizes=None):
+                self.extents = extents
+                self.global_sizes = global_sizes
+
+            def array_extents(self, name):
+                return self.extents
+
+            def dim_global_size_dict(self):
+                return self.global_sizes
+
+        # Each chunk is 240 bytes, so four fit in the cache.
+        # Time 0 is evicted by time 4 and time 1 by time 0
+        for t in (0, 1, 2, 3, 4, 0, 4):
+            defprov.uvw(Context([(t, t+1), (0, 10), (0, 3)]))
+
+        stats = defprov.cache_stats()['chunk']
+        self.assertEqual(stats['entries'], 4)
+        self.assertEqual(stats['nbytes'], 960)
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 6)
+
+        # Restarting with the same dimensions keeps the cache,
+        # while different dimensions invalidate it
+        defprov.start(Context(None, {'ntime': 5}))
+        defprov.start(Context(None, {'ntime': 5}))
+        self.assertEqual(len(defprov._chunk_cache), 4)
+        defprov.start(Context(None, {'ntime': 6}))
+        self.assertEqual(len(defprov._chunk_cache), 0)
+        self.assertEqual(defprov.cache_stats()['invalidations'], 1)
+
 if __name__ == "__main__":
     unittest.main()
 
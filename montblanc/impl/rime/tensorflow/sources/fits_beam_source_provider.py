@@ -20,10 +20,12 @@
 
 import collections
 import functools
+import hashlib
 import os
 import re
 import string
 import sys
+import threading
 import types
 
 import numpy as np
@@ -210,12 +212,16 @@ def _create_filenames(filename_schema, feed_type):
         (c, _re_im_filenames(c, template))
         for c in CORRELATIONS)
 
+# Size of the blocks in which FITS files are hashed
+HASH_BLOCK_SIZE = 16*1024*1024
+
 def _open_fits_files(filenames):
     """
     Given a {correlation: filename} mapping for filenames
-    returns a {correlation: file handle} mapping
+    returns a {correlation: file handle} mapping.
+    Files are opened read-only and memory mapped.
     """
-    kw = { 'mode' : 'update', 'memmap' : False }
+    kw = { 'mode' : 'readonly', 'memmap' : True }
 
     def _fh(fn):
         """ Returns a filehandle or None if file does not exist """
@@ -225,6 +231,32 @@ def _open_fits_files(filenames):
             (corr, tuple(_fh(fn) for fn in files))
         for corr, files in filenames.iteritems() )
 
+def _fits_content_hash(filenames, dtype):
+    """
+    Returns a SHA1 hex digest of the contents of the FITS files
+    in a list of {correlation: filename} mappings, one per beam,
+    and of the beam cube dtype.
+    Missing files contribute their absence to the digest.
+    """
+    sha = hashlib.sha1()
+    sha.update(np.dtype(dtype).str)
+
+    for corr, files in ((c, f) for beam_filenames in filenames
+                        for c, f in beam_filenames.iteritems()):
+        for fn in files:
+            sha.update(corr)
+
+            if not os.path.exists(fn):
+                sha.update('missing')
+                continue
+
+            with open(fn, 'rb') as f:
+                for block in iter(functools.partial(f.read,
+                        HASH_BLOCK_SIZE), b''):
+                    sha.update(block)
+
+    return sha.hexdigest()
+
 def _cube_extents(axes, l_ax, m_ax, f_ax, l_sign, m_sign):
     # List of (lower, upper) extent tuples for the given dimensions
     it = zip((l_ax, m_ax, f_ax), (l_sign, m_sign, 1.0))
@@ -234,6 +266,30 @@ def _cube_extents(axes, l_ax, m_ax, f_ax, l_sign, m_sign):
     # Return [[l_low, u_low, f_low], [l_high, u_high, f_high]]
     return np.array(extent_list).T
 
+def _frequency_window(grid, frequency):
+    """
+    Returns the [lower, upper) range of the beam frequency grid planes
+    bracketing the supplied frequencies. At least two planes are
+    included, if present, so that interpolation within the window
+    matches interpolation within the full grid.
+    """
+    nud = len(grid)
+
+    if frequency is None or nud == 0:
+        return 0, nud
+
+    frequency = np.asarray(frequency).ravel()
+    lower = max(np.searchsorted(grid, frequency.min(), side='right') - 1, 0)
+    upper = min(np.searchsorted(grid, frequency.max(), side='left') + 1, nud)
+
+    if upper - lower < 2:
+        if upper < nud:
+            upper += 1
+        else:
+            lower = max(upper - 2, 0)
+
+    return int(lower), int(upper)
+
 def _create_axes(filenames, file_dict):
     """ Create a FitsAxes object """
 
@@ -295,15 +351,29 @@ class FitsBeamSourceProvider(SourceProvider):
     The type of correlation will be derived from the feed type.
     Currently, linear :code:`['xx', 'xy', 'yx', 'yy']` and
     circular :code:`['rr', 'rl', 'lr', 'll']` are supported.
+
+    Heterogeneous arrays are supported by supplying a list of
+    filename schemas, one per beam, and the index of the beam
+    associated with each antenna:
+
+    .. code-block:: python
+
+        FitsBeamSourceProvider(['meerkat_$(corr)_$(reim).fits',
+                                'ska_$(corr)_$(reim).fits'],
+                                antenna_beam=[0, 0, 0, 1, 1])
+
+    The beams must share the same axes.
     """
-    def __init__(self, filename_schema, l_axis=None, m_axis=None):
+    def __init__(self, filename_schema, l_axis=None, m_axis=None,
+            cache_dir=None, frequency=None, antenna_beam=None):
         """
         Constructs a FitsBeamSourceProvider object
 
         Parameters
         ----------
-            filename_schema : str
-                See :py:class:`.FitsBeamSourceProvider` for valid schemas
+            filename_schema : str or list of str
+                See :py:class:`.FitsBeamSourceProvider` for valid schemas.
+                A list of schemas loads a beam per schema.
             l_axis : str
                 FITS axis interpreted as the L axis. `L` and `X` are
                 sensible values here. `-L` will invert the coordinate
@@ -312,6 +382,20 @@ class FitsBeamSourceProvider(SourceProvider):
                 FITS axis interpreted as the M axis. `M` and `Y` are
                 sensible values here. `-M` will invert the coordinate
                 system on that axis.
+            cache_dir : str
+                If supplied, assembled beam cubes are stored in
+                this directory, keyed on a hash of the FITS file
+                contents, and memory mapped by subsequent solves
+                and processes. Defaults to None in which case
+                the cube is assembled in memory.
+            frequency : np.ndarray
+                Observed channel frequencies. If supplied, only the
+                beam frequency planes bracketing these frequencies
+                are loaded and fed. Defaults to None in which case
+                all planes are used.
+            antenna_beam : list of int
+                Index of the filename schema supplying the beam of
+                each antenna. Required if multiple schemas are supplied.
         """
         l_axis, l_sign = _axis_and_sign('L' if l_axis is None else l_axis)
         m_axis, m_sign = _axis_and_sign('M' if m_axis is None else m_axis)
@@ -322,13 +406,36 @@ class FitsBeamSourceProvider(SourceProvider):
         self._m_sign = m_sign
 
         self._fits_dims = fits_dims = (l_axis, m_axis, 'FREQ')
-        self._beam_dims = ('beam_lw', 'beam_mh', 'beam_nud')
+        self._beam_dims = ('beam_nb', 'beam_lw', 'beam_mh', 'beam_nud')
 
         self._filename_schema = filename_schema
+        self._filename_schemas = schemas = ([filename_schema]
+            if isinstance(filename_schema, basestring)
+            else list(filename_schema))
+
+        if antenna_beam is not None:
+            antenna_beam = np.asarray(antenna_beam, dtype=np.int32)
+
+            if np.any((antenna_beam < 0) | (antenna_beam >= len(schemas))):
+                raise ValueError("antenna_beam indices '{ab}' must "
+                    "index the filename schemas '{s}'".format(
+                        ab=antenna_beam, s=schemas))
+        elif len(schemas) > 1:
+            raise ValueError("antenna_beam must be supplied "
+                "with multiple filename schemas '{s}'".format(s=schemas))
+
+        self._antenna_beam = antenna_beam
         self._name = "FITS Beams '{s}'".format(s=filename_schema)
+        self._cache_dir = cache_dir
+        self._frequency = frequency
+
+        # Read-only complex beam cubes, assembled once, keyed on dtype
+        self._ebeams = {}
+        self._ebeam_lock = threading.Lock()
 
         # Have we initialised this object?
         self._initialised = False
+        self._feed_type = None
 
     def _initialise(self, feed_type="linear"):
         """
@@ -336,10 +443,27 @@ class FitsBeamSourceProvider(SourceProvider):
         opening associated file handles and inspecting the FITS axes
         of these files.
         """
-        self._filenames = filenames = _create_filenames(self._filename_schema,
-                                                        feed_type)
-        self._files = files = _open_fits_files(filenames)
-        self._axes = axes = _create_axes(filenames, files)
+        # Files are only opened once for the same feed type
+        if self._initialised and self._feed_type == feed_type:
+            return
+
+        self.close()
+
+        self._filenames = [_create_filenames(s, feed_type)
+            for s in self._filename_schemas]
+        self._files = [_open_fits_files(f) for f in self._filenames]
+        beam_axes = [_create_axes(fn, fh) for fn, fh
+            in zip(self._filenames, self._files)]
+        self._axes = axes = beam_axes[0]
+
+        # Beams are stacked, so their axes must match
+        for schema, other in zip(self._filename_schemas[1:], beam_axes[1:]):
+            if (other.naxis != axes.naxis or not all(np.allclose(g, og)
+                    for g, og in zip(axes.grid, other.grid))):
+                raise ValueError("The axes of beam '{s}' differ from "
+                    "those of beam '{s0}'".format(s=schema,
+                        s0=self._filename_schemas[0]))
+
         self._dim_indices = dim_indices = l_ax, m_ax, f_ax = tuple(
             axes.iaxis(d) for d in self._fits_dims)
 
@@ -348,15 +472,28 @@ class FitsBeamSourceProvider(SourceProvider):
             if i == -1:
                 raise ValueError("'%s' axis not found!" % ax)
 
+        # Restrict the frequency planes to those
+        # bracketing the observed frequencies
+        self._nfreq = axes.naxis[f_ax]
+        self._freq_window = lower, upper = _frequency_window(
+            axes.grid[f_ax], self._frequency)
+        self._beam_freq_map = axes.grid[f_ax][lower:upper]
+
         self._cube_extents = _cube_extents(axes, l_ax, m_ax, f_ax,
             self._l_sign, self._m_sign)
-        self._shape = tuple(axes.naxis[d] for d in dim_indices) + (4,)
-        self._beam_freq_map = axes.grid[f_ax]
+        self._shape = ((len(self._files),) +
+            tuple(axes.naxis[d] for d in dim_indices[:2]) +
+            (upper - lower, 4))
+
+        if upper - lower < self._nfreq:
+            montblanc.log.info("{n} feeding frequency planes [{l}, {u}) "
+                "of {t}.".format(n=self._name, l=lower, u=upper,
+                    t=axes.naxis[f_ax]))
 
         # Now describe our dimension sizes
-        self._dim_updates = [(n, axes.naxis[i]) for n, i
-            in zip(self._beam_dims, dim_indices)]
+        self._dim_updates = zip(self._beam_dims, self._shape[:4])
 
+        self._feed_type = feed_type
         self._initialised = True
 
     def name(self):
@@ -367,30 +504,122 @@ class FitsBeamSourceProvider(SourceProvider):
         """ Perform any initialisation """
         self._initialise(init_context.cfg['polarisation_type'])
 
+    def _nud_extents(self, context):
+        """
+        Returns the beam_nud extents of the context,
+        complaining about partial beam, l and m extents
+        """
+        extents = context.dim_extents(*self._beam_dims)
+
+        if any(e != (0, s) for e, s in zip(extents[:3], self._shape[:3])):
+            raise ValueError("Partial feeding of the beam, "
+                "l and m dimensions is not supported.")
+
+        return extents[3]
+
     def ebeam(self, context):
         """ ebeam cube data source """
-        if context.shape != self.shape:
-            raise ValueError("Partial feeding of the "
-                "beam cube is not yet supported %s %s." % (context.shape, self.shape))
+        lower, upper = self._nud_extents(context)
+        return self._ebeam(context.dtype)[:,:,:,lower:upper,:]
+
+    def antenna_beam(self, context):
+        """ Antenna beam index data source """
+        if self._antenna_beam is None:
+            return np.zeros(context.shape, context.dtype)
+
+        if len(self._antenna_beam) != context.dim_global_size('na'):
+            raise ValueError("antenna_beam has '{n}' entries but "
+                "there are '{na}' antenna".format(n=len(self._antenna_beam),
+                    na=context.dim_global_size('na')))
 
-        ebeam = np.empty(context.shape, context.dtype)
+        lower, upper = context.dim_extents('na')
+        return self._antenna_beam[lower:upper].astype(context.dtype)
 
-        # Iterate through the correlations,
+    def _assemble_ebeam(self, dtype):
+        """ Assemble the complex beam cube from the FITS files """
+        ebeam = np.empty(self.shape, dtype)
+        lower, upper = self._freq_window
+
+        # Iterate through the beams and correlations,
         # assigning real and imaginary data, if present,
-        # otherwise zeroing the correlation
-        for i, (re, im) in enumerate(self._files.itervalues()):
-            ebeam[:,:,:,i].real[:] = 0 if re is None else re[0].data.T
-            ebeam[:,:,:,i].imag[:] = 0 if im is None else im[0].data.T
+        # otherwise zeroing the correlation.
+        # Only frequency planes in the window are read
+        for b, files in enumerate(self._files):
+            for i, (re, im) in enumerate(files.itervalues()):
+                ebeam[b,:,:,:,i].real[:] = (0 if re is None
+                    else re[0].data[lower:upper].T)
+                ebeam[b,:,:,:,i].imag[:] = (0 if im is None
+                    else im[0].data[lower:upper].T)
 
         return ebeam
 
+    def _cached_ebeam(self, dtype):
+        """
+        Memory map the beam cube stored in the cache directory,
+        assembling and storing it first if necessary
+        """
+        key = _fits_content_hash(self._filenames, dtype)
+        filename = os.path.join(self._cache_dir, 'ebeam-{k}-{l}-{u}.npy'
+            .format(k=key, l=self._freq_window[0], u=self._freq_window[1]))
+
+        if os.path.exists(filename):
+            montblanc.log.info("{n} using cached beam cube "
+                "'{f}'.".format(n=self._name, f=filename))
+        else:
+            if not os.path.exists(self._cache_dir):
+                os.makedirs(self._cache_dir)
+
+            # Write to a temporary file and rename, so that
+            # other processes never observe a partial cube
+            tmp_filename = '{f}.{p}.tmp'.format(f=filename, p=os.getpid())
+
+            with open(tmp_filename, 'wb') as f:
+                np.save(f, self._assemble_ebeam(dtype))
+
+            os.rename(tmp_filename, filename)
+
+            montblanc.log.info("{n} cached beam cube in "
+                "'{f}'.".format(n=self._name, f=filename))
+
+        return np.load(filename, mmap_mode='r')
+
+    def _ebeam(self, dtype):
+        """ Returns the read-only beam cube of the given dtype """
+        dtype = np.dtype(dtype)
+
+        with self._ebeam_lock:
+            try:
+                return self._ebeams[dtype]
+            except KeyError:
+                pass
+
+            if self._cache_dir is None:
+                ebeam = self._assemble_ebeam(dtype)
+                ebeam.setflags(write=False)
+            else:
+                ebeam = self._cached_ebeam(dtype)
+
+            self._ebeams[dtype] = ebeam
+            return ebeam
+
     def beam_extents(self, context):
         """ Beam extent data source """
-        return self._cube_extents.flatten().astype(context.dtype)
+        lower, upper = self._nud_extents(context)
+        extents = self._cube_extents.copy()
+
+        # Frequency extents of the fed planes,
+        # if they are not the whole frequency axis
+        offset = self._freq_window[0]
+
+        if (offset + lower, offset + upper) != (0, self._nfreq):
+            extents[:,2] = self._beam_freq_map[[lower, upper-1]]
+
+        return extents.flatten().astype(context.dtype)
 
     def beam_freq_map(self, context):
         """ Beam frequency map data source """
-        return self._beam_freq_map.astype(context.dtype)
+        lower, upper = self._nud_extents(context)
+        return self._beam_freq_map[lower:upper].astype(context.dtype)
 
     def updated_dimensions(self):
         """ Indicate dimension sizes """
@@ -403,18 +632,24 @@ class FitsBeamSourceProvider(SourceProvider):
 
     @property
     def shape(self):
-        """ Shape of the beam cube """
+        """ Shape of the stacked (nbeam, lw, mh, nud, 4) beam cubes """
         return self._shape
 
     def close(self):
+        with self._ebeam_lock:
+            self._ebeams.clear()
+
+        self._initialised = False
+
         if not hasattr(self, "_files"):
             return
 
-        for re, im in self._files.itervalues():
-            re.close()
-            im.close()
+        for fh in (f for files in self._files
+                    for pair in files.itervalues() for f in pair):
+            if fh is not None:
+                fh.close()
 
-        self._files.clear()
+        self._files = []
 
     def __enter__(self):
         return self
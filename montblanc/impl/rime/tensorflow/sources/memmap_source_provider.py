@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import numpy as np
+
+import montblanc
+from montblanc.impl.rime.tensorflow.ms.memmap_cache import (
+    load_manifest, ms_mtime)
+from montblanc.impl.rime.tensorflow.sources.np_source_provider import (
+    NumpySourceProvider)
+
+class MemmapSourceProvider(NumpySourceProvider):
+    """
+    Source Provider that serves input data from a directory
+    of memory mapped arrays created by
+    :py:func:`~montblanc.impl.rime.tensorflow.ms.memmap_cache.create_memmap_cache`.
+
+    Data sources return slices of the memory mapped arrays,
+    without copying them.
+    """
+
+    def __init__(self, directory, check_mtime=True):
+        """
+        Constructs a MemmapSourceProvider object
+
+        Parameters
+        ----------
+        directory: str
+            Memmap cache directory
+        check_mtime: bool
+            Raise a ValueError if the Measurement Set from which
+            the cache was created has been modified since.
+        """
+        manifest = load_manifest(directory)
+
+        if manifest is None:
+            raise ValueError("'{d}' does not contain a memmap "
+                "cache".format(d=directory))
+
+        msname = manifest['msname']
+
+        if (check_mtime and os.path.exists(msname) and
+                ms_mtime(msname) > manifest['ms_mtime']):
+            raise ValueError("'{ms}' has been modified since the memmap "
+                "cache in '{d}' was created".format(ms=msname, d=directory))
+
+        self._manifest = manifest
+        self._name = "Memmap cache '{d}' of '{ms}'".format(
+            d=directory, ms=msname)
+
+        arrays = { n: np.load(os.path.join(directory, a['file']),
+            mmap_mode='r') for n, a in manifest['arrays'].iteritems() }
+
+        super(MemmapSourceProvider, self).__init__(arrays)
+
+    def name(self):
+        return self._name
+
+    @property
+    def manifest(self):
+        return self._manifest
+
+    def updated_dimensions(self):
+        return [(k, v) for k, v in self._manifest['dimensions'].iteritems()]
+
+    def __str__(self):
+        return self.__class__.__name__
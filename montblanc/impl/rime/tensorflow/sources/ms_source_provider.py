@@ -21,23 +21,34 @@
 
 import collections
 import functools
+import threading
 import types
 
 import numpy as np
 
+import montblanc
 import montblanc.util as mbu
 import montblanc.impl.rime.tensorflow.ms.ms_manager as MS
+from montblanc.impl.rime.tensorflow.ms.row_prefetcher import RowPrefetcher
+from montblanc.impl.rime.tensorflow.ms.reader_processes import ReaderProcesses
 
-from montblanc.impl.rime.tensorflow.sources.source_provider import SourceProvider
+from montblanc.impl.rime.tensorflow.sources.source_provider import (
+    SourceProvider, relaxed_source)
 from montblanc.impl.rime.tensorflow.sources import SourceContext
 
+# Number of (table, row range) entries held in the chunk cache.
+# Feed threads for different shards request different chunks
+# concurrently, each reading a main and a uvw row range.
+CHUNK_CACHE_SIZE = 8
+
 class MSSourceProvider(SourceProvider):
     """
     Source Provider that retrieves input data from a
     MeasurementSet
     """
 
-    def __init__(self, manager, vis_column=None):
+    def __init__(self, manager, vis_column=None, prefetch=4,
+            parallactic_angle_interval=None, reader_processes=0):
         """
         Constructs an MSSourceProvider object
 
@@ -48,12 +59,36 @@ class MSSourceProvider(SourceProvider):
             the Measurement Set.
         vis_column: str
             Column from which observed visibilities will be read
+        prefetch: integer
+            Number of chunks whose rows are read ahead
+            in a background thread. 0 disables prefetching.
+        parallactic_angle_interval: float
+            If supplied, parallactic angles are computed on a grid
+            of times spaced this many seconds apart and interpolated.
+        reader_processes: integer
+            Number of processes forked on solution start to read
+            rows in parallel, each through its own read-only handle
+            on the Measurement Set. 0 reads rows in this process
+            through per-thread read-only handles.
         """
         self._manager = manager
         self._name = "Measurement Set '{ms}'".format(ms=manager.msname)
 
         self._vis_column = 'DATA' if vis_column is None else vis_column
 
+        # Chunk rows are read from the ordered tables of a field
+        # through read-only handles that aren't shared with sinks
+        self._reader_processes = reader_processes
+        self._readers = None
+
+        self._prefetch = prefetch
+        self._prefetcher = None
+
+        # Columns read for recent chunks, keyed by
+        # (table, lrow, urow) and then column name
+        self._chunk_cache = collections.OrderedDict()
+        self._chunk_cache_lock = threading.Lock()
+
         # Cache columns on the object
         # Handle these columns slightly differently
         # They're used to compute the parallactic angle
@@ -62,6 +97,26 @@ class MSSourceProvider(SourceProvider):
         # Cache antenna positions
         self._antenna_positions = manager.antenna_table.getcol(MS.POSITION)
 
+        # Parallactic angles of the field's times and antenna,
+        # computed once on first request
+        self._pa_interval = parallactic_angle_interval
+        self._pa_lock = threading.Lock()
+
+        self._field_id = None
+        self._read_field()
+
+    def _read_field(self):
+        """
+        Reads data associated with the field
+        currently selected on the manager
+        """
+        manager = self._manager
+
+        if self._field_id == manager.field_id:
+            return
+
+        self._tables = manager.reader_tables()
+
         # Cache timesteps
         self._times = manager.ordered_time_table.getcol(MS.TIME)
 
@@ -71,6 +126,21 @@ class MSSourceProvider(SourceProvider):
         self._phase_dir = manager.field_table.getcol(MS.PHASE_DIR,
             startrow=manager.field_id, nrow=1)[0][0]
 
+        with self._pa_lock:
+            self._parallactic_angles = None
+
+        # Irregular fields map rows onto the dense
+        # (time, baseline, band) grid with a row index
+        self._row_index = manager.row_index
+        self._uvw_row_index = manager.uvw_row_index
+
+        if self._uvw_row_index is not None:
+            obl = manager.ordered_baseline_table
+            self._baseline_ant1 = obl.getcol(MS.ANTENNA1)
+            self._baseline_ant2 = obl.getcol(MS.ANTENNA2)
+
+        self._field_id = manager.field_id
+
     def name(self):
         return self._name
 
@@ -78,22 +148,203 @@ class MSSourceProvider(SourceProvider):
         # Defer to manager's method
         return self._manager.updated_dimensions()
 
+    def start(self, start_context):
+        # The manager may have selected another field
+        self._read_field()
+
+        # Processes may be forked once the solution starts
+        self._manager.flush()
+
+        with self._chunk_cache_lock:
+            self._chunk_cache.clear()
+
+        self._stop_readers()
+
+        if self._reader_processes > 0:
+            self._readers = ReaderProcesses(self._manager,
+                self._reader_processes)
+            self._tables = self._readers.tables(self._field_id)
+
+        if self._prefetch > 0:
+            self._prefetcher = RowPrefetcher(self._tables,
+                self._chunk_reads(start_context), self._prefetch)
+
+    def _stop_readers(self):
+        """ Shut down any reader processes """
+        if self._readers is None:
+            return
+
+        self._readers.close()
+        self._readers = None
+        self._tables = self._manager.reader_tables()
+
+    def stop(self, stop_context):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            montblanc.log.info("{n} prefetch: {s}".format(n=self._name,
+                s=self._prefetcher.stats()))
+            self._prefetcher = None
+
+        self._stop_readers()
+
+    def close(self):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+
+        self._stop_readers()
+
+        with self._chunk_cache_lock:
+            self._chunk_cache.clear()
+
+    def reopen(self):
+        """
+        Reopens the Measurement Set in a forked process. The parent's
+        prefetcher thread, reader processes and locks are discarded,
+        so rows are read on request through the manager's reopened tables.
+        """
+        self._manager.reopen()
+        self._tables = self._manager.reader_tables()
+        self._readers = None
+        self._prefetcher = None
+
+        self._chunk_cache = collections.OrderedDict()
+        self._chunk_cache_lock = threading.Lock()
+        self._pa_lock = threading.Lock()
+
+    def _weight_column(self):
+        return (MS.WEIGHT_SPECTRUM if self._manager.weight_spectrum
+            else MS.WEIGHT)
+
+    def _chunk_reads(self, start_context):
+        """
+        Returns a list of the (table, column, startrow, nrow) reads
+        performed by the data sources for each chunk of the problem,
+        in the order in which the chunks will be requested
+        """
+        cube = start_context.cube.copy()
+        main_columns = (self._vis_column, MS.FLAG, self._weight_column())
+        uvw_columns = (MS.UVW, MS.ANTENNA1, MS.ANTENNA2)
+
+        chunks = []
+
+        for dim_desc in cube.dim_iter(*start_context.iter_args):
+            cube.update_dimensions(dim_desc)
+            lrow, urow, _, _ = self._tile_rows(cube)
+            ulrow, uurow, _, _ = self._uvw_tile_rows(cube)
+
+            chunks.append(
+                [(MS.ORDERED_MAIN_TABLE, c, lrow, urow-lrow)
+                    for c in main_columns if urow > lrow] +
+                [(MS.ORDERED_UVW_TABLE, c, ulrow, uurow-ulrow)
+                    for c in uvw_columns if uurow > ulrow])
+
+        return chunks
+
+    def _tile_rows(self, cube):
+        """
+        Returns (lrow, urow, rows, mask) describing the ordered main
+        table rows of the tile described by cube.
+        See :py:func:`.tile_rows`. rows and mask are None
+        if the field is regular.
+        """
+        if self._row_index is None:
+            lrow, urow = MS.row_extents(cube)
+            return lrow, urow, None, None
+
+        return MS.tile_rows(self._row_index, cube)
+
+    def _uvw_tile_rows(self, cube):
+        """
+        Returns (lrow, urow, rows, mask) describing the ordered uvw
+        table rows of the tile described by cube.
+        See :py:func:`.tile_rows`. rows and mask are None
+        if the field is regular.
+        """
+        if self._uvw_row_index is None:
+            lrow, urow = MS.uvw_row_extents(cube)
+            return lrow, urow, None, None
+
+        return MS.tile_rows(self._uvw_row_index, cube, MS.UVW_DIM_ORDER)
+
+    def _tile_col(self, context, table, column, tile_rows, fill):
+        """
+        Reads column for the tile rows described by tile_rows,
+        placing them on the dense grid of an irregular field
+        and filling missing positions with fill
+        """
+        lrow, urow, rows, mask = tile_rows
+
+        if mask is None:
+            return self._getcol(table, column, lrow, urow)
+        elif rows.size == 0:
+            return np.full(context.shape, fill, dtype=context.dtype)
+
+        data = self._getcol(table, column, lrow, urow)
+        result = np.full(mask.shape + data.shape[1:], fill, dtype=data.dtype)
+        result[mask] = data[rows - lrow]
+
+        return result
+
+    def _getcol(self, table, column, lrow, urow):
+        """
+        Reads rows [lrow, urow) of column in table.
+
+        Columns are cached per chunk row range so that each is read
+        once per chunk, regardless of the data sources requesting it.
+        Otherwise, data is taken from the prefetch buffer if present,
+        or read from the table.
+        """
+        range_key = (table, lrow, urow)
+
+        with self._chunk_cache_lock:
+            columns = self._chunk_cache.get(range_key, None)
+
+            if columns is not None and column in columns:
+                return columns[column]
+
+        # Only one feed thread requests a chunk,
+        # so reads for a row range are not duplicated
+        data = None
+        prefetcher = self._prefetcher
+
+        if prefetcher is not None:
+            data = prefetcher.get((table, column, lrow, urow-lrow))
+
+        if data is None:
+            data = self._tables[table].getcol(column,
+                startrow=lrow, nrow=urow-lrow)
+
+        with self._chunk_cache_lock:
+            columns = self._chunk_cache.pop(range_key, {})
+            columns[column] = data
+            # Reinsert as the most recently used range
+            self._chunk_cache[range_key] = columns
+
+            while len(self._chunk_cache) > CHUNK_CACHE_SIZE:
+                self._chunk_cache.popitem(last=False)
+
+        return data
+
+    @relaxed_source
     def phase_centre(self, context):
-        return self._phase_dir.astype(context.dtype)
+        return self._phase_dir
 
+    @relaxed_source
     def antenna_position(self, context):
         la, ua = context.dim_extents('na')
-        return (self._antenna_positions[la:ua]
-                    .astype(context.dtype))
+        return self._antenna_positions[la:ua]
 
+    @relaxed_source
     def time(self, context):
         lt, ut = context.dim_extents('ntime')
-        return self._times[lt:ut].astype(context.dtype)
+        return self._times[lt:ut]
 
+    @relaxed_source
     def frequency(self, context):
         """ Frequency data source """
-        channels = self._manager.spectral_window_table.getcol(MS.CHAN_FREQ)
-        return channels.reshape(context.shape).astype(context.dtype)
+        # (nbands, chan_per_band) to (nchan,)
+        return self._manager.spectral_window_table.getcol(MS.CHAN_FREQ).ravel()
 
     def ref_frequency(self, context):
         """ Reference frequency data source """
@@ -106,6 +357,9 @@ class MSSourceProvider(SourceProvider):
     def uvw(self, context):
         """ Per-antenna UVW coordinate data source """
 
+        if self._uvw_row_index is not None:
+            return self._irregular_uvw(context)
+
         # Hacky access of private member
         cube = context._cube
 
@@ -127,9 +381,7 @@ class MSSourceProvider(SourceProvider):
 
         # Obtain per baseline UVW data
         lrow, urow = MS.uvw_row_extents(context)
-        uvw = self._manager.ordered_uvw_table.getcol(MS.UVW,
-                                                startrow=lrow,
-                                                nrow=urow-lrow)
+        uvw = self._getcol(MS.ORDERED_UVW_TABLE, MS.UVW, lrow, urow)
 
         # Perform the per-antenna UVW decomposition
         ntime, nbl = context.dim_extent_size('ntime', 'nbl')
@@ -140,61 +392,99 @@ class MSSourceProvider(SourceProvider):
 
         return auvw.reshape(context.shape).astype(context.dtype)
 
+    def _irregular_uvw(self, context):
+        """
+        Per-antenna UVW coordinates of an irregular field,
+        decomposed from the baselines present at each timestep
+        """
+        lrow, urow, rows, mask = self._uvw_tile_rows(context)
+        ntime = mask.shape[0]
+        na = context.dim_global_size('na')
+        auvw = np.zeros((ntime, na, 3), dtype=context.dtype)
+
+        if rows.size == 0:
+            return auvw.reshape(context.shape)
+
+        rows = rows - lrow
+        uvw = self._getcol(MS.ORDERED_UVW_TABLE, MS.UVW, lrow, urow)[rows]
+        ant1 = self._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA1, lrow, urow)[rows]
+        ant2 = self._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA2, lrow, urow)[rows]
+
+        # Decompose timesteps with baselines, leaving coordinates of
+        # absent antenna at zero. Their baselines are missing
+        chunks = mask.sum(axis=1).astype(ant1.dtype)
+        present = chunks > 0
+        auvw[present] = mbu.antenna_uvw(uvw, ant1, ant2,
+            chunks[present], nr_of_antenna=na)
+        auvw[np.isnan(auvw)] = 0
+
+        return auvw.reshape(context.shape)
+
+    @relaxed_source
     def antenna1(self, context):
         """ antenna1 data source """
-        lrow, urow = MS.uvw_row_extents(context)
-        antenna1 = self._manager.ordered_uvw_table.getcol(
-            MS.ANTENNA1, startrow=lrow, nrow=urow-lrow)
+        if self._uvw_row_index is not None:
+            (lt, ut), (lb, ub) = context.dim_extents('ntime', 'nbl')
+            return np.tile(self._baseline_ant1[lb:ub], ut-lt)
 
-        return antenna1.reshape(context.shape).astype(context.dtype)
+        lrow, urow = MS.uvw_row_extents(context)
+        return self._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA1, lrow, urow)
 
+    @relaxed_source
     def antenna2(self, context):
         """ antenna2 data source """
-        lrow, urow = MS.uvw_row_extents(context)
-        antenna2 = self._manager.ordered_uvw_table.getcol(
-            MS.ANTENNA2, startrow=lrow, nrow=urow-lrow)
+        if self._uvw_row_index is not None:
+            (lt, ut), (lb, ub) = context.dim_extents('ntime', 'nbl')
+            return np.tile(self._baseline_ant2[lb:ub], ut-lt)
 
-        return antenna2.reshape(context.shape).astype(context.dtype)
+        lrow, urow = MS.uvw_row_extents(context)
+        return self._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA2, lrow, urow)
 
     def parallactic_angles(self, context):
         """ parallactic angle data source """
         # Time and antenna extents
         (lt, ut), (la, ua) = context.dim_extents('ntime', 'na')
 
-        return (mbu.parallactic_angles(self._times[lt:ut],
-                self._antenna_positions[la:ua], self._phase_dir)
+        return (self._field_parallactic_angles()[lt:ut, la:ua]
                                             .reshape(context.shape)
                                             .astype(context.dtype))
 
+    def _field_parallactic_angles(self):
+        """
+        Parallactic angles for all times and antenna of the field,
+        computed on first request and reused by subsequent chunks
+        and solves
+        """
+        with self._pa_lock:
+            if self._parallactic_angles is None:
+                self._parallactic_angles = mbu.parallactic_angles(
+                    self._times, self._antenna_positions,
+                    self._phase_dir, interval=self._pa_interval)
 
-    def observed_vis(self, context):
-        """ Observed visibility data source """
-        lrow, urow = MS.row_extents(context)
+            return self._parallactic_angles
 
-        data = self._manager.ordered_main_table.getcol(
-            self._vis_column, startrow=lrow, nrow=urow-lrow)
 
-        return data.reshape(context.shape).astype(context.dtype)
+    @relaxed_source
+    def observed_vis(self, context):
+        """ Observed visibility data source """
+        return self._tile_col(context, MS.ORDERED_MAIN_TABLE,
+            self._vis_column, self._tile_rows(context), 0)
 
+    @relaxed_source
     def flag(self, context):
         """ Flag data source """
-        lrow, urow = MS.row_extents(context)
-
-        flag = self._manager.ordered_main_table.getcol(
-            MS.FLAG, startrow=lrow, nrow=urow-lrow)
-
-        return flag.reshape(context.shape).astype(context.dtype)
+        # Flag positions missing from irregular fields
+        return self._tile_col(context, MS.ORDERED_MAIN_TABLE,
+            MS.FLAG, self._tile_rows(context), True)
 
+    @relaxed_source
     def weight(self, context):
         """ Weight data source """
-        lrow, urow = MS.row_extents(context)
-
-        weight = self._manager.ordered_main_table.getcol(
-            MS.WEIGHT, startrow=lrow, nrow=urow-lrow)
-
-        # WEIGHT is applied across all channels
-        weight = np.repeat(weight, self._manager.channels_per_band, 0)
-        return weight.reshape(context.shape).astype(context.dtype)
+        # WEIGHT has the same number of elements as the
+        # per band weight shape, (ntime, nbl, nbands, npol)
+        # and is broadcast across each band's channels during compute
+        return self._tile_col(context, MS.ORDERED_MAIN_TABLE,
+            self._weight_column(), self._tile_rows(context), 0)
 
     def __enter__(self):
         return self
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import types
+
+import numpy as np
+
+import montblanc
+import montblanc.impl.rime.tensorflow.ms.ms_manager as MS
+from .source_provider import SourceProvider
+from .source_context import SourceContext
+from ..start_context import StartContext
+
+# Dimensions that the Measurement Sets must share
+SHARED_DIMENSIONS = ('ntime', 'nbl', 'na', 'npol')
+
+def _route(name):
+    """
+    Returns a method routing the name data source
+    to the Measurement Set providers
+    """
+    def router(self, context):
+        return self._route(name, context)
+
+    router.__name__ = name
+    return router
+
+def _channel_broadcast(data, context):
+    """
+    Broadcast per band or per row data, such as weights, across
+    the channels of the context. See CHANNEL_BROADCAST_ARRAYS.
+    """
+    shape = tuple(context.shape)
+
+    if data.shape == shape:
+        return data
+
+    chan = context.array_schema.shape.index('nchan')
+
+    if data.ndim == len(shape):
+        return np.repeat(data, shape[chan] // data.shape[chan], axis=chan)
+
+    return np.broadcast_to(np.expand_dims(data, chan), shape)
+
+class MultiMSSourceProvider(SourceProvider):
+    """
+    Presents the providers of several Measurement Sets,
+    typically one per spectral window of an observation,
+    as a single problem whose channels (and bands) are the
+    concatenated channels of each Measurement Set.
+
+    Each tile of the solution therefore spans every Measurement
+    Set. Data sources with a channel dimension concatenate the
+    data of each Measurement Set whose channels overlap the tile,
+    requested from its provider with a context describing its
+    own channels (see :func:`.band_cube`). Other data sources,
+    such as ``uvw`` and ``antenna1``, are the same for every
+    Measurement Set and are requested from the first.
+
+    The Measurement Sets must share times, baselines, antenna
+    and polarisations, and the currently selected field of each
+    is presented.
+    """
+    def __init__(self, providers):
+        """
+        Parameters
+        ----------
+        providers: list of :py:class:`.SourceProvider`
+            Providers of each Measurement Set, in channel order,
+            such as :py:class:`.MSSourceProvider`'s
+        """
+        if len(providers) == 0:
+            raise ValueError("At least one provider is required")
+
+        self._providers = providers
+        self._prov_sources = [p.sources() for p in providers]
+        self._channel_bands = None
+
+        # Imported here to avoid circular imports
+        from ..solver_utils import DataSourceCopies
+        self._copies = DataSourceCopies()
+
+        names = set(n for s in self._prov_sources for n in s.iterkeys())
+
+        for n in names:
+            setattr(self, n, types.MethodType(_route(n), self))
+
+    def channel_bands(self):
+        """
+        Returns a list of :py:class:`.ChannelBands` describing the
+        channels of each Measurement Set within the concatenated
+        channels, for the currently selected fields
+        """
+        dims = [dict(p.updated_dimensions()) for p in self._providers]
+
+        for d in SHARED_DIMENSIONS:
+            sizes = [pd.get(d, None) for pd in dims]
+
+            if not all(s == sizes[0] for s in sizes[1:]):
+                raise ValueError("Measurement Sets '{p}' don't share "
+                    "dimension '{d}' with sizes '{s}'".format(d=d, s=sizes,
+                        p=[p.name() for p in self._providers]))
+
+        offsets = np.cumsum([0] + [pd['nchan'] for pd in dims])
+
+        return [MS.ChannelBands(int(o), pd['nchan'], pd['nbands'])
+            for o, pd in zip(offsets, dims)]
+
+    def _route(self, name, context):
+        """
+        Requests the name data source from the provider of each
+        Measurement Set overlapping the context's channels,
+        concatenating their data, or from the first if the
+        array has no channel dimension
+        """
+        # Imported here to avoid circular imports
+        from ..solver_utils import _conform_data, _expected_shapes
+
+        schema = getattr(context.array_schema, 'shape', ())
+        chan = schema.index('nchan') if 'nchan' in schema else None
+        channel_bands = self._channel_bands
+
+        if channel_bands is None:
+            channel_bands = self.channel_bands()
+
+        parts = []
+
+        for i, cube, _ in MS.band_tiles(context._cube, channel_bands):
+            source = self._prov_sources[i].get(name, None)
+
+            if source is None:
+                raise ValueError("'{p}' has no '{n}' data source".format(
+                    p=self._providers[i].name(), n=name))
+
+            array = cube.array(name, reify=True) if chan is not None else None
+            ctx = SourceContext(name, cube, context.cfg, context.iter_args,
+                context.array_schema,
+                context.shape if array is None else array.shape,
+                context.dtype)
+
+            data = source(ctx)
+
+            if getattr(source, 'relaxed', False):
+                data = _conform_data(data, ctx,
+                    _expected_shapes(ctx), self._copies)
+
+            if chan is None:
+                return data
+
+            parts.append(_channel_broadcast(data, ctx))
+
+        return np.concatenate(parts, axis=chan)
+
+    def name(self):
+        sub_prov_names = ', '.join([p.name() for p in self._providers])
+        return 'MultiMS({})'.format(sub_prov_names)
+
+    def init(self, init_context):
+        """ Perform any initialisation required """
+        for p in self._providers:
+            p.init(init_context)
+
+    def start(self, start_context):
+        """
+        Perform any logic on solution start, describing
+        the channels of its Measurement Set to each provider
+        """
+        self._channel_bands = self.channel_bands()
+        self._copies.reset()
+
+        for p, bands in zip(self._providers, self._channel_bands):
+            if isinstance(start_context, StartContext):
+                p.start(StartContext(MS.band_cube(start_context.cube, bands),
+                    start_context.cfg, start_context.iter_args))
+            else:
+                p.start(start_context)
+
+    def stop(self, stop_context):
+        """ Perform any logic on solution stop """
+        for p in self._providers:
+            p.stop(stop_context)
+
+        copies = self._copies.get()
+
+        if len(copies) > 0:
+            montblanc.log.debug("{n} copied data source arrays: "
+                "{c}".format(n=self.name(), c=copies))
+
+    def close(self):
+        for p in self._providers:
+            p.close()
+
+    def reopen(self):
+        """ Reopen the Measurement Set providers in a forked process """
+        for p in self._providers:
+            p.reopen()
+
+    def updated_dimensions(self):
+        """
+        Dimensions of the Measurement Sets, with their channels,
+        bands and visibilities concatenated
+        """
+        channel_bands = self.channel_bands()
+        dims = dict(self._providers[0].updated_dimensions())
+        nchan = sum(b.nchan for b in channel_bands)
+
+        dims['nchan'] = nchan
+        dims['nbands'] = sum(b.nbands for b in channel_bands)
+
+        if 'npolchan' in dims:
+            dims['npolchan'] = dims['npol']*nchan
+
+        if 'nvis' in dims:
+            dims['nvis'] = dims['ntime']*dims['nbl']*nchan
+
+        return [(k, v) for k, v in dims.iteritems()]
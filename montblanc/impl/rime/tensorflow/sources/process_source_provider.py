@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import functools
+import itertools
+import mmap
+import multiprocessing
+import Queue
+import threading
+import types
+
+import numpy as np
+from hypercube import HyperCube
+
+import montblanc
+from .source_provider import SourceProvider
+from .source_context import SourceContext
+from ..start_context import StartContext
+
+# Default size of each shared memory segment
+DEFAULT_SEGMENT_BYTES = 32*1024**2
+
+# Providers, data sources, array schemas, shared memory and segment
+# size of each ProcessSourceProvider, keyed on provider id.
+# Inherited by the worker processes when they are forked.
+_WORKER_STATE = {}
+_provider_ids = itertools.count()
+
+_WorkerState = collections.namedtuple("_WorkerState", ["providers",
+    "data_sources", "arrays", "shared", "segment_bytes"])
+
+# Failures to reopen providers in a worker process,
+# keyed on provider id
+_WORKER_ERRORS = {}
+
+# Hypercubes reconstructed in a worker process, keyed on provider id
+_WORKER_CUBES = {}
+
+# Describes an array written to a shared memory segment
+_Shared = collections.namedtuple("_Shared", ["dtype", "shape"])
+
+# Describes a SourceContext to a worker process
+_WorkerContext = collections.namedtuple("_WorkerContext", ["name",
+    "dims", "array_schema", "cfg", "iter_args", "shape", "dtype"])
+
+def _picklable_schema(array):
+    """
+    Array schema without the default and test data
+    functions, which cannot be pickled
+    """
+    return { k: v for k, v in array.iteritems() if not
+        isinstance(v, (types.FunctionType, types.MethodType)) }
+
+def _register_array(cube, array):
+    """ Registers an array schema on cube """
+    schema = array.copy()
+    cube.register_array(schema.pop('name'), schema.pop('shape'),
+        schema.pop('dtype'), **schema)
+
+def _worker_context(context):
+    """
+    Returns a compact, picklable description of a SourceContext.
+
+    Worker processes inherit the array schemas of the solver's
+    hypercube when they are forked, so only the dimension extents
+    and the schema of the requested array are sent with each call.
+    """
+    if not isinstance(context, SourceContext):
+        return context
+
+    dims = tuple((d.name, d.global_size, d.lower_extent, d.upper_extent)
+        for d in context.dimensions(copy=False).itervalues())
+
+    return _WorkerContext(context.name, dims,
+        _picklable_schema(context.array_schema), context.cfg,
+        context.iter_args, context.shape, context.dtype)
+
+def _source_context(provider_id, context):
+    """
+    Reconstructs a SourceContext from a :class:`_WorkerContext`
+    in a worker process. The hypercube is created once per worker
+    and only its dimensions are updated on subsequent calls.
+    """
+    if not isinstance(context, _WorkerContext):
+        return context
+
+    try:
+        cube = _WORKER_CUBES[provider_id]
+    except KeyError:
+        cube = _WORKER_CUBES[provider_id] = HyperCube()
+
+        for array in _WORKER_STATE[provider_id].arrays.itervalues():
+            _register_array(cube, array)
+
+    dims = cube.dimensions(copy=False)
+
+    for n, g, l, u in context.dims:
+        if n in dims:
+            cube.update_dimension(n, global_size=g,
+                lower_extent=l, upper_extent=u)
+        else:
+            cube.register_dimension(n, g, lower_extent=l, upper_extent=u)
+
+    # Solutions started without a hypercube
+    if context.name not in cube.arrays():
+        _register_array(cube, context.array_schema)
+
+    return SourceContext(context.name, cube, context.cfg,
+        context.iter_args, cube.array(context.name),
+        context.shape, context.dtype)
+
+def _init_worker(provider_id):
+    """
+    Reopens the providers of a ProcessSourceProvider in a newly
+    forked worker process, recording any failure to do so
+    """
+    for p in _WORKER_STATE[provider_id].providers:
+        try:
+            p.reopen()
+        except Exception as e:
+            _WORKER_ERRORS[provider_id] = ("'{p}' can't be used "
+                "in a worker process: {e!r}".format(p=p.name(), e=e))
+            return
+
+def _worker_error(provider_id):
+    """ Returns any failure to reopen providers in a worker process """
+    return _WORKER_ERRORS.get(provider_id, None)
+
+def _call_data_source(provider_id, name, context, segment):
+    """
+    Calls a data source in a worker process.
+
+    Arrays fitting in the given shared memory segment are written
+    there and described by a :class:`_Shared` tuple. Other values
+    are returned to the parent process by pickling.
+    """
+    error = _WORKER_ERRORS.get(provider_id, None)
+
+    if error is not None:
+        raise ValueError(error)
+
+    state = _WORKER_STATE[provider_id]
+    data = state.data_sources[name](_source_context(provider_id, context))
+
+    if (not isinstance(data, np.ndarray) or data.dtype.hasobject
+                                or data.nbytes > state.segment_bytes):
+        return data
+
+    dest = np.frombuffer(state.shared, dtype=np.uint8, count=data.nbytes,
+        offset=segment*state.segment_bytes)
+    dest[:] = np.ascontiguousarray(data).reshape(-1).view(np.uint8)
+
+    return _Shared(data.dtype.str, data.shape)
+
+def _process(name, method):
+    """
+    Decorator returning a method that calls
+    the named data source in the process pool.
+    """
+    @functools.wraps(method)
+    def wrapper(self, context):
+        return self._process_call(name, method, context)
+
+    return wrapper
+
+def _proxy(method):
+    """
+    Decorator returning a method that proxies a data source.
+    """
+    @functools.wraps(method)
+    def wrapper(self, context):
+        return method(context)
+
+    return wrapper
+
+class ProcessSourceProvider(SourceProvider):
+    """
+    Calls data_sources on the listed providers in a pool of
+    worker processes, so that CPU bound data sources do not contend
+    for the Global Interpreter Lock with the solver's feed
+    and sink threads.
+
+    Arrays are returned from the workers through a ring of
+    preallocated shared memory segments, rather than by pickling.
+    Each call occupies a segment until its array has been copied out,
+    bounding the number of calls in flight. Values that are not
+    arrays, or that are larger than a segment, are pickled.
+
+    Workers are forked when a solution starts, so that they observe
+    the state of the providers after their ``start`` method,
+    and are shut down when it stops. Data sources called outside
+    of a solution are called in this process.
+    Each worker calls the ``reopen`` method of the providers
+    after it is forked, to replace the files, locks and threads
+    inherited from this process. Providers raising an exception
+    from ``reopen`` are refused when the solution starts.
+    Data sources must not rely on state modified during the solution.
+    Contexts passed to data sources in worker processes hold the
+    dimensions and array schemas of the solver's hypercube,
+    but not its properties.
+    """
+    def __init__(self, providers, process_data_sources=None,
+                processes=None, segments=None,
+                segment_bytes=DEFAULT_SEGMENT_BYTES):
+        """
+        Parameters
+        ----------
+        providers: SourceProvider or Sequence of SourceProviders
+            providers containing data sources to call in worker processes
+        process_data_sources: list of str
+            list of data sources called in worker processes
+            (Defaults to None in which case all data sources are)
+        processes: integer
+            Number of worker processes. Defaults to None
+            in which case the number of CPUs is used.
+        segments: integer
+            Number of shared memory segments. Defaults to None
+            in which case twice the number of processes is used.
+        segment_bytes: integer
+            Size of each shared memory segment in bytes.
+        """
+        if not isinstance(providers, collections.Sequence):
+            providers = [providers]
+
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        if segments is None:
+            segments = 2*processes
+
+        if processes < 1:
+            raise ValueError("processes '{}' must be "
+                            "at least 1".format(processes))
+
+        if segments < 1:
+            raise ValueError("segments '{}' must be "
+                            "at least 1".format(segments))
+
+        if segment_bytes < 1:
+            raise ValueError("segment_bytes '{}' must be "
+                            "at least 1".format(segment_bytes))
+
+        self._providers = providers
+        self._processes = processes
+        self._segment_bytes = segment_bytes
+        self._id = next(_provider_ids)
+        self._pool = None
+        self._lock = threading.Lock()
+
+        # Anonymous memory maps are shared with forked processes
+        self._shared = mmap.mmap(-1, segments*segment_bytes)
+
+        # Ring of free segments
+        self._free = Queue.Queue()
+
+        for s in range(segments):
+            self._free.put(s)
+
+        self._calls = 0
+        self._shared_calls = 0
+        self._shared_bytes = 0
+        self._pickled = 0
+        self._inline = 0
+
+        # Construct a list of provider data sources
+        prov_data_sources = { n: ds for prov in providers
+                            for n, ds in prov.sources().iteritems() }
+
+        # Uniquely identify data source keys
+        prov_ds = set(prov_data_sources.keys())
+
+        # Call all data sources in worker processes by default
+        if process_data_sources is None:
+            process_data_sources = prov_ds
+        else:
+            # Uniquely identify data sources called in worker processes
+            process_data_sources = set(process_data_sources)
+            ds_diff = list((process_data_sources.difference(prov_ds)))
+
+            if len(ds_diff) > 0:
+                montblanc.log.warning("'{}' was requested to call the "
+                                     "following data source(s) '{}' "
+                                    "in worker processes but they were "
+                                    "not present on the supplied "
+                                    "providers '{}'".format(
+                                        self.name(), ds_diff,
+                                        [p.name() for p in providers]))
+
+        self._data_sources = { n: ds for n, ds
+            in prov_data_sources.iteritems()
+            if n in process_data_sources }
+
+        # Construct data sources on this source provider
+        for n, ds in prov_data_sources.iteritems():
+            if n in process_data_sources:
+                setattr(self, n, types.MethodType(_process(n, ds), self))
+            else:
+                setattr(self, n, types.MethodType(_proxy(ds), self))
+
+    def _process_call(self, name, method, context):
+        """ Call the data source in the process pool """
+        with self._lock:
+            pool = self._pool
+            self._calls += 1
+
+            if pool is None:
+                self._inline += 1
+
+        if pool is None:
+            return method(context)
+
+        # Blocks while all segments are in use
+        segment = self._free.get()
+
+        try:
+            result = pool.apply_async(_call_data_source, (self._id,
+                name, _worker_context(context), segment)).get()
+
+            if not isinstance(result, _Shared):
+                with self._lock:
+                    self._pickled += 1
+
+                return result
+
+            # Copy the array out of the segment before it is reused
+            dtype = np.dtype(result.dtype)
+            count = int(np.prod(result.shape))
+            data = np.frombuffer(self._shared, dtype=dtype, count=count,
+                offset=segment*self._segment_bytes).reshape(result.shape)
+            data = data.copy()
+        finally:
+            self._free.put(segment)
+
+        with self._lock:
+            self._shared_calls += 1
+            self._shared_bytes += data.nbytes
+
+        return data
+
+    def _start_pool(self, start_context):
+        """ Fork the worker processes, reopening providers in each """
+        if isinstance(start_context, StartContext):
+            arrays = { n: _picklable_schema(a) for n, a
+                in start_context.cube.arrays().iteritems() }
+        else:
+            arrays = {}
+
+        _WORKER_STATE[self._id] = _WorkerState(self._providers,
+            self._data_sources, arrays, self._shared, self._segment_bytes)
+
+        pool = multiprocessing.Pool(self._processes,
+            initializer=_init_worker, initargs=(self._id,))
+
+        # Workers reopen providers identically,
+        # so checking one of them suffices
+        error = pool.apply(_worker_error, (self._id,))
+
+        if error is not None:
+            pool.terminate()
+            pool.join()
+            _WORKER_STATE.pop(self._id, None)
+            raise ValueError(error)
+
+        with self._lock:
+            self._pool = pool
+
+    def _stop_pool(self):
+        """ Shut down the worker processes """
+        with self._lock:
+            pool, self._pool = self._pool, None
+
+        _WORKER_STATE.pop(self._id, None)
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def init(self, init_context):
+        """ Perform any initialisation required """
+        for p in self._providers:
+            p.init(init_context)
+
+    def start(self, start_context):
+        """ Perform any logic on solution start """
+        for p in self._providers:
+            p.start(start_context)
+
+        self._stop_pool()
+        self._start_pool(start_context)
+
+    def stop(self, stop_context):
+        """ Perform any logic on solution stop """
+        self._stop_pool()
+
+        montblanc.log.debug("{n} statistics {s}".format(
+            n=self.name(), s=self.stats()))
+
+        for p in self._providers:
+            p.stop(stop_context)
+
+    def reopen(self):
+        """ Worker processes can't fork their own workers """
+        raise NotImplementedError("'{}' can't be nested "
+            "in another ProcessSourceProvider".format(self.name()))
+
+    def updated_dimensions(self):
+        """ Update the dimensions """
+        return [d for p in self._providers
+                  for d in p.updated_dimensions()]
+
+    def name(self):
+        sub_prov_names = ', '.join([p.name() for p in self._providers])
+        return 'Process({})'.format(sub_prov_names)
+
+    def close(self):
+        """ Shut down the worker processes and release shared memory """
+        self._stop_pool()
+        self._shared.close()
+
+    def stats(self):
+        """ Returns a dictionary of data source call statistics """
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'shared': self._shared_calls,
+                'shared_bytes': self._shared_bytes,
+                'pickled': self._pickled,
+                'inline': self._inline,
+            }
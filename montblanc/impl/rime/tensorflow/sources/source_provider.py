@@ -42,6 +42,10 @@ class AbstractSourceProvider(object):
         """ Perform any required cleanup """
         raise NotImplementedError()
 
+    def reopen(self):
+        """ Reopen resources inherited by a forked process """
+        raise NotImplementedError()
+
     def sources(self):
         """ Returns a dictionary of source methods, keyed on source name """
         raise NotImplementedError()
@@ -56,6 +60,38 @@ class AbstractSourceProvider(object):
 
 DEFAULT_ARGSPEC = ['self', 'context']
 
+def relaxed_source(method):
+    """
+    Decorator marking a data source as opting into a relaxed
+    contract with the solver. Rather than returning arrays of exactly
+    :code:`context.shape` and :code:`context.dtype`, the data source
+    may return any array that is
+
+    1. castable to :code:`context.dtype`
+       (under numpy's :code:`same_kind` casting rules), and
+    2. either laid out in Measurement Set rows, i.e. the expected
+       shape with its leading dimensions merged into a single row
+       dimension, in which case it is reshaped in C order,
+       or broadcastable to the expected shape. The channel dimension
+       may also be laid out as (nbands, channels per band).
+       Other arrays, such as transposed ones, are rejected.
+
+    The solver conforms such arrays with at most one copy, and none
+    at all if a contiguous array of the expected dtype is returned.
+    Data sources should therefore avoid defensive
+    :code:`astype` and :code:`reshape` calls.
+
+    .. code-block:: python
+
+        class UVWSourceProvider(SourceProvider):
+            @relaxed_source
+            def uvw(self, context):
+                (lt, ut), (la, ua), (_, _) = context.array_extents("uvw")
+                return self._uvw[lt:ut, la:ua, :]
+    """
+    method.relaxed = True
+    return method
+
 def find_sources(obj, argspec=None):
     """
     Returns a dictionary of source methods found on this object,
@@ -110,6 +146,16 @@ class SourceProvider(AbstractSourceProvider):
         """ Perform any required cleanup. """
         pass
 
+    def reopen(self):
+        """
+        Called in a forked process, such as a worker of a
+        :py:class:`.ProcessSourceProvider`, before any data sources
+        are called. Files, locks and threads inherited from the parent
+        process should be replaced here. Providers which can't
+        be used in a forked process should raise NotImplementedError.
+        """
+        pass
+
     def sources(self):
         """
         Returns a dictionary of source methods found on this object,
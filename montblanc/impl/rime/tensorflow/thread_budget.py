@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import ctypes
+import ctypes.util
+import glob
+import multiprocessing
+import os
+import re
+
+import attr
+import numpy as np
+
+import montblanc
+
+# Threads outside the shards issuing blocking staging area operations
+# to the session: the descriptor feeder, the descriptor reader
+# and the output consumer
+PIPELINE_THREADS = 3
+
+ThreadBudget = attr.make_class("ThreadBudget", ['shards_per_device',
+    'omp_threads', 'intra_op_threads', 'inter_op_threads', 'shard_cpus'],
+    slots=True, frozen=True)
+
+def _parse_cpu_list(cpu_list):
+    """ Parses a linux cpu list, '0-3,8-11' for example """
+    cpus = []
+
+    for r in cpu_list.strip().split(','):
+        if len(r) == 0:
+            continue
+
+        lower, _, upper = r.partition('-')
+        cpus.extend(range(int(lower), int(upper or lower) + 1))
+
+    return cpus
+
+def available_cpus():
+    """ Returns the CPUs on which this process may run """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Cpus_allowed_list:'):
+                    return _parse_cpu_list(line.split(':', 1)[1])
+    except IOError:
+        pass
+
+    return range(multiprocessing.cpu_count())
+
+def numa_nodes():
+    """
+    Returns a list of the CPUs on each NUMA node.
+    A single node holding all CPUs is assumed if
+    NUMA information is unavailable.
+    """
+    node_dirs = glob.glob('/sys/devices/system/node/node[0-9]*')
+    node_nr = lambda d: int(re.search(r'node(\d+)$', d).group(1))
+    nodes = []
+
+    for node_dir in sorted(node_dirs, key=node_nr):
+        try:
+            with open(os.path.join(node_dir, 'cpulist')) as f:
+                nodes.append(_parse_cpu_list(f.read()))
+        except IOError:
+            pass
+
+    if len(nodes) == 0:
+        return [range(multiprocessing.cpu_count())]
+
+    return nodes
+
+def _shard_cpus(cpus, nodes, shards):
+    """
+    Partition cpus into a disjoint set per shard.
+    CPUs are ordered by NUMA node so that, where shards
+    evenly divide the nodes, each shard's CPUs
+    lie on a single node.
+    """
+    cpu_set = set(cpus)
+    ordered = [c for node in nodes for c in node if c in cpu_set]
+    ordered.extend(sorted(cpu_set.difference(ordered)))
+
+    return [tuple(int(c) for c in a) for a
+        in np.array_split(ordered, shards) if len(a) > 0]
+
+def plan_thread_budget(slvr_cfg, nr_of_devices, use_cpus):
+    """
+    Plan the number of threads used by each thread pool in the solver
+    so that concurrently executing shards do not oversubscribe the CPUs.
+    Thread counts are zero if the 'thread_budget' option is disabled.
+
+    Each shard is given an equal share of the CPU threads.
+    This share is used by the OpenMP parallel regions of each
+    operator executing on the shard.
+
+    Blocking staging area gets and puts hold an inter-op thread
+    while they wait, so tensorflow's inter-op pool holds a thread
+    for the feed and compute of each shard and for each
+    thread of the feed/consume pipeline, so that waiting
+    operations never starve compute. Even a single shard
+    therefore has at least five inter-op threads.
+
+    Parameters
+    ----------
+    slvr_cfg : dict
+        Solver configuration
+    nr_of_devices : integer
+        Number of compute devices
+    use_cpus : boolean
+        True if compute is performed on CPUs, rather than GPUs
+
+    Returns
+    -------
+    :class:`ThreadBudget`
+    """
+    cpus = available_cpus()
+    nthreads = slvr_cfg.get('cpu_threads', 0)
+    nthreads = len(cpus) if nthreads == 0 else nthreads
+    spd = slvr_cfg.get('shards_per_device', 2)
+
+    # Don't run more CPU shards than there are threads
+    if use_cpus:
+        spd = max(1, min(spd, nthreads // nr_of_devices))
+
+    shards = spd*nr_of_devices
+
+    if slvr_cfg.get('thread_budget', True):
+        omp_threads = max(1, nthreads // shards)
+        # CPU shards share the intra-op pool between them
+        # while GPU shards mostly leave it idle
+        intra_op_threads = omp_threads if use_cpus else nthreads
+        inter_op_threads = 2*shards + PIPELINE_THREADS
+    else:
+        # Zero leaves the library defaults in place
+        omp_threads = intra_op_threads = inter_op_threads = 0
+
+    if slvr_cfg.get('cpu_affinity', False):
+        shard_cpus = _shard_cpus(cpus[:nthreads], numa_nodes(), shards)
+    else:
+        shard_cpus = None
+
+    return ThreadBudget(spd, omp_threads, intra_op_threads,
+        inter_op_threads, shard_cpus)
+
+# OMP_NUM_THREADS value set by configure_openmp, if any
+_configured_omp_threads = None
+
+def configure_openmp(slvr_cfg):
+    """
+    Sets the number of OpenMP threads used by each operator
+    in the tensorflow rime library. This must be called
+    before the library is loaded, so only the first solver
+    in a process configures it. A user supplied
+    OMP_NUM_THREADS environment variable is respected.
+    """
+    global _configured_omp_threads
+
+    omp_threads = str(plan_thread_budget(slvr_cfg, 1, True).omp_threads)
+
+    if omp_threads == '0':
+        return
+
+    env_threads = os.environ.get('OMP_NUM_THREADS', None)
+
+    if env_threads is None:
+        os.environ['OMP_NUM_THREADS'] = omp_threads
+        _configured_omp_threads = omp_threads
+    elif env_threads == omp_threads:
+        pass
+    elif env_threads == _configured_omp_threads:
+        montblanc.log.warn("OpenMP was configured with {e} threads per "
+            "operator for an earlier solver in this process. The planned "
+            "{p} threads per operator can't take effect once the rime "
+            "library is loaded.".format(e=env_threads, p=omp_threads))
+    else:
+        montblanc.log.info("OMP_NUM_THREADS={e} is already set in the "
+            "environment, rather than the planned {p}.".format(
+                e=env_threads, p=omp_threads))
+
+_libc = None
+
+def pin_thread(cpus):
+    """
+    Pin the calling thread to the supplied CPUs.
+    Returns True on success, False otherwise.
+    """
+    global _libc
+
+    try:
+        if _libc is None:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                use_errno=True)
+
+        nr_of_cpus = max(max(cpus) + 1, multiprocessing.cpu_count())
+        word_bits = 8*ctypes.sizeof(ctypes.c_ulong)
+        mask = (ctypes.c_ulong*((nr_of_cpus + word_bits - 1) // word_bits))()
+
+        for c in cpus:
+            mask[c // word_bits] |= 1 << (c % word_bits)
+
+        # A pid of 0 refers to the calling thread
+        if _libc.sched_setaffinity(0, ctypes.sizeof(mask), mask) != 0:
+            raise OSError(ctypes.get_errno(),
+                os.strerror(ctypes.get_errno()))
+    except (AttributeError, OSError, TypeError) as e:
+        montblanc.log.warn("Unable to pin thread to CPUs "
+            "{c}: {e}".format(c=list(cpus), e=e))
+        return False
+
+    return True
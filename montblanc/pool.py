@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import atexit
+import collections
+import contextlib
+import threading
+
+import montblanc
+import montblanc.util as mbu
+
+def solver_pool_key(slvr_cfg):
+    """
+    Returns the key under which solvers constructed from
+    slvr_cfg are pooled.
+
+    Solvers are keyed by dtype, polarisation type, device type and
+    shards per device. As the remaining options also affect the
+    constructed solver, they form the last element of the key.
+    """
+    primary = ('dtype', 'polarisation_type',
+        'device_type', 'shards_per_device')
+
+    return (tuple(slvr_cfg[k] for k in primary) +
+        (mbu.freeze({ k: v for k, v in slvr_cfg.iteritems()
+            if k not in primary }),))
+
+class SolverPool(object):
+    """
+    Pool of constructed RIME solvers, reused across solves
+    with equivalent configurations.
+
+    Constructing a solver creates its compute graph and session,
+    which can dominate wall-clock time when many small problems
+    are solved in sequence. Solvers released to the pool are
+    handed out again by subsequent acquisitions with the same
+    :func:`solver_pool_key`.
+
+    .. code-block:: python
+
+        pool = SolverPool()
+
+        for msname in msnames:
+            with pool.solver(slvr_cfg) as slvr:
+                slvr.solve(source_providers=..., sink_providers=...)
+
+        pool.close()
+    """
+    def __init__(self, max_idle=1):
+        """
+        Parameters
+        ----------
+        max_idle : integer
+            Maximum number of idle solvers retained per key.
+            Further released solvers are closed.
+        """
+        if max_idle < 0:
+            raise ValueError("max_idle '{m}' must be "
+                "non-negative".format(m=max_idle))
+
+        self._max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = collections.defaultdict(list)
+        self._in_use = {}
+        self._closed = False
+
+        self._created = 0
+        self._reused = 0
+        self._discarded = 0
+        self._startup_time = 0.0
+        self._startup_saved = 0.0
+
+    def acquire(self, slvr_cfg):
+        """
+        Returns an idle solver constructed with an equivalent
+        configuration, constructing a new one if none are available.
+        The solver should be returned with :meth:`release`.
+        """
+        key = solver_pool_key(slvr_cfg)
+
+        with self._lock:
+            if self._closed:
+                raise ValueError("SolverPool is closed")
+
+            idle = self._idle.get(key)
+
+            if idle:
+                slvr = idle.pop()
+                self._in_use[id(slvr)] = key
+                self._reused += 1
+                self._startup_saved += slvr.startup_stats().get('total', 0.0)
+                return slvr
+
+        # Construct outside the lock, other
+        # keys may be acquired meanwhile
+        slvr = montblanc.rime_solver(slvr_cfg)
+
+        with self._lock:
+            self._in_use[id(slvr)] = key
+            self._created += 1
+            self._startup_time += slvr.startup_stats().get('total', 0.0)
+
+        return slvr
+
+    def release(self, slvr, discard=False):
+        """
+        Returns a solver acquired from this pool. The solver is closed
+        if discard is True, the pool is closed or sufficient solvers
+        with the same key are already idle.
+        """
+        with self._lock:
+            try:
+                key = self._in_use.pop(id(slvr))
+            except KeyError:
+                raise ValueError("Solver was not acquired from this pool")
+
+            idle = self._idle[key]
+            retain = (not discard and not self._closed and
+                len(idle) < self._max_idle)
+
+            if retain:
+                idle.append(slvr)
+            else:
+                self._discarded += 1
+
+        if not retain:
+            slvr.close()
+
+    @contextlib.contextmanager
+    def solver(self, slvr_cfg):
+        """
+        Context manager acquiring a solver and releasing it on exit.
+        Solvers that raised an exception are discarded, as their
+        staging areas may hold data from the failed solve.
+        """
+        slvr = self.acquire(slvr_cfg)
+
+        try:
+            yield slvr
+        except:
+            self.release(slvr, discard=True)
+            raise
+        else:
+            self.release(slvr)
+
+    def stats(self):
+        """ Returns a dictionary of pool statistics """
+        with self._lock:
+            return {
+                'created': self._created,
+                'reused': self._reused,
+                'discarded': self._discarded,
+                'idle': sum(len(v) for v in self._idle.itervalues()),
+                'in_use': len(self._in_use),
+                'startup_time': self._startup_time,
+                'startup_saved': self._startup_saved,
+            }
+
+    def close(self):
+        """
+        Close all idle solvers. Solvers still in use
+        are closed when they are released.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [s for v in self._idle.itervalues() for s in v]
+            self._idle.clear()
+
+        for slvr in idle:
+            slvr.close()
+
+        montblanc.log.debug("SolverPool closed: {s}".format(s=self.stats()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, evalue, etrace):
+        self.close()
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def default_solver_pool():
+    """
+    Returns the process-level :class:`SolverPool`,
+    creating it on first use. It is closed on interpreter exit.
+    """
+    global _default_pool
+
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SolverPool()
+            atexit.register(_default_pool.close)
+
+        return _default_pool
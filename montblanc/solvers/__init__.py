@@ -19,3 +19,4 @@
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
 from montblanc.solvers.mb_tensorflow_solver import MontblancTensorflowSolver
+from montblanc.solvers.mb_numpy_solver import MontblancNumpySolver
@@ -59,6 +59,9 @@ class RIMESolver(object):
         # Is this solver handling auto-correlations
         self._is_auto_correlated = slvr_cfg['auto_correlations']
 
+        # Time taken to start the solver, per phase, in seconds
+        self._startup_stats = {}
+
     @property
     def hypercube(self):
         return self._cube
@@ -111,6 +114,14 @@ class RIMESolver(object):
         """ Returns the configuration dictionary for this solver """
         return self._slvr_cfg
 
+    def startup_stats(self):
+        """
+        Returns a dictionary of the time taken, in seconds,
+        by each phase of the solver's construction.
+        The 'total' key holds the overall startup time.
+        """
+        return dict(self._startup_stats)
+
     def solve(self):
         """ Solve the RIME """
         pass
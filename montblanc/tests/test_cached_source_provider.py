@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+import montblanc
+from montblanc.impl.rime.tensorflow.sources import (SourceProvider,
+    CachedSourceProvider)
+
+class FakeContext(object):
+    """ Source context supplying a name and its array extents """
+    def __init__(self, name, extents):
+        self.name = name
+        self._extents = extents
+
+    def array_extents(self, name):
+        return self._extents
+
+class CountingProvider(SourceProvider):
+    """
+    Counts calls to its data sources, optionally
+    blocking uvw calls until released
+    """
+    def __init__(self, nbytes=80):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+        self._lock = threading.Lock()
+        self._n = nbytes // 8
+
+    def name(self):
+        return "Counting"
+
+    def uvw(self, context):
+        with self._lock:
+            self.calls += 1
+
+        self.started.set()
+        self.release.wait()
+
+        if self.fail:
+            raise ValueError("uvw failed")
+
+        return np.full(self._n, context.array_extents(context.name)[0][0],
+                                                        dtype=np.float64)
+
+    def antenna1(self, context):
+        with self._lock:
+            self.calls += 1
+
+        return np.zeros(self._n, dtype=np.float64)
+
+class TestCachedSourceProvider(unittest.TestCase):
+    """
+    TestCachedSourceProvider class defining unit tests for
+    montblanc's CachedSourceProvider
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+
+    def test_lru_eviction(self):
+        """ Test that the least recently used values are evicted """
+        prov = CountingProvider(nbytes=80)
+        cache = CachedSourceProvider(prov, max_bytes=160)
+
+        for t in (0, 1, 0, 2):
+            cache.uvw(FakeContext('uvw', [(t, t+1)]))
+
+        # Time 1 was the least recently used
+        self.assertEqual(cache.cache_size().ram, 160)
+        cache.uvw(FakeContext('uvw', [(0, 1)]))
+        cache.uvw(FakeContext('uvw', [(1, 2)]))
+
+        stats = cache.stats()
+        self.assertEqual(prov.calls, 4)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 4)
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['evicted_bytes'], 160)
+        self.assertEqual(stats['entries'], 2)
+
+        # Values larger than the cache aren't cached
+        small = CachedSourceProvider(CountingProvider(nbytes=80), max_bytes=40)
+        small.uvw(FakeContext('uvw', [(0, 1)]))
+        self.assertEqual(small.cache_size().ram, 0)
+        self.assertEqual(small.stats()['uncached'], 1)
+
+    def test_single_flight(self):
+        """ Test that concurrent misses call the data source once """
+        prov = CountingProvider()
+        prov.release.clear()
+        cache = CachedSourceProvider(prov)
+        ctx = FakeContext('uvw', [(3, 4)])
+        results = []
+
+        def _request():
+            results.append(cache.uvw(ctx))
+
+        threads = [threading.Thread(target=_request) for i in range(4)]
+
+        for t in threads:
+            t.start()
+
+        prov.started.wait()
+
+        # Other data sources aren't blocked by the call in progress
+        cache.antenna1(FakeContext('antenna1', [(0, 1)]))
+
+        while cache.stats()['waits'] < 3:
+            time.sleep(0.01)
+
+        prov.release.set()
+
+        for t in threads:
+            t.join()
+
+        self.assertEqual(prov.calls, 2)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(cache.stats()['waits'], 3)
+
+    def test_failure(self):
+        """ Test that failures reach all waiters and aren't cached """
+        prov = CountingProvider()
+        prov.fail = True
+        prov.release.clear()
+        cache = CachedSourceProvider(prov)
+        ctx = FakeContext('uvw', [(0, 1)])
+        errors = []
+
+        def _request():
+            try:
+                cache.uvw(ctx)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=_request) for i in range(2)]
+
+        for t in threads:
+            t.start()
+
+        while cache.stats()['waits'] < 1:
+            time.sleep(0.01)
+
+        prov.release.set()
+
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(cache.cache_size().ram, 0)
+
+        prov.fail = False
+        cache.uvw(ctx)
+        self.assertEqual(prov.calls, 2)
+
+    def test_clear_during_call(self):
+        """ Test that values requested before a clear aren't cached """
+        prov = CountingProvider()
+        prov.release.clear()
+        cache = CachedSourceProvider(prov)
+        ctx = FakeContext('uvw', [(0, 1)])
+
+        thread = threading.Thread(target=cache.uvw, args=(ctx,))
+        thread.start()
+        prov.started.wait()
+        cache.clear_cache()
+        prov.release.set()
+        thread.join()
+
+        self.assertEqual(cache.cache_size().ram, 0)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_spill(self):
+        """ Test spilling evicted values to disk and promoting them """
+        spill_dir = tempfile.mkdtemp()
+
+        try:
+            prov = CountingProvider(nbytes=80)
+            cache = CachedSourceProvider(prov, max_bytes=80,
+                spill_dir=spill_dir, max_spill_bytes=160)
+            ctx = lambda t: FakeContext('uvw', [(t, t+1)])
+
+            for t in range(4):
+                cache.uvw(ctx(t))
+
+            # Time 3 is in memory, times 1 and 2 on disk
+            # and time 0 was evicted from disk
+            self.assertEqual(cache.cache_size(), (80, 160))
+            self.assertEqual(cache.stats()['spill_evictions'], 1)
+
+            # Promote time 1 back into memory, spilling time 3
+            data = cache.uvw(ctx(1))
+            self.assertTrue(np.all(data == 1))
+            self.assertEqual(prov.calls, 4)
+            self.assertEqual(cache.cache_size(), (80, 160))
+
+            stats = cache.stats()
+            self.assertEqual(stats['promotions'], 1)
+            self.assertEqual(stats['spills'], 4)
+            self.assertEqual(stats['spill_entries'], 2)
+
+            # Time 0 must be requested from the data source again
+            self.assertTrue(np.all(cache.uvw(ctx(0)) == 0))
+            self.assertEqual(prov.calls, 5)
+
+            subdirs = os.listdir(spill_dir)
+            self.assertEqual(len(subdirs), 1)
+            files = os.listdir(os.path.join(spill_dir, subdirs[0]))
+            self.assertEqual(len(files), cache.stats()['spill_entries'])
+
+            cache.close()
+            self.assertEqual(cache.cache_size(), (0, 0))
+            self.assertEqual(os.listdir(spill_dir), [])
+        finally:
+            shutil.rmtree(spill_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+
+import attrdict
+from hypercube import HyperCube
+import numpy as np
+from astropy.io import fits
+
+import montblanc
+from montblanc.impl.rime.numpy.rime_kernels import e_beam
+from montblanc.impl.rime.tensorflow.sources import (FitsBeamSourceProvider,
+    SourceContext)
+
+# (l, m, frequency) size of the test beams
+BEAM_SHAPE = (5, 6, 3)
+
+def create_beams(schema, corrs=('xx', 'yy'), scale=1.0):
+    """
+    Create FITS beams for the given correlations,
+    returning the expected (l, m, frequency, corr) cube.
+    Other correlations are not created.
+    """
+    header = fits.Header()
+    for i, (ctype, n) in enumerate(zip(('X', 'Y', 'FREQ'), BEAM_SHAPE), 1):
+        header['CTYPE%d' % i] = ctype
+        header['CRPIX%d' % i] = 1
+        header['CRVAL%d' % i] = 1e9 if ctype == 'FREQ' else -1.0
+        header['CDELT%d' % i] = 1e6 if ctype == 'FREQ' else 0.5
+
+    expected = np.zeros(BEAM_SHAPE + (4,), dtype=np.complex128)
+
+    for c, corr in enumerate(('xx', 'xy', 'yx', 'yy')):
+        if corr not in corrs:
+            continue
+
+        for reim in ('re', 'im'):
+            data = (np.random.random(BEAM_SHAPE[::-1])*scale)
+            filename = schema.replace('$(corr)', corr).replace('$(reim)', reim)
+            fits.PrimaryHDU(data, header=header).writeto(filename,
+                overwrite=True)
+
+            if reim == 're':
+                expected[:,:,:,c].real = data.T
+            else:
+                expected[:,:,:,c].imag = data.T
+
+    return expected
+
+class TestFitsBeamCache(unittest.TestCase):
+    """
+    TestFitsBeamCache class defining unit tests for the
+    beam cube cache of the FitsBeamSourceProvider
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+        self._tmp_dir = tempfile.mkdtemp()
+        self._schema = os.path.join(self._tmp_dir, 'beam_$(corr)_$(reim).fits')
+        self._cache_dir = os.path.join(self._tmp_dir, 'cache')
+        self._init_context = attrdict.AttrDict(
+            cfg={'polarisation_type': 'linear'})
+
+    def tearDown(self):
+        """ Tear down each test case """
+        shutil.rmtree(self._tmp_dir)
+
+    def _context(self, prov, name, dtype, nud_extents=None):
+        """ Source context for the named beam array of prov """
+        cube = HyperCube()
+
+        for n, size in prov.updated_dimensions():
+            l, u = (0, size) if n != 'beam_nud' or nud_extents is None \
+                else nud_extents
+            cube.register_dimension(n, size, lower_extent=l, upper_extent=u)
+
+        cube.register_dimension('npol', 4)
+        cube.register_dimension('na', 3)
+        cube.register_array('ebeam', ('beam_nb', 'beam_lw', 'beam_mh',
+            'beam_nud', 'npol'), dtype)
+        cube.register_array('antenna_beam', ('na',), np.int32)
+        cube.register_array('beam_freq_map', ('beam_nud',), np.float64)
+        cube.register_array('beam_extents', (6,), np.float64)
+        array = cube.array(name, reify=True)
+
+        return SourceContext(name, cube, {}, [], cube.array(name),
+            array.shape, array.dtype)
+
+    def _ebeam(self, prov, dtype=np.complex128, nud_extents=None):
+        """ Request the beam cube from prov """
+        prov.init(self._init_context)
+        return prov.ebeam(self._context(prov, 'ebeam', dtype, nud_extents))
+
+    def _beam_arrays(self, prov, nud_extents=None):
+        """ Request the beam extents, frequency map and cube from prov """
+        prov.init(self._init_context)
+        return tuple(getattr(prov, n)(self._context(prov, n, np.complex128
+            if n == 'ebeam' else np.float64, nud_extents))
+                for n in ('beam_extents', 'beam_freq_map', 'ebeam'))
+
+    def test_ebeam_assembled_once(self):
+        """ Test that the beam cube is assembled once, read-only """
+        expected = create_beams(self._schema)
+
+        with FitsBeamSourceProvider(self._schema,
+                l_axis='X', m_axis='Y') as prov:
+            ebeam = self._ebeam(prov)
+            self.assertTrue(np.all(ebeam[0] == expected))
+            self.assertFalse(ebeam.flags.writeable)
+
+            files = prov._files
+            self.assertTrue(np.may_share_memory(self._ebeam(prov), ebeam))
+            self.assertTrue(prov._files is files)
+
+            ebeam64 = self._ebeam(prov, np.complex64)
+            self.assertEqual(ebeam64.dtype, np.complex64)
+            self.assertTrue(np.allclose(ebeam64[0], expected))
+
+    def test_disk_cache(self):
+        """ Test that cubes are cached on disk, keyed on content """
+        expected = create_beams(self._schema)
+
+        with FitsBeamSourceProvider(self._schema, l_axis='X',
+                m_axis='Y', cache_dir=self._cache_dir) as prov:
+            self.assertTrue(np.all(self._ebeam(prov)[0] == expected))
+
+        cached = glob.glob(os.path.join(self._cache_dir, '*.npy'))
+        self.assertEqual(len(cached), 1)
+
+        # A new provider memory maps the cached cube
+        with FitsBeamSourceProvider(self._schema, l_axis='X',
+                m_axis='Y', cache_dir=self._cache_dir) as prov:
+            prov._assemble_ebeam = None
+            ebeam = self._ebeam(prov)
+            self.assertTrue(isinstance(ebeam, np.memmap))
+            self.assertTrue(np.all(ebeam[0] == expected))
+            del ebeam
+
+        # Changing the beams creates a new cube
+        expected = create_beams(self._schema, scale=2.0)
+
+        with FitsBeamSourceProvider(self._schema, l_axis='X',
+                m_axis='Y', cache_dir=self._cache_dir) as prov:
+            self.assertTrue(np.all(self._ebeam(prov)[0] == expected))
+
+        cached = glob.glob(os.path.join(self._cache_dir, '*.npy'))
+        self.assertEqual(len(cached), 2)
+
+    def test_frequency_window(self):
+        """ Test that only the bracketing frequency planes are fed """
+        create_beams(self._schema)
+        nchan, na, nsrc, ntime = 4, 3, 5, 2
+
+        # Beam planes lie at 1e9, 1.001e9 and 1.002e9
+        frequency = np.linspace(1.0003e9, 1.0018e9, nchan)
+
+        with FitsBeamSourceProvider(self._schema, l_axis='X', m_axis='Y') as prov, \
+            FitsBeamSourceProvider(self._schema, l_axis='X', m_axis='Y',
+                frequency=frequency[2:]) as wprov:
+
+            full = self._beam_arrays(prov)
+            window = self._beam_arrays(wprov)
+
+            self.assertEqual(full[2].shape[3], 3)
+            self.assertEqual(window[2].shape[3], 2)
+            self.assertTrue(np.all(window[2] == full[2][:,:,:,1:,:]))
+            self.assertTrue(np.all(window[1] == full[1][1:]))
+            self.assertEqual(tuple(window[0][[2, 5]]), tuple(full[1][1:]))
+
+            # Partial feeding of the window
+            partial = self._beam_arrays(wprov, nud_extents=(1, 2))
+            self.assertTrue(np.all(partial[2] == window[2][:,:,:,1:,:]))
+            self.assertTrue(np.all(partial[1] == window[1][1:]))
+
+            lm = (np.random.random((nsrc, 2)) - 0.5)*0.5
+            args = (np.zeros((ntime, na, 2, 2)),
+                np.ones((na, 2, 2)),
+                np.zeros((ntime, na)), np.ones((ntime, na)))
+
+            antenna_beam = np.zeros(na, dtype=np.int32)
+
+            self.assertTrue(np.allclose(
+                e_beam(lm, frequency[2:], *(args + full + (antenna_beam,))),
+                e_beam(lm, frequency[2:], *(args + window + (antenna_beam,)))))
+
+            # At least two planes are fed
+            wprov._frequency = [1.001e9]
+            wprov.close()
+            self.assertEqual(self._ebeam(wprov).shape[3], 2)
+
+    def test_antenna_beams(self):
+        """ Test that beams are stacked and mapped onto antenna """
+        schema2 = os.path.join(self._tmp_dir, 'other_$(corr)_$(reim).fits')
+        expected = [create_beams(self._schema), create_beams(schema2)]
+        antenna_beam = [1, 0, 1]
+
+        with FitsBeamSourceProvider([self._schema, schema2],
+                l_axis='X', m_axis='Y', antenna_beam=antenna_beam) as prov:
+            ebeam = self._ebeam(prov)
+            self.assertEqual(dict(prov.updated_dimensions())['beam_nb'], 2)
+            self.assertTrue(np.all(ebeam == np.stack(expected)))
+
+            context = self._context(prov, 'antenna_beam', np.int32)
+            self.assertEqual(prov.antenna_beam(context).tolist(),
+                antenna_beam)
+
+            extents, freq_map, ebeam = self._beam_arrays(prov)
+            nsrc, ntime, na, nchan = 4, 2, 3, 2
+            lm = (np.random.random((nsrc, 2)) - 0.5)*0.5
+            frequency = np.array([1.0005e9, 1.0015e9])
+            args = (np.zeros((ntime, na, nchan, 2)),
+                np.ones((na, nchan, 2)),
+                np.zeros((ntime, na)), np.ones((ntime, na)),
+                extents, freq_map)
+
+            jones = e_beam(lm, frequency, *(args + (ebeam,
+                np.asarray(antenna_beam, dtype=np.int32))))
+
+            # Each antenna matches a solve with its own beam
+            for b in range(2):
+                single = e_beam(lm, frequency, *(args + (ebeam[b:b+1],
+                    np.zeros(na, dtype=np.int32))))
+                ants = [a for a, ab in enumerate(antenna_beam) if ab == b]
+                self.assertTrue(np.allclose(jones[:,:,ants],
+                    single[:,:,ants]))
+
+        self.assertRaises(ValueError, FitsBeamSourceProvider,
+            [self._schema, schema2])
+        self.assertRaises(ValueError, FitsBeamSourceProvider,
+            [self._schema, schema2], antenna_beam=[0, 2])
+
+if __name__ == '__main__':
+    unittest.main()
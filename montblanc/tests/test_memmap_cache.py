@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import glob
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+from hypercube import HyperCube
+import numpy as np
+import pyrap.tables as pt
+
+import montblanc
+from montblanc.impl.rime.tensorflow.ms import MeasurementSetManager
+from montblanc.impl.rime.tensorflow.ms.memmap_cache import (
+    ensure_memmap_cache, memmap_cache_valid)
+from montblanc.impl.rime.tensorflow.sources import (MemmapSourceProvider,
+    MSSourceProvider, SourceContext)
+from montblanc.tests.test_ms_fields import (create_ms,
+    FIELD_TIMES, BASELINES)
+
+class TestMemmapCache(unittest.TestCase):
+    """
+    TestMemmapCache class defining unit tests for
+    memory mapped caches of Measurement Set data
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+        self._tmp_dir = tempfile.mkdtemp()
+        self._msname = os.path.join(self._tmp_dir, 'test.ms')
+        self._cache_dir = os.path.join(self._tmp_dir, 'cache')
+
+        create_ms(self._msname, [(f, t, a1, a2)
+            for f, times in FIELD_TIMES.iteritems()
+            for t, (a1, a2) in itertools.product(times, BASELINES)])
+
+    def tearDown(self):
+        """ Tear down each test case """
+        shutil.rmtree(self._tmp_dir)
+
+    def _context(self, name, dims, extents):
+        """ Source context for a tile of the named array """
+        cube = HyperCube()
+
+        for n, s in dims.iteritems():
+            l, u = extents.get(n, (0, s))
+            cube.register_dimension(n, s,
+                lower_extent=l, upper_extent=u)
+
+        cube.register_array('observed_vis',
+            ('ntime', 'nbl', 'nchan', 'npol'), np.complex128)
+        array = cube.array(name, reify=True)
+
+        return SourceContext(name, cube, {}, [], cube.array(name),
+            array.shape, array.dtype)
+
+    def test_memmap_source_provider(self):
+        """ Test that cached tiles match those read from the MS """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[1])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            ensure_memmap_cache(manager, self._cache_dir, slvr_cfg)
+            dims = dict(manager.updated_dimensions())
+            ms_prov = MSSourceProvider(manager, prefetch=0)
+
+            prov = MemmapSourceProvider(self._cache_dir)
+            self.assertEqual(dict(prov.updated_dimensions()), dims)
+            self.assertTrue('uvw' in prov.sources())
+
+            context = self._context('observed_vis', dims,
+                {'ntime': (1, 3)})
+            data = prov.observed_vis(context)
+
+            # Served without copying
+            self.assertTrue(isinstance(data, np.memmap))
+            self.assertEqual(data.shape, context.shape)
+            self.assertTrue(np.all(data ==
+                ms_prov.observed_vis(context).reshape(context.shape)))
+
+    def test_invalidation(self):
+        """ Test that modifying the MS invalidates the cache """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            ensure_memmap_cache(manager, self._cache_dir, slvr_cfg)
+
+            self.assertTrue(memmap_cache_valid(self._cache_dir,
+                self._msname, 0, 'DATA', 'double'))
+            self.assertFalse(memmap_cache_valid(self._cache_dir,
+                self._msname, 1, 'DATA', 'double'))
+
+            # Modify the column data of the MS
+            data = manager.main_table.getcol('DATA')
+            manager.main_table.putcol('DATA', data*2)
+            manager.main_table.flush()
+
+            # Make the modification visible regardless
+            # of file system timestamp resolution
+            for f in glob.glob(os.path.join(self._msname, 'table.f*')):
+                mtime = os.path.getmtime(f) + 10
+                os.utime(f, (mtime, mtime))
+
+            self.assertFalse(memmap_cache_valid(self._cache_dir,
+                self._msname, 0, 'DATA', 'double'))
+            self.assertRaises(ValueError, MemmapSourceProvider,
+                self._cache_dir)
+
+            # Recreating the cache validates it
+            ensure_memmap_cache(manager, self._cache_dir, slvr_cfg)
+            prov = MemmapSourceProvider(self._cache_dir)
+            vis = manager.ordered_main_table.getcol('DATA')
+            self.assertTrue(np.allclose(prov.arrays['observed_vis'][0,0],
+                vis[0]))
+
+    def test_solver_after_cache(self):
+        """ Test that creating a cache leaves solvers constructible """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0],
+            backend='numpy')
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            ensure_memmap_cache(manager, self._cache_dir, slvr_cfg)
+
+        with montblanc.rime_solver(slvr_cfg) as slvr:
+            self.assertEqual(slvr.hypercube.dim_global_size('ntime'), 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import unittest
+
+import attrdict
+import numpy as np
+
+import montblanc
+import montblanc.impl.rime.tensorflow.ms.ms_manager as MS
+from montblanc.impl.rime.tensorflow.sources.ms_source_provider import (
+    MSSourceProvider, CHUNK_CACHE_SIZE)
+
+class FakeTable(object):
+    """ Table returning row numbers, recording the reads """
+    def __init__(self):
+        self.reads = []
+
+    def getcol(self, column, startrow=0, nrow=-1):
+        self.reads.append((column, startrow, nrow))
+        return np.arange(startrow, startrow+max(nrow, 1))
+
+def _fake_manager():
+    field_table = FakeTable()
+    field_table.getcol = lambda *a, **kw: np.zeros((1, 1, 2))
+
+    tables = { MS.ORDERED_MAIN_TABLE: FakeTable(),
+        MS.ORDERED_UVW_TABLE: FakeTable() }
+
+    return attrdict.AttrDict(msname='fake.ms',
+        ordered_main_table=tables[MS.ORDERED_MAIN_TABLE],
+        ordered_uvw_table=tables[MS.ORDERED_UVW_TABLE],
+        reader_tables=lambda: tables,
+        antenna_table=FakeTable(),
+        ordered_time_table=FakeTable(),
+        field_table=field_table,
+        field_id=0,
+        weight_spectrum=False,
+        row_index=None,
+        uvw_row_index=None)
+
+class TestMSChunkCache(unittest.TestCase):
+    """
+    TestMSChunkCache class defining unit tests for the
+    chunk column cache of the MSSourceProvider
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+
+    def test_column_read_once_per_chunk(self):
+        """ Test that column ranges are only read once per chunk """
+        manager = _fake_manager()
+        uvw_table = manager.ordered_uvw_table
+        prov = MSSourceProvider(manager, prefetch=0)
+
+        # antenna1 is requested by both the
+        # antenna1 and uvw data sources
+        for i in range(2):
+            a1 = prov._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA1, 10, 20)
+            self.assertTrue(np.all(a1 == np.arange(10, 20)))
+
+        prov._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA2, 10, 20)
+        prov._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA1, 20, 30)
+
+        self.assertEqual(uvw_table.reads, [(MS.ANTENNA1, 10, 10),
+            (MS.ANTENNA2, 10, 10), (MS.ANTENNA1, 20, 10)])
+
+    def test_cache_bounded(self):
+        """ Test that old chunks are evicted from the cache """
+        manager = _fake_manager()
+        uvw_table = manager.ordered_uvw_table
+        prov = MSSourceProvider(manager, prefetch=0)
+
+        for i in range(CHUNK_CACHE_SIZE + 1):
+            prov._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA1, i, i+1)
+
+        self.assertEqual(len(prov._chunk_cache), CHUNK_CACHE_SIZE)
+
+        # First chunk was evicted and is read again
+        prov._getcol(MS.ORDERED_UVW_TABLE, MS.ANTENNA1, 0, 1)
+        self.assertEqual(len(uvw_table.reads), CHUNK_CACHE_SIZE + 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from hypercube import HyperCube
+import numpy as np
+import pyrap.tables as pt
+
+import montblanc
+from montblanc.impl.rime.tensorflow.ms import MeasurementSetManager
+from montblanc.impl.rime.tensorflow.ms.ms_manager import ORDERED_MAIN_TABLE
+from montblanc.impl.rime.tensorflow.ms.reader_processes import (
+    ReaderProcesses)
+from montblanc.impl.rime.tensorflow.sources import (MSSourceProvider,
+    SourceContext)
+from montblanc.impl.rime.tensorflow.sinks import (MSSinkProvider,
+    SinkContext)
+
+# Timesteps observed in each field
+FIELD_TIMES = { 0: [1.0, 2.0], 1: [1.0, 2.0, 3.0] }
+BASELINES = [(0, 1), (0, 2), (1, 2)]
+PHASE_DIRS = np.array([[[0.1, 0.2]], [[0.3, 0.4]]])
+
+def _encode(field, time, ant1, ant2):
+    """ Encode the field, time and baseline of a row """
+    return field*100 + time*10 + ant1 + ant2/10.
+
+def create_ms(name, rows):
+    """
+    Create a Measurement Set with two fields containing
+    rows of (field, time, antenna1, antenna2), in random order.
+    DATA encodes the field, time and baseline of a row
+    """
+    desc = pt.maketabdesc([
+        pt.makearrcoldesc('DATA', 0j, shape=[4, 4],
+            valuetype='complex'),
+        pt.makearrcoldesc('FLAG', False, shape=[4, 4]),
+        pt.makearrcoldesc('WEIGHT', 0.0, shape=[4],
+            valuetype='float')])
+
+    ms = pt.default_ms(name, desc)
+
+    ant = pt.table(name + '::ANTENNA', readonly=False, ack=False)
+    ant.addrows(3)
+    ant.putcol('POSITION', np.random.random((3, 3)) + 5e6)
+
+    spw = pt.table(name + '::SPECTRAL_WINDOW', readonly=False, ack=False)
+    spw.addrows(1)
+    spw.putcol('NUM_CHAN', np.array([4]))
+    spw.putcol('CHAN_FREQ', np.linspace(1e9, 1.1e9, 4)[None, :])
+    spw.putcol('REF_FREQUENCY', np.array([1e9]))
+
+    ddesc = pt.table(name + '::DATA_DESCRIPTION',
+        readonly=False, ack=False)
+    ddesc.addrows(1)
+    ddesc.putcol('SPECTRAL_WINDOW_ID', np.array([0]))
+
+    pol = pt.table(name + '::POLARIZATION', readonly=False, ack=False)
+    pol.addrows(1)
+    pol.putcol('NUM_CORR', np.array([4]))
+
+    field = pt.table(name + '::FIELD', readonly=False, ack=False)
+    field.addrows(2)
+    field.putcol('PHASE_DIR', PHASE_DIRS)
+
+    rows = np.array(rows)
+    np.random.shuffle(rows)
+
+    ms.addrows(len(rows))
+    ms.putcol('FIELD_ID', rows[:,0].astype(np.int32))
+    ms.putcol('TIME', rows[:,1])
+    ms.putcol('ANTENNA1', rows[:,2].astype(np.int32))
+    ms.putcol('ANTENNA2', rows[:,3].astype(np.int32))
+    ms.putcol('DATA_DESC_ID', np.zeros(len(rows), dtype=np.int32))
+    ms.putcol('UVW', np.random.random((len(rows), 3)))
+    ms.putcol('DATA', _encode(*rows.T)[:,None,None] *
+        np.ones((1, 4, 4), dtype=np.complex64))
+    ms.putcol('FLAG', np.zeros((len(rows), 4, 4), dtype=np.bool))
+    ms.putcol('WEIGHT', np.ones((len(rows), 4), dtype=np.float32))
+
+    for table in (ms, ant, spw, ddesc, pol, field):
+        table.close()
+
+class TestMSFields(unittest.TestCase):
+    """
+    TestMSFields class defining unit tests for
+    processing multiple Measurement Set fields
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+        self._tmp_dir = tempfile.mkdtemp()
+        self._msname = os.path.join(self._tmp_dir, 'test.ms')
+        self._create_ms()
+
+    def tearDown(self):
+        """ Tear down each test case """
+        shutil.rmtree(self._tmp_dir)
+
+    def _create_ms(self):
+        create_ms(self._msname, [(f, t, a1, a2)
+            for f, times in FIELD_TIMES.iteritems()
+            for t, (a1, a2) in itertools.product(times, BASELINES)])
+
+    def test_field_views(self):
+        """ Test that each field is presented in (time, baseline) order """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0, 1])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            self.assertEqual(manager.field_ids, [0, 1])
+
+            for field_id in manager.iter_fields():
+                times = FIELD_TIMES[field_id]
+                dims = dict(manager.updated_dimensions())
+                self.assertEqual(manager.field_id, field_id)
+                self.assertEqual(dims['ntime'], len(times))
+                self.assertEqual(dims['nbl'], len(BASELINES))
+
+                expected = [_encode(field_id, t, a1, a2)
+                    for t, (a1, a2) in itertools.product(times, BASELINES)]
+                data = manager.ordered_main_table.getcol('DATA')
+                self.assertTrue(np.allclose(data[:,0,0].real, expected))
+
+                self.assertTrue(np.all(
+                    manager.ordered_time_table.getcol('TIME') == times))
+
+            self.assertRaises(ValueError, manager.select_field, 2)
+
+    def test_source_provider_follows_field(self):
+        """ Test that the source provider reads the selected field """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0, 1])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            prov = MSSourceProvider(manager, prefetch=0)
+
+            for field_id in manager.iter_fields():
+                prov.start(None)
+                self.assertTrue(np.all(prov.phase_centre(None) ==
+                    PHASE_DIRS[field_id][0]))
+                self.assertEqual(len(prov._times),
+                    len(FIELD_TIMES[field_id]))
+                prov.stop(None)
+
+    def test_single_field(self):
+        """ Test selection of a single, non-zero field """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[1])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            self.assertEqual(manager.field_ids, [1])
+            self.assertEqual(manager.field_id, 1)
+            self.assertEqual(manager.ordered_main_table.nrows(),
+                len(FIELD_TIMES[1])*len(BASELINES))
+
+    def test_reader_tables(self):
+        """ Test that reading threads read through their own handles """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0, 1])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            tables = manager.reader_tables()
+            main = tables[ORDERED_MAIN_TABLE]
+            self.assertTrue(main is tables[ORDERED_MAIN_TABLE])
+
+            result = {}
+
+            def _read():
+                table = tables[ORDERED_MAIN_TABLE]
+                result['table'] = table
+                result['data'] = table.getcol('DATA')
+
+            thread = threading.Thread(target=_read)
+            thread.start()
+            thread.join()
+
+            self.assertFalse(result['table'] is main)
+            self.assertTrue(np.all(result['data'] ==
+                manager.ordered_main_table.getcol('DATA')))
+
+            # Tables of other fields are read
+            # through the same thread handle
+            other = manager.reader_table(ORDERED_MAIN_TABLE, 1)
+            self.assertEqual(other.nrows(),
+                len(FIELD_TIMES[1])*len(BASELINES))
+            self.assertRaises(ValueError, manager.reader_table, 'ANTENNA')
+
+    def test_readers_during_write(self):
+        """ Test that two readers proceed at once while a sink writes """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0, 1])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            expected = manager.ordered_main_table.getcol('DATA')
+            readers = ReaderProcesses(manager, 2)
+
+            try:
+                for tables in (manager.reader_tables(),
+                        readers.tables(manager.field_id)):
+                    read = [threading.Event(), threading.Event()]
+                    result = {}
+
+                    def _read(i):
+                        data = tables[ORDERED_MAIN_TABLE].getcol('DATA')
+                        read[i].set()
+                        # Both readers are reading at the same time
+                        result[i] = (data, read[1-i].wait(10))
+
+                    # Hold the single writer lock, as a sink does
+                    with manager.write_lock:
+                        manager.ordered_main_table.putcol('MODEL_DATA',
+                            expected)
+
+                        threads = [threading.Thread(target=_read, args=(i,))
+                            for i in range(2)]
+
+                        for thread in threads:
+                            thread.start()
+
+                        for thread in threads:
+                            thread.join(20)
+                            self.assertFalse(thread.is_alive())
+
+                    for data, concurrent in result.itervalues():
+                        self.assertTrue(concurrent)
+                        self.assertTrue(np.all(data == expected))
+            finally:
+                readers.close()
+
+    def test_reader_processes(self):
+        """ Test that the source provider reads in reader processes """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0, 1])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            prov = MSSourceProvider(manager, prefetch=0,
+                reader_processes=2)
+
+            for field_id in manager.iter_fields():
+                prov.start(None)
+                self.assertTrue(isinstance(prov._readers, ReaderProcesses))
+
+                data = prov._tables[ORDERED_MAIN_TABLE].getcol('DATA')
+                self.assertTrue(np.all(data ==
+                    manager.ordered_main_table.getcol('DATA')))
+
+                prov.stop(None)
+                self.assertTrue(prov._readers is None)
+
+class TestMSIrregular(unittest.TestCase):
+    """
+    TestMSIrregular class defining unit tests for Measurement
+    Sets with missing (time, baseline) rows
+    """
+
+    # Rows missing from field 0
+    MISSING = [(1.0, (1, 2)), (2.0, (0, 2))]
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+        self._tmp_dir = tempfile.mkdtemp()
+        self._msname = os.path.join(self._tmp_dir, 'test.ms')
+
+        create_ms(self._msname, [(0, t, a1, a2)
+            for t, (a1, a2) in itertools.product(FIELD_TIMES[0], BASELINES)
+            if (t, (a1, a2)) not in self.MISSING])
+
+    def tearDown(self):
+        """ Tear down each test case """
+        shutil.rmtree(self._tmp_dir)
+
+    def _cube(self, manager):
+        """ Create a cube describing the field's dimensions """
+        cube = HyperCube()
+        for name, size in manager.updated_dimensions():
+            cube.register_dimension(name, size)
+        cube.register_array('observed_vis',
+            ('ntime', 'nbl', 'nchan', 'npol'), np.complex64)
+        cube.register_array('flag', ('ntime', 'nbl', 'nchan', 'npol'),
+            np.uint8)
+        cube.register_array('uvw', ('ntime', 'na', 3), np.float64)
+        cube.register_array('model_vis',
+            ('ntime', 'nbl', 'nchan', 'npol'), np.complex64)
+        return cube
+
+    def _source_context(self, cube, name):
+        array = cube.array(name, reify=True)
+        return SourceContext(name, cube, {}, [],
+            cube.array(name), array.shape, array.dtype)
+
+    def test_row_index(self):
+        """ Test that rows are mapped onto the dense grid """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            row_index = manager.row_index
+            self.assertEqual(row_index.shape, (2, 3, 1))
+            self.assertTrue(np.all(row_index[:,:,0] ==
+                [[0, 1, -1], [2, -1, 3]]))
+
+            cube = self._cube(manager)
+            prov = MSSourceProvider(manager, prefetch=0)
+
+            vis = prov.observed_vis(self._source_context(cube,
+                'observed_vis')).reshape(2, 3, 4, 4)
+            flag = prov.flag(self._source_context(cube,
+                'flag')).reshape(2, 3, 4, 4)
+
+            for t, time in enumerate(FIELD_TIMES[0]):
+                for bl, (a1, a2) in enumerate(BASELINES):
+                    missing = (time, (a1, a2)) in self.MISSING
+                    expected = 0 if missing else _encode(0, time, a1, a2)
+                    self.assertTrue(np.allclose(vis[t, bl], expected))
+                    self.assertTrue(np.all(flag[t, bl] == missing))
+
+            # Antenna coordinates reproduce present baselines
+            auvw = prov.uvw(self._source_context(cube, 'uvw'))
+            uvw = manager.ordered_uvw_table.getcol('UVW')
+            ant1 = manager.ordered_uvw_table.getcol('ANTENNA1')
+            ant2 = manager.ordered_uvw_table.getcol('ANTENNA2')
+            time = np.searchsorted(FIELD_TIMES[0],
+                manager.ordered_uvw_table.getcol('TIME'))
+            self.assertTrue(np.allclose(auvw[time, ant2] -
+                auvw[time, ant1], uvw))
+
+    def test_sink_writes_present_rows(self):
+        """ Test that the sink only writes rows present in the MS """
+        slvr_cfg = montblanc.rime_solver_cfg(field_ids=[0])
+
+        with MeasurementSetManager(self._msname, slvr_cfg) as manager:
+            cube = self._cube(manager)
+            data = np.arange(2*3).reshape(2, 3, 1, 1) * np.ones((1, 1, 4, 4))
+            context = SinkContext('model_vis', cube, {}, [],
+                cube.array('model_vis'), data.astype(np.complex64), None)
+
+            sink = MSSinkProvider(manager, 'CORRECTED_DATA')
+            sink.start(None)
+            sink.model_vis(context)
+            sink.stop(None)
+
+            written = manager.ordered_main_table.getcol('CORRECTED_DATA')
+            self.assertTrue(np.allclose(written[:,0,0], [0, 1, 3, 5]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pyrap.tables as pt
+
+import montblanc
+from montblanc.impl.rime.tensorflow.ms import (MeasurementSetManager,
+    solve_measurement_sets)
+from montblanc.impl.rime.tensorflow.sources import (SourceProvider,
+    MSSourceProvider, MultiMSSourceProvider, relaxed_source)
+from montblanc.impl.rime.tensorflow.sinks import (SinkProvider,
+    MSSinkProvider, MultiMSSinkProvider)
+from montblanc.tests.test_ms_fields import (create_ms,
+    FIELD_TIMES, BASELINES)
+
+class SkyModelProvider(SourceProvider):
+    """
+    Supplies a unit point source at the phase centre,
+    counting the number of point_lm and point_stokes calls
+    """
+    def __init__(self):
+        self.calls = 0
+        self.stokes_calls = 0
+
+    def name(self):
+        return "Sky Model"
+
+    def updated_dimensions(self):
+        return [('npsrc', 1)]
+
+    def point_lm(self, context):
+        self.calls += 1
+        return np.zeros(context.shape, context.dtype)
+
+    def point_stokes(self, context):
+        self.stokes_calls += 1
+        stokes = np.zeros(context.shape, context.dtype)
+        stokes[:,:,0] = 1
+        return stokes
+
+class TileSinkProvider(SinkProvider):
+    """ Records the time and baseline extents of each tile """
+    def __init__(self):
+        self.tiles = []
+
+    def name(self):
+        return "Tiles"
+
+    def chi_squared(self, context):
+        self.tiles.append(context.dim_extents('ntime', 'nbl'))
+
+class RecordingMSSourceProvider(MSSourceProvider):
+    """ Records the observed visibility tiles requested of each MS """
+    def __init__(self, manager, requests):
+        super(RecordingMSSourceProvider, self).__init__(manager, prefetch=0)
+        self._requests = requests
+
+    @relaxed_source
+    def observed_vis(self, context):
+        self._requests.append((self._manager.msname,
+            context.dim_extents('ntime', 'nbl')))
+        return super(RecordingMSSourceProvider, self).observed_vis(context)
+
+class TestMultiMS(unittest.TestCase):
+    """
+    TestMultiMS class defining unit tests for
+    solving multiple Measurement Sets against a single solver
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+        self._tmp_dir = tempfile.mkdtemp()
+        self._msnames = [os.path.join(self._tmp_dir, 'spw%d.ms' % i)
+            for i in range(3)]
+
+        for msname in self._msnames:
+            create_ms(msname, [(f, t, a1, a2)
+                for f, times in FIELD_TIMES.iteritems()
+                for t, (a1, a2) in itertools.product(times, BASELINES)])
+
+    def tearDown(self):
+        """ Tear down each test case """
+        shutil.rmtree(self._tmp_dir)
+
+    def _solver_cfg(self, **kwargs):
+        # A tiny memory budget splits the problem into several tiles
+        return montblanc.rime_solver_cfg(backend='numpy', dtype='double',
+            field_ids=[0, 1], mem_budget=1024, **kwargs)
+
+    def test_solve_measurement_sets(self):
+        """ Test that the fields of all MSs are solved together """
+        slvr_cfg = self._solver_cfg()
+        sky = SkyModelProvider()
+        tiles = TileSinkProvider()
+
+        with montblanc.rime_solver(slvr_cfg) as slvr:
+            stats = solve_measurement_sets(slvr, self._msnames, slvr_cfg,
+                [sky], sink_providers=[tiles], vis_column='DATA',
+                model_column='MODEL_DATA', open_threads=2,
+                source_kwargs={'prefetch': 0})
+
+        self.assertEqual([(s.msname, s.field_id) for s in stats.solves],
+            [(m, f) for f in (0, 1) for m in self._msnames])
+
+        for s in stats.solves:
+            self.assertEqual(s.nvis, len(FIELD_TIMES[s.field_id])*
+                len(BASELINES)*4)
+
+        self.assertEqual(stats.nvis, sum(s.nvis for s in stats.solves))
+        self.assertTrue(stats.throughput > 0)
+
+        # Model visibilities of the unit point source
+        # are written to every row of each MS
+        for msname in self._msnames:
+            ms = pt.table(msname, ack=False)
+            model_vis = ms.getcol('MODEL_DATA')
+            ms.close()
+
+            self.assertTrue(np.allclose(model_vis[:,:,0], 1))
+
+        # Source only sky model arrays are produced once, time
+        # varying arrays once per tile for all MSs, rather than per MS
+        self.assertTrue(len(tiles.tiles) > 2)
+        self.assertEqual(sky.calls, 1)
+        self.assertEqual(sky.stokes_calls, len(tiles.tiles))
+
+    def test_interleaved_tiles(self):
+        """ Test that tiles of the MSs are interleaved in one solve """
+        slvr_cfg = self._solver_cfg()
+        msnames = self._msnames[:2]
+        managers = [MeasurementSetManager(m, slvr_cfg) for m in msnames]
+        requests = []
+
+        try:
+            source_prov = MultiMSSourceProvider([RecordingMSSourceProvider(
+                m, requests) for m in managers])
+            sink_prov = MultiMSSinkProvider([MSSinkProvider(m, 'MODEL_DATA',
+                write_buffer_size=0) for m in managers], source_prov)
+
+            self.assertEqual([tuple(b) for b in source_prov.channel_bands()],
+                [(0, 4, 1), (4, 4, 1)])
+            dims = dict(source_prov.updated_dimensions())
+            self.assertEqual((dims['nchan'], dims['nbands']), (8, 2))
+
+            tiles = TileSinkProvider()
+
+            with montblanc.rime_solver(slvr_cfg) as slvr:
+                slvr.solve(source_providers=[source_prov,
+                    SkyModelProvider()], sink_providers=[sink_prov, tiles])
+        finally:
+            for m in managers:
+                m.close()
+
+        # Each tile requests the observed visibilities of both MSs
+        # before the next tile is requested
+        self.assertTrue(len(tiles.tiles) > 1)
+        self.assertEqual(requests, [(m, t) for t in tiles.tiles
+            for m in msnames])
+
+    def test_mismatched_measurement_sets(self):
+        """ Test that MSs with different dimensions are rejected """
+        msname = os.path.join(self._tmp_dir, 'other.ms')
+        create_ms(msname, [(f, t, a1, a2)
+            for f, times in FIELD_TIMES.iteritems()
+            for t, (a1, a2) in itertools.product(times + [4.0], BASELINES)])
+
+        slvr_cfg = self._solver_cfg()
+
+        with montblanc.rime_solver(slvr_cfg) as slvr:
+            self.assertRaises(ValueError, solve_measurement_sets, slvr,
+                [self._msnames[0], msname], slvr_cfg, [SkyModelProvider()])
+
+    def test_no_sky_model_cache(self):
+        """ Test that the sky model is produced per tile without a cache """
+        slvr_cfg = self._solver_cfg()
+        sky = SkyModelProvider()
+        tiles = TileSinkProvider()
+
+        with montblanc.rime_solver(slvr_cfg) as slvr:
+            stats = solve_measurement_sets(slvr, self._msnames, slvr_cfg,
+                [sky], sink_providers=[tiles], cache_sky_model=False,
+                source_kwargs={'prefetch': 0})
+
+        self.assertEqual(len(stats.solves), 2*len(self._msnames))
+        self.assertEqual(sky.calls, len(tiles.tiles))
+
+if __name__ == '__main__':
+    unittest.main()
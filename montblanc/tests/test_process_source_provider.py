@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from hypercube import HyperCube
+
+import montblanc
+import montblanc.util as mbu
+from montblanc.impl.rime.tensorflow.ms import MeasurementSetManager
+from montblanc.impl.rime.tensorflow.sources import (SourceProvider,
+    SourceContext, ProcessSourceProvider, MSSourceProvider)
+from montblanc.tests.test_ms_fields import create_ms, BASELINES
+from montblanc.tests.test_rime_numpy import (PointSourceProvider,
+    VisibilitySinkProvider)
+
+class PidSourceProvider(SourceProvider):
+    """ Supplies arrays containing the id of the calling process """
+    def name(self):
+        return self.__class__.__name__
+
+    def pid(self, context):
+        (lt, ut), _ = context.array_extents(context.name)
+        data = np.full(context.shape, os.getpid(), dtype=context.dtype)
+        data[:,0] = np.arange(lt, ut)
+        return data
+
+    def label(self, context):
+        return "pid {}".format(os.getpid())
+
+    def failure(self, context):
+        raise ValueError("Data source failure")
+
+class SkyModelProvider(SourceProvider):
+    """ Supplies point sources at the phase centre """
+    def __init__(self, stokes):
+        self._stokes = np.asarray(stokes)
+
+    def name(self):
+        return self.__class__.__name__
+
+    def updated_dimensions(self):
+        return [('npsrc', len(self._stokes))]
+
+    def point_lm(self, context):
+        return np.zeros(context.shape, context.dtype)
+
+    def point_stokes(self, context):
+        (ls, us), _, _ = context.array_extents(context.name)
+        data = np.empty(context.shape, context.dtype)
+        data[:] = self._stokes[ls:us,None,:]
+        return data
+
+class UnforkableSourceProvider(PidSourceProvider):
+    """ Can't be used in forked processes """
+    def reopen(self):
+        raise NotImplementedError("holds a device handle")
+
+class TestProcessSourceProvider(unittest.TestCase):
+    """
+    TestProcessSourceProvider class defining unit tests for
+    montblanc's ProcessSourceProvider
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+
+    def tearDown(self):
+        """ Tear down each test case """
+        pass
+
+    def _create_ms(self, tmp_dir, ntime):
+        """ Create a Measurement Set with a single field """
+        msname = os.path.join(tmp_dir, 'test.ms')
+        create_ms(msname, [(0, float(t), a1, a2) for t, (a1, a2)
+            in itertools.product(range(1, ntime+1), BASELINES)])
+        return msname
+
+    def _context(self, name, ntime, lower, upper):
+        """ Create a SourceContext for a tile of the named array """
+        cube = HyperCube()
+        cube.register_dimension('ntime', ntime,
+            lower_extent=lower, upper_extent=upper)
+        # Functions on array schemas can't be pickled
+        cube.register_array(name, ('ntime', 3), np.int64,
+            default=lambda s, c: np.zeros(c.shape, c.dtype))
+
+        return SourceContext(name, cube, {}, [('ntime', upper - lower)],
+            cube.array(name), (upper - lower, 3), np.int64)
+
+    def test_process_source_provider(self):
+        """ Test that data sources are called in worker processes """
+        prov = ProcessSourceProvider(PidSourceProvider(),
+            process_data_sources=['pid', 'label', 'failure'],
+            processes=2, segments=2, segment_bytes=1024)
+
+        try:
+            # Called in this process outside of a solution
+            data = prov.pid(self._context('pid', 100, 10, 20))
+            self.assertTrue(np.all(data[:,1:] == os.getpid()))
+
+            prov.start(None)
+
+            # Returned through shared memory
+            data = prov.pid(self._context('pid', 100, 10, 20))
+            self.assertTrue(np.all(data[:,0] == np.arange(10, 20)))
+            self.assertTrue(np.all(data[:,1:] == data[0,1]))
+            self.assertNotEqual(data[0,1], os.getpid())
+
+            # Too large for a segment, and not an array
+            data = prov.pid(self._context('pid', 100, 0, 100))
+            self.assertTrue(np.all(data[:,0] == np.arange(100)))
+            self.assertNotEqual(prov.label(None), "pid {}".format(os.getpid()))
+
+            with self.assertRaises(ValueError):
+                prov.failure(None)
+
+            prov.stop(None)
+
+            self.assertEqual(prov.stats(), { 'calls': 5, 'shared': 1,
+                'shared_bytes': 10*3*8, 'pickled': 2, 'inline': 1 })
+        finally:
+            prov.close()
+
+    def test_solve(self):
+        """ Test solving with data sources called in worker processes """
+        ntime, nchan, na = 6, 8, 5
+        nbl = mbu.nr_of_baselines(na)
+        shape = (ntime, nbl, nchan, 4)
+        stokes = [[1.0, 0.2, 0.1, 0.05], [2.0, -0.5, 0.0, 0.3]]
+        flag = np.zeros(shape, dtype=np.uint8)
+        flag[1,2,3,:] = 1
+
+        slvr_cfg = montblanc.rime_solver_cfg(backend='numpy',
+                                            mem_budget=32*1024)
+        sinks = [VisibilitySinkProvider(shape) for i in range(2)]
+        prov = ProcessSourceProvider(
+            PointSourceProvider(ntime, nchan, na, stokes, flag),
+            processes=2)
+
+        with montblanc.rime_solver(slvr_cfg) as slvr:
+            slvr.solve(source_providers=[PointSourceProvider(ntime,
+                nchan, na, stokes, flag)], sink_providers=[sinks[0]])
+            slvr.solve(source_providers=[prov], sink_providers=[sinks[1]])
+
+        prov.close()
+
+        self.assertTrue(np.all(sinks[0].vis == sinks[1].vis))
+        self.assertGreater(prov.stats()['shared'], 0)
+        self.assertEqual(prov.stats()['inline'], 0)
+
+    def test_refuse_unforkable(self):
+        """ Test that providers which can't be reopened are refused """
+        prov = ProcessSourceProvider(UnforkableSourceProvider(),
+            processes=1)
+
+        try:
+            with self.assertRaises(ValueError):
+                prov.start(None)
+
+            # Data sources are still called in this process
+            self.assertEqual(prov.label(None),
+                "pid {}".format(os.getpid()))
+        finally:
+            prov.close()
+
+        nested = ProcessSourceProvider(ProcessSourceProvider(
+            PidSourceProvider(), processes=1), processes=1)
+
+        try:
+            with self.assertRaises(ValueError):
+                nested.start(None)
+        finally:
+            nested.close()
+
+    def test_measurement_set(self):
+        """ Test reading a Measurement Set with prefetching in workers """
+        tmp_dir = tempfile.mkdtemp()
+        stokes = [[1.0, 0.2, 0.1, 0.05], [2.0, -0.5, 0.0, 0.3]]
+
+        try:
+            # More chunks than are prefetched before workers fork
+            msname = self._create_ms(tmp_dir, 12)
+            slvr_cfg = montblanc.rime_solver_cfg(backend='numpy',
+                field_ids=[0], mem_budget=4*1024)
+
+            with MeasurementSetManager(msname, slvr_cfg) as manager:
+                dims = dict(manager.updated_dimensions())
+                shape = (dims['ntime'], dims['nbl'], dims['nchan'], 4)
+                sinks = [VisibilitySinkProvider(shape) for i in range(2)]
+
+                ms_prov = MSSourceProvider(manager, prefetch=2)
+                prov = ProcessSourceProvider(
+                    MSSourceProvider(manager, prefetch=2), processes=2)
+
+                try:
+                    with montblanc.rime_solver(slvr_cfg) as slvr:
+                        slvr.solve(source_providers=[ms_prov,
+                            SkyModelProvider(stokes)],
+                            sink_providers=[sinks[0]])
+                        slvr.solve(source_providers=[prov,
+                            SkyModelProvider(stokes)],
+                            sink_providers=[sinks[1]])
+                finally:
+                    prov.close()
+                    ms_prov.close()
+
+                # The MS remains usable in this process
+                self.assertEqual(manager.ordered_main_table.getcol(
+                    'DATA').shape[0], dims['ntime']*dims['nbl'])
+
+            self.assertFalse(np.any(np.isnan(sinks[0].vis)))
+            self.assertTrue(np.all(sinks[0].vis == sinks[1].vis))
+            self.assertGreater(prov.stats()['shared'], 0)
+            self.assertEqual(prov.stats()['inline'], 0)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+if __name__ == "__main__":
+    unittest.main()
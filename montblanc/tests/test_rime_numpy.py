@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import numpy as np
+import time
+
+import montblanc
+import montblanc.util as mbu
+
+from hypercube import HyperCube
+
+from montblanc.impl.rime.tensorflow.sources import (SourceProvider,
+    SourceContext)
+from montblanc.impl.rime.tensorflow.sinks import SinkProvider
+import montblanc.impl.rime.numpy.rime_kernels as rime
+import montblanc.impl.rime.tensorflow.solver_utils as rime_solver_utils
+
+class PointSourceProvider(SourceProvider):
+    """ Supplies point sources at the phase centre """
+    def __init__(self, ntime, nchan, na, stokes, flag=None):
+        self._ntime, self._nchan, self._na = ntime, nchan, na
+        self._stokes = np.asarray(stokes)
+        self._flag = flag
+
+    def name(self):
+        return self.__class__.__name__
+
+    def updated_dimensions(self):
+        return [('ntime', self._ntime), ('nchan', self._nchan),
+            ('na', self._na), ('nbl', mbu.nr_of_baselines(self._na)),
+            ('npsrc', len(self._stokes))]
+
+    def point_lm(self, context):
+        return np.zeros(context.shape, context.dtype)
+
+    def point_stokes(self, context):
+        (ls, us), _, _ = context.array_extents(context.name)
+        data = np.empty(context.shape, context.dtype)
+        data[:] = self._stokes[ls:us,None,:]
+        return data
+
+    def flag(self, context):
+        if self._flag is None:
+            return np.zeros(context.shape, context.dtype)
+
+        return self._flag[context.slice_index(*context.array(
+            context.name).shape)]
+
+class VisibilitySinkProvider(SinkProvider):
+    """ Gathers model visibilities and chi squared values """
+    def __init__(self, shape):
+        self.vis = np.full(shape, np.nan, dtype=np.complex128)
+        self.chi_squared_values = []
+
+    def name(self):
+        return self.__class__.__name__
+
+    def model_vis(self, context):
+        idx = context.slice_index(*context.array(context.name).shape)
+        self.vis[idx] = context.data
+
+    def chi_squared(self, context):
+        self.chi_squared_values.append(context.data)
+
+class TestRimeNumpy(unittest.TestCase):
+    """
+    TestRimeNumpy class defining unit tests for
+    montblanc's NumPy backend
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        np.random.seed(int(time.time()) & 0xFFFFFFFF)
+        montblanc.setup_test_logging()
+
+    def tearDown(self):
+        """ Tear down each test case """
+        pass
+
+    def _solve(self, source_provider, shape, **kwargs):
+        slvr_cfg = montblanc.rime_solver_cfg(backend='numpy', **kwargs)
+        sink_provider = VisibilitySinkProvider(shape)
+
+        with montblanc.rime_solver(slvr_cfg) as slvr:
+            slvr.solve(source_providers=[source_provider],
+                sink_providers=[sink_provider])
+
+        return sink_provider
+
+    def test_point_sources_at_phase_centre(self):
+        """
+        Test that point sources at the phase centre produce
+        visibilities equal to their summed brightness matrices
+        """
+        ntime, nchan, na = 6, 8, 5
+        nbl = mbu.nr_of_baselines(na)
+        stokes = [[1.0, 0.2, 0.1, 0.05], [2.0, -0.5, 0.0, 0.3]]
+        flag = np.zeros((ntime, nbl, nchan, 4), dtype=np.uint8)
+        flag[1,2,3,:] = 1
+        flag[2,3,4,1] = 1
+
+        for dtype, mem_budget in (('double', 1024*1024), ('float', 32*1024)):
+            prov = PointSourceProvider(ntime, nchan, na, stokes, flag)
+            sink = self._solve(prov, (ntime, nbl, nchan, 4),
+                dtype=dtype, mem_budget=mem_budget)
+
+            I, Q, U, V = np.sum(stokes, axis=0)
+            expected = np.empty((ntime, nbl, nchan, 4), dtype=np.complex128)
+            expected[:] = [I + Q, U + 1j*V, U - 1j*V, I - Q]
+            expected[flag != 0] = 0
+
+            # Observed visibilities are zero and weights are one
+            expected_chi_squared = np.sum(np.abs(expected)**2)
+
+            rtol = 1e-5 if dtype == 'float' else 1e-8
+            self.assertTrue(np.allclose(sink.vis, expected, rtol=rtol))
+            self.assertTrue(np.allclose(np.sum(sink.chi_squared_values),
+                expected_chi_squared, rtol=rtol))
+
+    def test_fully_flagged(self):
+        """ Test that fully flagged problems produce zeroed outputs """
+        ntime, nchan, na = 4, 4, 4
+        nbl = mbu.nr_of_baselines(na)
+        flag = np.ones((ntime, nbl, nchan, 4), dtype=np.uint8)
+
+        prov = PointSourceProvider(ntime, nchan, na, [[1.0, 0, 0, 0]], flag)
+        sink = self._solve(prov, (ntime, nbl, nchan, 4))
+
+        self.assertTrue(np.all(sink.vis == 0))
+        self.assertTrue(np.sum(sink.chi_squared_values) == 0)
+
+    def test_tile_cache(self):
+        """
+        Test that tiles with unchanged inputs are
+        supplied from the tile cache
+        """
+        ntime, nchan, na = 6, 8, 5
+        nbl = mbu.nr_of_baselines(na)
+        shape = (ntime, nbl, nchan, 4)
+        flag = np.zeros(shape, dtype=np.uint8)
+        prov = PointSourceProvider(ntime, nchan, na, [[1.0, 0, 0, 0]], flag)
+
+        # Otherwise identical timesteps would share a tile result
+        flag[np.arange(ntime), 1, np.arange(ntime), 0] = 1
+
+        slvr_cfg = montblanc.rime_solver_cfg(backend='numpy',
+            mem_budget=32*1024, tile_cache_bytes=16*1024*1024)
+
+        with montblanc.rime_solver(slvr_cfg) as slvr:
+            sinks = [VisibilitySinkProvider(shape) for i in range(3)]
+
+            slvr.solve(source_providers=[prov], sink_providers=[sinks[0]])
+            tiles = slvr.tile_cache_stats()['misses']
+            self.assertGreater(tiles, 1)
+            self.assertEqual(slvr.tile_cache_stats()['hits'], 0)
+
+            # Identical inputs are served from the cache
+            slvr.solve(source_providers=[prov], sink_providers=[sinks[1]])
+            self.assertEqual(slvr.tile_cache_stats()['hits'], tiles)
+            self.assertTrue(np.all(sinks[0].vis == sinks[1].vis))
+            self.assertEqual(sinks[0].chi_squared_values,
+                sinks[1].chi_squared_values)
+
+            # Only the tile containing the flag is computed
+            flag[0,0,0,:] = 1
+            slvr.solve(source_providers=[prov], sink_providers=[sinks[2]])
+            stats = slvr.tile_cache_stats()
+            self.assertEqual(stats['misses'], tiles + 1)
+            self.assertEqual(stats['hits'], 2*tiles - 1)
+            self.assertTrue(np.all(sinks[2].vis[0,0,0] == 0))
+            self.assertFalse(np.all(sinks[0].vis[0,0,0] == 0))
+            self.assertTrue(np.all(sinks[2].vis[1:] == sinks[0].vis[1:]))
+
+    def test_phase(self):
+        """ Test the phase kernel against a numpy implementation """
+        nsrc, ntime, na, nchan = 10, 5, 7, 16
+
+        lm = np.random.random(size=(nsrc, 2))*0.1
+        uvw = np.random.random(size=(ntime, na, 3))*1000
+        frequency = np.linspace(1.3e9, 1.5e9, nchan)
+
+        l, m = lm[:,0,None,None,None], lm[:,1,None,None,None]
+        u, v, w = (uvw[None,:,:,i,None] for i in range(3))
+        n = np.sqrt(1.0 - l**2 - m**2) - 1.0
+
+        real_phase = (-2*np.pi*(l*u + m*v + n*w)*frequency /
+            montblanc.constants.C)
+        expected = np.exp(1j*real_phase)
+
+        cplx_phase = rime.phase(lm, uvw, frequency, CT=np.complex128)
+        self.assertTrue(np.allclose(cplx_phase, expected))
+
+    def test_gauss_shape(self):
+        """ Test the gaussian shape kernel against a numpy implementation """
+        ngsrc, ntime, na, nchan = 10, 5, 7, 16
+
+        ant1, ant2 = np.triu_indices(na, 1)
+        antenna1 = np.tile(ant1, (ntime, 1)).astype(np.int32)
+        antenna2 = np.tile(ant2, (ntime, 1)).astype(np.int32)
+
+        uvw = np.random.random(size=(ntime, na, 3))*1000
+        frequency = np.linspace(1.3e9, 1.5e9, nchan)
+        params = np.random.random(size=(3, ngsrc))*np.array([[1e-4,1e-4,1]]).T
+
+        t = np.arange(ntime)[:,None]
+        u = uvw[t,antenna2,0] - uvw[t,antenna1,0]
+        v = uvw[t,antenna2,1] - uvw[t,antenna1,1]
+
+        el, em, eR = (params[i,:,None,None,None] for i in range(3))
+        scaled_freq = rime.GAUSS_SCALE*frequency
+
+        u1 = (u[None,:,:,None]*em - v[None,:,:,None]*el)*scaled_freq*eR
+        v1 = (u[None,:,:,None]*el + v[None,:,:,None]*em)*scaled_freq
+        expected = np.exp(-(u1**2 + v1**2))
+
+        shape = rime.gauss_shape(uvw, antenna1, antenna2, frequency, params)
+        self.assertTrue(np.allclose(shape, expected))
+
+    def test_analytic_e_beam(self):
+        """ Test the analytic beam kernel against a numpy implementation """
+        nsrc, ntime, na, nchan = 10, 5, 7, 16
+
+        lm = (np.random.random(size=(nsrc, 2)) - 0.5)*0.05
+        frequency = np.linspace(1.3e9, 1.5e9, nchan)
+        point_errors = (np.random.random(size=(ntime, na, nchan, 2))
+                                                        - 0.5)*1e-3
+        antenna_scaling = 0.9 + 0.2*np.random.random(size=(na, nchan, 2))
+        pa = np.random.random(size=(ntime, na))*np.pi
+        pa_sin, pa_cos = np.sin(pa), np.cos(pa)
+
+        # Rotate, offset and scale the lm coordinates
+        l, m = lm[:,None,None,None,0], lm[:,None,None,None,1]
+        sint, cost = pa_sin[None,:,:,None], pa_cos[None,:,:,None]
+        vl = (l*cost - m*sint + point_errors[None,...,0])*antenna_scaling[...,0]
+        vm = (l*sint + m*cost + point_errors[None,...,1])*antenna_scaling[...,1]
+        r = np.sqrt(vl**2 + vm**2)
+        nu = frequency[None,None,None,:]
+        c = montblanc.constants.C
+
+        def bessel_j1(x):
+            """ Power series of the Bessel function J1 """
+            k = np.arange(30, dtype=np.float64)
+            terms = ((-1)**k / (np.cumprod(np.maximum(k, 1)) *
+                        np.cumprod(k + 1)))
+            return np.sum(terms*(x[...,None]/2)**(2*k+1), axis=-1)
+
+        x = np.pi*13.5*nu*r/c
+        fwhm = 1.02*c/(13.5*nu)
+
+        expected = {
+            'cos3': np.cos(np.minimum(65e-9*nu*r, 1.0881))**3,
+            'airy': 2*bessel_j1(x)/x,
+            'gaussian': np.exp(-4*np.log(2)*(r/fwhm)**2/2),
+        }
+
+        parameters = rime_solver_utils.ANALYTIC_BEAM_PARAMETERS
+
+        for model, E in expected.items():
+            jones = rime.analytic_e_beam(lm, frequency, point_errors,
+                antenna_scaling, pa_sin, pa_cos, CT=np.complex128,
+                beam_model=model, beam_parameter=parameters[model])
+
+            self.assertEqual(jones.shape, (nsrc, ntime, na, nchan, 4))
+            self.assertTrue(np.allclose(jones[...,0], E))
+            self.assertTrue(np.allclose(jones[...,3], E))
+            self.assertTrue(np.all(jones[...,1:3] == 0))
+
+        with self.assertRaises(ValueError):
+            rime.analytic_e_beam(lm, frequency, point_errors,
+                antenna_scaling, pa_sin, pa_cos, CT=np.complex128,
+                beam_model='cube', beam_parameter=1.0)
+
+    def test_analytic_beam_solve(self):
+        """
+        Test that analytic beams are unity at the phase centre,
+        and that no beam cube is sized for them
+        """
+        ntime, nchan, na = 4, 8, 5
+        nbl = mbu.nr_of_baselines(na)
+        stokes = [[1.0, 0.2, 0.1, 0.05]]
+
+        class BeamCubeProvider(PointSourceProvider):
+            def updated_dimensions(self):
+                return (super(BeamCubeProvider, self).updated_dimensions() +
+                    [('beam_lw', 100), ('beam_mh', 100), ('beam_nud', 50)])
+
+        for beam_model in ('cos3', 'airy', 'gaussian'):
+            prov = BeamCubeProvider(ntime, nchan, na, stokes)
+            slvr_cfg = montblanc.rime_solver_cfg(backend='numpy',
+                                                beam_model=beam_model)
+            sink = VisibilitySinkProvider((ntime, nbl, nchan, 4))
+
+            with montblanc.rime_solver(slvr_cfg) as slvr:
+                slvr.solve(source_providers=[prov], sink_providers=[sink])
+                beam_dims = [slvr.hypercube.dim_global_size(d) for d
+                                in rime_solver_utils.BEAM_CUBE_DIMS]
+
+            I, Q, U, V = stokes[0]
+            expected = np.empty((ntime, nbl, nchan, 4), dtype=np.complex128)
+            expected[:] = [I + Q, U + 1j*V, U - 1j*V, I - Q]
+
+            self.assertTrue(np.allclose(sink.vis, expected))
+            self.assertEqual(beam_dims, [1, 2, 2, 2])
+
+    def test_conform_relaxed_data(self):
+        """
+        Test that relaxed data is only reshaped from row layouts,
+        and is otherwise broadcast
+        """
+        ntime, nbl, na, nchan, nbands = 2, 3, 4, 4, 2
+        cube = HyperCube()
+        cube.register_dimension('ntime', ntime)
+        cube.register_dimension('nbl', nbl)
+        cube.register_dimension('na', na)
+        cube.register_dimension('nchan', nchan)
+        cube.register_dimension('nbands', nbands)
+        cube.register_dimension('npol', 4)
+        cube.register_array('antenna_position', ('na', 3), np.float64)
+        cube.register_array('observed_vis', ('ntime', 'nbl', 'nchan', 'npol'),
+            np.complex128)
+
+        def _conform(name, data):
+            array = cube.array(name, reify=True)
+            context = SourceContext(name, cube, {}, [], cube.array(name),
+                array.shape, array.dtype)
+            copies = rime_solver_utils.DataSourceCopies()
+            return rime_solver_utils._conform_data(data, context,
+                [array.shape], copies), copies.get()[name]
+
+        # MS rows of each band, with channels per band
+        rows = np.arange(ntime*nbl*nbands*2*4,
+            dtype=np.complex128).reshape(ntime*nbl*nbands, 2, 4)
+        vis, copies = _conform('observed_vis', rows)
+        self.assertEqual(vis.shape, (ntime, nbl, nchan, 4))
+        self.assertTrue(np.all(vis.ravel() == rows.ravel()))
+        self.assertEqual(copies, 0)
+
+        # Rows with all channels, cast
+        rows = np.ones((ntime*nbl, nchan, 4), dtype=np.complex64)
+        vis, copies = _conform('observed_vis', rows)
+        self.assertEqual(vis.dtype, np.complex128)
+        self.assertEqual(copies, 1)
+
+        # Broadcast
+        pos, copies = _conform('antenna_position', np.float32([1, 2, 3]))
+        self.assertTrue(np.all(pos == [[1, 2, 3]]*na))
+
+        # Transposed data has the same number of
+        # elements, but is neither a row layout or broadcastable
+        with self.assertRaises(ValueError) as cm:
+            _conform('antenna_position', np.zeros((3, na)))
+
+        self.assertTrue('antenna_position' in str(cm.exception))
+
+        with self.assertRaises(ValueError):
+            _conform('observed_vis', np.zeros((4, nchan, ntime*nbl)))
+
+if __name__ == '__main__':
+    unittest.main()
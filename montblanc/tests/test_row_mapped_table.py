@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pyrap.tables as pt
+
+import montblanc
+from montblanc.impl.rime.tensorflow.ms.ms_manager import RowMappedTable
+
+class TestRowMappedTable(unittest.TestCase):
+    """
+    TestRowMappedTable class defining unit tests for
+    reading ordered Measurement Set views through their base table
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        np.random.seed(int(time.time()) & 0xFFFFFFFF)
+        montblanc.setup_test_logging()
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """ Tear down each test case """
+        shutil.rmtree(self._tmp_dir)
+
+    def _create_table(self, time):
+        """ Create a table with TIME and DATA columns """
+        desc = pt.maketabdesc([pt.makescacoldesc('TIME', 0.0),
+            pt.makearrcoldesc('DATA', 0j, shape=[2, 4])])
+
+        table = pt.table(os.path.join(self._tmp_dir, 'test.table'),
+            desc, nrow=len(time), ack=False)
+
+        data = (np.random.random((len(time), 2, 4)) +
+            1j*np.random.random((len(time), 2, 4)))
+
+        table.putcol('TIME', time)
+        table.putcol('DATA', data)
+
+        return table
+
+    def _check_reads(self, table, view, rmt):
+        nrow = view.nrows()
+
+        self.assertTrue(np.all(rmt.getcol('TIME') == view.getcol('TIME')))
+
+        for i in range(10):
+            startrow = np.random.randint(0, nrow)
+            n = np.random.randint(0, nrow - startrow + 1)
+
+            self.assertTrue(np.all(
+                rmt.getcol('DATA', startrow=startrow, nrow=n) ==
+                view.getcol('DATA', startrow=startrow, nrow=n)))
+
+        # Write through the mapped table and read back through the view
+        startrow, n = nrow // 4, nrow // 2
+        data = (np.random.random((n, 2, 4)) +
+            1j*np.random.random((n, 2, 4)))
+        rmt.putcol('DATA', data, startrow=startrow, nrow=n)
+
+        self.assertTrue(np.all(data ==
+            view.getcol('DATA', startrow=startrow, nrow=n)))
+
+    def test_ordered_table(self):
+        """ Test that ordered tables are read directly """
+        table = self._create_table(np.arange(100, dtype=np.float64))
+
+        view = pt.taql("SELECT FROM $table WHERE TIME >= 10 ORDERBY TIME")
+        rmt = RowMappedTable(view, table)
+
+        self.assertTrue(rmt.contiguous)
+        self._check_reads(table, view, rmt)
+
+        view.close()
+        table.close()
+
+    def test_permuted_table(self):
+        """ Test that permuted tables are read through a row index """
+        # Shuffled timesteps, some of which are repeated
+        time = np.random.randint(0, 300, size=1000).astype(np.float64)
+        table = self._create_table(time)
+
+        view = pt.taql("SELECT FROM $table WHERE TIME != 5 ORDERBY TIME")
+        rmt = RowMappedTable(view, table)
+
+        self.assertFalse(rmt.contiguous)
+        self._check_reads(table, view, rmt)
+
+        # Unique views of views
+        uview = pt.taql("SELECT FROM $view ORDERBY UNIQUE TIME")
+        urmt = RowMappedTable(uview, table)
+        self._check_reads(table, uview, urmt)
+
+        uview.close()
+        view.close()
+        table.close()
+
+if __name__ == '__main__':
+    unittest.main()
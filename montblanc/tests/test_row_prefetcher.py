@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import threading
+import unittest
+
+import numpy as np
+
+import montblanc
+from montblanc.impl.rime.tensorflow.ms.row_prefetcher import RowPrefetcher
+
+class FakeTable(object):
+    """ Table returning row numbers, recording the reads """
+    def __init__(self):
+        self.reads = []
+        self.lock = threading.Lock()
+
+    def getcol(self, column, startrow, nrow):
+        with self.lock:
+            self.reads.append((column, startrow, nrow))
+
+        return np.arange(startrow, startrow+nrow)
+
+def _chunk_keys(nchunks, nrow=10, columns=('DATA', 'FLAG')):
+    return [[('MAIN', c, i*nrow, nrow) for c in columns]
+        for i in range(nchunks)]
+
+class TestRowPrefetcher(unittest.TestCase):
+    """
+    TestRowPrefetcher class defining unit tests for
+    background reads of upcoming chunk rows
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+
+    def test_prefetch_hits(self):
+        """ Test that chunk rows requested in order are prefetched """
+        table = FakeTable()
+        chunks = _chunk_keys(8)
+        prefetcher = RowPrefetcher({'MAIN': table}, chunks, 2)
+
+        for keys in chunks:
+            for key in keys:
+                _, _, startrow, nrow = key
+                data = prefetcher.get(key)
+                self.assertTrue(np.all(data ==
+                    np.arange(startrow, startrow+nrow)))
+
+        prefetcher.close()
+        stats = prefetcher.stats()
+
+        self.assertEqual(stats['hits'], 16)
+        self.assertEqual(stats['misses'], 0)
+        self.assertEqual(stats['evictions'], 0)
+        # Each column range is read exactly once
+        self.assertEqual(sorted(table.reads),
+            sorted((c, s, n) for keys in chunks for _, c, s, n in keys))
+
+    def test_unscheduled_and_repeated_keys(self):
+        """ Test misses and keys with multiple uses """
+        table = FakeTable()
+        chunks = [k + k[:1] for k in _chunk_keys(4)]
+        prefetcher = RowPrefetcher({'MAIN': table}, chunks, 2)
+
+        self.assertIsNone(prefetcher.get(('MAIN', 'WEIGHT', 0, 10)))
+
+        for keys in chunks:
+            for key in keys:
+                self.assertIsNotNone(prefetcher.get(key))
+
+            # All uses of the keys have been consumed
+            self.assertIsNone(prefetcher.get(keys[0]))
+
+        prefetcher.close()
+        stats = prefetcher.stats()
+
+        self.assertEqual(stats['hits'], 12)
+        self.assertEqual(stats['misses'], 5)
+
+    def test_unrequested_columns_evicted(self):
+        """ Test that unrequested columns don't stall the prefetcher """
+        table = FakeTable()
+        chunks = _chunk_keys(8)
+        prefetcher = RowPrefetcher({'MAIN': table}, chunks, 2)
+
+        # Only request DATA, FLAG is never requested
+        for keys in chunks:
+            self.assertIsNotNone(prefetcher.get(keys[0]))
+
+        prefetcher.close()
+        stats = prefetcher.stats()
+
+        self.assertEqual(stats['hits'], 8)
+        self.assertEqual(stats['misses'], 0)
+        self.assertGreater(stats['evictions'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
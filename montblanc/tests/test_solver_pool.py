@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+import numpy as np
+
+import montblanc
+import montblanc.util as mbu
+from montblanc.pool import SolverPool, solver_pool_key
+from montblanc.tests.test_rime_numpy import (PointSourceProvider,
+    VisibilitySinkProvider)
+
+class TestSolverPool(unittest.TestCase):
+    """
+    TestSolverPool class defining unit tests for
+    montblanc's SolverPool
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+
+    def tearDown(self):
+        """ Tear down each test case """
+        pass
+
+    def _solve(self, slvr, ntime, nchan, na):
+        """ Solve a single unit point source, returning visibilities """
+        nbl = mbu.nr_of_baselines(na)
+        prov = PointSourceProvider(ntime, nchan, na, [[1, 0, 0, 0]])
+        sink = VisibilitySinkProvider((ntime, nbl, nchan, 4))
+        slvr.solve(source_providers=[prov], sink_providers=[sink])
+        return sink.vis
+
+    def test_solver_pool_key(self):
+        """ Test that equivalent configurations share a key """
+        cfg = montblanc.rime_solver_cfg(backend='numpy', field_ids=[0, 1])
+        same = montblanc.rime_solver_cfg(backend='numpy', field_ids=(0, 1))
+        other = montblanc.rime_solver_cfg(backend='numpy', dtype='float')
+
+        self.assertEqual(solver_pool_key(cfg), solver_pool_key(same))
+        self.assertNotEqual(solver_pool_key(cfg), solver_pool_key(other))
+        hash(solver_pool_key(cfg))
+
+    def test_reuse(self):
+        """ Test that released solvers are reused """
+        cfg = montblanc.rime_solver_cfg(backend='numpy')
+        float_cfg = montblanc.rime_solver_cfg(backend='numpy', dtype='float')
+
+        with SolverPool() as pool:
+            with pool.solver(cfg) as slvr:
+                self.assertIn('total', slvr.startup_stats())
+                vis = self._solve(slvr, 2, 4, 5)
+
+            # The same solver is handed out for the same configuration
+            # and handles problems of differing dimensions
+            with pool.solver(cfg) as reused:
+                self.assertIs(reused, slvr)
+                reused_vis = self._solve(reused, 3, 2, 4)
+
+                # A solver with a different configuration is constructed
+                with pool.solver(float_cfg) as float_slvr:
+                    self.assertIsNot(float_slvr, slvr)
+
+            self.assertTrue(np.allclose(vis[...,0], 1))
+            self.assertTrue(np.allclose(reused_vis[...,0], 1))
+
+            stats = pool.stats()
+            self.assertEqual(stats['created'], 2)
+            self.assertEqual(stats['reused'], 1)
+            self.assertEqual(stats['idle'], 2)
+            self.assertEqual(stats['in_use'], 0)
+            self.assertGreater(stats['startup_time'], 0)
+
+        self.assertEqual(pool.stats()['idle'], 0)
+
+        with self.assertRaises(ValueError):
+            pool.acquire(cfg)
+
+    def test_discard(self):
+        """ Test that failed and surplus solvers are closed """
+        cfg = montblanc.rime_solver_cfg(backend='numpy')
+
+        with SolverPool(max_idle=1) as pool:
+            with self.assertRaises(RuntimeError):
+                with pool.solver(cfg) as slvr:
+                    raise RuntimeError("Solve failed")
+
+            self.assertEqual(pool.stats()['idle'], 0)
+
+            first, second = pool.acquire(cfg), pool.acquire(cfg)
+            self.assertIsNot(first, second)
+            pool.release(first)
+            pool.release(second)
+
+            with self.assertRaises(ValueError):
+                pool.release(second)
+
+            stats = pool.stats()
+            self.assertEqual(stats['created'], 3)
+            self.assertEqual(stats['discarded'], 2)
+            self.assertEqual(stats['idle'], 1)
+
+    def test_default_pool(self):
+        """ Test that the process-level pool is shared """
+        self.assertIs(montblanc.solver_pool(), montblanc.solver_pool())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import os
+import unittest
+import numpy as np
+import time
+
+import montblanc
+
+import montblanc.impl.rime.tensorflow.thread_budget as thread_budget
+from montblanc.impl.rime.tensorflow.thread_budget import (
+    _parse_cpu_list, _shard_cpus, available_cpus,
+    plan_thread_budget, pin_thread, configure_openmp)
+
+class TestThreadBudget(unittest.TestCase):
+    """
+    TestThreadBudget class defining unit tests for
+    montblanc's solver thread budgeting
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        np.random.seed(int(time.time()) & 0xFFFFFFFF)
+        montblanc.setup_test_logging()
+
+    def tearDown(self):
+        """ Tear down each test case """
+        pass
+
+    def test_parse_cpu_list(self):
+        """ Test parsing of linux cpu lists """
+        self.assertTrue(_parse_cpu_list("0-3,8,10-11\n") ==
+            [0, 1, 2, 3, 8, 10, 11])
+        self.assertTrue(_parse_cpu_list("5") == [5])
+        self.assertTrue(_parse_cpu_list("") == [])
+
+    def test_cpu_budget(self):
+        """ Test that CPU shards share the CPU threads """
+        slvr_cfg = montblanc.rime_solver_cfg(cpu_threads=16,
+            shards_per_device=2)
+
+        budget = plan_thread_budget(slvr_cfg, 1, True)
+        self.assertTrue(budget.shards_per_device == 2)
+        self.assertTrue(budget.omp_threads == 8)
+        self.assertTrue(budget.intra_op_threads == 8)
+        self.assertTrue(budget.inter_op_threads == 7)
+        self.assertTrue(budget.shard_cpus is None)
+
+        # Don't create more shards than threads
+        slvr_cfg = montblanc.rime_solver_cfg(cpu_threads=1,
+            shards_per_device=4)
+
+        budget = plan_thread_budget(slvr_cfg, 1, True)
+        self.assertTrue(budget.shards_per_device == 1)
+        self.assertTrue(budget.omp_threads == 1)
+        self.assertTrue(budget.inter_op_threads == 5)
+
+        # Library defaults
+        slvr_cfg = montblanc.rime_solver_cfg(thread_budget=False)
+        budget = plan_thread_budget(slvr_cfg, 1, True)
+        self.assertTrue(budget.omp_threads == 0)
+        self.assertTrue(budget.intra_op_threads == 0)
+        self.assertTrue(budget.inter_op_threads == 0)
+
+    def test_gpu_budget(self):
+        """ Test the budget of shards on multiple GPUs """
+        slvr_cfg = montblanc.rime_solver_cfg(cpu_threads=16,
+            shards_per_device=2)
+
+        budget = plan_thread_budget(slvr_cfg, 2, False)
+        self.assertTrue(budget.shards_per_device == 2)
+        self.assertTrue(budget.omp_threads == 4)
+        self.assertTrue(budget.intra_op_threads == 16)
+        self.assertTrue(budget.inter_op_threads == 11)
+
+    def test_shard_cpus(self):
+        """ Test that shards are assigned disjoint CPUs on NUMA nodes """
+        nodes = [range(0, 8), range(8, 16)]
+        shard_cpus = _shard_cpus(range(16), nodes, 4)
+
+        self.assertTrue(shard_cpus == [(0, 1, 2, 3), (4, 5, 6, 7),
+            (8, 9, 10, 11), (12, 13, 14, 15)])
+
+        # Interleaved nodes, unavailable CPUs
+        nodes = [range(0, 16, 2), range(1, 16, 2)]
+        shard_cpus = _shard_cpus(range(8), nodes, 2)
+        self.assertTrue(shard_cpus == [(0, 2, 4, 6), (1, 3, 5, 7)])
+
+        slvr_cfg = montblanc.rime_solver_cfg(cpu_affinity=True)
+        budget = plan_thread_budget(slvr_cfg, 1, True)
+        cpus = [c for s in budget.shard_cpus for c in s]
+        self.assertTrue(sorted(cpus) == sorted(available_cpus()))
+
+    def test_pin_thread(self):
+        """ Test pinning the calling thread to the available CPUs """
+        self.assertTrue(pin_thread(available_cpus()))
+
+    def test_configure_openmp(self):
+        """ Test that OpenMP threads are only configured once """
+        env_threads = os.environ.pop('OMP_NUM_THREADS', None)
+        configured = thread_budget._configured_omp_threads
+
+        try:
+            thread_budget._configured_omp_threads = None
+            configure_openmp(montblanc.rime_solver_cfg(cpu_threads=4,
+                shards_per_device=2))
+            self.assertEqual(os.environ['OMP_NUM_THREADS'], '2')
+            self.assertEqual(thread_budget._configured_omp_threads, '2')
+
+            # Later solvers leave the stale value in place
+            configure_openmp(montblanc.rime_solver_cfg(cpu_threads=4,
+                shards_per_device=1))
+            self.assertEqual(os.environ['OMP_NUM_THREADS'], '2')
+        finally:
+            thread_budget._configured_omp_threads = configured
+            os.environ.pop('OMP_NUM_THREADS', None)
+
+            if env_threads is not None:
+                os.environ['OMP_NUM_THREADS'] = env_threads
+
+if __name__ == '__main__':
+    unittest.main()
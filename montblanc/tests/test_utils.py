@@ -98,6 +98,77 @@ class TestUtils(unittest.TestCase):
                 proportion_cplx = np.sum(np.iscomplex(random_ary)) / random_ary.size
                 self.assertTrue(proportion_cplx > 0.9)
 
+    def _array_layout(self, na):
+        """ Antenna ITRF positions near the MeerKAT site """
+        centre = np.array([5109224.3, 2006790.3, -3239100.6])
+        return centre + (np.random.random((na, 3)) - 0.5)*2000.0
+
+    def test_parallactic_angles_casa(self):
+        """ Test vectorised parallactic angles against casacore """
+        times = 5.0e9 + np.linspace(0, 8*3600, 16)
+        positions = self._array_layout(3)
+        field_centre = np.array([3.0, -1.2])
+
+        try:
+            casa_pa = mbu.parallactic_angles(times, positions,
+                field_centre, backend='casa')
+        except (ImportError, RuntimeError) as e:
+            self.skipTest("casacore measures unavailable: {e}".format(e=e))
+
+        pa = mbu.parallactic_angles(times, positions, field_centre)
+        diff = np.angle(np.exp(1j*(pa - casa_pa)))
+
+        # Nutation, aberration and UT1 are ignored
+        self.assertTrue(np.all(np.abs(diff) < 1e-3))
+
+    def test_parallactic_angles_transit(self):
+        """ Test parallactic angles of fields transiting the meridian """
+        from montblanc.util.parallactic_angles import (
+            _itrf_to_geodetic, _j2000_zenith)
+
+        # Geodetic coordinates of points on the WGS84 ellipsoid
+        a, f = 6378137.0, 1.0/298.257223563
+        e2 = f*(2.0 - f)
+        phi = np.deg2rad(-30.0)
+        N = a / np.sqrt(1.0 - e2*np.sin(phi)**2)
+
+        lon, lat = _itrf_to_geodetic(np.array([[a, 0, 0], [0, a, 0],
+            [N*np.cos(phi), 0, N*(1.0 - e2)*np.sin(phi)]]))
+        self.assertTrue(np.allclose(lon, [0, np.pi/2, 0]))
+        self.assertTrue(np.allclose(lat, [0, 0, phi]))
+
+        times = np.array([5.0e9])
+        positions = self._array_layout(1)
+        zenith_ra, zenith_dec = _j2000_zenith(times, positions)
+        ra, dec = zenith_ra[0,0], zenith_dec[0,0]
+
+        # The zenith lies north of a transiting field south of it,
+        # and south of a transiting field north of it
+        south_pa = mbu.parallactic_angles(times, positions,
+            np.array([ra, dec - 0.2]))
+        north_pa = mbu.parallactic_angles(times, positions,
+            np.array([ra, dec + 0.2]))
+
+        self.assertTrue(np.allclose(south_pa, 0.0))
+        self.assertTrue(np.allclose(np.abs(north_pa), np.pi))
+
+    def test_parallactic_angles_interpolation(self):
+        """ Test parallactic angles interpolated from a coarse grid """
+        times = 5.0e9 + np.arange(0, 4*3600, 8.0)
+        positions = self._array_layout(4)
+        field_centre = np.array([0.5, -0.5])
+
+        pa = mbu.parallactic_angles(times, positions, field_centre)
+        interp_pa = mbu.parallactic_angles(times, positions,
+            field_centre, interval=16.0)
+
+        self.assertEqual(interp_pa.shape, (times.size, 4))
+        diff = np.angle(np.exp(1j*(pa - interp_pa)))
+        self.assertTrue(np.all(np.abs(diff) < 1e-3))
+
+        self.assertRaises(ValueError, mbu.parallactic_angles,
+            times, positions, field_centre, backend='foo')
+
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(TestUtils)
     unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Simon Perkins
+#
+# This file is part of montblanc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+#
+# You should have received a copy of the GNU General Public License
+
+import threading
+import unittest
+
+import numpy as np
+
+import montblanc
+from montblanc.impl.rime.tensorflow.ms.write_behind import WriteBehindBuffer
+
+class FakeTable(object):
+    """ Table storing columns of 8 byte rows, recording writes """
+    def __init__(self, nrow, fail_at=None, event=None):
+        self.columns = { 'DATA': np.zeros(nrow), 'FLAG': np.zeros(nrow) }
+        self.writes = []
+        self._fail_at = fail_at
+        self._event = event
+
+    def putcol(self, column, data, startrow, nrow):
+        if self._event is not None:
+            self._event.wait()
+
+        if startrow == self._fail_at:
+            raise IOError("Failed writing row '{r}'".format(r=startrow))
+
+        self.writes.append((column, startrow, nrow))
+        self.columns[column][startrow:startrow+nrow] = data
+
+class TestWriteBehindBuffer(unittest.TestCase):
+    """
+    TestWriteBehindBuffer class defining unit tests for
+    coalesced writes from a background I/O thread
+    """
+
+    def setUp(self):
+        """ Set up each test case """
+        montblanc.setup_test_logging()
+
+    def test_coalesced_writes(self):
+        """ Test that adjacent row ranges are coalesced """
+        table = FakeTable(100)
+        buf = WriteBehindBuffer(table, max_bytes=100*8*2)
+
+        # Write ranges of 10 rows out of order
+        for startrow in [30, 10, 20, 0, 60, 50]:
+            buf.write('DATA', np.arange(startrow, startrow+10), startrow, 10)
+
+        buf.close()
+
+        self.assertEqual(sorted(table.writes),
+            [('DATA', 0, 40), ('DATA', 50, 20)])
+        self.assertTrue(np.all(table.columns['DATA'][:40] == np.arange(40)))
+        self.assertTrue(np.all(table.columns['DATA'][50:70] ==
+            np.arange(50, 70)))
+        self.assertEqual(buf.stats(), {'writes': 6, 'table_writes': 2})
+
+    def test_columns_not_coalesced(self):
+        """ Test that adjacent ranges of different columns are separate """
+        table = FakeTable(20)
+        buf = WriteBehindBuffer(table, max_bytes=20*8*2)
+        buf.write('DATA', np.ones(10), 0, 10)
+        buf.write('FLAG', np.ones(10), 10, 10)
+        buf.close()
+
+        self.assertEqual(sorted(table.writes),
+            [('DATA', 0, 10), ('FLAG', 10, 10)])
+
+    def test_bounded(self):
+        """ Test that writes block while the buffer is full """
+        event = threading.Event()
+        table = FakeTable(100, event=event)
+        buf = WriteBehindBuffer(table, max_bytes=20*8, write_bytes=10*8)
+
+        # Fills the buffer, while writes are blocked
+        buf.write('DATA', np.ones(10), 0, 10)
+        buf.write('DATA', np.ones(10), 50, 10)
+
+        thread = threading.Thread(target=buf.write,
+            args=('DATA', np.ones(10), 80, 10))
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+
+        event.set()
+        thread.join()
+        buf.close()
+
+        self.assertEqual(len(table.writes), 3)
+
+    def test_error_propagation(self):
+        """ Test that I/O thread exceptions are re-raised """
+        table = FakeTable(100, fail_at=10)
+        buf = WriteBehindBuffer(table, max_bytes=100*8)
+
+        buf.write('DATA', np.ones(10), 10, 10)
+
+        with self.assertRaises(IOError):
+            buf.close()
+
+        # Subsequent writes raise the original exception
+        with self.assertRaises(IOError):
+            buf.write('DATA', np.ones(10), 40, 10)
+
+if __name__ == '__main__':
+    unittest.main()
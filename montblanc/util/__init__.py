@@ -125,6 +125,21 @@ def flatten(nested):
 
     return flat_return
 
+def freeze(value):
+    """
+    Return a hashable version of the value argument,
+    recursively converting dictionaries into sorted
+    tuples of (key, value) pairs and lists into tuples
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.iteritems()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return tuple(sorted(freeze(v) for v in value))
+
+    return value
+
 def dict_array_bytes(ary, template):
     """
     Return the number of bytes required by an array
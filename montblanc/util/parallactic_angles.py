@@ -29,9 +29,16 @@ try:
 except ImportError as e:
     pm = None
     montblanc.log.warn("python-casacore import failed. "
-                       "Parallactic Angle computation will fail.")
+                       "casacore Parallactic Angle computation will fail.")
 
-def parallactic_angles(times, antenna_positions, field_centre):
+# WGS84 ellipsoid semi-major axis (m) and flattening
+WGS84_A = 6378137.0
+WGS84_F = 1.0 / 298.257223563
+
+ARCSEC = np.pi / (180.0 * 3600.0)
+
+def parallactic_angles(times, antenna_positions, field_centre,
+        backend='numpy', interval=None):
     """
     Computes parallactic angles per timestep for the given
     reference antenna position and field centre.
@@ -45,11 +52,119 @@ def parallactic_angles(times, antenna_positions, field_centre):
             column of MS ANTENNA sub-table
         field_centre : ndarray of shape (2,)
             Field centre, should be obtained from MS PHASE_DIR
+        backend : str
+            'numpy' computes the angles with vectorised spherical
+            astronomy. 'casa' calls casacore measures for each
+            time and antenna.
+        interval : float
+            If supplied, angles are computed on a coarse grid of
+            times spaced interval seconds apart and interpolated.
 
     Returns:
         An array of parallactic angles per time-step
 
     """
+    times = np.asarray(times, dtype=np.float64)
+    antenna_positions = np.asarray(antenna_positions, dtype=np.float64)
+
+    try:
+        pa_fn = { 'numpy': _numpy_parallactic_angles,
+            'casa': _casa_parallactic_angles }[backend]
+    except KeyError:
+        raise ValueError("Invalid parallactic angle backend '{b}'"
+            .format(b=backend))
+
+    if interval is None or times.size < 2:
+        return pa_fn(times, antenna_positions, field_centre)
+
+    # Compute on a grid spanning the times
+    tmin, tmax = times.min(), times.max()
+    ngrid = int(np.ceil((tmax - tmin) / interval)) + 1
+
+    if ngrid >= times.size:
+        return pa_fn(times, antenna_positions, field_centre)
+
+    grid = tmin + interval*np.arange(ngrid)
+    grid_pa = np.unwrap(pa_fn(grid, antenna_positions, field_centre), axis=0)
+
+    # Interpolate unwrapped angles, wrapping into [-pi, pi]
+    pa = np.stack([np.interp(times, grid, grid_pa[:,a])
+        for a in range(grid_pa.shape[1])], axis=1)
+
+    return np.arctan2(np.sin(pa), np.cos(pa))
+
+def _itrf_to_geodetic(positions):
+    """
+    Returns WGS84 geodetic longitude and latitude
+    of ITRF positions with shape (na, 3)
+    """
+    e2 = WGS84_F*(2.0 - WGS84_F)
+    x, y, z = positions.T
+
+    lon = np.arctan2(y, x)
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p*(1.0 - e2))
+
+    # Converges to well below a micro-radian within a few iterations
+    for i in range(5):
+        sin_lat = np.sin(lat)
+        N = WGS84_A / np.sqrt(1.0 - e2*sin_lat*sin_lat)
+        h = p / np.cos(lat) - N
+        lat = np.arctan2(z, p*(1.0 - e2*N/(N + h)))
+
+    return lon, lat
+
+def _j2000_zenith(times, antenna_positions):
+    """
+    Returns the J2000 right ascension and declination of the zenith
+    of each antenna at each time, each with shape (ntime, na).
+
+    Uses Greenwich mean sidereal time (UTC approximating UT1) and
+    IAU 1976 precession, ignoring nutation and aberration.
+    """
+    # Days and Julian centuries since J2000 (MS times are MJD seconds)
+    d = times / 86400.0 + 2400000.5 - 2451545.0
+    T = d / 36525.0
+
+    gmst = np.deg2rad(np.mod(280.46061837 + 360.98564736629*d +
+        0.000387933*T*T - T*T*T/38710000.0, 360.0))
+
+    # IAU 1976 precession angles
+    zeta = (2306.2181*T + 0.30188*T*T + 0.017998*T*T*T)*ARCSEC
+    z = (2306.2181*T + 1.09468*T*T + 0.018203*T*T*T)*ARCSEC
+    theta = (2004.3109*T - 0.42665*T*T - 0.041833*T*T*T)*ARCSEC
+
+    # Zenith of date of each antenna at each time
+    lon, lat = _itrf_to_geodetic(antenna_positions)
+    ra = gmst[:,None] + lon[None,:] - z[:,None]
+    cos_dec, sin_dec = np.cos(lat)[None,:], np.sin(lat)[None,:]
+    cos_theta, sin_theta = np.cos(theta)[:,None], np.sin(theta)[:,None]
+
+    # Precess the zenith back to J2000
+    A = cos_dec*np.sin(ra)
+    B = cos_theta*cos_dec*np.cos(ra) + sin_theta*sin_dec
+    C = -sin_theta*cos_dec*np.cos(ra) + cos_theta*sin_dec
+
+    return (np.arctan2(A, B) - zeta[:,None],
+        np.arcsin(np.clip(C, -1.0, 1.0)))
+
+def _numpy_parallactic_angles(times, antenna_positions, field_centre):
+    """
+    Vectorised parallactic angles, the position angle of the zenith
+    as seen from the field centre, measured in the J2000 frame.
+    """
+    zenith_ra, zenith_dec = _j2000_zenith(times, antenna_positions)
+
+    # Position angle of the zenith from the field centre
+    fc_ra, fc_dec = field_centre
+    dra = zenith_ra - fc_ra
+
+    return np.arctan2(np.sin(dra)*np.cos(zenith_dec),
+        np.cos(fc_dec)*np.sin(zenith_dec) -
+        np.sin(fc_dec)*np.cos(zenith_dec)*np.cos(dra))
+
+def _casa_parallactic_angles(times, antenna_positions, field_centre):
+    """ Parallactic angles computed with casacore measures """
     import pyrap.quanta as pq
 
     try: